@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+链上状态预取缓存
+每次狙击时 Trader 现取 recent blockhash 和优先费估算，要在关键路径上多等两次 RPC 往返。
+这里在后台按固定节奏刷新:
+- getLatestBlockhash (blockhash 约 150 个区块 / 60s 内有效，默认每 2s 刷新)
+- getRecentPrioritizationFees (按交易会写入的账户取最近 150 个 slot 的优先费，取分位数)
+买入路径通过 hints() 零等待读取，超过 max_age 没刷新成功的值不返回 (退回 Trader 自己获取)。
+
+与 Trader 的约定: Trader.buy 的签名里声明了 recent_blockhash / priority_fee
+(微 lamports / CU) 参数时，接收器把缓存中新鲜的值作为关键字参数传入；没有声明的参数不会传。
+每笔狙击节省的时间按对应 RPC 调用的实测耗时 (EWMA) 估算。
+
+Usage: python3 chain_state.py --bench
+"""
+import asyncio
+import itertools
+import math
+import os
+import sys
+import time
+from typing import NamedTuple, Optional
+
+import aiohttp
+from loguru import logger
+
+# ============================================
+# 配置
+# ============================================
+
+CHAIN_STATE_CONFIG = {
+    'enabled': os.getenv('CHAIN_STATE', '1') == '1',
+    'rpc_url': os.getenv('SOLANA_RPC_URL', 'https://api.mainnet-beta.solana.com'),
+    'commitment': 'confirmed',
+    'blockhash_interval': 2.0,      # blockhash 刷新间隔 (秒)
+    'blockhash_max_age': 20.0,      # 超过这个时间没刷新成功视为过期 (远小于 ~60s 的有效期)
+    'fee_interval': 5.0,            # 优先费刷新间隔 (秒)
+    'fee_max_age': 30.0,            # 优先费过期时间 (秒)
+    'fee_accounts': [               # 狙击交易会写入的程序账户 (最多 128 个)
+        '6EF8rrecthR5Dkzon8Nwu78hRvfCKubJ14M5uBEwF6P',   # pump.fun
+        '675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8',  # Raydium AMM v4
+    ],
+    'fee_percentile': 75,           # 取最近 slot 优先费的分位数
+    'fee_min': 1_000,               # 优先费下限 (微 lamports / CU)
+    'fee_max': 2_000_000,           # 优先费上限，防止被个别极端值带偏
+    'timeout': 3.0,                 # 单次 RPC 超时 (秒)
+    'pool_size': 2,                 # HTTP 连接池大小 (两个刷新循环各一条 keep-alive 连接)
+    'ewma_alpha': 0.2,              # RPC 耗时 EWMA 的平滑系数
+}
+
+HINT_BLOCKHASH = 'recent_blockhash'
+HINT_FEE = 'priority_fee'
+HINT_NAMES = (HINT_BLOCKHASH, HINT_FEE)
+
+# ============================================
+# 缓存条目
+# ============================================
+
+class Blockhash(NamedTuple):
+    blockhash: str
+    last_valid_block_height: int
+    slot: int
+    fetched_at: float               # time.monotonic()
+
+
+class FeeEstimate(NamedTuple):
+    micro_lamports: int             # 每 CU 的优先费
+    samples: int                    # 参与计算的 slot 数
+    fetched_at: float
+
+
+class RpcError(Exception):
+    """RPC 返回了 error 字段或无法解析的结果"""
+
+
+def fee_percentile(fees, percentile: float, floor: int, cap: int) -> int:
+    """最近各 slot 优先费的第 percentile 分位数 (最近邻)，限制在 [floor, cap]"""
+    if not fees:
+        return floor
+    ordered = sorted(fees)
+    idx = max(0, math.ceil(len(ordered) * percentile / 100) - 1)
+    return min(cap, max(floor, int(ordered[idx])))
+
+# ============================================
+# 缓存
+# ============================================
+
+class ChainStateCache:
+    """后台刷新 blockhash 和优先费，买入路径零等待读取"""
+
+    def __init__(self, rpc_url: str = None, config: dict = None):
+        self.cfg = {**CHAIN_STATE_CONFIG, **(config or {})}
+        self.rpc_url = rpc_url or self.cfg['rpc_url']
+        self._blockhash: Optional[Blockhash] = None
+        self._fee: Optional[FeeEstimate] = None
+        self._session = None
+        self._tasks = []
+        self._ids = itertools.count(1)
+        self._failing = set()           # 正在连续失败的刷新函数名
+        # 各 RPC 调用的耗时 EWMA (毫秒)，即命中缓存时买入路径省下的时间
+        self.fetch_ms = {HINT_BLOCKHASH: None, HINT_FEE: None}
+        self.stats = {'refreshes': 0, 'failures': 0, 'hits': 0, 'stale': 0, 'snipes': 0, 'saved_ms': 0.0}
+
+    async def start(self):
+        """建立连接并各取一次 (失败不阻塞启动，后台继续重试)"""
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.cfg['pool_size'], keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=self.cfg['timeout']))
+        await asyncio.gather(self._refresh(self.refresh_blockhash), self._refresh(self.refresh_fee))
+        self._tasks = [
+            asyncio.create_task(self._loop(self.refresh_blockhash, self.cfg['blockhash_interval'])),
+            asyncio.create_task(self._loop(self.refresh_fee, self.cfg['fee_interval'])),
+        ]
+        bh = self._blockhash
+        logger.info(f"⛓️ 链上状态缓存已启动: {self.rpc_url} | blockhash "
+                    f"{bh.blockhash[:12] + '...' if bh else '未取到'} | 优先费 "
+                    f"{self._fee.micro_lamports if self._fee else '未取到'} µlamports/CU")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    # ---------- 读取 (买入路径，不做任何 I/O) ----------
+
+    def _fresh(self, entry, max_age: float):
+        if entry is None or time.monotonic() - entry.fetched_at > max_age:
+            self.stats['stale'] += 1
+            return None
+        self.stats['hits'] += 1
+        return entry
+
+    def blockhash(self) -> Optional[Blockhash]:
+        """最近的 blockhash，过期或从未取到时返回 None"""
+        return self._fresh(self._blockhash, self.cfg['blockhash_max_age'])
+
+    def priority_fee(self) -> Optional[FeeEstimate]:
+        """最近的优先费估算，过期或从未取到时返回 None"""
+        return self._fresh(self._fee, self.cfg['fee_max_age'])
+
+    def hints(self, names=HINT_NAMES) -> dict:
+        """names 中仍然新鲜的值，直接作为 Trader.buy 的关键字参数"""
+        hints = {}
+        if HINT_BLOCKHASH in names and (bh := self.blockhash()):
+            hints[HINT_BLOCKHASH] = bh.blockhash
+        if HINT_FEE in names and (fee := self.priority_fee()):
+            hints[HINT_FEE] = fee.micro_lamports
+        return hints
+
+    def record_snipe(self, hints: dict) -> float:
+        """记一笔使用了 hints 的狙击，返回估计节省的毫秒数"""
+        saved = sum(self.fetch_ms[name] or 0.0 for name in hints)
+        self.stats['snipes'] += 1
+        self.stats['saved_ms'] += saved
+        return saved
+
+    # ---------- 后台刷新 ----------
+
+    async def _rpc(self, method: str, params: list):
+        payload = {'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': params}
+        async with self._session.post(self.rpc_url, json=payload) as resp:
+            if resp.status != 200:
+                raise RpcError(f"{method}: HTTP {resp.status}")
+            body = await resp.json(content_type=None)
+        if 'error' in body:
+            err = body['error']
+            raise RpcError(f"{method}: {err.get('message', err) if isinstance(err, dict) else err}")
+        return body['result']
+
+    def _observe(self, name: str, elapsed_ms: float):
+        prev = self.fetch_ms[name]
+        alpha = self.cfg['ewma_alpha']
+        self.fetch_ms[name] = elapsed_ms if prev is None else prev + alpha * (elapsed_ms - prev)
+
+    async def refresh_blockhash(self):
+        start = time.perf_counter()
+        result = await self._rpc('getLatestBlockhash', [{'commitment': self.cfg['commitment']}])
+        self._observe(HINT_BLOCKHASH, (time.perf_counter() - start) * 1000)
+        value = result['value']
+        self._blockhash = Blockhash(value['blockhash'], value['lastValidBlockHeight'],
+                                    result['context']['slot'], time.monotonic())
+
+    async def refresh_fee(self):
+        start = time.perf_counter()
+        result = await self._rpc('getRecentPrioritizationFees', [self.cfg['fee_accounts']])
+        self._observe(HINT_FEE, (time.perf_counter() - start) * 1000)
+        fees = [item['prioritizationFee'] for item in result]
+        estimate = fee_percentile(fees, self.cfg['fee_percentile'], self.cfg['fee_min'], self.cfg['fee_max'])
+        self._fee = FeeEstimate(estimate, len(fees), time.monotonic())
+
+    async def _refresh(self, refresh) -> bool:
+        try:
+            await refresh()
+        except (aiohttp.ClientError, asyncio.TimeoutError, RpcError, KeyError, TypeError, ValueError) as e:
+            self.stats['failures'] += 1
+            # 连续失败只在第一次记警告，避免 RPC 故障时刷屏
+            if refresh.__name__ not in self._failing:
+                self._failing.add(refresh.__name__)
+                logger.warning(f"链上状态刷新失败 ({refresh.__name__}): {str(e) or type(e).__name__}")
+            return False
+        self.stats['refreshes'] += 1
+        if refresh.__name__ in self._failing:
+            self._failing.discard(refresh.__name__)
+            logger.info(f"链上状态刷新恢复 ({refresh.__name__})")
+        return True
+
+    async def _loop(self, refresh, interval: float):
+        """固定节奏刷新: 扣除本次请求耗时再睡眠，不随 RPC 延迟漂移"""
+        next_at = time.monotonic() + interval
+        while True:
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+            next_at = max(next_at + interval, time.monotonic())
+            await self._refresh(refresh)
+
+    def report(self) -> str:
+        s = self.stats
+        now = time.monotonic()
+        parts = []
+        for label, entry, name in (('blockhash', self._blockhash, HINT_BLOCKHASH), ('优先费', self._fee, HINT_FEE)):
+            age = f"{now - entry.fetched_at:.1f}s 前" if entry else "无"
+            rpc = f"{self.fetch_ms[name]:.1f}ms" if self.fetch_ms[name] is not None else "-"
+            parts.append(f"{label} {age} (RPC {rpc})")
+        avg = s['saved_ms'] / s['snipes'] if s['snipes'] else 0.0
+        return (" | ".join(parts) + f" | 刷新 {s['refreshes']} 失败 {s['failures']} | 过期读取 {s['stale']} | "
+                f"狙击 {s['snipes']} 笔，平均节省 {avg:.1f}ms")
+
+# ============================================
+# 本地模拟 RPC + 基准测试
+# ============================================
+
+async def start_mock_rpc(delay_ms: float = 80.0):
+    """
+    模拟 Solana RPC (每个请求延迟 delay_ms)，支持 getLatestBlockhash /
+    getRecentPrioritizationFees / sendTransaction；state['down'] = True 时返回 503，
+    state['error'] 不为 None 时把它原样作为 error 字段返回
+    """
+    from aiohttp import web
+
+    state = {'slot': 300_000_000, 'down': False, 'error': None, 'calls': {}}
+
+    async def handle(request):
+        body = await request.json()
+        await asyncio.sleep(delay_ms / 1000)
+        if state['down']:
+            return web.Response(status=503)
+        if state['error'] is not None:
+            return web.json_response({'jsonrpc': '2.0', 'id': body['id'], 'error': state['error']})
+        method = body['method']
+        state['calls'][method] = state['calls'].get(method, 0) + 1
+        state['slot'] += 1
+        if method == 'getLatestBlockhash':
+            result = {'context': {'slot': state['slot']},
+                      'value': {'blockhash': f"Hash{state['slot']:040d}", 'lastValidBlockHeight': state['slot'] + 150}}
+        elif method == 'getRecentPrioritizationFees':
+            result = [{'slot': state['slot'] - i, 'prioritizationFee': (i * 7919) % 50_000} for i in range(150)]
+        elif method == 'sendTransaction':
+            result = f"Sig{state['slot']:060d}"
+        else:
+            return web.json_response({'jsonrpc': '2.0', 'id': body['id'],
+                                      'error': {'code': -32601, 'message': 'Method not found'}})
+        return web.json_response({'jsonrpc': '2.0', 'id': body['id'], 'result': result})
+
+    app = web.Application()
+    app.router.add_post('/', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/", state
+
+
+class _BenchTrader:
+    """模拟 Trader: 没有传入的链上状态自己去取，然后发送交易 (独立连接，不与缓存抢连接池)"""
+
+    def __init__(self, url: str):
+        self.rpc = ChainStateCache(url)
+
+    async def buy(self, address: str, amount_sol: float, recent_blockhash: str = None, priority_fee: int = None):
+        rpc = self.rpc._rpc
+        if recent_blockhash is None:
+            recent_blockhash = (await rpc('getLatestBlockhash', [{'commitment': 'confirmed'}]))['value']['blockhash']
+        if priority_fee is None:
+            await rpc('getRecentPrioritizationFees', [CHAIN_STATE_CONFIG['fee_accounts']])
+        return await rpc('sendTransaction', [f"{address}:{recent_blockhash}"])
+
+
+async def _run_bench(snipes: int = 20, delay_ms: float = 80.0):
+    runner, url, state = await start_mock_rpc(delay_ms)
+    cache = ChainStateCache(url, {'blockhash_interval': 0.5, 'fee_interval': 1.0,
+                                  'blockhash_max_age': 1.5, 'fee_max_age': 3.0})
+    await cache.start()
+    trader = _BenchTrader(url)
+    trader.rpc._session = aiohttp.ClientSession()
+
+    async def snipe(use_cache: bool) -> float:
+        hints = cache.hints() if use_cache else {}
+        start = time.perf_counter()
+        await trader.buy('Addr', 0.01, **hints)
+        elapsed = (time.perf_counter() - start) * 1000
+        if use_cache:
+            cache.record_snipe(hints)
+        return elapsed
+
+    cold = [await snipe(False) for _ in range(snipes)]
+    warm = [await snipe(True) for _ in range(snipes)]
+    hint_ns = time.perf_counter_ns()
+    for _ in range(10000):
+        cache.hints()
+    hint_ns = (time.perf_counter_ns() - hint_ns) / 10000
+
+    # RPC 故障: 超过 max_age 后不再返回过期的值，恢复后重新可用
+    state['down'] = True
+    await asyncio.sleep(cache.cfg['fee_max_age'] + 0.5)
+    stale_hints = cache.hints()
+    state['down'] = False
+    await asyncio.sleep(cache.cfg['fee_interval'] + 0.3)
+    recovered = cache.hints()
+
+    await cache.stop()
+    await trader.rpc.stop()
+    await runner.cleanup()
+
+    cold_avg, warm_avg = sum(cold) / len(cold), sum(warm) / len(warm)
+    print("=" * 64)
+    print(f" ⛓️ CHAIN STATE CACHE (模拟 RPC，每次往返 {delay_ms:.0f}ms，{snipes} 笔)")
+    print("=" * 64)
+    print(f"现取 blockhash + 优先费: 平均 {cold_avg:7.1f}ms / 笔")
+    print(f"使用缓存:                平均 {warm_avg:7.1f}ms / 笔")
+    print(f"实测节省 {cold_avg - warm_avg:.1f}ms，估算节省 {cache.stats['saved_ms'] / snipes:.1f}ms / 笔")
+    print(f"hints() 读取 {hint_ns / 1000:.2f}µs")
+    print(f"RPC 故障 {cache.cfg['fee_max_age'] + 0.5:.1f}s 后: {stale_hints or '无 (全部过期)'}")
+    print(f"恢复后: {sorted(recovered)}")
+    print(f"RPC 调用: {state['calls']}")
+    print(cache.report())
+    print("=" * 64)
+
+
+def run_bench():
+    asyncio.run(_run_bench())
+
+
+if __name__ == "__main__":
+    if '--bench' in sys.argv:
+        run_bench()
+    else:
+        print(__doc__)
@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+"""
+延迟感知的执行路由
+各节点的 scripts/latency_test.py --daemon 把到各端点的延迟摘要写到 Master (latency:matrix)。
+接收端定期读取这张表，买入时比较本地和其他节点到目标 RPC 的 p99:
+- 远端 p99 × RPC 往返次数 + 转发一跳 明显低于本地时，把这笔交易交给那个节点执行
+- 请求 / 确认走 Redis。请求带截止时间 (按时钟同步的偏差换算成执行节点的时钟)，过期的请求执行节点直接拒绝
+- 谁来买由 Redis 上的认领键决定 (SET NX，先写入者执行): 执行节点认领成功才确认并买入；
+  接收端没有及时收到确认时先替本地认领，认领成功才本地执行，所以时钟偏差再大也不会两边都买
+- 确认之后不再回退 (对方可能已经发出交易)，等待执行结果；结果消息丢失时视为"未知"，
+  从执行节点保存的结果中核对，而不是当作失败
+
+节点侧 (需要 Trader 和钱包): python3 exec_router.py --agent
+"""
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import NamedTuple, Optional
+
+import redis.asyncio as aioredis
+import yaml
+from loguru import logger
+
+import supervisor
+import wire
+
+# ============================================
+# 配置
+# ============================================
+
+ROUTER_CONFIG = {
+    'enabled': os.getenv('EXEC_ROUTING', '0') == '1',   # 默认关闭，EXEC_ROUTING=1 启用
+    'local': os.getenv('NODE_LOCATION', 'LA'),   # 接收端所在节点 (延迟摘要中的 loc)
+    'target': 'Solana Mainnet RPC',     # 交易发往的 RPC (latency_test.py ENDPOINTS 中的名字)
+    'rpc_round_trips': 2,               # 一笔买入经过的 RPC 往返次数 (取 blockhash + 发送交易)
+    'min_saving_ms': 10,                # 预计节省少于它时不转发
+    'default_hop_ms': 80,               # 没有时钟同步 RTT 时假设的转发单程耗时
+    'ack_timeout_ms': 150,              # 执行节点必须在这个时间内确认 (写入请求的截止时间)
+    'ack_grace_ms': 100,                # 接收端额外等待确认消息在路上的时间
+    'claim_ttl': 3600,                  # 认领键 / 执行结果保留时间 (秒)
+    'result_timeout': 30,               # 已确认的请求等待执行结果的上限 (秒)
+    'reconcile_timeout': 300,           # 结果未知时继续从执行节点保存的结果中核对的时间 (秒)
+    'reconcile_interval': 2,            # 核对的轮询间隔 (秒)
+    'refresh_interval': 5,              # 重新读取延迟表和执行节点心跳的间隔 (秒)
+    'report_max_age': 180,              # 延迟摘要超过这个时间视为过期 (秒)
+    'agent_heartbeat': 2,               # 执行节点心跳间隔 (秒)
+    'agent_max_age': 6,                 # 心跳超过这个时间的节点不参与路由 (秒)
+}
+
+LATENCY_KEY = 'latency:matrix'          # 与 scripts/latency_test.py 一致
+
+# ============================================
+# 路由决策
+# ============================================
+
+class Route(NamedTuple):
+    node: str
+    remote_p99: float
+    local_p99: float
+    hop_ms: float
+    saving_ms: float
+
+
+class RemoteResult(NamedTuple):
+    """
+    字段与 Trader.buy 的返回值一致，execute_snipe 不区分本地 / 远端执行
+    unknown=True 表示执行节点已接单但结果没有送达: 可能已经成交，需要用 request_id 核对
+    """
+    success: bool
+    tx_signature: Optional[str]
+    price: Optional[float]
+    output_amount: Optional[float]
+    error: Optional[str]
+    node: str
+    request_id: str = ''
+    unknown: bool = False
+
+
+def _remote_result(done: dict, node: str, req_id: str) -> RemoteResult:
+    return RemoteResult(bool(done.get('success')), done.get('tx'), done.get('price'),
+                        done.get('output_amount'), done.get('error'), node, req_id)
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class ExecutionRouter:
+    """接收端: 维护各节点的延迟表，选择执行节点并完成请求 / 确认"""
+
+    def __init__(self, redis_client, hop_ms=None, clock_offset_ns=None, config: dict = None):
+        """
+        hop_ms(loc) 返回到该节点的单程转发耗时 (毫秒)，未知时返回 None
+        clock_offset_ns(loc) 返回 该节点时钟 - 本地时钟 (纳秒)，未知时返回 None
+        """
+        self.redis_client = redis_client
+        self.config = {**ROUTER_CONFIG, **(config or {})}
+        self.hop_ms = hop_ms or (lambda loc: None)
+        self.clock_offset_ns = clock_offset_ns or (lambda loc: None)
+        self.table = {}       # loc -> {endpoint: 摘要}
+        self.agents = {}      # loc -> 心跳时间 (纪元秒)
+        self.stats = Counter()
+        self.saved_ms = 0.0
+        self._pending = {}    # 请求 id -> (确认 future, 结果 future)
+        self._ids = itertools.count()
+        self._prefix = f"{self.config['local']}-{os.getpid()}-"
+        self._task = None
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresh_loop())
+        logger.info(f"🧭 执行路由已启用: 目标 {self.config['target']}，"
+                    f"可用节点 {sorted(self._live_agents()) or '无'}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        for ack, result in self._pending.values():
+            for future in (ack, result):
+                if not future.done():
+                    future.cancel()
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.config['refresh_interval'])
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.debug(f"延迟表刷新失败: {e}")
+
+    async def refresh(self):
+        """重新读取各节点的延迟摘要和执行节点心跳"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hgetall(LATENCY_KEY)
+        pipe.hgetall(wire.KEY_EXEC_AGENTS)
+        reports, agents = await pipe.execute()
+        now = time.time()
+        table = {}
+        for raw in reports.values():
+            try:
+                report = json.loads(raw)
+                if report.get('loc') and now - report['ts'] <= self.config['report_max_age']:
+                    table[report['loc']] = report['endpoints']
+            except (ValueError, KeyError, TypeError):
+                continue
+        self.table = table
+        self.agents = {_text(loc): float(ts) for loc, ts in agents.items()}
+
+    def _live_agents(self) -> list:
+        now = time.time()
+        return [loc for loc, ts in self.agents.items() if now - ts <= self.config['agent_max_age']]
+
+    def choose(self) -> Optional[Route]:
+        """预计节省最多的远端节点；本地没有延迟数据或没有更快的节点时返回 None"""
+        target, local = self.config['target'], self.config['local']
+        local_p99 = self.table.get(local, {}).get(target, {}).get('p99')
+        if local_p99 is None:
+            return None
+        best = None
+        for loc in self._live_agents():
+            if loc == local:
+                continue
+            p99 = self.table.get(loc, {}).get(target, {}).get('p99')
+            if p99 is None:
+                continue
+            hop = self.hop_ms(loc)
+            hop = self.config['default_hop_ms'] if hop is None else hop
+            saving = (local_p99 - p99) * self.config['rpc_round_trips'] - hop
+            if saving >= self.config['min_saving_ms'] and (best is None or saving > best.saving_ms):
+                best = Route(loc, p99, local_p99, hop, saving)
+        return best
+
+    async def execute(self, route: Route, address: str, symbol: str, amount_sol: float) -> Optional[RemoteResult]:
+        """
+        把买入交给 route.node 执行
+        对方没有订阅、拒绝或没有及时确认 (且本地认领成功) 时返回 None，由调用方本地执行
+        """
+        loop = asyncio.get_running_loop()
+        req_id = f"{self._prefix}{next(self._ids)}"
+        ack, result = loop.create_future(), loop.create_future()
+        self._pending[req_id] = (ack, result)
+        self.stats['routed'] += 1
+        # 截止时间用执行节点的时钟表示，它在自己那边直接和 time.time_ns() 比较
+        offset_ns = self.clock_offset_ns(route.node) or 0
+        request = json.dumps({
+            'id': req_id,
+            'address': address,
+            'symbol': symbol,
+            'amount_sol': amount_sol,
+            'deadline_ns': time.time_ns() + offset_ns + int(self.config['ack_timeout_ms'] * 1e6),
+        })
+        sent = time.perf_counter()
+        try:
+            try:
+                receivers = await self.redis_client.publish(wire.CHANNEL_EXEC_REQUEST + route.node, request)
+            except Exception as e:
+                self.stats['fallback'] += 1
+                logger.warning(f"↩️ 转发 {symbol} 到 {route.node} 失败 ({e})，本地执行")
+                return None
+            if not receivers:
+                self.stats['fallback'] += 1
+                logger.warning(f"↩️ {route.node} 没有执行节点在线，本地执行 {symbol}")
+                return None
+
+            wait_s = (self.config['ack_timeout_ms'] + self.config['ack_grace_ms']) / 1000
+            try:
+                reply = await asyncio.wait_for(asyncio.shield(ack), wait_s)
+            except asyncio.TimeoutError:
+                reply = None
+            if reply is None:
+                # 确认可能还在路上: 先替本地认领，执行节点看到认领键后会拒绝
+                claimed = await self._claim_local(req_id)
+                if claimed:
+                    self.stats['fallback'] += 1
+                    logger.warning(f"↩️ {route.node} 未在 {wait_s * 1000:.0f}ms 内确认 {symbol}，本地执行")
+                    return None
+                if claimed is None:
+                    # 认领键写不进去，不知道执行节点是否已经认领: 本地不能买，按结果未知处理
+                    self.stats['unknown'] += 1
+                    return RemoteResult(False, None, None, None, f"{route.node} 未确认且无法认领 {symbol}",
+                                        route.node, req_id, unknown=True)
+                logger.info(f"📨 {route.node} 已先认领 {symbol}，等待执行结果")
+                reply = {'status': 'accepted'}
+            elif reply.get('status') != 'accepted':
+                self.stats['fallback'] += 1
+                logger.warning(f"↩️ {route.node} 拒绝 {symbol} ({reply.get('reason')})，本地执行")
+                return None
+
+            ack_ms = (time.perf_counter() - sent) * 1000
+            self.stats['accepted'] += 1
+            self.saved_ms += route.saving_ms
+            logger.info(f"📨 {route.node} 已接单 {symbol} (确认 {ack_ms:.1f}ms，预计节省 {route.saving_ms:.1f}ms)")
+            try:
+                done = await asyncio.wait_for(result, self.config['result_timeout'])
+            except asyncio.TimeoutError:
+                # 结果消息丢了不代表没成交: 先查一次执行节点保存的结果，仍然没有就交给调用方继续核对
+                done = await self.fetch_result(req_id)
+                if done is None:
+                    self.stats['unknown'] += 1
+                    return RemoteResult(False, None, None, None,
+                                        f"{route.node} 未在 {self.config['result_timeout']}s 内返回结果",
+                                        route.node, req_id, unknown=True)
+            return _remote_result(done, route.node, req_id)
+        finally:
+            self._pending.pop(req_id, None)
+
+    async def _claim_local(self, req_id: str) -> Optional[bool]:
+        """替接收端认领请求: True 认领成功，False 执行节点已认领，None Redis 出错"""
+        try:
+            return bool(await self.redis_client.set(wire.KEY_EXEC_CLAIM + req_id, self.config['local'],
+                                                    nx=True, ex=self.config['claim_ttl']))
+        except Exception as e:
+            logger.error(f"认领 {req_id} 失败: {e}")
+            return None
+
+    async def fetch_result(self, req_id: str) -> Optional[dict]:
+        """读取执行节点保存的执行结果，没有 (或读取失败) 时返回 None"""
+        try:
+            raw = await self.redis_client.get(wire.KEY_EXEC_RESULT + req_id)
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.debug(f"读取执行结果 {req_id} 失败: {e}")
+            return None
+
+    async def reconcile(self, unknown: RemoteResult) -> Optional[RemoteResult]:
+        """
+        结果未知的请求: 在 reconcile_timeout 内轮询执行节点保存的结果
+        返回最终结果；超时仍然没有结果时返回 None (需要人工核对)
+        """
+        deadline = time.monotonic() + self.config['reconcile_timeout']
+        while True:
+            done = await self.fetch_result(unknown.request_id)
+            if done is not None:
+                self.stats['reconciled'] += 1
+                return _remote_result(done, unknown.node, unknown.request_id)
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(self.config['reconcile_interval'])
+
+    def handle_reply(self, raw):
+        """处理执行节点发来的确认 / 拒绝 / 结果"""
+        try:
+            reply = json.loads(raw)
+            req_id = reply['id']
+            status = reply['status']
+        except (ValueError, KeyError, TypeError) as e:
+            logger.debug(f"无效执行回复: {e}")
+            return
+        futures = self._pending.get(req_id)
+        if futures is None:
+            if status == 'accepted':
+                # 认领键保证只有一方执行；走到这里说明确认到得很晚 (此时已经在等结果或已核对)
+                logger.warning(f"⚠️ 请求结束后才收到 {reply.get('node')} 的确认 ({req_id})")
+            return
+        ack, result = futures
+        if status == 'done':
+            if not ack.done():
+                ack.set_result({'status': 'accepted'})
+            if not result.done():
+                result.set_result(reply)
+        elif not ack.done():
+            ack.set_result(reply)
+
+    def report(self) -> str:
+        live = sorted(self._live_agents())
+        target = self.config['target']
+        p99s = ", ".join(f"{loc}={endpoints[target]['p99']}ms" for loc, endpoints in sorted(self.table.items())
+                         if endpoints.get(target, {}).get('p99') is not None)
+        return (f"转发 {self.stats['routed']} | 远端接单 {self.stats['accepted']} | 回退本地 {self.stats['fallback']} | "
+                f"结果未知 {self.stats['unknown']} (已核对 {self.stats['reconciled']}) | 累计预计节省 {self.saved_ms:.0f}ms | 执行节点 {live or '无'} | "
+                f"{target} p99: {p99s or '无数据'}")
+
+# ============================================
+# 执行节点
+# ============================================
+
+class ExecutionAgent:
+    """节点侧: 接收转发过来的买入，在截止时间前确认后用本节点的 Trader 执行"""
+
+    def __init__(self, redis_client, location: str, trader, config: dict = None):
+        self.redis_client = redis_client
+        self.location = location
+        self.trader = trader
+        self.config = {**ROUTER_CONFIG, **(config or {})}
+        self._tasks = set()
+
+    async def _reply(self, req_id: str, status: str, **fields):
+        await self.redis_client.publish(wire.CHANNEL_EXEC_REPLY, json.dumps(
+            {'id': req_id, 'status': status, 'node': self.location, **fields}))
+
+    async def _heartbeat_loop(self):
+        while True:
+            try:
+                await self.redis_client.hset(wire.KEY_EXEC_AGENTS, self.location, time.time())
+            except Exception as e:
+                logger.warning(f"心跳写入失败: {e}")
+            await asyncio.sleep(self.config['agent_heartbeat'])
+
+    async def handle(self, raw):
+        try:
+            request = json.loads(raw)
+            req_id = request['id']
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"无效执行请求: {e}")
+            return
+        symbol = request.get('symbol', 'NEW')
+        # 截止时间已过: 接收端已经 (或即将) 本地执行，这里不能再买
+        late_ms = (time.time_ns() - request.get('deadline_ns', 0)) / 1e6
+        if late_ms > 0:
+            logger.warning(f"⏰ {symbol} 请求已过截止时间 {late_ms:.1f}ms，拒绝")
+            await self._reply(req_id, 'rejected', reason=f"expired {late_ms:.1f}ms")
+            return
+        if self.trader is None:
+            await self._reply(req_id, 'rejected', reason="no trader")
+            return
+        # 认领: 接收端超时后会替本地认领，谁先写入谁执行
+        try:
+            claimed = await self.redis_client.set(wire.KEY_EXEC_CLAIM + req_id, self.location,
+                                                  nx=True, ex=self.config['claim_ttl'])
+        except Exception as e:
+            # 没有认领就不确认，接收端超时后自己认领并本地执行
+            logger.error(f"认领 {req_id} 失败，不执行: {e}")
+            return
+        if not claimed:
+            logger.warning(f"⏰ {symbol} 已由接收端本地执行，拒绝")
+            await self._reply(req_id, 'rejected', reason="claimed by receiver")
+            return
+
+        # 先确认再执行: 认领之后接收端不会再本地买入
+        await self._reply(req_id, 'accepted')
+        logger.warning(f"🎯 执行转发的狙击 {symbol} ({request['address'][:16]}...) - {request['amount_sol']} SOL")
+        try:
+            result = await self.trader.buy(request['address'], request['amount_sol'])
+            done = {'success': result.success, 'tx': result.tx_signature, 'price': result.price,
+                    'output_amount': result.output_amount, 'error': result.error}
+        except Exception as e:
+            logger.error(f"转发狙击执行错误: {e}")
+            done = {'success': False, 'error': str(e)}
+        # 结果先保存再发布: 发布的消息丢了，接收端还能从这里核对
+        try:
+            await self.redis_client.set(wire.KEY_EXEC_RESULT + req_id, json.dumps(done), ex=self.config['claim_ttl'])
+        except Exception as e:
+            logger.error(f"保存执行结果 {req_id} 失败: {e}")
+        await self._reply(req_id, 'done', **done)
+
+    async def run(self):
+        subscription = supervisor.PubSubSupervisor(
+            self.redis_client, [wire.CHANNEL_EXEC_REQUEST + self.location], name=f"agent-{self.location}")
+        await subscription.connect()
+        heartbeat = asyncio.create_task(self._heartbeat_loop())
+        logger.info(f"🛠️ 执行节点 [{self.location}] 等待转发的交易...")
+        try:
+            async for message in subscription.messages():
+                task = asyncio.create_task(self.handle(message['data']))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            heartbeat.cancel()
+            logger.info(f"🔌 订阅连接: {subscription.report()}")
+            await self.redis_client.hdel(wire.KEY_EXEC_AGENTS, self.location)
+            await subscription.close()
+
+
+async def run_agent():
+    """读取 mesh 配置 (Redis / 节点位置) 和机器人配置 (Trader / 钱包)，启动执行节点"""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml')) as f:
+        mesh = yaml.safe_load(f)
+    redis_client = aioredis.Redis(
+        host=mesh['redis']['host'],
+        port=mesh['redis']['port'],
+        password=mesh['redis']['password'],
+        db=mesh['redis']['db'],
+        socket_timeout=mesh['redis']['socket_timeout'],
+        decode_responses=True,
+        **supervisor.connection_kwargs(asyncio_client=True)
+    )
+
+    sys.path.insert(0, os.path.expanduser('~/solana-sniper-bot/src'))
+    trader = None
+    try:
+        from trader import Trader
+        from solders.keypair import Keypair
+        config_path = os.path.expanduser('~/solana-sniper-bot/config/config.yaml')
+        with open(config_path) as f:
+            config = yaml.safe_load(f)
+        trader = Trader(config)
+        await trader.start()
+        wallet_path = config.get('wallet', {}).get('keypair_path', '')
+        if wallet_path and os.path.exists(wallet_path):
+            with open(wallet_path) as f:
+                trader.set_wallet(Keypair.from_bytes(bytes(json.load(f))))
+        else:
+            logger.warning("⚠️ 未配置钱包，将以模拟模式运行")
+    except (ImportError, OSError) as e:
+        logger.error(f"无法初始化 Trader ({e})，收到的请求都会被拒绝")
+
+    await ExecutionAgent(redis_client, mesh['node']['location'], trader).run()
+
+
+if __name__ == "__main__":
+    if '--agent' in sys.argv:
+        asyncio.run(run_agent())
+    else:
+        print(__doc__)
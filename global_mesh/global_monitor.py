@@ -4,21 +4,26 @@
 将 TokenMonitor 检测到的新币通过 Redis 广播到全球网络
 """
 import asyncio
-import json
 import sys
 import os
-from datetime import datetime
+import time
+from collections import deque
 
 # 添加 solana-sniper-bot 路径
 sys.path.insert(0, os.path.expanduser('~/solana-sniper-bot/src'))
 
-import redis
+import redis.asyncio as aioredis
 import yaml
 from loguru import logger
 
 # 导入现有的监控模块
 from monitor import TokenMonitor, NewToken
 
+import stream_transport
+import supervisor
+import wire
+from latency import LatencyHistogram, run_pong_responder
+
 # ============================================
 # 配置
 # ============================================
@@ -35,65 +40,175 @@ REDIS_CONFIG = {
 # 当前节点位置
 NODE_LOCATION = os.getenv('NODE_LOCATION', 'DE')  # HK / JP / DE
 
+# 消息格式: json / binary (先升级所有接收端，再切换到 binary)
+WIRE_FORMAT = os.getenv('WIRE_FORMAT', wire.FORMAT_JSON)
+
+# 传输方式: pubsub / streams (streams 模式下接收端断线重连后可以补收消息)
+MESH_TRANSPORT = os.getenv('MESH_TRANSPORT', stream_transport.TRANSPORT_PUBSUB)
+
 # Redis 频道
 CHANNEL_ALERTS = 'global_alerts'
 CHANNEL_NEW_TOKENS = 'new_tokens'
 
+# 广播队列配置
+BROADCAST_CONFIG = {
+    'max_queue': 1000,          # 待发送队列上限
+    'max_batch': 64,            # 每次 pipeline 往返最多合并的消息数
+    'overflow': 'drop_oldest',  # 队列满时: drop_oldest 丢最旧的 / drop_newest 丢新来的
+    'retry_max_age': 10.0,      # 发送失败的消息放回队列重试，入队超过这个时间的不再重试 (秒)
+    'stats_interval': 60,       # 输出广播统计的间隔 (秒)
+}
+
 # ============================================
 # 全球广播器
 # ============================================
 
 class GlobalBroadcaster:
-    """将本地检测的信号广播到全球网络"""
+    """将本地检测的信号广播到全球网络 (入队立即返回，后台批量发送)"""
     
     def __init__(self):
-        self.redis_client = redis.Redis(
+        self.redis_client = aioredis.Redis(
             host=REDIS_CONFIG['host'],
             port=REDIS_CONFIG['port'],
             password=REDIS_CONFIG['password'],
             db=REDIS_CONFIG['db'],
             socket_timeout=REDIS_CONFIG['socket_timeout'],
-            decode_responses=True
+            decode_responses=True,
+            **supervisor.connection_kwargs(asyncio_client=True)
         )
         self.location = NODE_LOCATION
-        logger.info(f"[{self.location}] 连接到 Redis Master...")
+        self.use_streams = MESH_TRANSPORT == stream_transport.TRANSPORT_STREAMS
+        self._queue = deque()        # (channel, message, label, enqueued_ns)
+        self._ready = asyncio.Event()
+        self._task = None
+        self._sending = False        # 有一批正在发送 (已出队、还没确认)
+        # 发送失败后的重试间隔 (与订阅重连使用相同的退避参数)
+        self._backoff = supervisor.Backoff(supervisor.SUPERVISOR_CONFIG['backoff_base'],
+                                           supervisor.SUPERVISOR_CONFIG['backoff_factor'],
+                                           supervisor.SUPERVISOR_CONFIG['backoff_max'])
+        self.publish_latency = LatencyHistogram()   # 入队 -> Redis 确认
+        self.stats = {'enqueued': 0, 'published': 0, 'dropped': 0, 'failed': 0, 'retried': 0, 'batches': 0}
+        logger.info(f"[{self.location}] 连接到 Redis Master... (传输: {MESH_TRANSPORT})")
         
-    def broadcast_new_token(self, token: NewToken):
-        """广播新代币发现"""
-        message = {
-            'type': 'NEW_TOKEN',
-            'source': self.location,
-            'timestamp': datetime.now().isoformat(),
-            'data': {
-                'address': token.address,
-                'name': token.name,
-                'symbol': token.symbol,
-                'platform': token.platform,
-                'liquidity': token.liquidity,
-                'price': token.price
-            }
-        }
+    def _send(self, pipe, channel: str, message):
+        """按配置的传输方式把一条消息加入 pipeline"""
+        if self.use_streams:
+            stream_transport.publish(pipe, channel, message)
+        else:
+            pipe.publish(channel, message)
+            
+    def _enqueue(self, channel: str, message, label: str) -> bool:
+        """入队一条消息 (不等待网络)，按溢出策略处理队列已满的情况"""
+        if len(self._queue) >= BROADCAST_CONFIG['max_queue']:
+            self.stats['dropped'] += 1
+            if BROADCAST_CONFIG['overflow'] == 'drop_newest':
+                logger.warning(f"[{self.location}] ⚠️ 广播队列已满，丢弃 {label}")
+                return False
+            _, _, old_label, _ = self._queue.popleft()
+            logger.warning(f"[{self.location}] ⚠️ 广播队列已满，丢弃最旧的 {old_label}")
+        self._queue.append((channel, message, label, time.perf_counter_ns()))
+        self.stats['enqueued'] += 1
+        self._ready.set()
+        return True
+        
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
         
-        try:
-            receivers = self.redis_client.publish(CHANNEL_NEW_TOKENS, json.dumps(message))
-            logger.success(f"[{self.location}] 🚀 广播新币 {token.symbol} -> {receivers} 个接收者")
-        except Exception as e:
-            logger.error(f"[{self.location}] ❌ 广播失败: {e}")
+    def broadcast_new_token(self, token: NewToken) -> bool:
+        """广播新代币发现"""
+        message = wire.encode_message('NEW_TOKEN', self.location, {
+            'address': token.address,
+            'name': token.name,
+            'symbol': token.symbol,
+            'platform': token.platform,
+            'liquidity': token.liquidity,
+            'price': token.price
+        }, fmt=WIRE_FORMAT)
+        return self._enqueue(CHANNEL_NEW_TOKENS, message, f"新币 {token.symbol}")
             
-    def broadcast_alert(self, alert_type: str, data: dict):
+    def broadcast_alert(self, alert_type: str, data: dict) -> bool:
         """广播通用报警"""
-        message = {
-            'type': alert_type,
-            'source': self.location,
-            'timestamp': datetime.now().isoformat(),
-            'data': data
-        }
+        message = wire.encode_message(alert_type, self.location, data, fmt=WIRE_FORMAT)
+        return self._enqueue(CHANNEL_ALERTS, message, f"报警 {alert_type}")
+        
+    async def start(self):
+        """启动后台发送任务"""
+        self._task = asyncio.create_task(self._publish_loop())
+        
+    async def stop(self, timeout: float = 5.0):
+        """尽量发送完队列中的消息后停止"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (self._queue or self._sending) and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        logger.info(f"[{self.location}] 📊 {self.metrics_report()}")
+        await self.redis_client.aclose()
+        
+    async def _publish_loop(self):
+        """把积压的消息合并到一次 pipeline 往返中发送"""
+        while True:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+                
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), BROADCAST_CONFIG['max_batch']))]
+            pipe = self.redis_client.pipeline(transaction=False)
+            for channel, message, _, _ in batch:
+                self._send(pipe, channel, message)
+                
+            self._sending = True
+            try:
+                results = await pipe.execute()
+            except Exception as e:
+                self._sending = False
+                retry = self._requeue(batch)
+                delay = self._backoff.next()
+                logger.error(f"[{self.location}] ❌ 广播失败 ({len(batch)} 条，{retry} 条 {delay:.2f}s 后重试): {e}")
+                await asyncio.sleep(delay)
+                continue
+                
+            self._sending = False
+            self._backoff.reset()
+            done_ns = time.perf_counter_ns()
+            self.stats['batches'] += 1
+            self.stats['published'] += len(batch)
+            for (_, _, label, enqueued_ns), result in zip(batch, results):
+                self.publish_latency.record((done_ns - enqueued_ns) / 1e6)
+                target = f"stream {result}" if self.use_streams else f"{result} 个接收者"
+                logger.success(f"[{self.location}] 🚀 广播{label} -> {target}")
+                
+    def _requeue(self, batch) -> int:
+        """
+        把发送失败的一批放回队首 (保持原顺序)，超过 retry_max_age 的消息已经没有意义，直接计为失败
+        放回后超出队列上限时按溢出策略丢弃
+        """
+        cutoff_ns = time.perf_counter_ns() - int(BROADCAST_CONFIG['retry_max_age'] * 1e9)
+        fresh = [item for item in batch if item[3] >= cutoff_ns]
+        self.stats['failed'] += len(batch) - len(fresh)
+        self.stats['retried'] += len(fresh)
+        self._queue.extendleft(reversed(fresh))
+        while len(self._queue) > BROADCAST_CONFIG['max_queue']:
+            self.stats['dropped'] += 1
+            if BROADCAST_CONFIG['overflow'] == 'drop_newest':
+                self._queue.pop()
+            else:
+                self._queue.popleft()
+        return len(fresh)
         
-        try:
-            receivers = self.redis_client.publish(CHANNEL_ALERTS, json.dumps(message))
-            logger.info(f"[{self.location}] 📡 广播报警 {alert_type} -> {receivers} 个接收者")
-        except Exception as e:
-            logger.error(f"[{self.location}] ❌ 广播失败: {e}")
+    def metrics_report(self) -> str:
+        hist = self.publish_latency
+        batches = self.stats['batches']
+        avg_batch = self.stats['published'] / batches if batches else 0
+        return (
+            f"广播队列深度 {self.queue_depth} | 已发送 {self.stats['published']} | 丢弃 {self.stats['dropped']} | "
+            f"重试 {self.stats['retried']} | 失败 {self.stats['failed']} | 平均批大小 {avg_batch:.1f} | "
+            f"发送延迟 p50 {hist.percentile(50):.1f}ms p99 {hist.percentile(99):.1f}ms max {hist.max_ms:.1f}ms"
+        )
 
 # ============================================
 # 主程序
@@ -105,9 +220,15 @@ async def on_new_token_detected(token: NewToken):
     """当检测到新币时的回调"""
     logger.info(f"🆕 检测到新币: {token.symbol} ({token.platform})")
     
-    # 广播到全球网络
+    # 广播到全球网络 (只入队，不等待网络)
     broadcaster.broadcast_new_token(token)
 
+async def log_broadcast_stats():
+    """定期输出广播队列统计"""
+    while True:
+        await asyncio.sleep(BROADCAST_CONFIG['stats_interval'])
+        logger.info(f"[{NODE_LOCATION}] 📊 {broadcaster.metrics_report()}")
+
 async def main():
     """主入口"""
     logger.info(f"="*50)
@@ -129,6 +250,13 @@ async def main():
             'rpc': {'helius_api_key': ''}
         }
     
+    # 启动后台广播队列
+    await broadcaster.start()
+    stats_task = asyncio.create_task(log_broadcast_stats())
+    
+    # 回应接收端的时钟同步 ping (用于估算本节点的时钟偏差)
+    clock_task = asyncio.create_task(run_pong_responder(broadcaster.redis_client, NODE_LOCATION))
+    
     # 创建监控器
     monitor = TokenMonitor(config, on_new_token_detected)
     
@@ -139,6 +267,10 @@ async def main():
     except KeyboardInterrupt:
         logger.info("停止监控...")
         await monitor.stop()
+    finally:
+        clock_task.cancel()
+        stats_task.cancel()
+        await broadcaster.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
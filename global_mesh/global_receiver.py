@@ -2,34 +2,50 @@
 """
 全球网络接收器 (运行在洛杉矶)
 接收全球节点广播的新币信号，触发 Telegram 通知和狙击交易
+
+启动顺序: 先连上 Redis 并订阅 (之后到达的信号都不会丢)，
+交易 / 通知模块在线程里并行导入，Redis / RPC / Telegram 连接在第一条信号前预热；
+交易就绪前到达的买入信号等待就绪 (最多 trade_ready_wait 秒)，通知先缓存
 """
+import time
+PROCESS_START_NS = time.perf_counter_ns()   # 启动计时起点 (在其他导入之前)
+
 import asyncio
+import functools
+import importlib
+import inspect
 import json
 import sys
 import os
+import signal
 from datetime import datetime
 
 sys.path.insert(0, os.path.expanduser('~/solana-sniper-bot/src'))
 
-import redis
+import redis.asyncio as aioredis
 import yaml
 from loguru import logger
 
-# 尝试导入模块
-try:
-    from notifications import Notifier
-    NOTIFIER_AVAILABLE = True
-except ImportError:
-    NOTIFIER_AVAILABLE = False
-    logger.warning("无法导入 Notifier，Telegram 通知禁用")
+from exec_router import ROUTER_CONFIG, ExecutionRouter
+from latency import ClockSync, LatencyTracker
+from notify_queue import NotificationQueue
+from position_store import PositionStore
+from signal_dedup import SignalDedup
+from snipe_rules import RULES_PATH, RuleEngine, rules_from_sniper_config
+import stream_transport
+import supervisor
+import wire
 
-try:
-    from trader import Trader
-    from solders.keypair import Keypair
-    TRADER_AVAILABLE = True
-except ImportError:
-    TRADER_AVAILABLE = False
-    logger.warning("无法导入 Trader，自动交易禁用")
+# 重模块 (trader / solders / notifications / aiohttp) 不在这里导入:
+# 启动时在线程里并行导入，订阅不用等它们
+
+def import_optional(*names):
+    """在线程中调用: 依次导入模块，全部成功返回模块列表，任何一个不可用返回 None"""
+    try:
+        return [importlib.import_module(name) for name in names]
+    except ImportError as e:
+        logger.warning(f"无法导入 {', '.join(names)}: {e}")
+        return None
 
 # ============================================
 # 配置
@@ -46,10 +62,26 @@ REDIS_CONFIG = {
 # 订阅的频道
 CHANNELS = ['global_alerts', 'new_tokens']
 
+# 时钟同步 pong 频道 (接收端 decode_responses=False，频道名是 bytes)
+CLOCK_PONG_CHANNEL = wire.CHANNEL_CLOCK_PONG.encode()
+EXEC_REPLY_CHANNEL = wire.CHANNEL_EXEC_REPLY.encode()
+
+# 接收器配置
+RECEIVER_CONFIG = {
+    'max_concurrency': 16,              # 同时处理的消息数上限 (超过时读取端等待)
+    'stats_interval': 300,              # 定期输出赛跑统计的间隔 (秒)
+    'transport': os.getenv('MESH_TRANSPORT', stream_transport.TRANSPORT_PUBSUB),  # pubsub / streams
+    'stream_group': 'global_receiver',  # Streams 模式下的消费组
+    'positions_path': os.path.expanduser('~/solana-sniper-bot/data/positions.wal'),  # 持仓日志
+    'trade_ready_wait': 5.0,            # 启动期间到达的买入信号最多等待交易就绪的时间 (秒)
+}
+
 # ============================================
 # 狙击配置
 # ============================================
 
+# 平台 / 流动性 / 买入数量等过滤条件在 snipe_rules.yaml 中配置 (热加载)，
+# 下面的 buy_amount_sol / min_liquidity / platforms 只在找不到规则文件时使用
 SNIPER_CONFIG = {
     'enabled': True,                    # 是否启用自动交易
     'buy_amount_sol': 0.01,             # 每次买入的 SOL 数量
@@ -60,6 +92,35 @@ SNIPER_CONFIG = {
     'stop_loss_percent': 10,            # 止损 %
 }
 
+# ============================================
+# 分阶段计时
+# ============================================
+
+class StageTimer:
+    """记录一条信号 (或启动过程) 在各阶段的耗时 (单调时钟，纳秒)"""
+    
+    def __init__(self, origin: str = 'received', origin_ns: int = None):
+        self.marks = [(origin, origin_ns if origin_ns is not None else time.perf_counter_ns())]
+        
+    def mark(self, stage: str):
+        self.marks.append((stage, time.perf_counter_ns()))
+        
+    def since_received_ms(self, stage: str) -> float:
+        for name, ts in self.marks:
+            if name == stage:
+                return (ts - self.marks[0][1]) / 1e6
+        return float('nan')
+        
+    def summary(self) -> str:
+        parts = []
+        for (_, prev), (name, ts) in zip(self.marks, self.marks[1:]):
+            parts.append(f"{name} +{(ts - prev) / 1e6:.2f}ms")
+        return " | ".join(parts)
+        
+    def report(self) -> str:
+        """每个阶段距起点的累计耗时，一行一个"""
+        return "\n".join(f"   {name:<20} {(ts - self.marks[0][1]) / 1e6:>9.1f}ms" for name, ts in self.marks[1:])
+
 # ============================================
 # 全球接收器
 # ============================================
@@ -69,66 +130,359 @@ class GlobalReceiver:
     
     def __init__(self, config: dict):
         self.config = config
-        self.redis_client = redis.Redis(
+        self.redis_client = aioredis.Redis(
             host=REDIS_CONFIG['host'],
             port=REDIS_CONFIG['port'],
             password=REDIS_CONFIG['password'],
             db=REDIS_CONFIG['db'],
             socket_timeout=REDIS_CONFIG['socket_timeout'],
-            decode_responses=True
+            decode_responses=False,  # 消息可能是二进制格式，由 wire 模块自动识别
+            **supervisor.connection_kwargs(asyncio_client=True)
         )
-        self.pubsub = self.redis_client.pubsub()
+        self.subscription = None     # 订阅连接的监管器 (心跳 + 断线重连 + 重新订阅)
         self.notifier = None
+        self.notify_queue = None     # 后台通知队列 (不在交易路径上等待 Telegram)
         self.trader = None
-        self.positions = {}  # 记录持仓
+        # 持仓: 内存索引 + 预写日志，重启后不会重复买入已持有的代币
+        self.positions = PositionStore(RECEIVER_CONFIG['positions_path'])
+        self.positions.load()
+        # 狙击规则 (编译后的判定函数，规则文件修改后自动替换)
+        self.rules = RuleEngine(RULES_PATH, rules_from_sniper_config(SNIPER_CONFIG))
+        self._handler_slots = None   # 并发上限 (在事件循环内创建)
+        self._handler_tasks = set()  # 正在运行的处理任务
+        self._reconcile_tasks = set()  # 核对结果未知的远端买入
+        self._stats_task = None
+        self.dedup = SignalDedup()   # 跨区域去重 (先到先得)
+        self.latency = LatencyTracker()  # 各节点传播延迟 (已做时钟偏差修正)
+        self.clock_sync = ClockSync(self.redis_client, self.latency)
+        self._clock_task = None
+        self.stream_consumer = None  # Streams 模式下的消费者
+        # 延迟感知的执行路由: 其他节点到目标 RPC 明显更快时把买入转给它 (需要本地 Trader 兜底)
+        self.router = None
+        # 后台预取的 blockhash / 优先费 (chain_state.py)，作为关键字参数传给 Trader.buy
+        self.chain_state = None
+        self._chain_hints = ()
+        # 启动计时 (起点为模块开始导入)；交易就绪前的通知先缓存
+        self.startup = StageTimer('process', PROCESS_START_NS)
+        self.startup.mark('receiver_init')
+        self._trade_ready = asyncio.Event()
+        self._early_notifications = []
+        self._reader_task = None
+        
+    def _hop_ms(self, location: str):
+        """到某个节点的单程转发耗时: 时钟同步 ping/pong 的最小 RTT 的一半"""
+        rtt = self.latency.clock.rtt_ms(location)
+        return rtt / 2 if rtt is not None else None
         
     async def start(self):
-        """启动接收器"""
-        # 初始化 Telegram 通知
-        if NOTIFIER_AVAILABLE:
-            self.notifier = Notifier(self.config)
-            await self.notifier.start()
+        """启动接收器: 先订阅，再并行准备交易 / 通知并预热连接"""
+        # 重模块立即在线程里开始导入，与下面的 Redis 连接 / 订阅同时进行
+        trading_modules = chain_modules = None
+        if SNIPER_CONFIG['enabled']:
+            trading_modules = asyncio.create_task(asyncio.to_thread(import_optional, 'trader', 'solders.keypair'))
+            chain_modules = asyncio.create_task(asyncio.to_thread(import_optional, 'chain_state'))
+        telegram = self.config.get('telegram') or {}
+        use_dispatcher = bool(telegram.get('enabled') and telegram.get('bot_token') and telegram.get('chat_id'))
+        notify_modules = asyncio.create_task(asyncio.to_thread(
+            import_optional, 'telegram_dispatcher' if use_dispatcher else 'notifications'))
         
-        # 初始化交易模块
-        if TRADER_AVAILABLE and SNIPER_CONFIG['enabled']:
-            self.trader = Trader(self.config)
-            await self.trader.start()
-            
-            # 加载钱包
-            wallet_path = self.config.get('wallet', {}).get('keypair_path', '')
-            if wallet_path and os.path.exists(wallet_path):
-                try:
-                    with open(wallet_path, 'r') as f:
-                        keypair_data = json.load(f)
-                    keypair = Keypair.from_bytes(bytes(keypair_data))
-                    self.trader.set_wallet(keypair)
-                    logger.info(f"✅ 钱包已加载: {str(keypair.pubkey())[:16]}...")
-                except Exception as e:
-                    logger.error(f"加载钱包失败: {e}")
-            else:
-                logger.warning("⚠️ 未配置钱包，将以模拟模式运行")
-                
-            logger.info(f"🎯 狙击模式已启用 - 每次买入: {SNIPER_CONFIG['buy_amount_sol']} SOL")
+        # 持仓日志 / 规则热加载只是起后台任务，先于订阅完成
+        await self.positions.start()
+        await self.rules.start()
+        
+        # 1. 订阅 (时钟同步 pong 和执行回复始终走 Pub/Sub)；Redis 不可用时按退避重试
+        use_streams = RECEIVER_CONFIG['transport'] == stream_transport.TRANSPORT_STREAMS
+        control = [wire.CHANNEL_CLOCK_PONG, wire.CHANNEL_EXEC_REPLY]
+        channels = control if use_streams else [*CHANNELS, *control]
+        self.subscription = supervisor.PubSubSupervisor(self.redis_client, channels, name='receiver')
+        await self.subscription.connect()
+        if use_streams:
+            logger.info(f"📚 Streams 模式: {[stream_transport.stream_key(ch) for ch in CHANNELS]}")
         else:
+            logger.info(f"📡 订阅频道: {CHANNELS}")
+        self._handler_slots = asyncio.Semaphore(RECEIVER_CONFIG['max_concurrency'])
+        if use_streams:
+            # gather() 返回的是 Future 而不是协程，不能交给 create_task
+            self._reader_task = asyncio.ensure_future(asyncio.gather(self._pubsub_loop(), self._stream_loop()))
+        else:
+            self._reader_task = asyncio.create_task(self._pubsub_loop())
+        self.startup.mark('subscribed')
+        
+        # 2. 并行: 交易模块 + 钱包 + RPC 预热、通知 + Telegram 预热
+        await asyncio.gather(
+            self._start_trading(trading_modules, chain_modules),
+            self._start_notifications(notify_modules, telegram, use_dispatcher),
+        )
+        self._trade_ready.set()
+        self.startup.mark('trade_ready')
+        for method, args, kwargs in self._early_notifications:
+            self.notify(method, *args, **kwargs)
+        self._early_notifications.clear()
+        
+        self._stats_task = asyncio.create_task(self._stats_loop())
+        self._clock_task = asyncio.create_task(self.clock_sync.run())
+        # kill -USR1 <pid> 随时输出统计
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, self.log_stats)
+        logger.info(f"🚀 启动计时 (自进程加载):\n{self.startup.report()}")
+        logger.info(f"⏱️ 订阅就绪 {self.startup.since_received_ms('subscribed'):.0f}ms，"
+                    f"交易就绪 {self.startup.since_received_ms('trade_ready'):.0f}ms")
+        logger.info(f"🌍 全球接收器启动，等待信号... (并发上限: {RECEIVER_CONFIG['max_concurrency']})")
+        
+        await self._reader_task
+        
+    async def _start_trading(self, modules_task, chain_task):
+        """交易模块: 导入 (线程) -> Trader -> 钱包 -> 预热 RPC 连接 -> 链上状态缓存 -> 执行路由"""
+        if modules_task is None:
             logger.info("💤 狙击模式已禁用")
+            return
+        modules = await modules_task
+        self.startup.mark('trader_imported')
+        if modules is None:
+            logger.warning("自动交易禁用")
+            return
+        trader_module, keypair_module = modules
+        self.trader = trader_module.Trader(self.config)
+        await self.trader.start()
+        self.startup.mark('trader_started')
+        
+        # 加载钱包
+        wallet_path = self.config.get('wallet', {}).get('keypair_path', '')
+        if wallet_path and os.path.exists(wallet_path):
+            try:
+                with open(wallet_path, 'r') as f:
+                    keypair_data = json.load(f)
+                keypair = keypair_module.Keypair.from_bytes(bytes(keypair_data))
+                self.trader.set_wallet(keypair)
+                logger.info(f"✅ 钱包已加载: {str(keypair.pubkey())[:16]}...")
+            except Exception as e:
+                logger.error(f"加载钱包失败: {e}")
+        else:
+            logger.warning("⚠️ 未配置钱包，将以模拟模式运行")
+        logger.info(f"🎯 狙击模式已启用 - 每次买入: {SNIPER_CONFIG['buy_amount_sol']} SOL")
+        
+        await self._prewarm_rpc()
+        await self._start_chain_state(chain_task)
+        
+        if ROUTER_CONFIG['enabled']:
+            self.router = ExecutionRouter(self.redis_client, hop_ms=self._hop_ms,
+                                          clock_offset_ns=self.latency.clock.offset_ns)
+            await self.router.start()
+            
+    async def _prewarm_rpc(self):
+        """
+        第一笔买入前先建立 Trader 到 RPC 的连接:
+        Trader 提供 warmup() 时调用它，否则对它的 RPC 客户端 (solana-py AsyncClient) 做一次 getHealth
+        """
+        warmup = getattr(self.trader, 'warmup', None)
+        if warmup is None:
+            for attr in ('client', 'rpc', 'rpc_client'):
+                client = getattr(self.trader, attr, None)
+                if client is not None and hasattr(client, 'is_connected'):
+                    warmup = client.is_connected
+                    break
+        if warmup is None:
+            logger.debug("Trader 没有可预热的 RPC 客户端")
+            return
+        try:
+            await warmup()
+            self.startup.mark('rpc_warm')
+        except Exception as e:
+            logger.warning(f"RPC 预热失败: {e}")
+            
+    async def _start_chain_state(self, modules_task):
+        """后台刷新 blockhash / 优先费，只在 Trader.buy 能接收这些参数时启动"""
+        modules = await modules_task
+        if modules is None:
+            return
+        chain_state = modules[0]
+        if not chain_state.CHAIN_STATE_CONFIG['enabled']:
+            return
+        try:
+            params = inspect.signature(self.trader.buy).parameters
+        except (TypeError, ValueError):
+            params = {}
+        self._chain_hints = tuple(name for name in chain_state.HINT_NAMES if name in params)
+        if not self._chain_hints:
+            logger.info(f"Trader.buy 不接受 {' / '.join(chain_state.HINT_NAMES)}，不启动链上状态缓存")
+            return
+        self.chain_state = chain_state.ChainStateCache()
+        await self.chain_state.start()
+        self.startup.mark('chain_state_ready')
+            
+    async def _start_notifications(self, modules_task, telegram: dict, use_dispatcher: bool):
+        """通知: 导入 (线程) -> 分发器 / Notifier -> 预热 Telegram 连接"""
+        # 配置了 bot_token / chat_id 时直接走限速分发器 (合并摘要、买入插队)，否则沿用 Notifier
+        modules = await modules_task
+        if modules is None:
+            logger.warning("Telegram 通知禁用")
+            return
+        if use_dispatcher:
+            dispatcher = modules[0].TelegramDispatcher(telegram)
+            await dispatcher.start()
+            self.notify_queue = dispatcher
+            try:
+                await dispatcher.warmup()
+                self.startup.mark('telegram_warm')
+            except Exception as e:
+                logger.warning(f"Telegram 预热失败: {e}")
+        else:
+            self.notifier = modules[0].Notifier(self.config)
+            await self.notifier.start()
+            self.notify_queue = NotificationQueue(self.notifier)
+            await self.notify_queue.start()
+            self.startup.mark('notifier_started')
+            
+    async def _pubsub_loop(self):
+        async for message in self.subscription.messages():
+            await self.dispatch(message)
+                
+    async def _stream_loop(self):
+        """Streams 模式: 批量读取，每条消息的处理任务完成后才确认 (处理途中重启会重新投递)"""
+        self.stream_consumer = consumer = stream_transport.StreamConsumer(
+            self.redis_client, CHANNELS,
+            group=RECEIVER_CONFIG['stream_group'],
+            consumer=stream_transport.default_consumer_name('LA')
+        )
+        async for batch in consumer.batches(ack_on_next=False):
+            for message in batch:
+                task = await self.dispatch(message)
+                if task is None:
+                    consumer.done(message)
+                else:
+                    task.add_done_callback(functools.partial(self._stream_handled, message))
+                    
+    def _stream_handled(self, message, task):
+        """处理任务结束后确认；被取消 (没处理完) 的不确认，下次启动重新投递"""
+        if not task.cancelled():
+            self.stream_consumer.done(message)
+                
+    async def dispatch(self, message):
+        """
+        解码并去重，然后交给独立的处理任务，读取循环立即返回继续收下一条
+        返回处理任务；消息在这里就处理完 (或被丢弃) 时返回 None
+        """
+        recv_ns = time.time_ns()
+        timer = StageTimer()
+        if message.get('channel') == CLOCK_PONG_CHANNEL:
+            self.clock_sync.handle_pong(message['data'])
+            return
+        if message.get('channel') == EXEC_REPLY_CHANNEL:
+            if self.router:
+                self.router.handle_reply(message['data'])
+            return
+            
+        data = self.decode_message(message)
+        if data is None:
+            return
+        timer.mark('decoded')
         
-        # 订阅频道
-        self.pubsub.subscribe(*CHANNELS)
-        logger.info(f"📡 订阅频道: {CHANNELS}")
+        # 每一份副本都计入来源节点的传播延迟
+        if data.get('ts_ns'):
+            self.latency.record(data.get('source', 'UNKNOWN'), data['ts_ns'], recv_ns)
         
-        # 开始监听
-        logger.info("🌍 全球接收器启动，等待信号...")
+        # 其他区域送来的重复新币信号直接丢弃，不做任何处理
+        if data.get('type') == 'NEW_TOKEN':
+            payload = data.get('data', {})
+            address = payload.get('address', '')
+            if address and not self.dedup.check(address, data.get('source', 'UNKNOWN'), payload.get('platform', '')):
+                logger.debug(f"重复信号 [{data.get('source')}] {address[:16]}... (首发: {self.dedup.winner(address)})")
+                return
         
-        for message in self.pubsub.listen():
-            if message['type'] == 'message':
-                await self.handle_message(message)
+        # 并发已满时在这里等待，而不是无限制地堆积任务
+        await self._handler_slots.acquire()
+        task = asyncio.create_task(self._run_handler(data, timer))
+        self._handler_tasks.add(task)
+        task.add_done_callback(self._handler_tasks.discard)
+        return task
+        
+    async def _run_handler(self, data: dict, timer: StageTimer):
+        try:
+            await self.handle_message(data, timer)
+        finally:
+            self._handler_slots.release()
+            
+    async def _stats_loop(self):
+        """定期输出各区域的赛跑成绩"""
+        while True:
+            await asyncio.sleep(RECEIVER_CONFIG['stats_interval'])
+            self.log_stats()
+            
+    def log_stats(self):
+        logger.info(f"🏁 区域赛跑统计:\n{self.dedup.report()}")
+        logger.info(f"🛰️ 传播延迟 (时钟修正后):\n{self.latency.report()}")
+        if self.subscription:
+            logger.info(f"🔌 订阅连接: {self.subscription.report()}")
+        if self.stream_consumer:
+            logger.info(f"📚 Stream 统计: {self.stream_consumer.stats}")
+        if self.router:
+            logger.info(f"🧭 执行路由: {self.router.report()}")
+        if self.chain_state:
+            logger.info(f"⛓️ 链上状态缓存: {self.chain_state.report()}")
+            
+    async def stop(self):
+        """等待在途消息处理完成并关闭连接"""
+        for task in (self._stats_task, self._clock_task):
+            if task:
+                task.cancel()
+        self.log_stats()
+        if self._handler_tasks:
+            await asyncio.gather(*self._handler_tasks, return_exceptions=True)
+        if self.stream_consumer:
+            # 在途消息已处理完，确认它们 (失败时留在未确认列表中，下次启动重新投递)
+            try:
+                await self.stream_consumer.flush()
+            except Exception as e:
+                logger.warning(f"Stream 确认失败: {e}")
+        for task in self._reconcile_tasks:
+            task.cancel()
+        if self.router:
+            await self.router.stop()
+        if self.chain_state:
+            await self.chain_state.stop()
+        if self.notify_queue is not None:
+            await self.notify_queue.stop()
+        await self.positions.stop()
+        await self.rules.stop()
+        if self.subscription:
+            await self.subscription.close()
+        await self.redis_client.aclose()
                 
-    async def handle_message(self, message):
-        """处理收到的消息"""
+    def notify(self, method: str, *args, **kwargs):
+        """把通知交给后台队列 (不等待网络)；启动完成前先缓存"""
+        if self.notify_queue is not None:
+            self.notify_queue.submit(method, *args, **kwargs)
+        elif not self._trade_ready.is_set():
+            self._early_notifications.append((method, args, kwargs))
+            
+    def decode_message(self, message):
+        """
+        解析 Redis 消息并检查结构，无效时返回 None
+        读取循环直接使用 source / data / ts_ns 字段，结构不对的消息不能让它抛异常
+        """
         try:
-            channel = message['channel']
-            data = json.loads(message['data'])
+            data = wire.decode_message(message['data'])
+            if not isinstance(data.get('source', ''), str):
+                raise ValueError("source 不是字符串")
+            payload = data.get('data', {})
+            if not isinstance(payload, dict):
+                raise ValueError("data 不是对象")
+            for field in ('address', 'platform'):
+                if not isinstance(payload.get(field, ''), str):
+                    raise ValueError(f"data.{field} 不是字符串")
+        except ValueError as e:
+            logger.warning(f"无效消息 ({e}): {message['data'][:64]!r}")
+            return None
+        ts_ns = data.get('ts_ns')
+        if ts_ns is not None and (type(ts_ns) is not int or ts_ns <= 0):
+            # 发送时间戳无效只影响延迟统计，消息本身照常处理
+            logger.debug(f"忽略无效的 ts_ns: {ts_ns!r}")
+            data['ts_ns'] = None
+        return data
             
+    async def handle_message(self, data: dict, timer: StageTimer = None):
+        """处理解码后的消息"""
+        timer = timer or StageTimer()
+        try:
             source = data.get('source', 'UNKNOWN')
             msg_type = data.get('type', 'UNKNOWN')
             timestamp = data.get('timestamp', '')
@@ -137,102 +491,161 @@ class GlobalReceiver:
             logger.info(f"⚡ [{source}] {msg_type} @ {timestamp}")
             
             if msg_type == 'NEW_TOKEN':
-                await self.handle_new_token(source, payload)
+                await self.handle_new_token(source, payload, timer)
             elif msg_type == 'PUMP_DETECTED':
                 await self.handle_pump_alert(source, payload)
             else:
                 logger.debug(f"未知消息类型: {msg_type}")
                 
-        except json.JSONDecodeError:
-            logger.warning(f"无效 JSON: {message['data']}")
         except Exception as e:
             logger.error(f"处理消息错误: {e}")
             
-    async def handle_new_token(self, source: str, data: dict):
-        """处理新代币信号"""
+    async def handle_new_token(self, source: str, data: dict, timer: StageTimer = None):
+        """处理新代币信号 (先交易，后通知)"""
+        timer = timer or StageTimer()
         symbol = data.get('symbol', '???')
         address = data.get('address', '')
         platform = data.get('platform', '')
-        liquidity = data.get('liquidity', 0)
+        # 二进制格式中缺失 / NaN 的流动性解码为 None
+        liquidity = data.get('liquidity') or 0.0
         
-        logger.success(f"🆕 收到新币信号 from {source}: {symbol} on {platform}")
-        logger.info(f"   地址: {address[:20]}...")
-        logger.info(f"   流动性: ${liquidity:,.0f}")
+        # 快速路径: 过滤 + 买入决策，不等待任何通知
+        decision = await self.should_snipe(data, source)
+        timer.mark('decided')
+        
+        # 启动期间 (已订阅、交易模块还没就绪) 到达的信号等待就绪，而不是直接放弃
+        if decision and not self._trade_ready.is_set():
+            try:
+                await asyncio.wait_for(self._trade_ready.wait(), RECEIVER_CONFIG['trade_ready_wait'])
+                timer.mark('trade_ready_wait')
+            except asyncio.TimeoutError:
+                logger.warning(f"交易模块 {RECEIVER_CONFIG['trade_ready_wait']}s 内未就绪，放弃 {symbol}")
         
-        # 发送 Telegram 通知
-        if self.notifier:
-            await self.notifier.notify_new_token(symbol, address, f"{platform} (via {source})", liquidity)
+        if decision and self.trader:
+            await self.execute_snipe(data, timer, decision.amount_sol)
         
-        # 检查是否应该自动买入
-        should_buy = await self.should_snipe(data)
+        # 通知放入后台队列，同一代币的重复通知会被合并
+        self.notify('notify_new_token', symbol, address, f"{platform} (via {source})", liquidity,
+                    key=('new_token', address))
         
-        if should_buy and self.trader:
-            await self.execute_snipe(data)
+        logger.success(f"🆕 收到新币信号 from {source}: {symbol} on {platform}")
+        logger.info(f"   地址: {address[:20]}...")
+        logger.info(f"   流动性: ${liquidity:,.0f}")
+        logger.info(f"⏱️ {symbol} 阶段耗时: {timer.summary()}")
             
-    async def should_snipe(self, data: dict) -> bool:
-        """判断是否应该狙击这个代币"""
+    async def should_snipe(self, data: dict, source: str = 'UNKNOWN'):
+        """判断是否应该狙击这个代币，返回命中的规则判定 (Decision)，不买时返回 None"""
         if not SNIPER_CONFIG['enabled']:
-            return False
+            return None
             
-        platform = data.get('platform', '')
-        liquidity = data.get('liquidity', 0)
         address = data.get('address', '')
         
-        # 检查平台
-        if platform not in SNIPER_CONFIG['platforms']:
-            logger.debug(f"跳过: 平台 {platform} 不在白名单")
-            return False
-            
-        # 检查流动性
-        if liquidity < SNIPER_CONFIG['min_liquidity']:
-            logger.debug(f"跳过: 流动性 ${liquidity} < ${SNIPER_CONFIG['min_liquidity']}")
-            return False
-            
         # 检查是否已持仓
         if address in self.positions:
             logger.debug(f"跳过: 已持仓 {address[:16]}...")
-            return False
+            return None
+        
+        # 平台 / 流动性 / 黑名单 / 来源信任度 (snipe_rules.yaml)
+        decision = self.rules.evaluate(data, source)
+        if not decision.buy:
+            logger.debug(f"跳过: {decision.reason}")
+            return None
             
-        return True
+        return decision
         
-    async def execute_snipe(self, data: dict):
-        """执行狙击交易"""
+    async def execute_snipe(self, data: dict, timer: StageTimer = None, buy_amount: float = None):
+        """执行狙击交易 (buy_amount 由命中的规则决定)"""
+        timer = timer or StageTimer()
         address = data.get('address', '')
         symbol = data.get('symbol', 'NEW')
-        buy_amount = SNIPER_CONFIG['buy_amount_sol']
+        buy_amount = buy_amount or SNIPER_CONFIG['buy_amount_sol']
         
         logger.warning(f"🎯 开始狙击 {symbol} ({address[:16]}...) - {buy_amount} SOL")
         
         try:
-            result = await self.trader.buy(address, buy_amount)
+            # 其他节点到目标 RPC 的尾部延迟明显更低时转给它执行，没有及时确认就本地执行
+            result = None
+            route = self.router.choose() if self.router else None
+            if route:
+                logger.info(f"🧭 路由 {symbol} -> {route.node}: p99 {route.remote_p99:.1f}ms + 转发 {route.hop_ms:.1f}ms "
+                            f"vs 本地 {route.local_p99:.1f}ms，预计节省 {route.saving_ms:.1f}ms")
+                timer.mark('routed')
+                result = await self.router.execute(route, address, symbol, buy_amount)
+            if result is None:
+                # 缓存中新鲜的 blockhash / 优先费直接交给 Trader，省掉买入前的 RPC 往返
+                hints = self.chain_state.hints(self._chain_hints) if self.chain_state else {}
+                timer.mark('buy_submitted')
+                logger.info(f"⏱️ 信号→买入提交: {timer.since_received_ms('buy_submitted'):.2f}ms")
+                result = await self.trader.buy(address, buy_amount, **hints)
+                if hints:
+                    saved = self.chain_state.record_snipe(hints)
+                    logger.info(f"⛓️ 预取 {' + '.join(hints)}，预计节省 {saved:.1f}ms")
+            timer.mark('buy_done')
             
-            if result.success:
-                logger.success(f"✅ 狙击成功! TX: {result.tx_signature}")
-                
-                # 记录持仓
-                self.positions[address] = {
+            if getattr(result, 'unknown', False):
+                # 执行节点已接单但结果没送达: 可能已经成交，不能当作失败，也不能再买一次
+                logger.warning(f"❓ {symbol} 在 {result.node} 的执行结果未知 ({result.error})，开始核对")
+                self.positions.add(address, {
                     'symbol': symbol,
-                    'buy_price': result.price,
-                    'amount': result.output_amount,
                     'sol_spent': buy_amount,
+                    'node': result.node,
+                    'status': 'unconfirmed',
+                    'request_id': result.request_id,
                     'timestamp': datetime.now().isoformat()
-                }
-                
-                # 发送成功通知
-                if self.notifier:
-                    await self.notifier.notify_buy(
-                        symbol=symbol,
-                        amount_sol=buy_amount,
-                        token_amount=result.output_amount,
-                        tx=result.tx_signature or "N/A"
-                    )
+                })
+                self.notify('send_message', f"❓ 狙击 {symbol} 已由 {result.node} 接单，结果未知，正在核对",
+                            droppable=False)
+                task = asyncio.create_task(self._reconcile(address, symbol, buy_amount, result))
+                self._reconcile_tasks.add(task)
+                task.add_done_callback(self._reconcile_tasks.discard)
+            elif result.success:
+                self._record_buy(address, symbol, buy_amount, result)
             else:
                 logger.error(f"❌ 狙击失败: {result.error}")
-                if self.notifier:
-                    await self.notifier.notify_error(f"狙击 {symbol} 失败: {result.error}")
+                self.notify('notify_error', f"狙击 {symbol} 失败: {result.error}", droppable=False)
                     
         except Exception as e:
             logger.error(f"狙击执行错误: {e}")
+            self.notify('notify_error', f"狙击 {symbol} 执行错误: {e}", droppable=False)
+            
+    def _record_buy(self, address: str, symbol: str, buy_amount: float, result):
+        """记录成功的买入并发送通知"""
+        executed_by = getattr(result, 'node', ROUTER_CONFIG['local'])
+        logger.success(f"✅ 狙击成功! TX: {result.tx_signature} (执行节点: {executed_by})")
+        
+        # 记录持仓 (内存立即生效，日志由后台分组提交)
+        self.positions.add(address, {
+            'symbol': symbol,
+            'buy_price': result.price,
+            'amount': result.output_amount,
+            'sol_spent': buy_amount,
+            'node': executed_by,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+        # 发送成功通知 (买入结果不会因队列满被丢弃)
+        self.notify(
+            'notify_buy',
+            symbol=symbol,
+            amount_sol=buy_amount,
+            token_amount=result.output_amount,
+            tx=result.tx_signature or "N/A",
+            droppable=False
+        )
+        
+    async def _reconcile(self, address: str, symbol: str, buy_amount: float, unknown):
+        """从执行节点保存的结果中核对未知的远端买入；核对期间持仓保持 unconfirmed，不会重复买入"""
+        result = await self.router.reconcile(unknown)
+        if result is None:
+            logger.error(f"⚠️ {symbol} 在 {unknown.node} 的执行结果仍然未知 ({unknown.request_id})，请人工核对持仓")
+            self.notify('notify_error', f"狙击 {symbol} 在 {unknown.node} 的结果未知，请人工核对 ({unknown.request_id})",
+                        droppable=False)
+        elif result.success:
+            self._record_buy(address, symbol, buy_amount, result)
+        else:
+            self.positions.remove(address)
+            logger.error(f"❌ 狙击失败 (核对): {result.error}")
+            self.notify('notify_error', f"狙击 {symbol} 失败: {result.error}", droppable=False)
             
     async def handle_pump_alert(self, source: str, data: dict):
         """处理 Pump 报警"""
@@ -242,8 +655,8 @@ class GlobalReceiver:
         logger.warning(f"🚨 PUMP 报警 from {source}: {token}")
         logger.info(f"   原因: {reason}")
         
-        if self.notifier:
-            await self.notifier.send_message(f"🚨 *PUMP 报警*\n\n来源: {source}\n代币: {token}\n原因: {reason}")
+        self.notify('send_message', f"🚨 *PUMP 报警*\n\n来源: {source}\n代币: {token}\n原因: {reason}",
+                    key=('pump', token))
 
 # ============================================
 # 主程序
@@ -269,8 +682,10 @@ async def main():
     
     try:
         await receiver.start()
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logger.info("停止接收器...")
+    finally:
+        await receiver.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+端到端传播延迟测量
+- 发布端在每条消息里写入纪元纳秒发送时间 (ts_ns)
+- 接收端按来源节点维护延迟直方图 (p50 / p99 / max)
+- 通过 Redis 上的 ping/pong 估算各节点与接收端的时钟偏差，
+  修正后的单向延迟在跨大洲时也可信
+"""
+import asyncio
+import itertools
+import json
+import math
+import time
+
+from loguru import logger
+
+from supervisor import PubSubSupervisor
+from wire import CHANNEL_CLOCK_PING, CHANNEL_CLOCK_PONG, make_ping, make_pong
+
+# ============================================
+# 配置
+# ============================================
+
+CLOCK_SYNC_CONFIG = {
+    'interval': 10.0,         # ping 间隔 (秒)
+    'window': 16,             # 每个节点保留最近多少个样本，取 RTT 最小的那个
+}
+
+# ============================================
+# 直方图
+# ============================================
+
+class LatencyHistogram:
+    """对数分桶直方图，相对误差约 2%，内存固定"""
+
+    GROWTH = 1.02
+    MIN_MS = 0.01
+
+    def __init__(self):
+        self._log_growth = math.log(self.GROWTH)
+        self.buckets = {}
+        self.count = 0
+        self.negative = 0         # 时钟修正后仍为负的样本 (偏差估计误差)
+        self.max_ms = 0.0
+        self.total_ms = 0.0
+
+    def record(self, value_ms: float):
+        if value_ms < 0:
+            self.negative += 1
+            value_ms = 0.0
+        self.count += 1
+        self.total_ms += value_ms
+        if value_ms > self.max_ms:
+            self.max_ms = value_ms
+        idx = 0 if value_ms <= self.MIN_MS else int(math.log(value_ms / self.MIN_MS) / self._log_growth) + 1
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+
+    def _bucket_value(self, idx: int) -> float:
+        if idx == 0:
+            return self.MIN_MS
+        # 取桶的几何中点
+        return self.MIN_MS * self.GROWTH ** (idx - 0.5)
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return float('nan')
+        target = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= target:
+                return min(self._bucket_value(idx), self.max_ms)
+        return self.max_ms
+
+    @property
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count else float('nan')
+
+# ============================================
+# 时钟偏差估计
+# ============================================
+
+class ClockOffsetEstimator:
+    """
+    NTP 式偏差估计: offset = t1 - (t0 + t3) / 2
+    t0 = 接收端发 ping，t1 = 节点收到 ping，t3 = 接收端收到 pong
+    取窗口内 RTT 最小的样本，排队抖动对它的影响最小
+    """
+
+    def __init__(self, window: int = None):
+        self.window = window or CLOCK_SYNC_CONFIG['window']
+        self.samples = {}   # source -> [(rtt_ns, offset_ns), ...]
+
+    def add_sample(self, source: str, t0: int, t1: int, t3: int):
+        rtt = t3 - t0
+        if rtt < 0:
+            return
+        samples = self.samples.setdefault(source, [])
+        samples.append((rtt, t1 - (t0 + t3) // 2))
+        if len(samples) > self.window:
+            samples.pop(0)
+
+    def offset_ns(self, source: str):
+        """节点时钟 - 接收端时钟 (纳秒)，没有样本时返回 None"""
+        samples = self.samples.get(source)
+        return min(samples)[1] if samples else None
+
+    def rtt_ms(self, source: str):
+        samples = self.samples.get(source)
+        return min(samples)[0] / 1e6 if samples else None
+
+# ============================================
+# 延迟跟踪
+# ============================================
+
+class LatencyTracker:
+    """按来源节点记录单向传播延迟"""
+
+    def __init__(self):
+        self.clock = ClockOffsetEstimator()
+        self.histograms = {}   # source -> LatencyHistogram
+
+    def record(self, source: str, sent_ns: int, recv_ns: int = None):
+        """
+        记录一条消息的传播延迟，返回修正后的毫秒数
+        没有时钟偏差样本时按原始时间差记录
+        """
+        recv_ns = recv_ns if recv_ns is not None else time.time_ns()
+        offset = self.clock.offset_ns(source) or 0
+        latency_ms = (recv_ns - sent_ns + offset) / 1e6
+        hist = self.histograms.get(source)
+        if hist is None:
+            hist = self.histograms[source] = LatencyHistogram()
+        hist.record(latency_ms)
+        return latency_ms
+
+    def report(self) -> str:
+        lines = [f"{'SOURCE':<8} | {'COUNT':>7} | {'P50':>9} | {'P99':>9} | {'MAX':>9} | {'OFFSET':>10} | {'RTT':>9}"]
+        for source in sorted(self.histograms):
+            hist = self.histograms[source]
+            offset = self.clock.offset_ns(source)
+            rtt = self.clock.rtt_ms(source)
+            offset_text = f"{offset / 1e6:+8.2f}ms" if offset is not None else f"{'N/A':>10}"
+            rtt_text = f"{rtt:7.2f}ms" if rtt is not None else f"{'N/A':>9}"
+            lines.append(
+                f"{source:<8} | {hist.count:>7} | {hist.percentile(50):7.2f}ms | "
+                f"{hist.percentile(99):7.2f}ms | {hist.max_ms:7.2f}ms | {offset_text} | {rtt_text}"
+            )
+        return "\n".join(lines)
+
+# ============================================
+# Ping / Pong
+# ============================================
+
+class ClockSync:
+    """接收端: 定期广播 ping，处理各节点返回的 pong"""
+
+    def __init__(self, redis_client, tracker: LatencyTracker, interval: float = None):
+        self.redis_client = redis_client
+        self.tracker = tracker
+        self.interval = interval or CLOCK_SYNC_CONFIG['interval']
+        self._ids = itertools.count()
+
+    async def run(self):
+        while True:
+            try:
+                await self.redis_client.publish(CHANNEL_CLOCK_PING, make_ping(next(self._ids)))
+            except Exception as e:
+                logger.debug(f"时钟 ping 发送失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def handle_pong(self, raw):
+        t3 = time.time_ns()
+        try:
+            pong = json.loads(raw)
+            self.tracker.clock.add_sample(pong['source'], pong['t0'], pong['t1'], t3)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.debug(f"无效 pong: {e}")
+
+
+async def run_pong_responder(redis_client, location: str):
+    """节点侧 (异步): 订阅 ping 频道并立即回复 pong (断线后自动重连、重新订阅)"""
+    subscription = PubSubSupervisor(redis_client, [CHANNEL_CLOCK_PING], name=f"pong-{location}")
+    async for message in subscription.messages():
+        try:
+            await redis_client.publish(CHANNEL_CLOCK_PONG, make_pong(location, message['data']))
+        except Exception as e:
+            logger.debug(f"时钟 pong 发送失败: {e}")
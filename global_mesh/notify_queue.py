@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+后台通知队列
+把 Telegram 通知从交易路径上拿走: 处理器只负责入队 (不等待网络)，
+由后台 worker 慢慢发送。队列有界，满了就丢最旧的资讯类通知，
+同一个 key 的通知 (例如同一个代币的多次报警) 会合并成最新的一条。
+"""
+import asyncio
+import itertools
+from collections import OrderedDict
+
+from loguru import logger
+
+# ============================================
+# 配置
+# ============================================
+
+NOTIFY_QUEUE_CONFIG = {
+    'maxsize': 256,           # 队列上限 (条)
+    'workers': 2,             # 后台发送 worker 数
+    'drain_timeout': 5.0,     # 退出时等待队列清空的最长时间 (秒)
+}
+
+# ============================================
+# 通知队列
+# ============================================
+
+class NotificationQueue:
+    """有界、可合并的后台通知队列"""
+
+    def __init__(self, notifier, maxsize: int = None, workers: int = None):
+        self.notifier = notifier
+        self.maxsize = maxsize or NOTIFY_QUEUE_CONFIG['maxsize']
+        self.num_workers = workers or NOTIFY_QUEUE_CONFIG['workers']
+        self._pending = OrderedDict()   # key -> (method, args, kwargs, droppable)
+        self._seq = itertools.count()   # 不合并的通知使用唯一 key
+        self._ready = asyncio.Event()
+        self._workers = []
+        self._inflight = 0              # 已出队、正在发送的通知数
+        self.stats = {'enqueued': 0, 'coalesced': 0, 'dropped': 0, 'sent': 0, 'failed': 0}
+
+    def submit(self, method: str, *args, key=None, droppable: bool = True, **kwargs):
+        """
+        入队一条通知 (不阻塞，不等待网络)
+        method: notifier 上的方法名，例如 'notify_new_token'
+        key: 相同 key 的未发送通知会被新的一条替换
+        droppable: 队列满时是否允许被丢弃 (买入结果应设为 False)
+        """
+        if key is not None and key in self._pending:
+            self._pending[key] = (method, args, kwargs, droppable)
+            self.stats['coalesced'] += 1
+            return
+
+        if len(self._pending) >= self.maxsize and not self._drop_oldest():
+            if droppable:
+                self.stats['dropped'] += 1
+                return
+
+        if key is None:
+            key = ('seq', next(self._seq))
+        self._pending[key] = (method, args, kwargs, droppable)
+        self.stats['enqueued'] += 1
+        self._ready.set()
+
+    def _drop_oldest(self) -> bool:
+        """丢弃最旧的一条可丢弃通知，返回是否腾出了位置"""
+        for key, item in self._pending.items():
+            if item[3]:
+                del self._pending[key]
+                self.stats['dropped'] += 1
+                return True
+        return False
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def start(self):
+        """启动后台 worker"""
+        for _ in range(self.num_workers):
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def stop(self):
+        """尽量发送完剩余通知后停止 worker"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + NOTIFY_QUEUE_CONFIG['drain_timeout']
+        while (self._pending or self._inflight) and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        if self._pending:
+            logger.warning(f"通知队列退出时丢弃 {len(self._pending)} 条未发送通知")
+        logger.info(f"📨 通知队列统计: {self.stats}")
+
+    async def _worker(self):
+        while True:
+            if not self._pending:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            _, (method, args, kwargs, _) = self._pending.popitem(last=False)
+            self._inflight += 1
+            try:
+                # 先让出事件循环，交易路径上的任务总是先跑
+                await asyncio.sleep(0)
+                await getattr(self.notifier, method)(*args, **kwargs)
+                self.stats['sent'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                logger.warning(f"通知发送失败 ({method}): {e}")
+            finally:
+                self._inflight -= 1
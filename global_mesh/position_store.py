@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+持久化持仓存储 (WAL)
+- 每次买入 / 平仓追加一行到预写日志，内存索引同步更新
+  格式: "O <地址> <持仓 JSON>" / "C <地址>"
+- 查询只访问内存字典，O(1)
+- 写盘在后台分组提交: 攒一小段时间的记录后一次 write + fsync，
+  fsync 放在线程里执行，不阻塞事件循环，也不在买入路径上
+- 启动时只按空格切分每行重建索引，持仓 JSON 在第一次读取时才解析，
+  几万条历史记录也在几十毫秒内完成
+- 日志条目远多于实际持仓时自动压缩 (原子替换)
+
+Usage: python3 position_store.py --bench
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+from loguru import logger
+
+# ============================================
+# 配置
+# ============================================
+
+POSITION_STORE_CONFIG = {
+    'commit_interval': 0.05,      # 分组提交间隔 (秒)
+    'compact_min_records': 5000,  # 日志条目超过这个数才考虑压缩
+    'compact_ratio': 4,           # 日志条目 / 持仓数 超过这个比例时压缩
+}
+
+OP_OPEN = 'O'
+OP_CLOSE = 'C'
+
+# ============================================
+# 持仓存储
+# ============================================
+
+def _open_line(address: str, position: dict) -> str:
+    return f"{OP_OPEN} {address} {json.dumps(position, separators=(',', ':'))}"
+
+
+class PositionStore:
+    """内存索引 + 追加写日志的持仓存储"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._positions = {}          # address -> position dict (或尚未解析的 JSON 字符串)
+        self._pending = []            # 尚未落盘的日志行
+        self._file_lock = threading.Lock()
+        self._wakeup = None
+        self._task = None
+        self.records = 0              # 日志中的条目数 (用于判断是否需要压缩)
+        self.stats = {'commits': 0, 'fsync_ms_max': 0.0, 'compactions': 0}
+
+    # ---------- 查询 (纯内存) ----------
+
+    def __contains__(self, address) -> bool:
+        return address in self._positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def get(self, address, default=None):
+        position = self._positions.get(address)
+        if position is None:
+            return default
+        if isinstance(position, str):
+            position = self._positions[address] = json.loads(position)
+        return position
+
+    def items(self):
+        for address in list(self._positions):
+            yield address, self.get(address)
+
+    # ---------- 写入 (只入队，后台落盘) ----------
+
+    def add(self, address: str, position: dict):
+        """记录一笔买入"""
+        self._positions[address] = position
+        self._append(_open_line(address, position))
+
+    def remove(self, address: str):
+        """记录一笔平仓"""
+        if self._positions.pop(address, None) is not None:
+            self._append(f"{OP_CLOSE} {address}")
+
+    def _append(self, line: str):
+        self._pending.append(line)
+        self.records += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ---------- 启动加载 ----------
+
+    def load(self):
+        """从日志重建内存索引，截掉崩溃时写了一半的最后一行"""
+        start = time.perf_counter()
+        if not os.path.exists(self.path):
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            return
+
+        with open(self.path, 'rb') as f:
+            raw = f.read()
+
+        # 只有最后一行可能不完整 (没有换行符结尾)
+        end = raw.rfind(b'\n') + 1
+        if end < len(raw):
+            logger.warning(f"📒 持仓日志末尾有 {len(raw) - end} 字节不完整记录，已截断")
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+            raw = raw[:end]
+
+        positions = self._positions
+        lines = raw.splitlines()
+        for chunk in lines:
+            # 逐行解码: 单个损坏字节只影响它所在的那一行，不能让整个启动失败
+            try:
+                line = chunk.decode('utf-8')
+            except UnicodeDecodeError:
+                logger.warning(f"📒 跳过无法解码的持仓记录: {chunk[:80]!r}")
+                continue
+            parts = line.split(' ', 2)
+            if parts[0] == OP_OPEN and len(parts) == 3:
+                positions[parts[1]] = parts[2]     # 延迟解析
+            elif parts[0] == OP_CLOSE and len(parts) >= 2:
+                positions.pop(parts[1], None)
+            elif line:
+                logger.warning(f"📒 跳过损坏的持仓记录: {line[:80]}")
+        self.records = len(lines)
+
+        elapsed = (time.perf_counter() - start) * 1000
+        logger.info(f"📒 载入 {len(positions)} 个持仓 (日志 {self.records} 条, 耗时 {elapsed:.1f}ms)")
+
+    # ---------- 后台分组提交 ----------
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._commit_loop())
+
+    async def stop(self):
+        """停止后台任务并把剩余记录落盘"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self._commit, self._take_pending())
+
+    def _take_pending(self):
+        pending, self._pending = self._pending, []
+        return pending
+
+    async def _commit_loop(self):
+        while True:
+            await self._wakeup.wait()
+            # 等一个提交间隔，把这段时间内的所有写入合并成一次 fsync
+            await asyncio.sleep(POSITION_STORE_CONFIG['commit_interval'])
+            self._wakeup.clear()
+            batch = self._take_pending()
+            try:
+                await asyncio.to_thread(self._commit, batch)
+            except OSError as e:
+                # 写盘失败时放回队列，下次再试
+                self._pending[:0] = batch
+                self._wakeup.set()
+                logger.error(f"📒 持仓日志写入失败: {e}")
+                continue
+            if self._should_compact():
+                await self.compact()
+
+    def _commit(self, lines):
+        if not lines:
+            return
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        with self._file_lock:
+            start = time.perf_counter()
+            with open(self.path, 'ab') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            fsync_ms = (time.perf_counter() - start) * 1000
+        self.stats['commits'] += 1
+        self.stats['fsync_ms_max'] = max(self.stats['fsync_ms_max'], fsync_ms)
+
+    # ---------- 压缩 ----------
+
+    def _should_compact(self) -> bool:
+        cfg = POSITION_STORE_CONFIG
+        return (self.records >= cfg['compact_min_records']
+                and self.records > cfg['compact_ratio'] * max(len(self._positions), 1))
+
+    async def compact(self):
+        """把日志重写为只包含当前持仓的快照，并原子替换"""
+        # 先把未落盘的记录写入，快照覆盖之后不会丢
+        await asyncio.to_thread(self._commit, self._take_pending())
+        snapshot = [
+            _open_line(address, position) if not isinstance(position, str) else f"{OP_OPEN} {address} {position}"
+            for address, position in self._positions.items()
+        ]
+        await asyncio.to_thread(self._write_snapshot, snapshot)
+        # 快照生成期间新增的写入仍在 _pending 中，会追加到新文件
+        self.records = len(snapshot) + len(self._pending)
+        self.stats['compactions'] += 1
+        logger.info(f"📒 持仓日志已压缩: {len(snapshot)} 条")
+
+    def _write_snapshot(self, lines):
+        tmp_path = self.path + '.tmp'
+        with self._file_lock:
+            with open(tmp_path, 'wb') as f:
+                if lines:
+                    f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            # 目录也要 fsync，保证 rename 本身持久化
+            dir_fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+# ============================================
+# 基准测试
+# ============================================
+
+def run_bench(entries: int = 50000):
+    """生成大量历史记录，测量启动重建耗时"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'positions.wal')
+        with open(path, 'w') as f:
+            for i in range(entries):
+                position = {'symbol': f'T{i}', 'buy_price': 0.0001 * i, 'amount': 1000 + i,
+                            'sol_spent': 0.01, 'timestamp': '2026-01-14T20:16:20'}
+                f.write(_open_line(f'Addr{i:040d}', position) + '\n')
+                if i % 3 == 0:
+                    f.write(f'{OP_CLOSE} Addr{i:040d}\n')
+
+        store = PositionStore(path)
+        start = time.perf_counter()
+        store.load()
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"📒 {store.records:,} 条日志 -> {len(store):,} 个持仓，重建耗时 {elapsed:.1f}ms")
+
+        keys = [f'Addr{i:040d}' for i in range(100000)]
+        start = time.perf_counter()
+        for key in keys:
+            key in store
+        print(f"🔍 查询: {(time.perf_counter() - start) / len(keys) * 1e9:.0f}ns/次")
+
+
+if __name__ == "__main__":
+    if '--bench' in sys.argv:
+        run_bench()
+    else:
+        print(__doc__)
@@ -1,9 +1,12 @@
 import redis
-import json
+import threading
 import time
 import yaml
 import os
-from datetime import datetime
+
+import stream_transport
+import wire
+from supervisor import SyncPubSubSupervisor, connection_kwargs
 
 # Load Configuration
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.yaml')
@@ -21,26 +24,48 @@ class GlobalPublisher:
             password=self.config['redis']['password'],
             db=self.config['redis']['db'],
             socket_timeout=self.config['redis']['socket_timeout'],
-            decode_responses=True
+            decode_responses=True,
+            **connection_kwargs()
         )
         self.channel = self.config['channels']['alerts']
         self.location = self.config['node']['location']
+        self.wire_format = self.config.get('wire', {}).get('format', wire.FORMAT_JSON)
+        self.transport = self.config.get('transport', {}).get('mode', stream_transport.TRANSPORT_PUBSUB)
         print(f"[{self.location}] Publisher initialized. Connecting to Brain at {self.config['redis']['host']}...")
 
+    def start_clock_responder(self):
+        """
+        Answers the receiver's clock-sync pings in a background thread,
+        so it can correct this node's clock offset in latency stats.
+        The subscription is supervised, so it survives Redis restarts.
+        """
+        subscription = SyncPubSubSupervisor(self.r, [wire.CHANNEL_CLOCK_PING], name=f"pong-{self.location}")
+
+        def respond():
+            for message in subscription.messages():
+                try:
+                    self.r.publish(wire.CHANNEL_CLOCK_PONG, wire.make_pong(self.location, message['data']))
+                except redis.ConnectionError:
+                    pass
+
+        thread = threading.Thread(target=respond, daemon=True)
+        thread.start()
+        return thread
+
     def publish_alert(self, token_data):
         """
         Publishes an alert to the global mesh network.
         """
-        message = {
-            "source": self.location,
-            "timestamp": datetime.now().isoformat(),
-            "type": "PUMP_DETECTED",
-            "data": token_data
-        }
+        message = wire.encode_message("PUMP_DETECTED", self.location, token_data, fmt=self.wire_format)
         
         try:
+            if self.transport == stream_transport.TRANSPORT_STREAMS:
+                # Appended to a bounded stream; receivers catch up after reconnecting
+                entry_id = stream_transport.publish(self.r, self.channel, message)
+                print(f"[{self.location}] 🚀 Sent alert! Stream entry {entry_id}.")
+                return
             # Publishing returns the number of subscribers that received the message
-            receivers = self.r.publish(self.channel, json.dumps(message))
+            receivers = self.r.publish(self.channel, message)
             print(f"[{self.location}] 🚀 Sent alert! Received by {receivers} nodes.")
         except redis.ConnectionError:
             print(f"[{self.location}] ❌ Connection Lost! Retrying...")
@@ -63,6 +88,7 @@ class GlobalPublisher:
 if __name__ == "__main__":
     # Example usage
     publisher = GlobalPublisher()
+    publisher.start_clock_responder()
     try:
         publisher.start_mock_loop()
     except KeyboardInterrupt:
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+跨区域信号去重
+HK / JP / DE 会各自广播同一个新币，接收端只处理最先到达的一份，
+后到的副本在 O(1) 内直接丢弃，并记录每个区域的 "赛跑" 成绩:
+谁先到、领先了多少毫秒，按平台分别统计。
+"""
+import time
+from collections import OrderedDict, defaultdict
+
+# ============================================
+# 配置
+# ============================================
+
+DEDUP_CONFIG = {
+    'ttl_seconds': 120,       # 地址在去重索引中保留的时间
+    'max_entries': 50000,     # 索引上限，超过后淘汰最旧的
+}
+
+# ============================================
+# 去重索引
+# ============================================
+
+class RaceStats:
+    """单个 (平台, 区域) 的赛跑统计"""
+
+    __slots__ = ('wins', 'losses', 'lead_ms_total', 'lead_count', 'lag_ms_total', 'lag_ms_max')
+
+    def __init__(self):
+        self.wins = 0
+        self.losses = 0
+        self.lead_ms_total = 0.0   # 作为第一名时领先第二名的时间
+        self.lead_count = 0
+        self.lag_ms_total = 0.0    # 作为后到者时落后第一名的时间
+        self.lag_ms_max = 0.0
+
+    @property
+    def avg_lead_ms(self) -> float:
+        return self.lead_ms_total / self.lead_count if self.lead_count else 0.0
+
+    @property
+    def avg_lag_ms(self) -> float:
+        return self.lag_ms_total / self.losses if self.losses else 0.0
+
+
+class SignalDedup:
+    """按代币地址去重，先到先得，带 TTL 淘汰"""
+
+    def __init__(self, ttl_seconds: float = None, max_entries: int = None):
+        self.ttl_ns = int((ttl_seconds or DEDUP_CONFIG['ttl_seconds']) * 1e9)
+        self.max_entries = max_entries or DEDUP_CONFIG['max_entries']
+        # address -> [winner, platform, first_seen_ns, lead_recorded]
+        # OrderedDict 的插入顺序就是到达顺序，过期淘汰只需看队头
+        self._seen = OrderedDict()
+        self.stats = defaultdict(lambda: defaultdict(RaceStats))  # platform -> source -> RaceStats
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._seen)
+
+    def _evict(self, now_ns: int):
+        seen = self._seen
+        while seen:
+            entry = next(iter(seen.values()))
+            if now_ns - entry[2] < self.ttl_ns and len(seen) <= self.max_entries:
+                break
+            seen.popitem(last=False)
+
+    def check(self, address: str, source: str, platform: str = '', now_ns: int = None) -> bool:
+        """
+        登记一次到达
+        返回 True 表示这是第一份 (应处理)，False 表示重复副本 (应丢弃)
+        """
+        now_ns = now_ns if now_ns is not None else time.perf_counter_ns()
+        self._evict(now_ns)
+
+        entry = self._seen.get(address)
+        if entry is None:
+            self._seen[address] = [source, platform, now_ns, False]
+            self.stats[platform][source].wins += 1
+            return True
+
+        winner, platform, first_ns, lead_recorded = entry
+        lag_ms = (now_ns - first_ns) / 1e6
+        self.dropped += 1
+        if source == winner:
+            # 同一区域的重复发送 (例如发布端重试)，不是输掉了赛跑
+            return False
+
+        loser = self.stats[platform][source]
+        loser.losses += 1
+        loser.lag_ms_total += lag_ms
+        loser.lag_ms_max = max(loser.lag_ms_max, lag_ms)
+
+        # 第一个后到的其他区域决定了第一名的领先幅度
+        if not lead_recorded:
+            entry[3] = True
+            lead = self.stats[platform][winner]
+            lead.lead_ms_total += lag_ms
+            lead.lead_count += 1
+        return False
+
+    def winner(self, address: str):
+        """查询某个地址由哪个区域首先送达"""
+        entry = self._seen.get(address)
+        return entry[0] if entry else None
+
+    def report(self) -> str:
+        """按平台输出各区域的赛跑成绩"""
+        lines = [f"{'PLATFORM':<12} | {'SOURCE':<6} | {'WINS':>6} | {'LOSSES':>6} | {'AVG LEAD':>9} | {'AVG LAG':>9} | {'MAX LAG':>9}"]
+        for platform in sorted(self.stats):
+            by_source = self.stats[platform]
+            for source in sorted(by_source, key=lambda s: -by_source[s].wins):
+                st = by_source[source]
+                lines.append(
+                    f"{platform or '-':<12} | {source:<6} | {st.wins:>6} | {st.losses:>6} | "
+                    f"{st.avg_lead_ms:>7.1f}ms | {st.avg_lag_ms:>7.1f}ms | {st.lag_ms_max:>7.1f}ms"
+                )
+        lines.append(f"已丢弃重复信号: {self.dropped} | 索引大小: {len(self._seen)}")
+        return "\n".join(lines)
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+狙击规则引擎
+规则写在 snipe_rules.yaml 里，加载时编译成 Python 函数:
+- 规则按平台建索引，每个平台一个生成的匹配函数 (一串 if + 数值常量)
+- 名称 / 符号黑名单合并成一个正则
+- 来源节点有信任度，规则可以要求最低信任度
+- 文件修改后自动重新编译，编译成功才原子替换，不影响消息接收
+
+Usage: python3 snipe_rules.py --bench
+"""
+import asyncio
+import math
+import os
+import re
+import sys
+import time
+from typing import NamedTuple
+
+import yaml
+from loguru import logger
+
+# ============================================
+# 配置
+# ============================================
+
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snipe_rules.yaml')
+
+RULE_ENGINE_CONFIG = {
+    'reload_interval': 1.0,    # 检查规则文件是否修改的间隔 (秒)
+}
+
+# 规则文件中允许出现的键，拼错的键 (例如 min_liquidty) 会被当成错误，而不是静默忽略
+SPEC_KEYS = {'defaults', 'blocklist', 'sources', 'rules'}
+DEFAULTS_KEYS = {'buy_amount_sol'}
+BLOCKLIST_KEYS = {'name', 'symbol'}
+RULE_KEYS = {'name', 'action', 'platforms', 'buy_amount_sol',
+             'min_liquidity', 'max_liquidity', 'min_price', 'max_price', 'min_trust'}
+
+# ============================================
+# 编译
+# ============================================
+
+class Decision(NamedTuple):
+    """规则判定结果"""
+    buy: bool
+    amount_sol: float
+    rule: str
+    reason: str
+
+
+class RuleError(ValueError):
+    """规则文件格式错误"""
+
+
+def _number(value, field: str) -> float:
+    """规则里的数值必须是有限数: repr(inf) / repr(nan) 写进生成的代码会变成未定义的名字"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise RuleError(f"{field} 不是数字: {value!r}") from None
+    if not math.isfinite(number):
+        raise RuleError(f"{field} 必须是有限数: {value!r}")
+    return number
+
+
+def _literal(value, field: str = '') -> str:
+    return repr(_number(value, field))
+
+
+def _conditions(rule: dict) -> str:
+    """把一条规则的数值条件翻译成 Python 表达式"""
+    parts = []
+    for key, var, op in (
+        ('min_liquidity', 'liq', '>='), ('max_liquidity', 'liq', '<='),
+        ('min_price', 'price', '>='), ('max_price', 'price', '<='),
+        ('min_trust', 'trust', '>='),
+    ):
+        if rule.get(key) is not None:
+            field = f"{rule.get('name', '')}.{key}"
+            parts.append(f"{var} {op} {_literal(rule[key], field)}")
+    return ' and '.join(parts) or 'True'
+
+
+def _compile_matcher(indexed_rules):
+    """
+    把一组规则编译成一个函数 match(liq, price, trust) -> 规则下标 (-1 表示都不匹配)
+    规则按原顺序排列，第一条命中的生效
+    """
+    lines = ['def match(liq, price, trust):']
+    for idx, rule in indexed_rules:
+        lines.append(f"    if {_conditions(rule)}: return {idx}")
+    lines.append('    return -1')
+    namespace = {}
+    exec(compile('\n'.join(lines), '<snipe_rules>', 'exec'), namespace)
+    return namespace['match']
+
+
+def _check_keys(section: dict, allowed: set, where: str):
+    unknown = sorted(str(k) for k in section if k not in allowed)
+    if unknown:
+        raise RuleError(f"{where} 含有未知字段: {', '.join(unknown)}")
+
+
+def _section(spec: dict, key: str, allowed: set = None) -> dict:
+    section = spec.get(key) or {}
+    if not isinstance(section, dict):
+        raise RuleError(f"{key} 必须是字典")
+    if allowed is not None:
+        _check_keys(section, allowed, key)
+    return section
+
+
+def _compile_blocklist(words, field: str):
+    """
+    黑名单按整词匹配 (不区分大小写): "rug" 命中 "Rug Pull" / "$RUG" / "rug_coin"，
+    但不会命中 "Drug" / "Rugby"；词的两侧不能紧挨字母或数字
+    """
+    if not isinstance(words, (list, tuple)):
+        raise RuleError(f"{field} 必须是列表: {words!r}")
+    words = [str(w) for w in words if w]
+    if not words:
+        return None
+    alternatives = '|'.join(re.escape(w) for w in words)
+    return re.compile(rf"(?<![^\W_])(?:{alternatives})(?![^\W_])", re.IGNORECASE)
+
+
+class CompiledRules:
+    """编译后的规则集 (只读，整体替换)"""
+
+    def __init__(self, spec: dict, version: str = ''):
+        if not isinstance(spec, dict):
+            raise RuleError("规则文件顶层必须是字典")
+        _check_keys(spec, SPEC_KEYS, "规则文件")
+        self.version = version
+        defaults = _section(spec, 'defaults', DEFAULTS_KEYS)
+        self.default_amount = float(defaults.get('buy_amount_sol', 0.01))
+
+        blocklist = _section(spec, 'blocklist', BLOCKLIST_KEYS)
+        self.name_block = _compile_blocklist(blocklist.get('name') or [], 'blocklist.name')
+        self.symbol_block = _compile_blocklist(blocklist.get('symbol') or [], 'blocklist.symbol')
+
+        sources = _section(spec, 'sources')
+        self.trust = {str(k): float(v) for k, v in sources.items() if k != 'default'}
+        self.default_trust = float(sources.get('default', 1.0))
+
+        rules = spec.get('rules') or []
+        if not isinstance(rules, list):
+            raise RuleError("rules 必须是列表")
+        self.rules = []
+        for i, rule in enumerate(rules):
+            if not isinstance(rule, dict):
+                raise RuleError(f"第 {i + 1} 条规则不是字典")
+            action = rule.get('action', 'buy')
+            if action not in ('buy', 'skip'):
+                raise RuleError(f"第 {i + 1} 条规则 action 无效: {action}")
+            name = str(rule.get('name', f'rule_{i + 1}'))
+            _check_keys(rule, RULE_KEYS, f"规则 {name}")
+            platforms = rule.get('platforms') or []
+            if not isinstance(platforms, (list, tuple)):
+                # 写成 platforms: raydium 时字符串会被逐字符当成平台名
+                raise RuleError(f"规则 {name} 的 platforms 必须是列表: {platforms!r}")
+            self.rules.append({
+                'name': name,
+                'buy': action == 'buy',
+                'amount': _number(rule.get('buy_amount_sol', self.default_amount), f'{name}.buy_amount_sol'),
+                'platforms': [str(p) for p in platforms],
+                **{k: rule.get(k) for k in ('min_liquidity', 'max_liquidity', 'min_price', 'max_price', 'min_trust')},
+            })
+
+        # 按平台建索引: 每个平台只看适用于它的规则 (含不限平台的通配规则)，保持原顺序
+        wildcard = [i for i, r in enumerate(self.rules) if not r['platforms']]
+        by_platform = {}
+        for i, rule in enumerate(self.rules):
+            for platform in rule['platforms']:
+                by_platform.setdefault(platform, []).append(i)
+        self._by_platform = {
+            platform: _compile_matcher((i, self.rules[i]) for i in sorted(set(indices) | set(wildcard)))
+            for platform, indices in by_platform.items()
+        }
+        self._wildcard = _compile_matcher((i, self.rules[i]) for i in wildcard)
+
+    def evaluate(self, data: dict, source: str = 'UNKNOWN') -> Decision:
+        """对一条新币信号做出判定"""
+        trust = self.trust.get(source, self.default_trust)
+        if trust <= 0:
+            return Decision(False, 0.0, '', f"来源 {source} 不受信任")
+
+        name = data.get('name') or ''
+        if self.name_block and name and self.name_block.search(name):
+            return Decision(False, 0.0, '', f"名称命中黑名单: {name}")
+        symbol = data.get('symbol') or ''
+        if self.symbol_block and symbol and self.symbol_block.search(symbol):
+            return Decision(False, 0.0, '', f"符号命中黑名单: {symbol}")
+
+        platform = data.get('platform', '')
+        liquidity = data.get('liquidity') or 0.0
+        price = data.get('price')
+        match = self._by_platform.get(platform, self._wildcard)
+        idx = match(liquidity, float('nan') if price is None else price, trust)
+        if idx < 0:
+            return Decision(False, 0.0, '', f"没有匹配的规则 (平台 {platform}, 流动性 ${liquidity})")
+
+        rule = self.rules[idx]
+        if not rule['buy']:
+            return Decision(False, 0.0, rule['name'], f"规则 {rule['name']} 要求跳过")
+        return Decision(True, rule['amount'], rule['name'], f"命中规则 {rule['name']}")
+
+
+def compile_file(path: str) -> CompiledRules:
+    with open(path, 'r') as f:
+        spec = yaml.safe_load(f)
+    return CompiledRules(spec, version=str(os.stat(path).st_mtime_ns))
+
+
+def rules_from_sniper_config(sniper_config: dict) -> CompiledRules:
+    """没有规则文件时，用旧的 SNIPER_CONFIG 生成等价规则"""
+    return CompiledRules({
+        'defaults': {'buy_amount_sol': sniper_config['buy_amount_sol']},
+        'rules': [{
+            'name': 'sniper_config',
+            'platforms': list(sniper_config['platforms']),
+            'min_liquidity': sniper_config['min_liquidity'],
+        }],
+    }, version='SNIPER_CONFIG')
+
+# ============================================
+# 热加载
+# ============================================
+
+class RuleEngine:
+    """持有当前规则集，后台监视规则文件并原子替换"""
+
+    def __init__(self, path: str, fallback: CompiledRules):
+        self.path = path
+        self.fallback = fallback
+        self.current = fallback
+        self._mtime = -1          # 文件不存在时 _stat() 返回 None，用 -1 保证首次一定会加载
+        self._task = None
+        self.reload()
+
+    def evaluate(self, data: dict, source: str = 'UNKNOWN') -> Decision:
+        # 只读取一次引用，判定过程中即使发生重载也使用同一个规则集
+        return self.current.evaluate(data, source)
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload(self) -> bool:
+        """文件有变化时重新编译，失败则保留旧规则"""
+        mtime = self._stat()
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        if mtime is None:
+            self.current = self.fallback
+            logger.info(f"📏 未找到规则文件 {self.path}，使用 SNIPER_CONFIG")
+            return True
+        try:
+            start = time.perf_counter()
+            rules = compile_file(self.path)
+        except (OSError, yaml.YAMLError, RuleError, TypeError, ValueError) as e:
+            logger.error(f"📏 规则文件编译失败，继续使用旧规则: {e}")
+            return False
+        self.current = rules
+        logger.info(f"📏 已加载 {len(rules.rules)} 条狙击规则 ({(time.perf_counter() - start) * 1000:.1f}ms)")
+        return True
+
+    async def start(self):
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(RULE_ENGINE_CONFIG['reload_interval'])
+            if self._stat() != self._mtime:
+                # 编译放到线程里，规则很多时也不阻塞消息接收
+                await asyncio.to_thread(self.reload)
+
+# ============================================
+# 基准测试
+# ============================================
+
+def run_bench(n_messages: int = 100000):
+    """
+    测量数千条规则下每条消息的判定耗时
+    规则分散在 n/50 个平台上时每个平台的匹配函数只有几十条规则，耗时基本不随规则总数增长；
+    所有规则都在同一个平台上且信号不命中任何规则时 (single) 匹配函数要逐条比较完，
+    这是最坏情况，耗时随规则数线性增长
+    """
+    import random
+
+    random.seed(7)
+    print("=" * 64)
+    print(" 📏 SNIPE RULE ENGINE BENCHMARK")
+    print("=" * 64)
+    print(f"{'RULES':>7} | {'LAYOUT':>7} | {'PLATFORMS':>9} | {'COMPILE':>9} | {'PER MESSAGE':>12}")
+    print("-" * 64)
+
+    cases = [(n, 'spread') for n in (10, 1000, 5000, 10000)] + [(n, 'single') for n in (10, 1000, 5000, 10000)]
+    for n_rules, layout in cases:
+        if layout == 'spread':
+            platforms = [f"dex_{i}" for i in range(max(2, n_rules // 50))] + ['pump_fun', 'raydium']
+        else:
+            platforms = ['raydium']
+        spec = {
+            'defaults': {'buy_amount_sol': 0.01},
+            'blocklist': {'name': [f"scam{i}" for i in range(200)], 'symbol': ['RUG', 'TEST']},
+            'sources': {'HK': 1.0, 'JP': 0.8, 'DE': 0.9, 'default': 0.5},
+            'rules': [
+                {
+                    'name': f"r{i}",
+                    'platforms': random.sample(platforms, min(2, len(platforms))),
+                    'min_liquidity': random.randint(500, 50000),
+                    'max_liquidity': random.choice([None, 1e6]),
+                    'min_trust': random.choice([None, 0.7]),
+                    'buy_amount_sol': 0.01,
+                }
+                for i in range(n_rules)
+            ],
+        }
+        start = time.perf_counter()
+        rules = CompiledRules(spec)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        messages = [
+            # single: 流动性低于所有规则的下限，每条信号都要比较完全部规则
+            ({'platform': random.choice(platforms),
+              'liquidity': random.uniform(0, 60000) if layout == 'spread' else random.uniform(0, 400),
+              'price': 0.0001, 'name': 'Mesh Token', 'symbol': 'MESH'}, random.choice(['HK', 'JP', 'DE', 'LA']))
+            for _ in range(1000)
+        ]
+        start = time.perf_counter()
+        for i in range(n_messages):
+            data, source = messages[i % 1000]
+            rules.evaluate(data, source)
+        per_msg_us = (time.perf_counter() - start) / n_messages * 1e6
+        print(f"{n_rules:>7} | {layout:>7} | {len(platforms):>9} | {compile_ms:>7.1f}ms | {per_msg_us:>10.2f}µs")
+
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    if '--bench' in sys.argv:
+        run_bench()
+    else:
+        print(__doc__)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Redis Streams 传输 (可选，替代 Pub/Sub)
+
+Pub/Sub 是 "发出即忘"，接收端断线期间的信号全部丢失。Streams 模式下:
+- 发布端 XADD 到 stream:<频道>，用 MAXLEN ~ 限制长度
+- 接收端通过消费组 XREADGROUP 读取，消息处理完成后才 XACK 确认，
+  重连 / 重启后先取回已投递未确认的消息，再从上次位置继续
+- 超过 stale_ms 的旧消息直接确认并跳过 (过期的狙击信号没有价值)
+- 每次往返批量读取多条，负载高时吞吐高于逐条 Pub/Sub
+"""
+import asyncio
+import socket
+import time
+
+import redis
+
+from supervisor import SUPERVISOR_CONFIG, Backoff, OutageStats
+
+try:
+    from loguru import logger
+except ImportError:
+    # publisher.py / subscriber.py 所在的边缘节点只安装了 redis + pyyaml
+    import logging
+    logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置
+# ============================================
+
+TRANSPORT_PUBSUB = 'pubsub'
+TRANSPORT_STREAMS = 'streams'
+
+STREAM_CONFIG = {
+    'prefix': 'stream:',      # stream key = prefix + 频道名
+    'maxlen': 10000,          # 每个 stream 保留的近似条数
+    'group': 'receivers',     # 默认消费组名 (同组消费者分摊消息，不同程序应使用不同的组)
+    'batch': 64,              # 每次 XREADGROUP 最多读取的条数
+    'block_ms': 1000,         # 没有新消息时阻塞等待的时间
+    'stale_ms': 3000,         # 超过这个年龄的消息直接跳过
+}
+
+FIELD = b'm'
+
+# ============================================
+# 公共函数
+# ============================================
+
+def stream_key(channel: str) -> str:
+    return f"{STREAM_CONFIG['prefix']}{channel}"
+
+
+def default_consumer_name(location: str = '') -> str:
+    host = socket.gethostname()
+    return f"{host}-{location}" if location else host
+
+
+def publish(client, channel: str, message):
+    """
+    追加一条消息到频道对应的 stream
+    同步客户端返回消息 ID，异步客户端返回需要 await 的协程
+    """
+    return client.xadd(stream_key(channel), {FIELD: message},
+                       maxlen=STREAM_CONFIG['maxlen'], approximate=True)
+
+
+def _entry_ms(entry_id) -> int:
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    return int(entry_id.split('-', 1)[0])
+
+
+class _ConsumerBase:
+    """同步 / 异步消费者共用的状态和批次解析"""
+
+    def __init__(self, client, channels, group: str = None, consumer: str = None, stale_ms: int = None):
+        self.client = client
+        self.group = group or STREAM_CONFIG['group']
+        self.consumer = consumer or default_consumer_name()
+        self.stale_ms = stale_ms if stale_ms is not None else STREAM_CONFIG['stale_ms']
+        self.keys = {stream_key(ch): ch for ch in channels}
+        self._key_bytes = {k.encode(): ch for k, ch in self.keys.items()}
+        self.pending_first = True   # 启动 / 重连后先取回未确认的消息
+        self._pending_from = {}     # 取回未确认消息时每个 stream 的翻页位置 (上一批最后一条的 ID)
+        self.inflight = set()       # 已交给调用方、还没处理完的消息 ID (重新取回未确认消息时跳过)
+        self._done = {}             # 处理完成、等待确认的消息: key -> [ID]
+        self.stats = {'received': 0, 'stale': 0, 'acked': 0, 'batches': 0, 'reconnects': 0}
+        # 断线重连: 与订阅连接相同的抖动退避，并记录每次中断的恢复耗时
+        self.backoff = Backoff(SUPERVISOR_CONFIG['backoff_base'], SUPERVISOR_CONFIG['backoff_factor'],
+                               SUPERVISOR_CONFIG['backoff_max'])
+        self.outages = OutageStats(SUPERVISOR_CONFIG['history'])
+
+    def connection_lost(self, error) -> float:
+        """记录一次连接故障，返回重连前应等待的秒数"""
+        if self.outages.down_since is None:
+            self.stats['reconnects'] += 1
+        self.outages.down(error)
+        self.pending_first = True
+        return self.backoff.next()
+
+    def connection_ok(self):
+        """读取成功: 如果正在中断中，记录恢复耗时"""
+        ttr = self.outages.up()
+        if ttr is not None:
+            self.backoff.reset()
+            logger.info(f"Stream 已恢复，恢复耗时 {ttr * 1000:.0f}ms")
+
+    def _read_args(self):
+        if not self.pending_first:
+            return {key: '>' for key in self.keys}
+        return {key: self._pending_from.get(key, '0') for key in self.keys}
+
+    def done(self, message):
+        """调用方处理完一条消息，下一次读取前统一确认"""
+        self.inflight.discard(message['id'])
+        self._done.setdefault(message['key'], []).append(message['id'])
+
+    @staticmethod
+    def _ids(messages) -> dict:
+        ids = {}
+        for message in messages:
+            ids.setdefault(message['key'], []).append(message['id'])
+        return ids
+
+    def _take_done(self) -> dict:
+        done, self._done = self._done, {}
+        return done
+
+    def _split(self, response):
+        """
+        把 XREADGROUP 的返回拆成 (新鲜消息列表, 可以直接确认的 ID)
+        新鲜消息: [{'channel', 'key', 'id', 'data'}]，过期 / 已被裁掉的消息只确认不返回；
+        还在处理中的消息 (重连后重新取回的) 既不返回也不确认
+        """
+        now_ms = int(time.time() * 1000)
+        fresh = []
+        to_ack = {}
+        got_any = False
+        for key, entries in response or []:
+            channel = self._key_bytes.get(key) or self.keys.get(key)
+            if self.pending_first and entries:
+                # 下一次从这一批之后继续取 (还在处理中的消息留在待确认列表里，不能每次都从 0 开始)
+                self._pending_from[stream_key(channel)] = entries[-1][0]
+            for entry_id, fields in entries:
+                got_any = True
+                if entry_id in self.inflight:
+                    continue
+                if fields is None:
+                    # 已被 MAXLEN 裁掉的待确认消息
+                    to_ack.setdefault(key, []).append(entry_id)
+                    continue
+                if self.stale_ms and now_ms - _entry_ms(entry_id) > self.stale_ms:
+                    self.stats['stale'] += 1
+                    to_ack.setdefault(key, []).append(entry_id)
+                    continue
+                fresh.append({'type': 'message', 'channel': channel, 'key': key, 'id': entry_id,
+                              'data': fields.get(FIELD)})
+        if self.pending_first and not got_any:
+            # 积压的未确认消息已经处理完，开始读新消息
+            self.pending_first = False
+            self._pending_from = {}
+        self.stats['received'] += len(fresh)
+        if got_any:
+            self.stats['batches'] += 1
+        return fresh, to_ack
+
+# ============================================
+# 异步消费者 (接收端)
+# ============================================
+
+class StreamConsumer(_ConsumerBase):
+    """基于消费组的异步 stream 读取器"""
+
+    async def ensure_groups(self):
+        for key in self.keys:
+            try:
+                await self.client.xgroup_create(key, self.group, id='$', mkstream=True)
+                logger.info(f"📚 创建消费组 {self.group} @ {key}")
+            except redis.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+    async def ack(self, to_ack: dict):
+        if not to_ack:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, ids in to_ack.items():
+            pipe.xack(key, self.group, *ids)
+        results = await pipe.execute()
+        self.stats['acked'] += sum(results)
+
+    async def flush(self):
+        """确认所有已处理完的消息 (失败时放回，下次再试)"""
+        done = self._take_done()
+        try:
+            await self.ack(done)
+        except BaseException:
+            for key, ids in done.items():
+                self._done.setdefault(key, []).extend(ids)
+            raise
+
+    async def batches(self, ack_on_next: bool = True):
+        """
+        持续产出消息批次 (list)
+        ack_on_next=True: 调用方处理完一批后再取下一批时，上一批会被确认
+        ack_on_next=False: 调用方把消息交给后台任务处理，每条处理完后调用 done(message)，
+                           在下一次读取前统一确认；进程在处理途中退出时，消息仍是未确认状态，重启后会重新投递
+        连接断开时自动重试，重连后先取回未确认的消息
+        """
+        await self.ensure_groups()
+        while True:
+            try:
+                await self.flush()
+                response = await self.client.xreadgroup(
+                    self.group, self.consumer, self._read_args(),
+                    count=STREAM_CONFIG['batch'], block=STREAM_CONFIG['block_ms']
+                )
+                self.connection_ok()
+                fresh, to_ack = self._split(response)
+                if not ack_on_next:
+                    self.inflight.update(message['id'] for message in fresh)
+                await self.ack(to_ack)
+                if fresh:
+                    yield fresh
+                    if ack_on_next:
+                        await self.ack(self._ids(fresh))
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                delay = self.connection_lost(e)
+                logger.warning(f"Stream 连接中断: {e}，{delay:.2f}s 后重连...")
+                await asyncio.sleep(delay)
+                try:
+                    await self.ensure_groups()
+                except (redis.ConnectionError, redis.TimeoutError):
+                    pass
+
+# ============================================
+# 同步消费者 (subscriber.py)
+# ============================================
+
+class SyncStreamConsumer(_ConsumerBase):
+    """基于消费组的同步 stream 读取器"""
+
+    def ensure_groups(self):
+        for key in self.keys:
+            try:
+                self.client.xgroup_create(key, self.group, id='$', mkstream=True)
+            except redis.ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+    def ack(self, to_ack: dict):
+        if not to_ack:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, ids in to_ack.items():
+            pipe.xack(key, self.group, *ids)
+        self.stats['acked'] += sum(pipe.execute())
+
+    def messages(self):
+        """逐条产出消息，每批处理完后统一确认；连接异常直接抛给调用方 (调用方用 connection_lost() 取得退避时间后重试)"""
+        self.ensure_groups()
+        self.pending_first = True
+        while True:
+            response = self.client.xreadgroup(
+                self.group, self.consumer, self._read_args(),
+                count=STREAM_CONFIG['batch'], block=STREAM_CONFIG['block_ms']
+            )
+            self.connection_ok()
+            fresh, to_ack = self._split(response)
+            self.ack(to_ack)
+            # 生成器在调用方处理完这一批之后才继续，确认在处理之后
+            yield from fresh
+            self.ack(self._ids(fresh))
@@ -1,9 +1,13 @@
+import logging
 import redis
-import json
 import yaml
 import os
 import time
 
+import stream_transport
+import wire
+from supervisor import CONNECTION_ERRORS, SyncPubSubSupervisor, connection_kwargs
+
 # Load Configuration
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config.yaml')
 
@@ -20,12 +24,25 @@ class GlobalSubscriber:
             password=self.config['redis']['password'],
             db=self.config['redis']['db'],
             socket_timeout=self.config['redis']['socket_timeout'],
-            decode_responses=True
+            decode_responses=False,  # 二进制消息不能按 UTF-8 解码
+            **connection_kwargs()
         )
         self.channel = self.config['channels']['alerts']
-        self.pubsub = self.r.pubsub()
-        self.pubsub.subscribe(self.channel)
-        print(f"[BOT] Listening on channel: {self.channel}...")
+        self.location = self.config['node']['location']
+        self.transport = self.config.get('transport', {}).get('mode', stream_transport.TRANSPORT_PUBSUB)
+        if self.transport == stream_transport.TRANSPORT_STREAMS:
+            # Consumer group keeps our position, so signals sent while we were offline are replayed
+            self.stream_consumer = stream_transport.SyncStreamConsumer(
+                self.r, [self.channel],
+                group=f"subscriber-{self.location}",
+                consumer=stream_transport.default_consumer_name(self.location)
+            )
+            print(f"[BOT] Reading stream: {stream_transport.stream_key(self.channel)}...")
+        else:
+            # Heartbeats on the subscription, jittered backoff and re-subscription on reconnect
+            self.subscription = SyncPubSubSupervisor(self.r, [self.channel], name=f"subscriber-{self.location}")
+            self.subscription.connect()
+            print(f"[BOT] Listening on channel: {self.channel}...")
 
     def process_message(self, message):
         """
@@ -33,7 +50,7 @@ class GlobalSubscriber:
         """
         if message['type'] == 'message':
             try:
-                data = json.loads(message['data'])
+                data = wire.decode_message(message['data'])
                 source = data.get('source', 'UNKNOWN')
                 timestamp = data.get('timestamp')
                 content = data.get('data')
@@ -44,23 +61,39 @@ class GlobalSubscriber:
                 # Here you would trigger your Telegram Bot or Trading Action
                 self.trigger_action(content)
                 
-            except json.JSONDecodeError:
-                print(f"Received raw message: {message['data']}")
+            except ValueError:
+                print(f"Received raw message: {message['data']!r}")
 
     def trigger_action(self, data):
         # Placeholder for actual action
         print(f"   >>> EXECUTING TRADE/ALERT FOR {data.get('token')} <<<")
 
     def run(self):
-        print("Waiting for signals instantly via Redis/PubSub...")
-        try:
-            for message in self.pubsub.listen():
+        print(f"Waiting for signals instantly via Redis/{self.transport}...")
+        if self.transport == stream_transport.TRANSPORT_STREAMS:
+            while True:
+                try:
+                    for message in self.stream_consumer.messages():
+                        self.process_message(message)
+                except CONNECTION_ERRORS as e:
+                    delay = self.stream_consumer.connection_lost(e)
+                    print(f"❌ Connection to Redis Master lost ({e}). Reconnecting in {delay:.2f}s...")
+                    time.sleep(delay)
+        else:
+            # The supervisor reconnects and re-subscribes internally; messages() never ends on its own
+            for message in self.subscription.messages():
                 self.process_message(message)
-        except redis.ConnectionError:
-            print("❌ Connection to Redis Master lost! Reconnecting...")
-            time.sleep(2)
-            self.run() # Simple reconnect logic
+
+    def report(self):
+        """Outage count and time-to-recover per outage"""
+        if self.transport == stream_transport.TRANSPORT_STREAMS:
+            return self.stream_consumer.outages.report()
+        return self.subscription.report()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
     bot = GlobalSubscriber()
-    bot.run()
+    try:
+        bot.run()
+    except KeyboardInterrupt:
+        print(f"[BOT] Connection: {bot.report()}")
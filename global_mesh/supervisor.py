@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+Redis 连接监管 (所有 mesh 客户端共用)
+- 订阅连接空闲时主动发 PING，PING 之后 heartbeat_timeout 内没有任何数据就判定对端已死，
+  不用等 socket_timeout 才发现半开的 TCP 连接
+- 断线后按带抖动的指数退避重连 (从 0.1s 起，上限 2s)，重连后自动重新订阅
+- 每次中断记录 恢复耗时 (从发现断线到重新订阅成功)，report() 输出统计
+- 同时提供 asyncio (接收器 / 执行节点 / pong 应答) 和同步 (subscriber.py) 两个版本
+
+边缘节点只安装了 redis + pyyaml，这里不依赖 loguru。
+
+Usage: python3 supervisor.py --bench [--redis-server PATH]
+"""
+import asyncio
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import deque
+
+import redis
+from redis.backoff import NoBackoff
+
+try:
+    from loguru import logger
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+# ============================================
+# 配置
+# ============================================
+
+SUPERVISOR_CONFIG = {
+    'heartbeat_interval': 1.0,   # 订阅连接空闲这么久就发一次 PING (秒)
+    'heartbeat_timeout': 1.0,    # PING 之后这么久没有任何数据视为对端已死 (秒)
+    'backoff_base': 0.1,         # 第一次重连前的等待 (秒)
+    'backoff_factor': 2.0,
+    'backoff_max': 2.0,          # 重连等待上限 (秒)
+    'connect_timeout': 2.0,      # 建立连接 + 握手 + 发出订阅的超时 (秒)
+    'keepalive_idle': 5,         # TCP keepalive: 空闲多久开始探测 (秒)
+    'keepalive_interval': 2,     # 探测间隔 (秒)
+    'keepalive_count': 3,        # 连续失败几次断开
+    'history': 1000,             # 保留最近多少次中断的恢复耗时
+}
+
+# 断线 / 超时 / 心跳判死都按连接故障处理
+CONNECTION_ERRORS = (redis.ConnectionError, redis.TimeoutError, OSError)
+
+
+class DeadPeer(redis.ConnectionError):
+    """PING 之后对端在 heartbeat_timeout 内没有任何回应"""
+
+
+def connection_kwargs(asyncio_client: bool = False) -> dict:
+    """
+    创建 mesh Redis 客户端时附加的参数:
+    连接超时 + TCP keepalive，并关闭 redis-py 自带的命令重试 (重连节奏统一由监管器控制)
+    """
+    if asyncio_client:
+        from redis.asyncio.retry import Retry
+    else:
+        from redis.retry import Retry
+    options = {}
+    for name, key in (('TCP_KEEPIDLE', 'keepalive_idle'), ('TCP_KEEPINTVL', 'keepalive_interval'),
+                      ('TCP_KEEPCNT', 'keepalive_count')):
+        if hasattr(socket, name):   # macOS 没有 TCP_KEEPIDLE
+            options[getattr(socket, name)] = SUPERVISOR_CONFIG[key]
+    return {
+        'socket_connect_timeout': SUPERVISOR_CONFIG['connect_timeout'],
+        'socket_keepalive': True,
+        'socket_keepalive_options': options,
+        'retry': Retry(NoBackoff(), 0),
+    }
+
+# ============================================
+# 退避 / 中断统计 / 心跳
+# ============================================
+
+class Backoff:
+    """带抖动的指数退避: 第 n 次等待 d/2 ~ d 之间的随机值，d = base × factor^n (不超过上限)"""
+
+    def __init__(self, base: float, factor: float, cap: float):
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+        self.attempt = 0
+
+    def next(self) -> float:
+        delay = min(self.cap, self.base * self.factor ** self.attempt)
+        self.attempt += 1
+        return random.uniform(delay / 2, delay)
+
+    def reset(self):
+        self.attempt = 0
+
+
+class OutageStats:
+    """每次中断: 发现断线 -> 重新订阅成功 的耗时"""
+
+    def __init__(self, history: int):
+        self.recoveries = deque(maxlen=history)   # 秒
+        self.down_since = None
+        self.outages = 0
+        self.dead_peers = 0        # 其中由心跳发现的 (半开连接)
+        self.attempts = 0          # 重连尝试次数
+        self.last_error = None
+
+    def down(self, error):
+        self.last_error = str(error) or type(error).__name__
+        if self.down_since is None:
+            self.down_since = time.monotonic()
+            self.outages += 1
+            if isinstance(error, DeadPeer):
+                self.dead_peers += 1
+
+    def up(self):
+        """连接恢复，返回这次中断的恢复耗时 (秒)；不在中断中返回 None"""
+        if self.down_since is None:
+            return None
+        ttr = time.monotonic() - self.down_since
+        self.recoveries.append(ttr)
+        self.down_since = None
+        return ttr
+
+    def report(self) -> str:
+        if not self.outages:
+            return "无中断"
+        parts = [f"中断 {self.outages} 次 (心跳判死 {self.dead_peers})", f"重连尝试 {self.attempts}"]
+        if self.recoveries:
+            ordered = sorted(self.recoveries)
+            parts.append(f"恢复耗时 p50 {ordered[len(ordered) // 2] * 1000:.0f}ms / "
+                         f"max {ordered[-1] * 1000:.0f}ms / 最近 {self.recoveries[-1] * 1000:.0f}ms")
+        if self.down_since is not None:
+            parts.append(f"当前已中断 {time.monotonic() - self.down_since:.1f}s")
+        return " | ".join(parts)
+
+
+class Heartbeat:
+    """订阅连接的心跳状态: 收到任何数据都算活着"""
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.last_rx = time.monotonic()
+        self.ping_sent = None
+
+    def alive(self):
+        self.last_rx = time.monotonic()
+        self.ping_sent = None
+
+    def budget(self) -> float:
+        """
+        距下一个动作的秒数: > 0 表示可以继续等消息，
+        0 表示该发 PING 了；PING 超时抛 DeadPeer
+        """
+        now = time.monotonic()
+        if self.ping_sent is not None:
+            wait = self.ping_sent + self.timeout - now
+            if wait <= 0:
+                raise DeadPeer(f"PING 后 {self.timeout}s 无响应")
+            return wait
+        return max(0.0, self.last_rx + self.interval - now)
+
+# ============================================
+# 监管器
+# ============================================
+
+class _SupervisorBase:
+    def __init__(self, client, channels, name: str = 'pubsub', config: dict = None):
+        self.client = client
+        self.channels = list(channels)
+        self.name = name
+        self.cfg = {**SUPERVISOR_CONFIG, **(config or {})}
+        self.pubsub = None
+        self.backoff = Backoff(self.cfg['backoff_base'], self.cfg['backoff_factor'], self.cfg['backoff_max'])
+        self.stats = OutageStats(self.cfg['history'])
+        self.heartbeat = None
+        self.confirmed = False          # 已收到服务端对订阅的确认 (或任何数据)
+
+    def _on_down(self, error):
+        first = self.stats.down_since is None
+        self.stats.down(error)
+        if first:
+            logger.warning(f"❌ [{self.name}] Redis 连接中断: {self.stats.last_error}，开始重连...")
+
+    def _on_subscribed(self):
+        """SUBSCRIBE 已发出；确认没回来之前心跳照常计时，对端没响应同样判死"""
+        self.heartbeat = Heartbeat(self.cfg['heartbeat_interval'], self.cfg['heartbeat_timeout'])
+        self.confirmed = False
+
+    def _on_alive(self):
+        self.heartbeat.alive()
+        if self.confirmed:
+            return
+        # 收到服务端的第一个回应才算恢复 (TCP 连上不代表订阅生效)
+        self.confirmed = True
+        self.backoff.reset()
+        ttr = self.stats.up()
+        if ttr is not None:
+            logger.info(f"✅ [{self.name}] 已重连并重新订阅 {len(self.channels)} 个频道，"
+                        f"恢复耗时 {ttr * 1000:.0f}ms ({self.stats.attempts} 次尝试累计)")
+
+    @staticmethod
+    def _is_data(message) -> bool:
+        return message['type'] in ('message', 'pmessage')
+
+    def report(self) -> str:
+        return self.stats.report()
+
+
+class PubSubSupervisor(_SupervisorBase):
+    """asyncio 版: messages() 持续产出消息，断线重连和重新订阅对调用方透明"""
+
+    async def connect(self):
+        """订阅所有频道，失败时按退避重试直到成功"""
+        while True:
+            self.stats.attempts += 1
+            pubsub = self.client.pubsub()
+            try:
+                # 对端接受 TCP 但不回应时，连接握手会一直等到 socket_timeout
+                await asyncio.wait_for(pubsub.subscribe(*self.channels), self.cfg['connect_timeout'])
+            except (*CONNECTION_ERRORS, asyncio.TimeoutError) as e:
+                self._on_down(e)
+                await self._discard(pubsub)
+                await asyncio.sleep(self.backoff.next())
+                continue
+            self.pubsub = pubsub
+            self._on_subscribed()
+            return
+
+    async def messages(self):
+        while True:
+            if self.pubsub is None:
+                await self.connect()
+            try:
+                message = await self._next()
+            except CONNECTION_ERRORS as e:
+                self._on_down(e)
+                pubsub, self.pubsub = self.pubsub, None
+                await self._discard(pubsub)
+                await asyncio.sleep(self.backoff.next())
+                continue
+            yield message
+
+    async def _next(self):
+        while True:
+            wait = self.heartbeat.budget()
+            if wait == 0:
+                await self.pubsub.ping()
+                self.heartbeat.ping_sent = time.monotonic()
+                continue
+            message = await self.pubsub.get_message(timeout=wait)
+            if message is None:
+                continue
+            self._on_alive()
+            if self._is_data(message):
+                return message
+
+    @staticmethod
+    async def _discard(pubsub):
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+    async def close(self):
+        if self.pubsub is not None:
+            await self._discard(self.pubsub)
+            self.pubsub = None
+
+
+class SyncPubSubSupervisor(_SupervisorBase):
+    """同步版 (subscriber.py)，接口与 PubSubSupervisor 相同"""
+
+    def connect(self):
+        while True:
+            self.stats.attempts += 1
+            pubsub = self.client.pubsub()
+            try:
+                pubsub.subscribe(*self.channels)
+            except CONNECTION_ERRORS as e:
+                self._on_down(e)
+                self._discard(pubsub)
+                time.sleep(self.backoff.next())
+                continue
+            self.pubsub = pubsub
+            self._on_subscribed()
+            return
+
+    def messages(self):
+        while True:
+            if self.pubsub is None:
+                self.connect()
+            try:
+                message = self._next()
+            except CONNECTION_ERRORS as e:
+                self._on_down(e)
+                pubsub, self.pubsub = self.pubsub, None
+                self._discard(pubsub)
+                time.sleep(self.backoff.next())
+                continue
+            yield message
+
+    def _next(self):
+        while True:
+            wait = self.heartbeat.budget()
+            if wait == 0:
+                self.pubsub.ping()
+                self.heartbeat.ping_sent = time.monotonic()
+                continue
+            message = self.pubsub.get_message(timeout=wait)
+            if message is None:
+                continue
+            self._on_alive()
+            if self._is_data(message):
+                return message
+
+    @staticmethod
+    def _discard(pubsub):
+        try:
+            pubsub.close()
+        except Exception:
+            pass
+
+    def close(self):
+        if self.pubsub is not None:
+            self._discard(self.pubsub)
+            self.pubsub = None
+
+# ============================================
+# 基准测试: 杀掉 / 冻结本地 redis-server
+# ============================================
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _spawn_redis(binary: str, port: int):
+    proc = subprocess.Popen([binary, '--port', str(port), '--save', '', '--appendonly', 'no'],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"{binary} 没有在 5s 内监听 {port}")
+
+
+class _FreezableProxy:
+    """TCP 转发；freeze() 后停止转发但不关闭连接，模拟半开连接 / 网络黑洞"""
+
+    def __init__(self, target_port: int):
+        self.target_port = target_port
+        self.frozen = False
+        self.server = None
+        self.port = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        if self.frozen:
+            return      # 冻结期间的新连接: 接受后什么也不回
+        try:
+            up_reader, up_writer = await asyncio.open_connection('127.0.0.1', self.target_port)
+        except OSError:
+            writer.close()
+            return
+
+        async def pipe(src, dst):
+            try:
+                while data := await src.read(65536):
+                    while self.frozen:
+                        await asyncio.sleep(3600)
+                    dst.write(data)
+                    await dst.drain()
+            except (OSError, asyncio.CancelledError):
+                pass
+            finally:
+                dst.close()
+
+        try:
+            await asyncio.gather(pipe(reader, up_writer), pipe(up_reader, writer))
+        except asyncio.CancelledError:
+            pass
+
+
+async def _run_bench(binary: str):
+    import redis.asyncio as aioredis
+
+    port = _free_port()
+    proc = _spawn_redis(binary, port)
+    proxy = _FreezableProxy(port)
+    await proxy.start()
+    channel = 'supervisor_bench'
+
+    client = aioredis.Redis(port=proxy.port, socket_timeout=10, **connection_kwargs(asyncio_client=True))
+    supervisor = PubSubSupervisor(client, [channel], name='bench',
+                                  config={'heartbeat_interval': 0.5, 'heartbeat_timeout': 0.5})
+    await supervisor.connect()
+
+    received = []
+
+    async def consume():
+        async for message in supervisor.messages():
+            received.append((time.monotonic(), int(message['data'])))
+
+    async def produce():
+        publisher = aioredis.Redis(port=port, **connection_kwargs(asyncio_client=True))
+        seq = 0
+        while True:
+            try:
+                await publisher.publish(channel, seq)
+            except CONNECTION_ERRORS:
+                pass
+            seq += 1
+            await asyncio.sleep(0.02)
+
+    consumer = asyncio.create_task(consume())
+    producer = asyncio.create_task(produce())
+    results = []
+
+    async def outage(label: str, down_s: float, break_fn, heal_fn):
+        await asyncio.sleep(1.0)
+        start = time.monotonic()
+        before = len(received)
+        break_fn()
+        await asyncio.sleep(down_s)
+        heal_fn()
+        healed = time.monotonic()
+        while supervisor.stats.down_since is not None or len(supervisor.stats.recoveries) < len(results) + 1:
+            await asyncio.sleep(0.01)
+        first_after = None
+        while first_after is None:
+            first_after = next((ts for ts, _ in received[before:] if ts > healed), None)
+            await asyncio.sleep(0.01)
+        results.append((label, down_s, supervisor.stats.recoveries[-1], first_after - start, first_after - healed))
+
+    def kill():
+        nonlocal proc
+        proc.kill()
+        proc.wait()
+
+    def restart():
+        nonlocal proc
+        proc = _spawn_redis(binary, port)
+
+    def freeze():
+        proxy.frozen = True
+
+    def thaw():
+        proxy.frozen = False
+
+    try:
+        await outage('kill -9 redis-server', 1.0, kill, restart)
+        await outage('kill -9 redis-server', 3.0, kill, restart)
+        await outage('blackhole (half-open)', 2.0, freeze, thaw)
+    finally:
+        consumer.cancel()
+        producer.cancel()
+        await asyncio.gather(consumer, producer, return_exceptions=True)
+        await supervisor.close()
+        proxy.server.close()
+        proc.kill()
+
+    print("=" * 72)
+    print(" 🔌 CONNECTION SUPERVISOR (心跳 0.5s / 超时 0.5s，退避 0.1s 起)")
+    print("=" * 72)
+    print(f"{'OUTAGE':<24} | {'DOWN':>6} | {'RECOVER':>9} | {'FIRST MSG':>10} | {'AFTER HEAL':>10}")
+    print("-" * 72)
+    for label, down_s, ttr, first_msg, after_heal in results:
+        print(f"{label:<24} | {down_s:>5.1f}s | {ttr * 1000:>7.0f}ms | {first_msg * 1000:>8.0f}ms | "
+              f"{after_heal * 1000:>8.0f}ms")
+    print("-" * 72)
+    print(f"{supervisor.report()} | 收到 {len(received)} 条")
+    print("RECOVER: 发现断线 -> 重新订阅成功；AFTER HEAL: 服务恢复 -> 收到第一条消息")
+    print("=" * 72)
+
+
+def run_bench():
+    binary = 'redis-server'
+    if '--redis-server' in sys.argv:
+        binary = sys.argv[sys.argv.index('--redis-server') + 1]
+    asyncio.run(_run_bench(binary))
+
+
+if __name__ == "__main__":
+    if '--bench' in sys.argv:
+        run_bench()
+    else:
+        print(__doc__)
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Telegram 通知分发器
+新币潮期间每个信号各发一条 Telegram 消息会触发 429 限流，失败和重试又会拖慢处理器。
+这里直接调用 Bot API，替代 Notifier + NotificationQueue:
+- 令牌桶限速 (默认 1 条/秒，允许少量突发)，收到 429 时按 retry_after 暂停
+- aiohttp 连接池 + keep-alive，每条消息不再重新握手
+- 积压的资讯类通知 (新币 / 报警) 自动合并成一条摘要，
+  例如 "14 个新币 (最近 5s)" 并列出流动性最高的几个
+- 买入结果 / 错误 (droppable=False) 总是插队，先于资讯类通知发送
+- submit() 接口与 NotificationQueue 一致，处理器只入队，不等待网络
+- api_base 可配置，可以对着本地替身服务器测试
+
+Usage: python3 telegram_dispatcher.py --bench
+"""
+import asyncio
+import itertools
+import sys
+import time
+from collections import OrderedDict, deque
+
+import aiohttp
+from loguru import logger
+
+# ============================================
+# 配置
+# ============================================
+
+TELEGRAM_CONFIG = {
+    'api_base': 'https://api.telegram.org',
+    'rate': 1.0,              # 每秒发送条数 (Telegram 对单个聊天约 1 条/秒)
+    'burst': 3,               # 令牌桶容量 (允许的短时突发)
+    'digest_threshold': 3,    # 积压的资讯类通知达到这个数就合并成一条摘要
+    'digest_top': 5,          # 摘要中列出的新币数
+    'max_pending': 500,       # 资讯类通知积压上限，超过时丢最旧的
+    'pool_size': 4,           # HTTP 连接池大小
+    'keepalive': 60,          # 空闲连接保持时间 (秒)
+    'timeout': 10,            # 单次请求超时 (秒)
+    'max_retries': 3,         # 非 429 错误的重试次数
+    'drain_timeout': 5.0,     # 退出时等待发送完毕的最长时间 (秒)
+}
+
+MAX_MESSAGE_CHARS = 4096      # Telegram 单条消息长度上限
+
+# ============================================
+# 令牌桶
+# ============================================
+
+class TokenBucket:
+    """按 rate 条/秒补充令牌，最多积攒 burst 个"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self) -> float:
+        """距离下一个可用令牌的秒数 (0 表示可以立即发送)"""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """服务端要求等待 (429 retry_after)，暂停结束时只留一个令牌给重发的那条"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 1.0
+        self.updated = self.paused_until
+
+# ============================================
+# 消息格式
+# ============================================
+
+def _fmt_new_token(symbol, address, platform, liquidity):
+    return (f"🆕 *新币*: {symbol}\n平台: {platform}\n"
+            f"流动性: ${liquidity or 0:,.0f}\n`{address}`")
+
+
+def _fmt_buy(symbol, amount_sol, token_amount, tx):
+    return f"✅ *买入成功*: {symbol}\n花费: {amount_sol} SOL\n数量: {token_amount}\nTX: `{tx}`"
+
+
+def _fmt_error(message):
+    return f"❌ *错误*\n{message}"
+
+
+def _fmt_text(text):
+    return text
+
+
+# notifier 方法名 -> 格式化函数 (与 receiver 中 notify() 使用的方法名一致)
+FORMATTERS = {
+    'notify_new_token': _fmt_new_token,
+    'notify_buy': _fmt_buy,
+    'notify_error': _fmt_error,
+    'send_message': _fmt_text,
+}
+
+# ============================================
+# 分发器
+# ============================================
+
+class TelegramDispatcher:
+    """限速、可合并、带优先级的 Telegram 发送器"""
+
+    def __init__(self, telegram_config: dict):
+        self.bot_token = telegram_config['bot_token']
+        self.chat_id = telegram_config['chat_id']
+        # config.yaml 的 telegram 段可以覆盖 TELEGRAM_CONFIG 中的任意参数
+        self.cfg = {k: telegram_config.get(k, v) for k, v in TELEGRAM_CONFIG.items()}
+        self.url = f"{self.cfg['api_base'].rstrip('/')}/bot{self.bot_token}/sendMessage"
+        self.bucket = TokenBucket(self.cfg['rate'], self.cfg['burst'])
+        self._urgent = deque()          # 买入结果 / 错误: 文本
+        self._info = OrderedDict()      # key -> (method, args, kwargs, 入队时间)
+        self._seq = itertools.count()
+        self._ready = asyncio.Event()
+        self._session = None
+        self._task = None
+        self._inflight = 0
+        self.stats = {'enqueued': 0, 'coalesced': 0, 'dropped': 0, 'sent': 0, 'digests': 0,
+                      'folded': 0, 'rate_limited': 0, 'retries': 0, 'failed': 0}
+
+    # ---------- 入队 (处理器调用，不阻塞) ----------
+
+    def submit(self, method: str, *args, key=None, droppable: bool = True, **kwargs):
+        """
+        入队一条通知，参数与 NotificationQueue.submit 相同
+        droppable=False 的通知进入优先队列，不会被合并或丢弃
+        """
+        formatter = FORMATTERS.get(method)
+        if formatter is None:
+            logger.warning(f"未知的通知方法: {method}")
+            return
+
+        if not droppable:
+            self._urgent.append(formatter(*args, **kwargs))
+        elif key is not None and key in self._info:
+            self._info[key] = (method, args, kwargs, self._info[key][3])
+            self.stats['coalesced'] += 1
+            return
+        else:
+            if len(self._info) >= self.cfg['max_pending']:
+                self._info.popitem(last=False)
+                self.stats['dropped'] += 1
+            if key is None:
+                key = ('seq', next(self._seq))
+            self._info[key] = (method, args, kwargs, time.monotonic())
+        self.stats['enqueued'] += 1
+        self._ready.set()
+
+    def __len__(self):
+        return len(self._urgent) + len(self._info)
+
+    # ---------- 生命周期 ----------
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.cfg['pool_size'],
+            keepalive_timeout=self.cfg['keepalive'],
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.cfg['timeout']),
+        )
+        self._task = asyncio.create_task(self._sender())
+        logger.info(f"📨 Telegram 分发器已启动 (限速 {self.cfg['rate']}/s, 突发 {self.cfg['burst']})")
+
+    async def warmup(self) -> float:
+        """启动时先建立到 Bot API 的连接 (getMe)，第一条通知不用再等 TLS 握手；返回耗时 (毫秒)"""
+        start = time.perf_counter()
+        async with self._session.get(f"{self.cfg['api_base'].rstrip('/')}/bot{self.bot_token}/getMe") as resp:
+            await resp.read()
+        return (time.perf_counter() - start) * 1000
+
+    async def stop(self):
+        """尽量发送完剩余通知后关闭连接池"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.cfg['drain_timeout']
+        while (len(self) or self._inflight) and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._session:
+            await self._session.close()
+            self._session = None
+        if len(self):
+            logger.warning(f"Telegram 分发器退出时丢弃 {len(self)} 条未发送通知")
+        logger.info(f"📨 Telegram 统计: {self.stats}")
+
+    # ---------- 发送循环 ----------
+
+    async def _sender(self):
+        while True:
+            if not len(self):
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            # 等令牌期间新到的资讯类通知继续积压，稍后一起合并
+            delay = self.bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            text = self._next_text()
+            self.bucket.take()
+            self._inflight += 1
+            try:
+                await self._deliver(text)
+            finally:
+                self._inflight -= 1
+
+    def _next_text(self) -> str:
+        """取下一条要发送的文本: 优先队列 > 摘要 > 单条资讯"""
+        if self._urgent:
+            return self._urgent.popleft()
+        if len(self._info) >= self.cfg['digest_threshold']:
+            items = list(self._info.values())
+            self._info.clear()
+            self.stats['digests'] += 1
+            self.stats['folded'] += len(items)
+            return build_digest(items, self.cfg['digest_top'])
+        _, (method, args, kwargs, _) = self._info.popitem(last=False)
+        return FORMATTERS[method](*args, **kwargs)
+
+    async def _deliver(self, text: str):
+        payload = {
+            'chat_id': self.chat_id,
+            'text': text[:MAX_MESSAGE_CHARS],
+            'parse_mode': 'Markdown',
+            'disable_web_page_preview': True,
+        }
+        attempt = 0
+        while True:
+            try:
+                async with self._session.post(self.url, json=payload) as resp:
+                    if resp.status == 200:
+                        self.stats['sent'] += 1
+                        return
+                    body = await resp.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                body, error = None, str(e) or type(e).__name__
+            else:
+                error = (body or {}).get('description', f"HTTP {resp.status}")
+                if resp.status == 429:
+                    # 限流不算失败: 暂停整个令牌桶，然后重发同一条
+                    retry_after = ((body or {}).get('parameters') or {}).get('retry_after', 1)
+                    self.stats['rate_limited'] += 1
+                    logger.warning(f"Telegram 限流，暂停 {retry_after}s")
+                    self.bucket.pause(retry_after)
+                    while (delay := self.bucket.delay()) > 0:
+                        await asyncio.sleep(delay)
+                    self.bucket.take()
+                    continue
+                if resp.status == 400 and 'parse_mode' in payload and 'parse entities' in error:
+                    # 代币名里的 _ * ` 会破坏 Markdown，退回纯文本重发
+                    payload.pop('parse_mode')
+                    continue
+
+            attempt += 1
+            if attempt > self.cfg['max_retries']:
+                self.stats['failed'] += 1
+                logger.warning(f"Telegram 发送失败: {error}")
+                return
+            self.stats['retries'] += 1
+            await asyncio.sleep(min(2 ** attempt * 0.5, 5))
+
+
+def build_digest(items, top: int) -> str:
+    """把积压的资讯类通知合并成一条摘要"""
+    now = time.monotonic()
+    window = max(1, round(now - min(item[3] for item in items)))
+    new_tokens = [args for method, args, _, _ in items if method == 'notify_new_token' and len(args) == 4]
+    others = [FORMATTERS[method](*args, **kwargs) for method, args, kwargs, _ in items
+              if not (method == 'notify_new_token' and len(args) == 4)]
+
+    lines = []
+    if new_tokens:
+        lines.append(f"📦 *{len(new_tokens)} 个新币 (最近 {window}s)*")
+        ranked = sorted(new_tokens, key=lambda a: a[3] or 0, reverse=True)
+        for symbol, address, platform, liquidity in ranked[:top]:
+            lines.append(f"• {symbol} - {platform} - ${liquidity or 0:,.0f}\n  `{address}`")
+        if len(ranked) > top:
+            lines.append(f"… 另有 {len(ranked) - top} 个")
+    if others:
+        if lines:
+            lines.append("")
+        lines.append(f"📋 *其他通知 {len(others)} 条*")
+        lines.extend(others)
+    return "\n".join(lines)
+
+# ============================================
+# 本地替身服务器 + 基准测试
+# ============================================
+
+async def start_mock_api(min_interval: float = 0.9, retry_after: float = 1):
+    """
+    模拟 Bot API 的本地服务器: 距上次成功发送不足 min_interval 秒时返回 429 (带 retry_after)，
+    state['received'] 记录成功收到的 (时间, 文本)，state['rejected'] 记录 429 次数
+    """
+    from aiohttp import web
+
+    state = {'received': [], 'rejected': 0, 'last_ok': float('-inf')}
+
+    async def send_message(request):
+        body = await request.json()
+        now = time.monotonic()
+        if now - state['last_ok'] < min_interval:
+            state['rejected'] += 1
+            return web.json_response(
+                {'ok': False, 'error_code': 429, 'description': f'Too Many Requests: retry after {retry_after}',
+                 'parameters': {'retry_after': retry_after}}, status=429)
+        state['last_ok'] = now
+        state['received'].append((now, body['text']))
+        return web.json_response({'ok': True, 'result': {}})
+
+    app = web.Application()
+    app.router.add_post('/bot{token}/sendMessage', send_message)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f'http://127.0.0.1:{port}', state
+
+
+async def _run_bench(n_tokens: int = 40, n_buys: int = 3):
+    """
+    启动一个模拟 Bot API 的本地服务器 (超过 1 条/秒返回 429)，
+    模拟新币潮，观察分发器的合并、插队和限流处理
+    """
+    runner, api_base, state = await start_mock_api()
+    received = state['received']
+
+    dispatcher = TelegramDispatcher({'bot_token': 'TEST', 'chat_id': 1,
+                                     'api_base': api_base, 'drain_timeout': 15})
+    await dispatcher.start()
+
+    start = time.monotonic()
+    submit_ns = 0
+    for i in range(n_tokens):
+        t0 = time.perf_counter_ns()
+        dispatcher.submit('notify_new_token', f'TOK{i}', f'Addr{i:040d}', 'pump_fun', 1000 + i * 137,
+                          key=('new_token', f'Addr{i:040d}'))
+        if i % (n_tokens // n_buys) == n_tokens // n_buys - 1:
+            dispatcher.submit('notify_buy', symbol=f'TOK{i}', amount_sol=0.01, token_amount=12345,
+                              tx='5xTX', droppable=False)
+        submit_ns += time.perf_counter_ns() - t0
+        await asyncio.sleep(0.05)
+
+    await dispatcher.stop()
+    await runner.cleanup()
+
+    print("=" * 64)
+    print(f" 📨 TELEGRAM DISPATCHER ({n_tokens} 新币 + {n_buys} 买入，{n_tokens * 0.05:.0f}s 内)")
+    print("=" * 64)
+    for ts, text in received:
+        print(f"[{ts - start:5.2f}s] {text.splitlines()[0]}")
+    print("-" * 64)
+    print(f"服务器收到 {len(received)} 条消息，入队平均 {submit_ns / (n_tokens + n_buys) / 1000:.1f}µs")
+    print(f"统计: {dispatcher.stats}")
+    print("=" * 64)
+
+
+def run_bench():
+    asyncio.run(_run_bench())
+
+
+if __name__ == "__main__":
+    if '--bench' in sys.argv:
+        run_bench()
+    else:
+        print(__doc__)
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Mesh 消息线格式 (Wire Format)
+
+二进制格式 v1 (小端):
+  头部 (固定 12 字节):
+    magic    u8   0xB5
+    version  u8   1
+    type     u8   1=NEW_TOKEN 2=PUMP_DETECTED
+    flags    u8   bit0: 地址不是 32 字节公钥，按字符串编码
+    ts_ns    u64  发送时间 (Unix 纪元纳秒)
+  source   str8 (u8 长度 + UTF-8)
+
+  NEW_TOKEN 消息体:
+    address    32 字节原始公钥 (flags bit0 时为 str8)
+    liquidity  f64 (NaN 表示缺失)
+    price      f64 (NaN 表示缺失)
+    platform   u8 平台编号 (0 = 其他，后跟 str8 平台名)
+    name       str8
+    symbol     str8
+
+  PUMP_DETECTED 消息体:
+    token   str8
+    price   f64 (NaN 表示缺失)
+    reason  str8
+    extra   u16 长度 + JSON (其余字段，没有则长度为 0)
+
+没有二进制 schema 的消息类型仍然使用 JSON。
+接收端通过首字节自动识别: JSON 以 '{' 开头，二进制以 0xB5 开头，
+所以可以逐个节点升级: 先升级所有接收端，再把发布端切到 binary。
+
+Usage: python3 wire.py --bench
+"""
+import json
+import math
+import struct
+import sys
+import time
+from datetime import datetime
+
+# ============================================
+# 常量
+# ============================================
+
+MAGIC = 0xB5
+VERSION = 1
+
+FORMAT_JSON = 'json'
+FORMAT_BINARY = 'binary'
+
+TYPE_CODES = {'NEW_TOKEN': 1, 'PUMP_DETECTED': 2}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+PLATFORM_CODES = {'pump_fun': 1, 'raydium': 2}
+PLATFORM_NAMES = {code: name for name, code in PLATFORM_CODES.items()}
+
+FLAG_TEXT_ADDRESS = 0x01
+
+_HEADER = struct.Struct('<BBBBQ')
+_F64 = struct.Struct('<d')
+_U16 = struct.Struct('<H')
+_NEW_TOKEN_NUMS = struct.Struct('<ddB')
+
+# ============================================
+# Base58 (Solana 地址)
+# ============================================
+
+_B58_ALPHABET = b'123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+_B58_INDEX = {c: i for i, c in enumerate(_B58_ALPHABET)}
+# 两位一组查表，大整数除法次数减半
+_B58_PAIRS = [bytes((_B58_ALPHABET[i // 58], _B58_ALPHABET[i % 58])) for i in range(58 * 58)]
+
+
+def b58encode(raw: bytes) -> str:
+    n = int.from_bytes(raw, 'big')
+    pairs = []
+    while n:
+        n, rem = divmod(n, 3364)
+        pairs.append(_B58_PAIRS[rem])
+    body = b''.join(reversed(pairs)).lstrip(b'1')
+    pad = len(raw) - len(raw.lstrip(b'\0'))
+    return '1' * pad + body.decode('ascii')
+
+
+def b58decode(text: str) -> bytes:
+    raw = text.encode('ascii')
+    n = 0
+    pos = 0
+    step = len(raw) % 10 or 10   # 先处理不足 10 位的头部，之后每次 10 位
+    while pos < len(raw):
+        chunk = 0
+        for c in raw[pos:pos + step]:
+            chunk = chunk * 58 + _B58_INDEX[c]
+        n = n * 58 ** step + chunk
+        pos += step
+        step = 10
+    body = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    pad = len(text) - len(text.lstrip('1'))
+    return b'\0' * pad + body
+
+
+def _pubkey_bytes(address: str):
+    """把 base58 地址转换为 32 字节公钥，不是合法公钥时返回 None"""
+    try:
+        raw = b58decode(address)
+    except (KeyError, ValueError, UnicodeEncodeError):
+        return None
+    return raw if len(raw) == 32 else None
+
+# ============================================
+# 编码
+# ============================================
+
+def _str8(value) -> bytes:
+    raw = str(value if value is not None else '').encode('utf-8')
+    if len(raw) > 255:
+        # 在字符边界截断，不把多字节字符切成两半 (否则接收端解码失败，整条消息被丢弃)
+        raw = raw[:255].decode('utf-8', 'ignore').encode('utf-8')
+    return bytes((len(raw),)) + raw
+
+
+def _f64(value) -> float:
+    return float('nan') if value is None else float(value)
+
+
+def now_ns() -> int:
+    """当前 Unix 纪元纳秒"""
+    return time.time_ns()
+
+
+def encode_message(msg_type: str, source: str, data: dict, ts_ns: int = None, fmt: str = FORMAT_JSON):
+    """
+    编码一条 mesh 消息
+    fmt='binary' 且消息类型有 schema 时输出二进制，否则输出 JSON 字符串
+    """
+    ts_ns = ts_ns if ts_ns is not None else now_ns()
+    code = TYPE_CODES.get(msg_type)
+
+    if fmt != FORMAT_BINARY or code is None:
+        return json.dumps({
+            'type': msg_type,
+            'source': source,
+            'timestamp': datetime.fromtimestamp(ts_ns / 1e9).isoformat(),
+            'ts_ns': ts_ns,
+            'data': data
+        })
+
+    flags = 0
+    if code == 1:
+        address = data.get('address', '')
+        raw_address = _pubkey_bytes(address)
+        if raw_address is None:
+            flags |= FLAG_TEXT_ADDRESS
+            raw_address = _str8(address)
+        platform = data.get('platform', '')
+        platform_code = PLATFORM_CODES.get(platform, 0)
+        body = b''.join((
+            raw_address,
+            _NEW_TOKEN_NUMS.pack(_f64(data.get('liquidity')), _f64(data.get('price')), platform_code),
+            b'' if platform_code else _str8(platform),
+            _str8(data.get('name')),
+            _str8(data.get('symbol')),
+        ))
+    else:
+        extra = {k: v for k, v in data.items() if k not in ('token', 'price', 'reason')}
+        extra_raw = json.dumps(extra).encode('utf-8') if extra else b''
+        body = b''.join((
+            _str8(data.get('token')),
+            _F64.pack(_f64(data.get('price'))),
+            _str8(data.get('reason')),
+            _U16.pack(len(extra_raw)),
+            extra_raw,
+        ))
+
+    return _HEADER.pack(MAGIC, VERSION, code, flags, ts_ns) + _str8(source) + body
+
+# ============================================
+# 解码
+# ============================================
+
+class _Reader:
+    __slots__ = ('buf', 'pos')
+
+    def __init__(self, buf: bytes, pos: int):
+        self.buf = buf
+        self.pos = pos
+
+    def str8(self) -> str:
+        n = self.buf[self.pos]
+        start = self.pos + 1
+        self.pos = start + n
+        return self.buf[start:self.pos].decode('utf-8')
+
+    def raw(self, n: int) -> bytes:
+        start = self.pos
+        self.pos += n
+        return self.buf[start:self.pos]
+
+    def unpack(self, st: struct.Struct):
+        values = st.unpack_from(self.buf, self.pos)
+        self.pos += st.size
+        return values
+
+
+def _opt(value: float):
+    return None if math.isnan(value) else value
+
+
+def is_binary(raw) -> bool:
+    return isinstance(raw, (bytes, bytearray)) and len(raw) > 0 and raw[0] == MAGIC
+
+
+def decode_message(raw) -> dict:
+    """
+    解码一条 mesh 消息 (自动识别 JSON / 二进制)
+    返回统一的结构: {'type', 'source', 'timestamp', 'ts_ns', 'data'}
+    JSON 消息没有 ts_ns 时为 None
+    抛出 ValueError 表示消息无效
+    """
+    if not is_binary(raw):
+        try:
+            message = json.loads(raw)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ValueError(f"无效 JSON: {e}") from e
+        if not isinstance(message, dict):
+            raise ValueError("消息不是 JSON 对象")
+        message.setdefault('ts_ns', None)
+        return message
+
+    try:
+        _, version, code, flags, ts_ns = _HEADER.unpack_from(raw, 0)
+        if version != VERSION:
+            raise ValueError(f"不支持的版本: {version}")
+        reader = _Reader(raw, _HEADER.size)
+        source = reader.str8()
+
+        if code == 1:
+            if flags & FLAG_TEXT_ADDRESS:
+                address = reader.str8()
+            else:
+                address = b58encode(reader.raw(32))
+            liquidity, price, platform_code = reader.unpack(_NEW_TOKEN_NUMS)
+            platform = PLATFORM_NAMES.get(platform_code) if platform_code else reader.str8()
+            data = {
+                'address': address,
+                'name': reader.str8(),
+                'symbol': reader.str8(),
+                'platform': platform,
+                'liquidity': _opt(liquidity),
+                'price': _opt(price),
+            }
+        elif code == 2:
+            data = {'token': reader.str8()}
+            data['price'] = _opt(reader.unpack(_F64)[0])
+            data['reason'] = reader.str8()
+            (extra_len,) = reader.unpack(_U16)
+            if extra_len:
+                data.update(json.loads(reader.raw(extra_len)))
+        else:
+            raise ValueError(f"未知消息类型编号: {code}")
+    except (struct.error, IndexError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"二进制消息损坏: {e}") from e
+
+    return {
+        'type': TYPE_NAMES[code],
+        'source': source,
+        'timestamp': datetime.fromtimestamp(ts_ns / 1e9).isoformat(),
+        'ts_ns': ts_ns,
+        'data': data,
+    }
+
+# ============================================
+# 时钟同步 ping / pong
+# ============================================
+
+CHANNEL_CLOCK_PING = 'mesh_clock_ping'
+CHANNEL_CLOCK_PONG = 'mesh_clock_pong'
+
+
+def make_ping(ping_id: int) -> str:
+    """接收端发出的 ping，t0 为接收端的发送时间"""
+    return json.dumps({'id': ping_id, 't0': now_ns()})
+
+
+def make_pong(location: str, ping_raw) -> str:
+    """节点侧: 根据收到的 ping 生成 pong，t1 为本节点收到 ping 的时间"""
+    t1 = now_ns()
+    ping = json.loads(ping_raw)
+    return json.dumps({'source': location, 'id': ping['id'], 't0': ping['t0'], 't1': t1})
+
+# ============================================
+# 跨节点执行 (请求 / 确认)
+# ============================================
+
+CHANNEL_EXEC_REQUEST = 'mesh_exec_request:'   # + 执行节点位置代码，例如 mesh_exec_request:HK
+CHANNEL_EXEC_REPLY = 'mesh_exec_reply'        # 确认 / 拒绝 / 执行结果
+KEY_EXEC_AGENTS = 'mesh_exec_agents'          # hash: 位置代码 -> 执行节点最近一次心跳 (纪元秒)
+KEY_EXEC_CLAIM = 'mesh_exec_claim:'           # + 请求 id，SET NX: 执行节点或接收端谁先写入谁执行
+KEY_EXEC_RESULT = 'mesh_exec_result:'         # + 请求 id，执行节点保存的执行结果 (结果消息丢失时用来核对)
+
+# ============================================
+# 基准测试
+# ============================================
+
+def run_bench(n: int = 100000):
+    """对比 JSON 与二进制格式的编码、解码耗时和消息大小"""
+    samples = {
+        'NEW_TOKEN': {
+            'address': '7xKXtg2CW87d97TXJSDpbD5jBkheTqA83TZRuJosgAsU',
+            'name': 'Global Mesh Token',
+            'symbol': 'MESH',
+            'platform': 'pump_fun',
+            'liquidity': 12500.0,
+            'price': 0.00002315,
+        },
+        'PUMP_DETECTED': {
+            'token': 'SolanaGlobalPubSub',
+            'price': 0.0023,
+            'reason': 'Huge Volume Spike',
+        },
+    }
+
+    print("=" * 72)
+    print(f" 📦 WIRE FORMAT BENCHMARK ({n:,} iterations)")
+    print("=" * 72)
+    print(f"{'TYPE':<14} | {'FORMAT':<7} | {'BYTES':>6} | {'ENCODE':>10} | {'DECODE':>10}")
+    print("-" * 72)
+
+    for msg_type, data in samples.items():
+        for fmt in (FORMAT_JSON, FORMAT_BINARY):
+            ts = now_ns()
+            start = time.perf_counter()
+            for _ in range(n):
+                encoded = encode_message(msg_type, 'HK', data, ts, fmt)
+            encode_us = (time.perf_counter() - start) / n * 1e6
+
+            # JSON 路径与旧接收端一致: 收到的是 bytes
+            wire_bytes = encoded.encode('utf-8') if isinstance(encoded, str) else encoded
+            start = time.perf_counter()
+            for _ in range(n):
+                decode_message(wire_bytes)
+            decode_us = (time.perf_counter() - start) / n * 1e6
+
+            print(f"{msg_type:<14} | {fmt:<7} | {len(wire_bytes):>6} | {encode_us:>8.2f}µs | {decode_us:>8.2f}µs")
+
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    if '--bench' in sys.argv:
+        run_bench()
+    else:
+        print(__doc__)
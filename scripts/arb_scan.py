@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+🔭 多交易对价差扫描引擎
+- 输入: 两个场所的批量行情 {symbol: price}，每个场所每轮只需一次批量请求
+- 按固定的交易对顺序对齐成数组，一次向量化计算所有价差 / 方向 / 报警
+- 每个交易对可以有自己的报警阈值，冷却时间按交易对独立计算 (monotonic 时钟)
+- 安装了 numpy 时使用 numpy，否则退回纯 Python (结果相同，只是慢一些)
+"""
+
+import math
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# =================== 配置区域 ===================
+SCAN_QUOTE = "USDT"           # 只扫描以它计价的交易对
+SCAN_SYMBOLS = None           # 指定交易对列表，例如 ["SOLUSDT", "ETHUSDT"]；None 表示两边共有的全部
+SCAN_ALERT_THRESHOLD = 1.0    # 默认报警阈值 (百分比)
+PAIR_THRESHOLDS = {           # 个别交易对的阈值 (波动大的币放宽)
+    # "PEPEUSDT": 3.0,
+}
+SCAN_COOLDOWN = 60            # 每个交易对的报警冷却 (秒)
+# ================================================
+
+
+def _price(value) -> float:
+    """报价转 float；缺价 / 0 / 负数 / inf 都返回 NaN (与 numpy 路径一致)"""
+    price = float(value) if value is not None else math.nan
+    return price if math.isfinite(price) and price > 0 else math.nan
+
+
+class ScanResult:
+    """一轮扫描的结果"""
+
+    def __init__(self, symbols, cex, dex, spread, alerts):
+        self.symbols = symbols    # 交易对列表 (与数组下标对应)
+        self.cex = cex
+        self.dex = dex
+        self.spread = spread      # 价差百分比 (缺价为 NaN)
+        self.alerts = alerts      # 本轮触发报警的下标
+
+    def top(self, n: int):
+        """按 |价差| 从大到小的前 n 个下标 (跳过缺价的交易对)"""
+        if np is not None:
+            magnitude = np.nan_to_num(np.abs(self.spread), nan=-1.0)
+            n = min(n, len(magnitude))
+            if n <= 0:
+                return []
+            idx = np.argpartition(-magnitude, n - 1)[:n]
+            idx = idx[np.argsort(-magnitude[idx])]
+            return [int(i) for i in idx if magnitude[i] >= 0]
+        order = sorted((i for i, s in enumerate(self.spread) if not math.isnan(s)),
+                       key=lambda i: abs(self.spread[i]), reverse=True)
+        return order[:n]
+
+    @staticmethod
+    def direction(spread_pct: float) -> str:
+        return "CEX → DEX" if spread_pct > 0 else "DEX → CEX"
+
+
+class SpreadScanner:
+    """对齐两个场所的行情并批量计算价差"""
+
+    def __init__(self, symbols=None, quote: str = SCAN_QUOTE, thresholds: dict = None,
+                 default_threshold: float = SCAN_ALERT_THRESHOLD, cooldown: float = SCAN_COOLDOWN):
+        self.fixed_symbols = list(symbols) if symbols else None
+        self.quote = quote
+        self.thresholds = dict(PAIR_THRESHOLDS if thresholds is None else thresholds)
+        self.default_threshold = default_threshold
+        self.cooldown = cooldown
+        self.symbols = []
+        self._universe = None
+        self._thr = None
+        self._until = None
+        self._until_by_symbol = {}
+
+    def _reindex(self, cex: dict, dex: dict):
+        """交易对集合变化时重建对齐顺序 (平时每轮都复用)"""
+        if self.fixed_symbols is not None:
+            universe = frozenset(self.fixed_symbols)
+            symbols = self.fixed_symbols
+        else:
+            universe = frozenset(s for s in cex.keys() & dex.keys() if s.endswith(self.quote))
+            symbols = sorted(universe)
+        if universe == self._universe:
+            return
+        # 保留已有交易对的冷却状态
+        if self._until is not None:
+            for i, symbol in enumerate(self.symbols):
+                self._until_by_symbol[symbol] = float(self._until[i])
+        self._universe = universe
+        self.symbols = symbols
+        thr = [self.thresholds.get(s, self.default_threshold) for s in symbols]
+        until = [self._until_by_symbol.get(s, 0.0) for s in symbols]
+        if np is not None:
+            self._thr = np.array(thr, dtype=np.float64)
+            self._until = np.array(until, dtype=np.float64)
+        else:
+            self._thr, self._until = thr, until
+
+    def update(self, cex: dict, dex: dict) -> ScanResult:
+        """
+        cex / dex: {symbol: price}，price 可以是字符串 (交易所原始返回)
+        返回本轮所有交易对的价差和触发报警的下标
+        """
+        self._reindex(cex, dex)
+        symbols = self.symbols
+        now = time.monotonic()
+
+        if np is not None:
+            # 字符串数组一次性转 float，缺价为 NaN
+            cex_arr = np.array([cex.get(s, 'nan') for s in symbols], dtype=np.float64)
+            dex_arr = np.array([dex.get(s, 'nan') for s in symbols], dtype=np.float64)
+            # 0 / 负数 / inf 的报价 (停牌、接口异常) 按缺价处理，否则会算出 inf 价差并误报
+            for arr in (cex_arr, dex_arr):
+                with np.errstate(invalid='ignore'):
+                    arr[~(np.isfinite(arr) & (arr > 0))] = np.nan
+            with np.errstate(divide='ignore', invalid='ignore'):
+                spread = (dex_arr - cex_arr) / cex_arr * 100
+            hit = np.abs(spread) >= self._thr          # NaN 比较结果为 False
+            ready = now >= self._until
+            alerts = np.flatnonzero(hit & ready)
+            self._until[alerts] = now + self.cooldown
+            return ScanResult(symbols, cex_arr, dex_arr, spread, [int(i) for i in alerts])
+
+        cex_arr = [_price(cex.get(s)) for s in symbols]
+        dex_arr = [_price(dex.get(s)) for s in symbols]
+        spread = [(d - c) / c * 100 for c, d in zip(cex_arr, dex_arr)]
+        alerts = []
+        for i, value in enumerate(spread):
+            if abs(value) >= self._thr[i] and now >= self._until[i]:
+                self._until[i] = now + self.cooldown
+                alerts.append(i)
+        return ScanResult(symbols, cex_arr, dex_arr, spread, alerts)
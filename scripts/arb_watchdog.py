@@ -8,21 +8,54 @@
 - 洛杉矶节点: 查询 Solana DEX (1.4ms 延迟) 
 - 莱比锡节点: 对比分析 + 报警
 
-Usage: python3 scripts/arb_watchdog.py
+Usage: python3 scripts/arb_watchdog.py          # REST 轮询
+       python3 scripts/arb_watchdog.py --ws     # WebSocket 推送 (现货 vs 合约 bookTicker)
+       可选 --spot-ws URL --futures-ws URL 指向其他行情源 (例如 ws_feed.py 的本地回放服务器)
+       python3 scripts/arb_watchdog.py --scan   # 多交易对扫描 (现货 vs 合约，批量接口)
+       python3 scripts/arb_watchdog.py --scan --bench   # 扫描周期基准 (本地替身服务器)
+       任何模式加 --record DIR 都会把看到的价格记录下来，之后用 tick_store.py --backtest DIR 回测参数
 """
 
+import argparse
+import sys
 import time
 import json
+import http.client
+import threading
 import urllib.request
 import urllib.error
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+from arb_scan import SCAN_SYMBOLS, ScanResult, SpreadScanner
+from spread_stats import STATS_WINDOW, RollingStats
+from tick_store import TickWriter
+from ws_feed import BookTickerFeed
 
 # =================== 配置区域 ===================
 # 监控配置
 CHECK_INTERVAL = 0.5      # 检查间隔 (秒)
-ALERT_THRESHOLD = 1.0     # 报警阈值 (百分比)
+ALERT_THRESHOLD = 1.0     # 报警阈值 (百分比)，超过即报警
+ALERT_FLOOR = 0.3         # 统计报警的绝对下限 (百分比): 偏离再大，价差低于这个值也不报
+Z_ALERT = 4.0             # 价差偏离滚动均值超过这么多个标准差时报警
+Z_WATCH = 2.5             # 偏离超过这么多个标准差时进入观察
 SYMBOL = "SOL"            # 监控币种
+PAIR = f"{SYMBOL}USDT"    # 记录 tick 时使用的交易对名
+FETCH_TIMEOUT = 1.5       # 单个价格源的超时 (秒)
+KEEPALIVE_POOL_SIZE = 4   # 每个主机最多保留的空闲连接数 (对冲请求 / 并发请求同一个主机时各用各的连接)
+MAX_SKEW_MS = 100         # 两个价格的采样时间差超过这个值时，本次价差不可信
+ALERT_COOLDOWN = 60       # 报警冷却 (秒，按 monotonic 时钟计算)
+
+# DEX 侧价格源赛跑 (见 PriceSourceRegistry)
+HEDGE_DELAY = 0.15        # 当前最健康的源这么久没返回，就同时请求下一个源 (秒)
+BREAKER_FAILURES = 3      # 连续失败 / 过慢这么多次后熔断
+BREAKER_SLOW_MS = 800     # 单次耗时超过这个值算 "过慢"
+BREAKER_COOLDOWN = 30     # 熔断后暂停调用的时间，之后放行一次试探请求 (秒)
+SOURCE_PROBE_INTERVAL = 10    # 没有参与赛跑的源，每隔这么久在后台探测一次，让健康度能恢复 (秒)
+SOURCE_REPORT_INTERVAL = 30   # 价格源统计输出间隔 (秒)
 
 # Telegram 配置 (可选)
 TELEGRAM_ENABLED = False          # 设为 True 启用 Telegram 通知
@@ -34,46 +67,334 @@ BINANCE_API = "https://api.binance.com/api/v3/ticker/price?symbol=SOLUSDT"
 # 备用价格源 (选择一个可用的)
 COINGECKO_API = "https://api.coingecko.com/api/v3/simple/price?ids=solana&vs_currencies=usd"
 BINANCE_FUTURES_API = "https://fapi.binance.com/fapi/v1/ticker/price?symbol=SOLUSDT"
+
+# WebSocket 行情 (--ws 模式): 最优买卖价推送
+BINANCE_SPOT_WS = "wss://stream.binance.com:9443/ws/solusdt@bookTicker"
+BINANCE_FUTURES_WS = "wss://fstream.binance.com/ws/solusdt@bookTicker"
+STREAM_STALE_SEC = 2.0    # 推送流超过这个时间没有更新，改用 REST 补价
+WS_PRINT_INTERVAL = 0.5   # 每次更新都重新计算，但表格最多每隔这么久打印一行 (状态变化时立即打印)
+
+# 多交易对扫描 (--scan 模式): 每个场所每轮一次批量请求，交易对 / 阈值见 arb_scan.py
+SPOT_BULK_API = "https://api.binance.com/api/v3/ticker/price"
+FUTURES_BULK_API = "https://fapi.binance.com/fapi/v1/ticker/price"
+SCAN_TOP_N = 15           # 表格显示价差最大的前 N 个交易对
 # ================================================
 
-def get_binance_price() -> Optional[float]:
+# =================== 持久连接 ===================
+# 每个主机保持几条 keep-alive 连接，不再每次请求都重新 TCP + TLS 握手
+
+PriceSample = namedtuple('PriceSample', 'price ts_ns latency_ms source')
+Tick = namedtuple('Tick', 'spread_pct direction skew_ms z status alert')
+
+
+class KeepAliveClient:
+    """
+    单个主机的持久 HTTP(S) 连接池
+    每个请求独占一条连接，请求期间不持有锁: 一个卡住的请求 (例如对冲中落后的那一路) 不会挡住同主机的其他请求；
+    用完的连接放回池中复用，池满或服务端要求关闭时直接关掉
+    """
+
+    def __init__(self, scheme: str, host: str, timeout: float = FETCH_TIMEOUT, pool_size: int = KEEPALIVE_POOL_SIZE):
+        self.scheme = scheme
+        self.host = host
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.idle = []                 # 空闲连接 (后进先出，最近用过的最可能还活着)
+        self.lock = threading.Lock()   # 只保护 idle 列表
+        self.opened = 0                # 累计新建的连接数
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        with self.lock:
+            self.opened += 1
+        return cls(self.host, timeout=self.timeout)
+
+    def _acquire(self):
+        """取一条空闲连接，没有时新建；返回 (连接, 是否复用)"""
+        with self.lock:
+            if self.idle:
+                return self.idle.pop(), True
+        return self._connect(), False
+
+    def _release(self, conn):
+        with self.lock:
+            if len(self.idle) < self.pool_size:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            conn.close()
+
+    def get_json(self, path: str):
+        conn, reused = self._acquire()
+        while True:
+            try:
+                conn.request('GET', path, headers={'User-Agent': 'ArbWatchdog/1.0',
+                                                   'Connection': 'keep-alive'})
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                # 复用的空闲连接可能已被服务端关闭，换一条新连接重试一次
+                if not reused:
+                    raise
+                conn, reused = self._connect(), False
+                continue
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            return json.loads(body)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def fetch_json(url: str):
+    """通过对应主机的持久连接 GET 一个 JSON 接口"""
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = KeepAliveClient(parts.scheme, parts.netloc)
+    path = parts.path + (f"?{parts.query}" if parts.query else '')
+    return client.get_json(path)
+
+
+def fetch_sample(url: str, parse, source: str) -> PriceSample:
+    """
+    获取一个价格并记录采样时间
+    采样时间取请求发出和响应收到的中点，最接近交易所生成价格的时刻
+    """
+    start = time.time_ns()
+    price = float(parse(fetch_json(url)))
+    end = time.time_ns()
+    return PriceSample(price, (start + end) // 2, (end - start) / 1e6, source)
+
+# =================== Tick 记录 ===================
+# --record 时把每个价格样本记录到列式文件，场所按角色记为 cex / dex (回测按角色配对)
+
+_recorder = None
+VENUE_ROLES = {'spot': 'cex', 'futures': 'dex'}
+
+def start_recording(path: str):
+    global _recorder
+    _recorder = TickWriter(path)
+    print(f"💾 Recording ticks -> {path}")
+
+def stop_recording():
+    if _recorder is not None:
+        _recorder.close()
+        print(f"💾 已记录 {_recorder.written:,} ticks -> {_recorder.path}")
+
+def record_sample(venue: str, sample: Optional[PriceSample], symbol: str = PAIR):
+    if _recorder is not None and sample is not None:
+        _recorder.append(sample.ts_ns, venue, symbol, sample.price)
+
+# =================== 价格源 ===================
+
+def get_binance_sample() -> Optional[PriceSample]:
     """
     从 Binance 现货获取 SOL/USDT 价格 (CEX)
     最佳运行位置: 🇭🇰 香港 (1.6ms)
     """
     try:
-        req = urllib.request.Request(BINANCE_API, headers={'User-Agent': 'ArbWatchdog/1.0'})
-        with urllib.request.urlopen(req, timeout=5) as response:
-            data = json.loads(response.read().decode())
-            return float(data['price'])
+        return fetch_sample(BINANCE_API, lambda d: d['price'], 'Binance')
     except Exception as e:
         print(f"⚠️ Binance Spot API Error: {e}")
         return None
 
-def get_dex_price() -> Optional[float]:
+# =================== 价格源注册表 ===================
+
+class PriceSource:
+    """一个价格源: 健康度统计 + 熔断器"""
+
+    def __init__(self, name: str, url: str, parse):
+        self.name = name
+        self.url = url
+        self.parse = parse
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=200)   # 最近的成功耗时 (ms)
+        self.success_ewma = 1.0              # 成功率的指数平均
+        self.latency_ewma = None
+        self.strikes = 0                     # 连续失败 / 过慢次数
+        self.open_until = 0.0                # 熔断截止时间 (monotonic)
+        self.trial = False                   # 半开状态下试探请求是否已发出
+        self.last_call = 0.0                 # 最近一次请求的 monotonic 时间
+        self.stats = {'calls': 0, 'errors': 0, 'slow': 0, 'wins': 0, 'trips': 0}
+        self.last_error = ''
+
+    def state(self, now: float) -> str:
+        if now < self.open_until:
+            return 'OPEN'
+        return 'HALF' if self.strikes >= BREAKER_FAILURES else 'OK'
+
+    def allow(self, now: float) -> bool:
+        """熔断期间不调用；冷却结束后只放行一次试探请求"""
+        with self.lock:
+            state = self.state(now)
+            if state == 'OPEN':
+                return False
+            if state == 'HALF':
+                if self.trial:
+                    return False
+                self.trial = True
+            return True
+
+    def health(self) -> float:
+        """越大越好: 成功率 / 平均耗时"""
+        latency = self.latency_ewma if self.latency_ewma is not None else 100.0
+        return self.success_ewma / (1 + latency / 100)
+
+    def _record(self, ok: bool, latency_ms: float, error: str = ''):
+        with self.lock:
+            self.stats['calls'] += 1
+            self.success_ewma = 0.8 * self.success_ewma + 0.2 * (1.0 if ok else 0.0)
+            slow = latency_ms > BREAKER_SLOW_MS
+            if ok:
+                self.latencies.append(latency_ms)
+                self.latency_ewma = latency_ms if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency_ms
+            else:
+                self.stats['errors'] += 1
+                self.last_error = error
+            if slow:
+                self.stats['slow'] += 1
+            if ok and not slow:
+                self.strikes = 0
+            else:
+                self.strikes += 1
+                if self.strikes >= BREAKER_FAILURES:
+                    if self.open_until <= time.monotonic():
+                        self.stats['trips'] += 1
+                    self.open_until = time.monotonic() + BREAKER_COOLDOWN
+            self.trial = False
+
+    def fetch(self) -> Optional[PriceSample]:
+        self.last_call = time.monotonic()
+        start = time.perf_counter()
+        try:
+            sample = fetch_sample(self.url, self.parse, self.name)
+        except Exception as e:
+            self._record(False, (time.perf_counter() - start) * 1000, str(e) or type(e).__name__)
+            return None
+        self._record(True, sample.latency_ms)
+        return sample
+
+
+class PriceSourceRegistry:
+    """
+    多个价格源赛跑，第一个有效结果胜出
+    按健康度排序先请求最好的源，HEDGE_DELAY 内没返回 (或已失败) 再加入下一个，
+    落后的请求在后台完成，只用于更新统计
+    """
+
+    def __init__(self, sources):
+        self.sources = list(sources)
+        self._pool = ThreadPoolExecutor(max_workers=2 * len(self.sources), thread_name_prefix='source')
+
+    def get(self) -> Optional[PriceSample]:
+        now = time.monotonic()
+        queue = deque(sorted(self.sources, key=PriceSource.health, reverse=True))
+        deadline = now + FETCH_TIMEOUT
+        pending = {}
+        while True:
+            # 加入下一个可用的源 (熔断中的跳过)
+            while queue:
+                src = queue.popleft()
+                if src.allow(time.monotonic()):
+                    pending[self._pool.submit(src.fetch)] = src
+                    break
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0:
+                self._probe_idle(queue)
+                return None
+            timeout = min(HEDGE_DELAY, remaining) if queue else remaining
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                src = pending.pop(future)
+                sample = future.result()
+                if sample is not None:
+                    with src.lock:
+                        src.stats['wins'] += 1
+                    self._probe_idle(queue)
+                    return sample
+
+    def _probe_idle(self, idle):
+        """排在后面一直没被请求的源在后台探测一下，结果只用于更新健康度"""
+        now = time.monotonic()
+        for src in idle:
+            if now - src.last_call >= SOURCE_PROBE_INTERVAL and src.allow(now):
+                src.last_call = now
+                self._pool.submit(src.fetch)
+
+    def report(self):
+        now = time.monotonic()
+        print(f"{'SOURCE':<12} | {'STATE':<5} | {'CALLS':>6} | {'WINS':>5} | {'ERR%':>5} | {'SLOW':>4} | {'P50':>7} | {'P99':>7} | LAST ERROR")
+        for src in self.sources:
+            with src.lock:
+                latencies = sorted(src.latencies)
+                calls, stats = src.stats['calls'], dict(src.stats)
+                state, last_error = src.state(now), src.last_error
+            p50 = f"{latencies[len(latencies) // 2]:.0f}ms" if latencies else 'N/A'
+            p99 = f"{latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]:.0f}ms" if latencies else 'N/A'
+            err_pct = stats['errors'] / calls * 100 if calls else 0.0
+            print(f"{src.name:<12} | {state:<5} | {calls:>6} | {stats['wins']:>5} | {err_pct:>4.0f}% | "
+                  f"{stats['slow']:>4} | {p50:>7} | {p99:>7} | {last_error[:40]}")
+
+
+# DEX 侧价格源 (可以在这里注册更多源)
+DEX_SOURCES = PriceSourceRegistry([
+    PriceSource('CoinGecko', COINGECKO_API, lambda d: d['solana']['usd']),
+    # Binance Futures (可以对比现货 vs 合约价差)
+    PriceSource('Futures', BINANCE_FUTURES_API, lambda d: d['price']),
+])
+
+def get_dex_sample() -> Optional[PriceSample]:
     """
     从备用源获取 SOL 价格 (用于对比)
-    尝试顺序: CoinGecko -> Binance Futures
+    所有注册的源赛跑，熔断中的源不参与
     """
-    # 尝试 CoinGecko
-    try:
-        req = urllib.request.Request(COINGECKO_API, headers={'User-Agent': 'ArbWatchdog/1.0'})
-        with urllib.request.urlopen(req, timeout=5) as response:
-            data = json.loads(response.read().decode())
-            return float(data['solana']['usd'])
-    except Exception as e:
-        pass
-    
-    # 备用: Binance Futures (可以对比现货 vs 合约价差)
+    sample = DEX_SOURCES.get()
+    if sample is None:
+        print("⚠️ Price API Error: 所有价格源失败或已熔断")
+    return sample
+
+def get_futures_sample() -> Optional[PriceSample]:
+    """从 Binance 合约获取 SOL/USDT 价格"""
     try:
-        req = urllib.request.Request(BINANCE_FUTURES_API, headers={'User-Agent': 'ArbWatchdog/1.0'})
-        with urllib.request.urlopen(req, timeout=5) as response:
-            data = json.loads(response.read().decode())
-            return float(data['price'])
+        return fetch_sample(BINANCE_FUTURES_API, lambda d: d['price'], 'Futures')
     except Exception as e:
         print(f"⚠️ Price API Error: {e}")
         return None
 
+def get_binance_price() -> Optional[float]:
+    sample = get_binance_sample()
+    return sample.price if sample else None
+
+def get_dex_price() -> Optional[float]:
+    sample = get_dex_sample()
+    return sample.price if sample else None
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='price')
+
+def fetch_prices() -> Tuple[Optional[PriceSample], Optional[PriceSample]]:
+    """并发获取两边价格，两个采样时间尽量接近"""
+    cex = _executor.submit(get_binance_sample)
+    dex = _executor.submit(get_dex_sample)
+    return cex.result(), dex.result()
+
+def sample_skew_ms(a: PriceSample, b: PriceSample) -> float:
+    """两个价格采样时间的差 (毫秒)"""
+    return abs(a.ts_ns - b.ts_ns) / 1e6
+
 def calculate_spread(cex_price: float, dex_price: float) -> Tuple[float, str]:
     """
     计算价差百分比
@@ -88,6 +409,63 @@ def calculate_spread(cex_price: float, dex_price: float) -> Tuple[float, str]:
     
     return spread_pct, direction
 
+def classify_tick(cex: PriceSample, dex: PriceSample, stats: RollingStats,
+                  threshold: float = None, max_skew_ms: float = None) -> Tick:
+    """
+    对一对价格做出判定，并把价差计入滚动统计
+    报警条件: 价差超过 ALERT_THRESHOLD，或者偏离滚动均值 Z_ALERT 个标准差且价差不低于 ALERT_FLOOR
+    threshold / max_skew_ms 默认取配置区域的值 (tick_store.py 回测时传入要比较的参数)
+    """
+    threshold = ALERT_THRESHOLD if threshold is None else threshold
+    max_skew_ms = MAX_SKEW_MS if max_skew_ms is None else max_skew_ms
+    spread_pct, direction = calculate_spread(cex.price, dex.price)
+    abs_spread = abs(spread_pct)
+    skew_ms = sample_skew_ms(cex, dex)
+    
+    if skew_ms > max_skew_ms:
+        # 两个价格不是同一时刻的，价差只是噪声，不报警也不计入统计
+        return Tick(spread_pct, direction, skew_ms, stats.zscore(spread_pct), "⏱️ SKEWED", False)
+    z = stats.push(spread_pct)
+    if abs_spread >= threshold:
+        return Tick(spread_pct, direction, skew_ms, z, f"🚨 ARB! {direction}", True)
+    if abs(z) >= Z_ALERT and abs_spread >= ALERT_FLOOR:
+        return Tick(spread_pct, direction, skew_ms, z, f"📈 DEVIATION {direction}", True)
+    if abs_spread >= threshold * 0.5 or abs(z) >= Z_WATCH:
+        return Tick(spread_pct, direction, skew_ms, z, "⚠️ WATCHING", False)
+    return Tick(spread_pct, direction, skew_ms, z, "✅ NORMAL", False)
+
+def format_alert(cex: PriceSample, dex: PriceSample, tick: Tick, stats: RollingStats, timestamp: str) -> str:
+    return (
+        f"🐕 <b>ARB ALERT!</b>\n\n"
+        f"💰 Spread: <b>{abs(tick.spread_pct):.3f}%</b> (z = {tick.z:+.1f})\n"
+        f"📈 Binance: ${cex.price:.4f}\n"
+        f"📊 DEX: ${dex.price:.4f} ({dex.source})\n"
+        f"➡️ Direction: {tick.direction}\n"
+        f"📐 Rolling: mean {stats.mean:+.3f}% | std {stats.std:.3f}% | p95 {stats.percentile(95):+.3f}%\n"
+        f"⏱️ Skew: {tick.skew_ms:.0f}ms\n"
+        f"⏰ Time: {timestamp}"
+    )
+
+def print_row(timestamp: str, cex: PriceSample, dex: PriceSample, tick: Tick):
+    spread_display = f"{tick.spread_pct:+.3f}%"
+    skew_display = f"{tick.skew_ms:.0f}ms"
+    print(f"{timestamp:<12} | ${cex.price:<10.4f} | ${dex.price:<10.4f} | {spread_display:<10} | "
+          f"{tick.z:>+5.1f} | {skew_display:<8} | {tick.status}")
+
+
+class Cooldown:
+    """按 monotonic 时钟计算的报警冷却 (与轮询间隔、请求耗时无关)"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.until = 0.0
+
+    def ready(self) -> bool:
+        return time.monotonic() >= self.until
+
+    def trigger(self):
+        self.until = time.monotonic() + self.seconds
+
 def send_telegram_alert(message: str):
     """发送 Telegram 通知"""
     if not TELEGRAM_ENABLED or not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
@@ -112,74 +490,318 @@ def send_telegram_alert(message: str):
 
 def print_header():
     """打印监控头部"""
-    print("\n" + "="*70)
+    print("\n" + "="*88)
     print(" 🐕 ARB WATCHDOG - CEX/DEX Price Monitor")
     print(f" 📊 Symbol: {SYMBOL}/USDT")
-    print(f" ⏱️ Interval: {CHECK_INTERVAL}s | 🚨 Alert Threshold: {ALERT_THRESHOLD}%")
+    print(f" ⏱️ Interval: {CHECK_INTERVAL}s | 🚨 Alert Threshold: {ALERT_THRESHOLD}% | Max Skew: {MAX_SKEW_MS}ms")
+    print(f" 📐 Z-Score Alert: |z| ≥ {Z_ALERT} and spread ≥ {ALERT_FLOOR}% (window {STATS_WINDOW} ticks) | Cooldown: {ALERT_COOLDOWN}s")
     print(f" 📱 Telegram: {'Enabled' if TELEGRAM_ENABLED else 'Disabled'}")
-    print("="*70)
-    print(f"{'TIME':<12} | {'BINANCE':<12} | {'DEX':<12} | {'SPREAD':<10} | {'STATUS'}")
-    print("-"*70)
+    print("="*88)
+    print(f"{'TIME':<12} | {'BINANCE':<12} | {'DEX':<12} | {'SPREAD':<10} | {'Z':>5} | {'SKEW':<8} | {'STATUS'}")
+    print("-"*88)
 
 def run_watchdog():
     """运行监控主循环"""
     print_header()
-    alert_cooldown = 0
+    stats = RollingStats()
+    cooldown = Cooldown(ALERT_COOLDOWN)
+    next_report = time.monotonic() + SOURCE_REPORT_INTERVAL
+    next_tick = time.monotonic()
     
     while True:
         try:
             timestamp = datetime.now().strftime("%H:%M:%S")
             
-            # 获取价格
-            binance_price = get_binance_price()
-            dex_price = get_dex_price()
+            # 并发获取价格 (持久连接)
+            cex, dex = fetch_prices()
+            record_sample('cex', cex)
+            record_sample('dex', dex)
             
-            if binance_price and dex_price:
-                spread_pct, direction = calculate_spread(binance_price, dex_price)
-                abs_spread = abs(spread_pct)
-                
-                # 状态判定
-                if abs_spread >= ALERT_THRESHOLD:
-                    status = f"🚨 ARB! {direction}"
-                    
-                    # 发送报警 (有冷却时间避免刷屏)
-                    if alert_cooldown <= 0:
-                        alert_msg = (
-                            f"🐕 <b>ARB ALERT!</b>\n\n"
-                            f"💰 Spread: <b>{abs_spread:.3f}%</b>\n"
-                            f"📈 Binance: ${binance_price:.4f}\n"
-                            f"📊 DEX: ${dex_price:.4f}\n"
-                            f"➡️ Direction: {direction}\n"
-                            f"⏰ Time: {timestamp}"
-                        )
-                        send_telegram_alert(alert_msg)
-                        alert_cooldown = 60  # 60秒冷却
-                elif abs_spread >= ALERT_THRESHOLD * 0.5:
-                    status = "⚠️ WATCHING"
-                else:
-                    status = "✅ NORMAL"
+            if cex and dex:
+                tick = classify_tick(cex, dex, stats)
                 
-                # 根据价差显示颜色标记
-                spread_display = f"{spread_pct:+.3f}%"
+                # 发送报警 (有冷却时间避免刷屏)
+                if tick.alert and cooldown.ready():
+                    send_telegram_alert(format_alert(cex, dex, tick, stats, timestamp))
+                    cooldown.trigger()
                 
-                print(f"{timestamp:<12} | ${binance_price:<10.4f} | ${dex_price:<10.4f} | {spread_display:<10} | {status}")
+                print_row(timestamp, cex, dex, tick)
             else:
-                print(f"{timestamp:<12} | {'ERROR':<12} | {'ERROR':<12} | {'N/A':<10} | ⚠️ API ISSUE")
+                print(f"{timestamp:<12} | {'ERROR':<12} | {'ERROR':<12} | {'N/A':<10} | {'N/A':>5} | {'N/A':<8} | ⚠️ API ISSUE")
             
-            # 冷却倒计时
-            if alert_cooldown > 0:
-                alert_cooldown -= CHECK_INTERVAL
+            if time.monotonic() >= next_report:
+                print(f"📐 Spread: {stats.summary()}")
+                DEX_SOURCES.report()
+                next_report += SOURCE_REPORT_INTERVAL
             
-            time.sleep(CHECK_INTERVAL)
+            # 固定节拍: 扣除本轮请求耗时，不让间隔越拉越长
+            next_tick += CHECK_INTERVAL
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+            next_tick = max(next_tick, time.monotonic())
             
         except KeyboardInterrupt:
             print("\n\n🛑 Watchdog stopped by user.")
+            print(f"📐 Spread: {stats.summary()}")
+            DEX_SOURCES.report()
+            break
+        except Exception as e:
+            print(f"⚠️ Error: {e}")
+            time.sleep(CHECK_INTERVAL)
+            next_tick = time.monotonic()
+
+# =================== WebSocket 模式 ===================
+
+class StreamWatchdog:
+    """
+    事件驱动: 现货 / 合约 bookTicker 每推送一次就重新计算价差
+    推送流断开或超过 STREAM_STALE_SEC 没有更新时，用 REST 补价直到恢复
+    """
+
+    def __init__(self, spot_url: str, futures_url: str):
+        self.lock = threading.Lock()
+        self.samples = {'spot': None, 'futures': None}
+        self.feeds = {
+            'spot': BookTickerFeed('spot', spot_url, self.on_update),
+            'futures': BookTickerFeed('futures', futures_url, self.on_update),
+        }
+        self.rest_getters = {'spot': get_binance_sample, 'futures': get_futures_sample}
+        self.decision_us = []          # 更新 -> 决策延迟 (微秒)，报告时统计后清空
+        self.decisions = 0
+        self.rest_fallbacks = 0
+        self.spread_stats = RollingStats()   # 每次推送都计入 (窗口按更新次数计，覆盖的时长比轮询模式短)
+        self.cooldown = Cooldown(ALERT_COOLDOWN)
+        self.last_print = 0.0
+        self.last_status = None
+
+    def on_update(self, name: str, price: float, recv_ns: int, recv_perf: float):
+        """
+        推送流线程回调
+        每个样本保留自己的接收时间 (两边用同一个本地时钟；现货 bookTicker 没有事件时间)，
+        一边迟迟没有更新时两边的采样时间差会变大，由 MAX_SKEW_MS 判为不可信，而不是当成同一时刻的价格
+        """
+        with self.lock:
+            self.samples[name] = PriceSample(price, recv_ns, 0.0, f"WS {name}")
+            self._decide(recv_perf)
+        record_sample(VENUE_ROLES[name], self.samples[name])
+
+    def _decide(self, recv_perf: float):
+        cex, dex = self.samples['spot'], self.samples['futures']
+        if cex is None or dex is None:
+            return
+        tick = classify_tick(cex, dex, self.spread_stats)
+        self.decision_us.append((time.perf_counter() - recv_perf) * 1e6)
+        self.decisions += 1
+
+        now = time.monotonic()
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        if tick.alert and self.cooldown.ready():
+            self.cooldown.trigger()
+            # 发送可能要几秒，不能阻塞推送流线程
+            threading.Thread(target=send_telegram_alert, daemon=True,
+                             args=(format_alert(cex, dex, tick, self.spread_stats, timestamp),)).start()
+        if tick.status != self.last_status or now - self.last_print >= WS_PRINT_INTERVAL:
+            self.last_status, self.last_print = tick.status, now
+            print_row(timestamp, cex, dex, tick)
+
+    def poll_stale(self):
+        """主线程定期调用: 过期的推送流用 REST 补价 (两边都过期时并发获取，保证采样时间一致)"""
+        stale = [name for name, feed in self.feeds.items() if feed.is_stale(STREAM_STALE_SEC)]
+        if not stale:
+            return
+        recv_perf = time.perf_counter()
+        futures = {name: _executor.submit(self.rest_getters[name]) for name in stale}
+        results = {name: future.result() for name, future in futures.items()}
+        with self.lock:
+            for name, sample in results.items():
+                if sample is not None:
+                    self.samples[name] = sample._replace(source=f"REST {name}")
+                    record_sample(VENUE_ROLES[name], sample)
+                    self.rest_fallbacks += 1
+            self._decide(recv_perf)
+
+    def report(self):
+        with self.lock:
+            samples, self.decision_us = sorted(self.decision_us), []
+            print(f"📐 Spread: {self.spread_stats.summary()}")
+        feeds = " | ".join(f"{name}: {feed.stats['updates']} upd, {feed.stats['reconnects']} reconn"
+                           for name, feed in self.feeds.items())
+        if samples:
+            p50 = samples[len(samples) // 2]
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+            print(f"📡 {feeds} | REST 补价 {self.rest_fallbacks} 次 | "
+                  f"更新→决策 p50 {p50:.0f}µs p99 {p99:.0f}µs max {samples[-1]:.0f}µs ({len(samples)} 次)")
+        else:
+            print(f"📡 {feeds} | REST 补价 {self.rest_fallbacks} 次 | 暂无决策")
+
+    def run(self, report_interval: float = 30.0):
+        print_header()
+        for feed in self.feeds.values():
+            feed.start()
+        next_report = time.monotonic() + report_interval
+        try:
+            while True:
+                time.sleep(CHECK_INTERVAL)
+                self.poll_stale()
+                if time.monotonic() >= next_report:
+                    self.report()
+                    next_report += report_interval
+        except KeyboardInterrupt:
+            print("\n\n🛑 Watchdog stopped by user.")
+        finally:
+            for feed in self.feeds.values():
+                feed.stop()
+            self.report()
+
+def run_stream_watchdog(spot_url: str = BINANCE_SPOT_WS, futures_url: str = BINANCE_FUTURES_WS):
+    """运行 WebSocket 推送模式"""
+    StreamWatchdog(spot_url, futures_url).run()
+
+# =================== 多交易对扫描 ===================
+
+def fetch_bulk(url: str) -> dict:
+    """批量行情接口 -> {symbol: price 字符串}"""
+    return {row['symbol']: row['price'] for row in fetch_json(url)}
+
+def scan_cycle(scanner: SpreadScanner, spot_url: str, futures_url: str):
+    """一轮扫描: 两个批量请求并发，然后一次计算所有交易对；返回 (结果, 请求 ms, 计算 ms)"""
+    start = time.perf_counter()
+    spot = _executor.submit(fetch_bulk, spot_url)
+    futures = _executor.submit(fetch_bulk, futures_url)
+    spot, futures = spot.result(), futures.result()
+    fetched = time.perf_counter()
+    if _recorder is not None:
+        now_ns = time.time_ns()
+        _recorder.append_many(now_ns, 'cex', spot)
+        _recorder.append_many(now_ns, 'dex', futures)
+        fetched = time.perf_counter()   # 记录耗时不计入请求耗时
+    result = scanner.update(spot, futures)
+    return result, (fetched - start) * 1000, (time.perf_counter() - fetched) * 1000
+
+def print_scan_table(result: ScanResult, top_n: int, fetch_ms: float, compute_ms: float):
+    if sys.stdout.isatty():
+        print("\033[H\033[J", end='')   # 清屏，表格原地刷新
+    print(f"🔭 ARB SCAN | {datetime.now().strftime('%H:%M:%S')} | {len(result.symbols)} pairs | "
+          f"fetch {fetch_ms:.0f}ms | compute {compute_ms:.2f}ms")
+    print(f"{'#':>3} | {'SYMBOL':<14} | {'SPOT':>14} | {'FUTURES':>14} | {'SPREAD':>9} | STATUS")
+    print("-"*80)
+    alerts = set(result.alerts)
+    for rank, i in enumerate(result.top(top_n), 1):
+        spread = float(result.spread[i])
+        status = f"🚨 {ScanResult.direction(spread)}" if i in alerts else ""
+        print(f"{rank:>3} | {result.symbols[i]:<14} | {float(result.cex[i]):>14.6g} | "
+              f"{float(result.dex[i]):>14.6g} | {spread:>+8.3f}% | {status}")
+
+def run_scanner(spot_url: str = SPOT_BULK_API, futures_url: str = FUTURES_BULK_API, top_n: int = SCAN_TOP_N):
+    """运行多交易对扫描主循环"""
+    scanner = SpreadScanner(SCAN_SYMBOLS)
+    next_tick = time.monotonic()
+    while True:
+        try:
+            result, fetch_ms, compute_ms = scan_cycle(scanner, spot_url, futures_url)
+            print_scan_table(result, top_n, fetch_ms, compute_ms)
+            if result.alerts:
+                lines = [f"{result.symbols[i]}: {float(result.spread[i]):+.3f}% "
+                         f"({ScanResult.direction(float(result.spread[i]))})" for i in result.alerts[:20]]
+                send_telegram_alert("🐕 <b>ARB SCAN ALERT</b>\n\n" + "\n".join(lines))
+            next_tick += CHECK_INTERVAL
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+            next_tick = max(next_tick, time.monotonic())
+        except KeyboardInterrupt:
+            print("\n\n🛑 Scanner stopped by user.")
             break
         except Exception as e:
             print(f"⚠️ Error: {e}")
             time.sleep(CHECK_INTERVAL)
+            next_tick = time.monotonic()
+
+def run_scan_bench(universe: int = 2000, cycles: int = 20):
+    """
+    本地替身服务器返回 universe 个交易对的批量行情 (与真实接口一样，总是返回全部)，
+    测量扫描 1 ~ 500 个交易对时的周期耗时，并与逐个交易对请求的估算耗时对比
+    """
+    import random
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import arb_scan
+
+    random.seed(7)
+    names = [f"C{i:04d}USDT" for i in range(universe)]
+    base = {name: random.uniform(0.001, 500) for name in names}
+    spot_body = json.dumps([{'symbol': n, 'price': f"{p:.6f}"} for n, p in base.items()]).encode()
+    futures_body = json.dumps([{'symbol': n, 'price': f"{p * random.uniform(0.99, 1.01):.6f}", 'time': 0}
+                               for n, p in base.items()]).encode()
+    single_body = json.dumps({'symbol': names[0], 'price': '1.0'}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            body = {'/spot': spot_body, '/futures': futures_body}.get(self.path, single_body)
+            self.wfile.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(body) + body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    # 两个场所用不同的主机名，各自一条持久连接，和真实环境一样并发
+    spot_url, futures_url = f"http://127.0.0.1:{port}/spot", f"http://localhost:{port}/futures"
+
+    start = time.perf_counter()
+    for _ in range(cycles):
+        fetch_json(f"http://127.0.0.1:{port}/single")
+    single_ms = (time.perf_counter() - start) / cycles * 1000
+
+    print("="*80)
+    print(f" 🔭 SCAN BENCHMARK (批量接口返回 {universe} 个交易对, {cycles} 轮取平均, "
+          f"{'numpy' if arb_scan.np is not None else '纯 Python'})")
+    print("="*80)
+    print(f"{'PAIRS':>6} | {'CYCLE':>9} | {'FETCH':>9} | {'COMPUTE':>9} | {'逐个请求 (估算)':>16}")
+    print("-"*80)
+    for n in (1, 10, 100, 250, 500):
+        scanner = SpreadScanner(names[:n])
+        scan_cycle(scanner, spot_url, futures_url)   # 预热连接
+        totals = [0.0, 0.0, 0.0]
+        for _ in range(cycles):
+            start = time.perf_counter()
+            result, fetch_ms, compute_ms = scan_cycle(scanner, spot_url, futures_url)
+            result.top(SCAN_TOP_N)
+            totals[0] += (time.perf_counter() - start) * 1000
+            totals[1] += fetch_ms
+            totals[2] += compute_ms
+        cycle_ms, fetch_ms, compute_ms = (t / cycles for t in totals)
+        print(f"{n:>6} | {cycle_ms:>7.2f}ms | {fetch_ms:>7.2f}ms | {compute_ms:>7.3f}ms | "
+              f"{2 * n * single_ms:>14.1f}ms")
+    print("="*80)
+    server.shutdown()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CEX/DEX 价差监控器")
+    parser.add_argument('--ws', action='store_true', help="使用 WebSocket bookTicker 推送 (现货 vs 合约)")
+    parser.add_argument('--spot-ws', default=BINANCE_SPOT_WS, help="现货 bookTicker 流地址")
+    parser.add_argument('--futures-ws', default=BINANCE_FUTURES_WS, help="合约 bookTicker 流地址")
+    parser.add_argument('--scan', action='store_true', help="多交易对扫描 (现货 vs 合约批量接口)")
+    parser.add_argument('--top', type=int, default=SCAN_TOP_N, help="扫描模式显示的交易对数")
+    parser.add_argument('--bench', action='store_true', help="扫描周期基准测试 (配合 --scan)")
+    parser.add_argument('--record', metavar='DIR', help="把看到的价格记录到 DIR (列式 tick 文件，可回测)")
+    args = parser.parse_args()
+
+    if args.scan and args.bench:
+        run_scan_bench()
+        sys.exit(0)
+
     print("🐕 Initializing Arb Watchdog...")
     print("   Press Ctrl+C to stop\n")
-    run_watchdog()
+    if args.record:
+        start_recording(args.record)
+    try:
+        if args.ws:
+            run_stream_watchdog(args.spot_ws, args.futures_ws)
+        elif args.scan:
+            run_scanner(top_n=args.top)
+        else:
+            run_watchdog()
+    finally:
+        stop_recording()
@@ -1,7 +1,37 @@
-import subprocess
-import json
+#!/usr/bin/env python3
+"""
+🌍 Global Solana Infrastructure Monitor
+查询全球节点钱包的 SOL / 代币余额
+- 直接调用 JSON-RPC (不再为每个节点启动 solana / spl-token 命令行进程)
+- 所有钱包和它们的关联代币账户 (ATA) 放进 getMultipleAccounts 批量查询，每次最多 100 个地址，
+  多个批次通过 keep-alive 连接池并发发送
+- ATA 地址在本地推导 (PDA，带 ed25519 曲线外检查)，推导结果缓存
+
+Usage:
+  python3 scripts/global_monitor.py
+  python3 scripts/global_monitor.py --wallets wallets.json   # {"名称": "钱包地址", ...}
+  python3 scripts/global_monitor.py --bench                  # 本地替身 RPC，对比 4 个和 200 个钱包的耗时
+  python3 scripts/global_monitor.py --watch --events changes.jsonl   # 监视模式: 只重绘变化的行，变化事件写入 JSONL
+  python3 scripts/global_monitor.py --watch --bench          # 替身 RPC 上模拟余额变化，统计监视模式的查询量
+"""
+
+import argparse
 import datetime
+import hashlib
+import http.client
+import itertools
+import json
+import queue
+import random
+import sys
+import threading
 import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
 
 # --- 配置区域 ---
 # 你的自定义代币地址
@@ -14,62 +44,636 @@ NODES = {
     "🇭🇰 Hong Kong (Bot)": "6TqxxtoE4MxYtLbmsXtt7tXr5QCEXCeoPbkoM7JKrrNi",
     "🇯🇵 Osaka (RPC)": "4Qaaemy1m9LvC7H5nqys7s7Cry91KzGRQFyhApWtUigP"
 }
+
+# RPC 配置
+RPC_URL = "https://api.devnet.solana.com"
+RPC_POOL_SIZE = 4           # 并发请求数 (= keep-alive 连接数)
+RPC_TIMEOUT = 10            # 单次请求超时 (秒)
+RPC_BATCH_LIMIT = 100       # getMultipleAccounts 每次最多 100 个地址 (节点限制)
+RPC_COMMITMENT = "confirmed"
+
+# 代币程序 (Token-2022 的代币需要换成 TokenzQdBNbLqP5VEhdkAS6EPFLC1PHnBqCXEpPxuEb)
+TOKEN_PROGRAM_ID = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+ASSOCIATED_TOKEN_PROGRAM_ID = "ATokenGPvbdGVxr1b2hvZbsiqW5xWH25efTNsLJA8knL"
+
+# 监视模式 (--watch)
+WATCH_INTERVAL = 2.0        # 轮询间隔 (秒)；slot 没有前进时本轮不查询账户
+WATCH_COLD_AFTER = 5        # 连续这么多轮没有变化的钱包降为冷钱包
+WATCH_COLD_EVERY = 5        # 冷钱包每 N 轮才查询一次 (一有变化立即回到每轮查询)
 # ----------------
 
-def get_sol_balance(pubkey):
-    """查询 SOL 余额"""
-    if "Pending" in pubkey: return "N/A"
+LAMPORTS_PER_SOL = 1_000_000_000
+
+# =================== Base58 ===================
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+B58_INDEX = {c: i for i, c in enumerate(B58_ALPHABET)}
+
+def b58decode(text: str) -> bytes:
+    num = 0
+    for c in text:
+        num = num * 58 + B58_INDEX[c]     # 非法字符抛 KeyError
+    body = num.to_bytes((num.bit_length() + 7) // 8, 'big')
+    return b'\0' * (len(text) - len(text.lstrip('1'))) + body
+
+def b58encode(data: bytes) -> str:
+    num = int.from_bytes(data, 'big')
+    out = []
+    while num:
+        num, rem = divmod(num, 58)
+        out.append(B58_ALPHABET[rem])
+    return '1' * (len(data) - len(data.lstrip(b'\0'))) + ''.join(reversed(out))
+
+def decode_pubkey(address: str) -> bytes:
+    """地址 -> 32 字节公钥，不合法时抛 ValueError"""
     try:
-        result = subprocess.check_output(
-            ["solana", "balance", pubkey, "--url", "devnet"], 
-            stderr=subprocess.STDOUT
-        ).decode("utf-8").strip()
-        return result
-    except Exception:
-        return "Error"
-
-def get_token_balance(pubkey, mint):
-    """查询代币余额"""
-    if "Pending" in pubkey: return "N/A"
+        raw = b58decode(address)
+    except KeyError:
+        raise ValueError(f"非法 base58 地址: {address}") from None
+    if len(raw) != 32:
+        raise ValueError(f"地址长度不是 32 字节: {address}")
+    return raw
+
+# =================== ATA 推导 ===================
+
+ED25519_P = 2**255 - 19
+ED25519_D = -121665 * pow(121666, -1, ED25519_P) % ED25519_P
+ED25519_SQRT_M1 = pow(2, (ED25519_P - 1) // 4, ED25519_P)
+
+def is_on_curve(point: bytes) -> bool:
+    """32 字节是否能解压成 ed25519 曲线上的点 (PDA 必须不在曲线上)"""
+    y = int.from_bytes(point, 'little') & ((1 << 255) - 1)
+    if y >= ED25519_P:
+        return False
+    y2 = y * y % ED25519_P
+    x2 = (y2 - 1) * pow(ED25519_D * y2 + 1, -1, ED25519_P) % ED25519_P
+    if x2 == 0:
+        return True
+    x = pow(x2, (ED25519_P + 3) // 8, ED25519_P)
+    if (x * x - x2) % ED25519_P == 0:
+        return True
+    x = x * ED25519_SQRT_M1 % ED25519_P
+    return (x * x - x2) % ED25519_P == 0
+
+def find_program_address(seeds: list, program_id: bytes) -> tuple:
+    """与 Pubkey.find_program_address 相同: 从 bump 255 往下找第一个不在曲线上的地址"""
+    for bump in range(255, -1, -1):
+        digest = hashlib.sha256(b''.join(seeds) + bytes([bump]) + program_id + b"ProgramDerivedAddress").digest()
+        if not is_on_curve(digest):
+            return digest, bump
+    raise ValueError("找不到可用的 bump")
+
+_ata_cache = {}
+
+def get_associated_token_address(owner: str, mint: str, token_program: str = TOKEN_PROGRAM_ID) -> str:
+    """钱包 + 代币 -> 关联代币账户地址 (结果缓存，同一组参数只推导一次)"""
+    key = (owner, mint, token_program)
+    ata = _ata_cache.get(key)
+    if ata is None:
+        seeds = [decode_pubkey(owner), decode_pubkey(token_program), decode_pubkey(mint)]
+        ata = _ata_cache[key] = b58encode(find_program_address(seeds, decode_pubkey(ASSOCIATED_TOKEN_PROGRAM_ID))[0])
+    return ata
+
+# =================== JSON-RPC ===================
+
+class RpcError(Exception):
+    pass
+
+# 复用的空闲连接已被服务端关闭 (还没收到任何响应字节) 时的异常，这种情况换新连接重试是安全的
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                           ConnectionAbortedError)
+
+class RpcClient:
+    """
+    JSON-RPC 客户端: keep-alive 连接池 (每个线程借一条空闲连接，用完归还)
+    借来的空闲连接已经被服务端关闭时换一条新连接重试一次；超时不重试 (RPC 卡住时最多等一个 timeout)
+    """
+
+    def __init__(self, url: str = RPC_URL, timeout: float = RPC_TIMEOUT):
+        parts = urlsplit(url)
+        self.https = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.path = parts.path or '/'
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._ids = itertools.count(1)
+        self._id_lock = threading.Lock()
+        self.requests = 0
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _post(self, body: bytes):
+        try:
+            conn = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            conn = self._connect()
+            reused = False
+        while True:
+            try:
+                conn.request('POST', self.path, body, {'Content-Type': 'application/json'})
+                resp = conn.getresponse()
+                data = resp.read()
+            except STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                conn = self._connect()
+                reused = False
+                continue
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                raise
+            self._idle.put(conn)
+            self.requests += 1
+            if resp.status != 200:
+                raise RpcError(f"HTTP {resp.status}: {data[:200]!r}")
+            return json.loads(data)
+
+    def call(self, method: str, params: list = None):
+        with self._id_lock:
+            req_id = next(self._ids)
+        reply = self._post(json.dumps({'jsonrpc': '2.0', 'id': req_id, 'method': method,
+                                       'params': params or []}).encode())
+        if 'error' in reply:
+            err = reply['error']
+            raise RpcError(f"{method}: {err.get('message', err) if isinstance(err, dict) else err}")
+        return reply['result']
+
+def get_multiple_accounts(client: RpcClient, addresses: list, executor: ThreadPoolExecutor = None) -> tuple:
+    """
+    批量读取账户 (jsonParsed)，每 RPC_BATCH_LIMIT 个地址一次请求，多个批次并发
+    返回 ({地址: 账户或 None}, slot)
+    """
+    chunks = [addresses[i:i + RPC_BATCH_LIMIT] for i in range(0, len(addresses), RPC_BATCH_LIMIT)]
+
+    def fetch(chunk):
+        return client.call('getMultipleAccounts',
+                           [chunk, {'encoding': 'jsonParsed', 'commitment': RPC_COMMITMENT}])
+
+    replies = list(executor.map(fetch, chunks)) if executor and len(chunks) > 1 else [fetch(c) for c in chunks]
+    accounts = {}
+    for chunk, reply in zip(chunks, replies):
+        accounts.update(zip(chunk, reply['value']))
+    return accounts, min((reply['context']['slot'] for reply in replies), default=0)
+
+def format_sol(lamports: int) -> str:
+    return f"{lamports / LAMPORTS_PER_SOL:.9f}".rstrip('0').rstrip('.') + " SOL"
+
+class Balance(NamedTuple):
+    lamports: int
+    token: Optional[int]      # 代币最小单位数量，None 表示没有代币账户
+    decimals: int = 0
+
+def format_token(balance: Balance) -> str:
+    """代币余额字符串 (和 spl-token balance 输出一致)"""
+    if balance.token is None:
+        return "0 (No Account)"
+    return format(Decimal(balance.token).scaleb(-balance.decimals).normalize(), 'f')
+
+def resolve_owners(wallets: dict, mint: str = TOKEN_MINT) -> dict:
+    """{名称: 钱包地址} -> {名称: (钱包地址, ATA)}，跳过占位地址 (例如 "Pending...") 和格式错误的地址"""
+    owners = {}
+    for name, address in wallets.items():
+        try:
+            owners[name] = (address, get_associated_token_address(address, mint))
+        except ValueError:
+            pass
+    return owners
+
+def read_balances(client: RpcClient, owners: dict, executor: ThreadPoolExecutor = None) -> tuple:
+    """一次批量读取 owners 中所有钱包和 ATA，返回 ({名称: Balance}, slot)"""
+    keys = list(dict.fromkeys(k for pair in owners.values() for k in pair))
+    accounts, slot = get_multiple_accounts(client, keys, executor)
+    balances = {}
+    for name, (address, ata) in owners.items():
+        wallet, token = accounts.get(address), accounts.get(ata)
+        if token is None:
+            balances[name] = Balance(wallet['lamports'] if wallet else 0, None)
+            continue
+        amount = token['data']['parsed']['info']['tokenAmount']
+        balances[name] = Balance(wallet['lamports'] if wallet else 0, int(amount['amount']), amount['decimals'])
+    return balances, slot
+
+RPC_ERRORS = (RpcError, OSError, http.client.HTTPException, ValueError, KeyError, TypeError)
+
+def audit_balances(client: RpcClient, wallets: dict, mint: str = TOKEN_MINT,
+                   executor: ThreadPoolExecutor = None) -> dict:
+    """
+    一次查完所有钱包的 SOL 和代币余额
+    返回 {名称: (SOL 余额, 代币余额)}，地址无效时为 N/A，RPC 失败时为 Error
+    """
+    owners = resolve_owners(wallets, mint)
     try:
-        # 使用 spl-token balance 命令
-        result = subprocess.check_output(
-            ["spl-token", "balance", mint, "--owner", pubkey, "--url", "devnet"],
-            stderr=subprocess.STDOUT
-        ).decode("utf-8").strip()
-        # 处理可能的空返回或错误
-        if "could not find" in result.lower():
-            return "0 (No Account)"
-        return result
-    except Exception:
-        return "0"
-
-def print_dashboard():
+        balances, _ = read_balances(client, owners, executor)
+    except RPC_ERRORS:
+        return {name: ("Error", "Error") if name in owners else ("N/A", "N/A") for name in wallets}
+    return {name: (format_sol(balances[name].lamports), format_token(balances[name])) if name in balances
+            else ("N/A", "N/A") for name in wallets}
+
+# =================== 面板 ===================
+
+def print_dashboard(wallets: dict = NODES, client: RpcClient = None):
+    client = client or RpcClient()
     print("\n" + "="*60)
     print(f" 🌍 GLOBAL SOLANA INFRASTRUCTURE MONITOR")
     print(f" 🕒 Updated: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}")
     print(f" 🔑 Token Mint: {TOKEN_MINT[:6]}...{TOKEN_MINT[-4:]}")
     print("="*60)
-    
+
     # 表头
     print(f"{'NODE LOCATION':<25} | {'SOL BALANCE':<15} | {'TOKEN BALANCE':<15}")
     print("-" * 60)
-    
-    # 遍历查询
-    for name, address in NODES.items():
-        print(f"Scanning {name}...", end="\r") # 动态加载效果
-        sol = get_sol_balance(address)
-        token = get_token_balance(address, TOKEN_MINT)
-        
+
+    print(f"Scanning {len(wallets)} wallets...", end="\r") # 动态加载效果
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=RPC_POOL_SIZE) as executor:
+        balances = audit_balances(client, wallets, executor=executor)
+    elapsed = time.perf_counter() - start
+
+    for name, (sol, token) in balances.items():
         # 简单的状态着色（如果支持）或标记
         status_mark = "✅" if sol != "Error" and sol != "N/A" else "⚠️"
-        
+
         # 打印行
         print(f"{status_mark} {name:<22} | {sol:<15} | {token:<15}")
-        time.sleep(0.5) # 防止请求过快被限流
 
-    print("="*60 + "\n")
+    print("="*60)
+    print(f" {len(wallets)} wallets in {elapsed * 1000:.0f}ms ({client.requests} RPC requests so far)\n")
+    return elapsed
+
+# =================== 监视模式 ===================
+
+class BalanceWatcher:
+    """
+    内存中保存每个钱包的余额，增量刷新:
+    - 每轮先 getSlot (很便宜)，slot 没有前进就不查询账户
+    - 最近有变化的钱包每轮都查；连续 WATCH_COLD_AFTER 轮没变化的钱包每 WATCH_COLD_EVERY 轮查一次
+    - 只为变化的钱包产生事件 (带差值)
+    """
+
+    def __init__(self, client: RpcClient, wallets: dict, mint: str = TOKEN_MINT, executor: ThreadPoolExecutor = None):
+        self.client = client
+        self.mint = mint
+        self.executor = executor
+        self.owners = resolve_owners(wallets, mint)
+        self.state = {}                            # 名称 -> Balance
+        self.quiet = dict.fromkeys(self.owners, 0)  # 名称 -> 连续没有变化的轮数
+        self.slot = 0
+        self.rounds = 0
+        self.stats = Counter()
+
+    def _event(self, name: str, asset: str, old: int, new: int, decimals: int) -> dict:
+        delta = new - old
+        return {
+            'ts': round(time.time(), 3),
+            'slot': self.slot,
+            'wallet': name,
+            'address': self.owners[name][0],
+            'asset': asset,
+            'decimals': decimals,
+            'old': old,
+            'new': new,
+            'delta': delta,
+            'delta_ui': format(Decimal(delta).scaleb(-decimals).normalize(), 'f'),
+        }
+
+    def poll(self, force: bool = False) -> list:
+        """刷新一轮，返回变化事件列表 (第一轮只建立状态，不产生事件)"""
+        slot = self.client.call('getSlot', [{'commitment': RPC_COMMITMENT}])
+        self.stats['slot_checks'] += 1
+        if slot <= self.slot and not force:
+            self.stats['skipped'] += 1
+            return []
+        self.rounds += 1
+        due = {name: pair for name, pair in self.owners.items()
+               if force or name not in self.state or self.quiet[name] < WATCH_COLD_AFTER
+               or self.rounds % WATCH_COLD_EVERY == 0}
+        if not due:
+            return []
+        balances, self.slot = read_balances(self.client, due, self.executor)
+        self.stats['accounts'] += 2 * len(due)
+        self.stats['accounts_full'] += 2 * len(self.owners)
+
+        events = []
+        for name, new in balances.items():
+            old = self.state.get(name)
+            self.state[name] = new
+            if old is None:
+                continue
+            changed = False
+            if new.lamports != old.lamports:
+                events.append(self._event(name, 'SOL', old.lamports, new.lamports, 9))
+                changed = True
+            if new.token != old.token:
+                decimals = new.decimals if new.token is not None else old.decimals
+                events.append(self._event(name, self.mint, old.token or 0, new.token or 0, decimals))
+                changed = True
+            self.quiet[name] = 0 if changed else self.quiet[name] + 1
+        self.stats['events'] += len(events)
+        return events
+
+
+class WatchView:
+    """
+    终端上的监视面板: 先画完整的表，之后只重写变化的行和底部状态行
+    (输出不是终端时改为逐行打印变化)
+    """
+
+    def __init__(self, names: list, tty: bool):
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+        self.tty = tty
+        self.last_change = {}
+
+    def row(self, name: str, balance: Optional[Balance]) -> str:
+        if balance is None:
+            return f"⚠️ {name:<22} | {'N/A':<15} | {'N/A':<15} |"
+        change = self.last_change.get(name, '')
+        return f"✅ {name:<22} | {format_sol(balance.lamports):<15} | {format_token(balance):<15} | {change}"
+
+    def draw(self, state: dict, status: str):
+        print("\n" + "="*80)
+        print(f" 🌍 GLOBAL SOLANA INFRASTRUCTURE MONITOR (watch)")
+        print(f" 🔑 Token Mint: {TOKEN_MINT[:6]}...{TOKEN_MINT[-4:]}")
+        print("="*80)
+        print(f"{'NODE LOCATION':<25} | {'SOL BALANCE':<15} | {'TOKEN BALANCE':<15} | LAST CHANGE")
+        print("-" * 80)
+        for name in self.names:
+            print(self.row(name, state.get(name)))
+        print("="*80)
+        print(status)
+
+    def _rewrite(self, up: int, text: str):
+        # 光标上移 up 行，清行重写，再回到原位置 (表格下方)
+        sys.stdout.write(f"\033[{up}A\r\033[2K{text}\033[{up}B\r")
+
+    def update(self, events: list, state: dict, status: str):
+        changed = []
+        for event in events:
+            name = event['wallet']
+            asset = 'SOL' if event['asset'] == 'SOL' else 'TOKEN'
+            sign = '+' if event['delta'] > 0 else ''
+            self.last_change[name] = (f"{sign}{event['delta_ui']} {asset} @ "
+                                      f"{datetime.datetime.now().strftime('%H:%M:%S')}")
+            if name not in changed:
+                changed.append(name)
+        if not self.tty:
+            for name in changed:
+                print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {self.row(name, state.get(name))}")
+            return
+        footer = 2      # 表格下方的分隔线和状态行
+        for name in changed:
+            self._rewrite(len(self.names) - self.index[name] + footer, self.row(name, state.get(name)))
+        self._rewrite(1, status)
+        sys.stdout.flush()
+
+
+def run_watch(wallets: dict, client: RpcClient, interval: float = WATCH_INTERVAL, events_path: str = None,
+              duration: float = None):
+    """
+    监视模式主循环。events_path: 变化事件追加写入的 JSONL 文件，'-' 表示写到标准输出 (此时不画面板)
+    duration: 运行多少秒后返回 (None 表示一直运行)，返回 watcher 便于统计
+    """
+    events_out = sys.stdout if events_path == '-' else open(events_path, 'a') if events_path else None
+    with ThreadPoolExecutor(max_workers=RPC_POOL_SIZE) as executor:
+        watcher = BalanceWatcher(client, wallets, executor=executor)
+        view = WatchView(list(wallets), sys.stdout.isatty()) if events_out is not sys.stdout else None
+        try:
+            watcher.poll(force=True)
+            redraw = False
+        except RPC_ERRORS as e:
+            # 启动时 RPC 出错不退出: 先画出空表，之后每轮照常重试，第一次成功后重画整个表
+            watcher.stats['errors'] += 1
+            print(f"❌ 首次刷新失败: {e}", file=sys.stderr)
+            redraw = True
+
+        def status():
+            s = watcher.stats
+            return (f" 🕒 {datetime.datetime.now().strftime('%H:%M:%S')} slot {watcher.slot} | 轮询 {s['slot_checks']} "
+                    f"(slot 未变跳过 {s['skipped']}) | 查询账户 {s['accounts']}/{s['accounts_full']} | 变化 {s['events']}")
+
+        if view:
+            view.draw(watcher.state, status())
+        deadline = time.monotonic() + duration if duration else None
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                time.sleep(interval)
+                try:
+                    events = watcher.poll()
+                except RPC_ERRORS as e:
+                    watcher.stats['errors'] += 1
+                    if view and not view.tty:
+                        print(f"❌ 刷新失败: {e}")
+                    continue
+                if events_out:
+                    for event in events:
+                        events_out.write(json.dumps(event, ensure_ascii=False) + "\n")
+                    events_out.flush()
+                if view and redraw and watcher.state:
+                    view.draw(watcher.state, status())
+                    redraw = False
+                elif view:
+                    view.update(events, watcher.state, status())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if events_out not in (None, sys.stdout):
+                events_out.close()
+    return watcher
+
+# =================== 基准测试 ===================
+
+def make_mock_rpc(accounts: dict, delay_ms: float = 30.0):
+    """
+    本地替身 RPC: 支持 getMultipleAccounts / getBalance / getSlot，
+    每个请求等待 delay_ms 模拟网络往返。accounts: {地址: 账户 JSON}
+    """
+    state = {'slot': 1000, 'requests': 0}
+    lock = threading.Lock()
+
+    def handle(req):
+        method, params = req.get('method'), req.get('params', [])
+        if method == 'getMultipleAccounts':
+            if len(params[0]) > RPC_BATCH_LIMIT:
+                return {'error': {'code': -32602, 'message': 'Too many inputs provided; max 100'}}
+            value = [accounts.get(a) for a in params[0]]
+            return {'result': {'context': {'slot': state['slot']}, 'value': value}}
+        if method == 'getBalance':
+            account = accounts.get(params[0])
+            return {'result': {'context': {'slot': state['slot']}, 'value': account['lamports'] if account else 0}}
+        if method == 'getSlot':
+            return {'result': state['slot']}
+        return {'error': {'code': -32601, 'message': 'Method not found'}}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            req = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            with lock:
+                state['requests'] += 1
+            time.sleep(delay_ms / 1000)
+            if isinstance(req, list):
+                reply = [{'jsonrpc': '2.0', 'id': r.get('id'), **handle(r)} for r in req]
+            else:
+                reply = {'jsonrpc': '2.0', 'id': req.get('id'), **handle(req)}
+            body = json.dumps(reply).encode()
+            self.wfile.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(body) + body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+def mock_wallets(n: int, mint: str = TOKEN_MINT, seed: int = 5):
+    """生成 n 个随机钱包和对应的账户数据 (约三分之二持有代币)"""
+    rng = random.Random(seed)
+    wallets, accounts = {}, {}
+    for i in range(n):
+        address = b58encode(bytes(rng.getrandbits(8) for _ in range(32)))
+        wallets[f"Wallet {i:03d}"] = address
+        accounts[address] = {'lamports': rng.randrange(0, 50 * LAMPORTS_PER_SOL), 'owner': '11111111111111111111111111111111',
+                             'data': ['', 'base64'], 'executable': False, 'rentEpoch': 0}
+        if i % 3:
+            amount = rng.randrange(0, 10**12)
+            accounts[get_associated_token_address(address, mint)] = {
+                'lamports': 2039280, 'owner': TOKEN_PROGRAM_ID, 'executable': False, 'rentEpoch': 0,
+                'data': {'program': 'spl-token', 'space': 165, 'parsed': {'type': 'account', 'info': {
+                    'mint': mint, 'owner': address, 'tokenAmount': {
+                        'amount': str(amount), 'decimals': 6, 'uiAmountString': f"{amount / 1e6:g}"}}}}}
+    _ata_cache.clear()
+    return wallets, accounts
+
+def run_bench(delay_ms: float = 30.0):
+    """
+    替身 RPC 每个请求 delay_ms 往返: 4 个和 200 个钱包的面板耗时，
+    与旧的逐个节点串行查询 (每个节点两次请求 + 0.5s 间隔，不含 CLI 进程启动) 对比
+    """
+    print("="*72)
+    print(f" 🧪 BALANCE AUDIT BENCHMARK (替身 RPC，每个请求 {delay_ms:.0f}ms)")
+    print("="*72)
+    print(f"{'WALLETS':>8} | {'ATA 推导':>9} | {'面板耗时':>9} | {'RPC 请求':>8} | {'旧方式 (估算)':>13}")
+    print("-"*72)
+    for n in (4, 200):
+        wallets, accounts = mock_wallets(n)
+        server, state = make_mock_rpc(accounts, delay_ms)
+        client = RpcClient(f"http://127.0.0.1:{server.server_address[1]}")
+
+        start = time.perf_counter()
+        for address in wallets.values():
+            get_associated_token_address(address, TOKEN_MINT)
+        derive_ms = (time.perf_counter() - start) * 1000
+        _ata_cache.clear()
+
+        with ThreadPoolExecutor(max_workers=RPC_POOL_SIZE) as executor:
+            audit_balances(client, wallets, executor=executor)    # 预热连接
+            state['requests'] = 0
+            _ata_cache.clear()
+            start = time.perf_counter()
+            balances = audit_balances(client, wallets, executor=executor)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+        # 校验: 与替身数据一致
+        for name, address in wallets.items():
+            assert balances[name][0] == format_sol(accounts[address]['lamports'])
+        legacy_ms = n * (2 * delay_ms + 500)
+        print(f"{n:>8} | {derive_ms:>7.1f}ms | {elapsed_ms:>7.1f}ms | {state['requests']:>8} | {legacy_ms / 1000:>11.1f}s")
+        server.shutdown()
+    print("="*72)
+
+def run_watch_bench(n: int = 200, seconds: float = 12.0, interval: float = 0.5, slot_time: float = 0.8,
+                    changes_per_sec: float = 2.0):
+    """
+    替身 RPC 上模拟: slot 每 slot_time 秒前进一次，每秒随机改动几个钱包的余额；
+    统计监视模式的查询量、发现变化的延迟，最后强制全量刷新校验内存状态
+    """
+    wallets, accounts = mock_wallets(n)
+    server, state = make_mock_rpc(accounts, delay_ms=30)
+    client = RpcClient(f"http://127.0.0.1:{server.server_address[1]}")
+    owners = resolve_owners(wallets)
+    hot = random.Random(9).sample(list(owners), max(1, n // 20))    # 5% 的钱包频繁变动，其余偶尔变动
+    changed_at = {}
+    stop = threading.Event()
+
+    def mutate():
+        rng = random.Random(11)
+        next_slot = time.monotonic() + slot_time
+        while not stop.wait(1 / changes_per_sec):
+            if time.monotonic() >= next_slot:
+                state['slot'] += 1
+                next_slot += slot_time
+            name = rng.choice(hot) if rng.random() < 0.8 else rng.choice(list(owners))
+            address, ata = owners[name]
+            if ata in accounts and rng.random() < 0.5:
+                amount = accounts[ata]['data']['parsed']['info']['tokenAmount']
+                amount['amount'] = str(int(amount['amount']) + rng.randrange(1, 10**7))
+            else:
+                accounts[address]['lamports'] += rng.randrange(-10**6, 10**8)
+            changed_at.setdefault(name, time.monotonic())
+
+    with ThreadPoolExecutor(max_workers=RPC_POOL_SIZE) as executor:
+        watcher = BalanceWatcher(client, wallets, executor=executor)
+        watcher.poll(force=True)
+        state['requests'] = 0
+        threading.Thread(target=mutate, daemon=True).start()
+        lags = []
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            time.sleep(interval)
+            for event in watcher.poll():
+                since = changed_at.pop(event['wallet'], None)
+                if since is not None:
+                    lags.append(time.monotonic() - since)
+        stop.set()
+        polls = watcher.stats['slot_checks']
+        requests = state['requests']
+        watcher.poll(force=True)
+        expected, _ = read_balances(client, owners, executor)
+    server.shutdown()
+
+    s = watcher.stats
+    per_scan = -(-2 * len(owners) // RPC_BATCH_LIMIT)
+    print("="*72)
+    print(f" 👀 WATCH MODE BENCHMARK ({n} 个钱包, {seconds:.0f}s, 每 {interval}s 轮询, slot {slot_time}s)")
+    print("="*72)
+    print(f" 轮询次数:            {polls} (slot 未前进跳过 {s['skipped']})")
+    print(f" RPC 请求:            {requests} (每次全量重扫需要 {polls * (per_scan + 1)})")
+    print(f" 查询账户:            {s['accounts']} / 全量 {s['accounts_full']} "
+          f"({s['accounts'] / max(1, s['accounts_full']) * 100:.0f}%)")
+    print(f" 变化事件:            {s['events']}")
+    if lags:
+        lags.sort()
+        print(f" 发现变化的延迟:      p50 {lags[len(lags) // 2]:.2f}s  max {lags[-1]:.2f}s "
+              f"(冷钱包最多晚 {WATCH_COLD_EVERY} 个有效轮次)")
+    print(f" 内存状态与 RPC 一致: {'✅' if watcher.state == expected else '❌'}")
+    print("="*72)
 
 if __name__ == "__main__":
-    print("Initializing Connection to Solana Devnet Cluster...")
-    print_dashboard()
+    parser = argparse.ArgumentParser(description="全球节点余额面板")
+    parser.add_argument('--wallets', metavar='FILE', help='钱包列表 JSON: {"名称": "地址", ...} (默认 NODES)')
+    parser.add_argument('--rpc', default=RPC_URL, help=f"RPC 地址 (默认 {RPC_URL})")
+    parser.add_argument('--bench', action='store_true', help="本地替身 RPC 基准测试")
+    parser.add_argument('--watch', action='store_true', help="监视模式: 增量刷新，只重绘变化的行")
+    parser.add_argument('--interval', type=float, default=WATCH_INTERVAL, help=f"监视模式轮询间隔 (默认 {WATCH_INTERVAL}s)")
+    parser.add_argument('--events', metavar='PATH', help="监视模式下把变化事件追加到 JSONL 文件 ('-' 为标准输出)")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_watch_bench() if args.watch else run_bench()
+    else:
+        wallets = NODES
+        if args.wallets:
+            with open(args.wallets) as f:
+                wallets = json.load(f)
+        print("Initializing Connection to Solana Devnet Cluster...")
+        if args.watch:
+            run_watch(wallets, RpcClient(args.rpc), args.interval, args.events)
+        else:
+            print_dashboard(wallets, RpcClient(args.rpc))
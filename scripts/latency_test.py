@@ -2,17 +2,53 @@
 """
 🌍 Global Exchange Latency Tester
 测试全球各节点到交易所 API 的响应延迟
+- 所有端点并行探测 (asyncio)，每个端点同时保持几个探测槽
+- 每次探测分阶段计时: DNS 解析 / TCP 连接 / TLS 握手 / HTTP 首字节 (TTFB)，
+  和 HTTPS 交易客户端新建一条连接时经历的过程一致
+- 样本进对数分桶直方图 (内存固定)，报告 p50/p90/p99/p99.9、抖动 (标准差 / 相邻样本差) 和丢失率；
+  评级和推荐都按 TCP 连接的 p99 (交易关心的是尾部延迟，不是平均值)
 
-Usage: python3 scripts/latency_test.py
+Usage:
+  python3 scripts/latency_test.py
+  python3 scripts/latency_test.py --samples 200        # 每个端点的采样数
+  python3 scripts/latency_test.py --duration 10        # 改为按时间预算采样
+  python3 scripts/latency_test.py --bench              # 本地回环替身服务器，对比旧的串行测试
+  python3 scripts/latency_test.py --daemon             # 各节点常驻: 定期探测，摘要发布到 Redis Master
+  python3 scripts/latency_test.py --aggregate --export heatmap.md   # Master 上: 实时的节点 × 端点矩阵
 """
 
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import random
+import shutil
 import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
 import time
-import statistics
+from collections import Counter, deque
 from datetime import datetime
+from typing import NamedTuple, Optional
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
 
 # --- 配置区域 ---
-# 测试目标 (交易所 API 端点)
+# 测试目标 (交易所 API 端点)，443 端口走 TLS；也可以写成 (host, port, tls) 显式指定
 ENDPOINTS = {
     "Binance Futures": ("fapi.binance.com", 443),
     "Binance Spot": ("api.binance.com", 443),
@@ -22,8 +58,41 @@ ENDPOINTS = {
     "Solana Mainnet RPC": ("api.mainnet-beta.solana.com", 443),
 }
 
-# 每个端点测试次数
-TEST_COUNT = 5
+# 每个端点测试次数: 对真实交易所每个样本都是一次新的 TCP 连接，默认量不宜大 (p99 够用)；
+# 需要 p99.9 时用 --samples 2000 / --duration 一次性多采，回环基准测试 (--bench) 不受此限制
+TEST_COUNT = 200
+
+# 并发探测参数
+PROBE_CONCURRENCY = 8      # 每个端点同时进行的探测数
+PROBE_FULL_EVERY = 10      # 每 N 次探测做一次完整的 TLS + HTTP，其余只测 DNS + TCP (握手太重，不必每次都做)
+PROBE_MAX_INFLIGHT = 24    # 全局同时进行的探测上限 (过多时事件循环排队，计时会偏大)
+PROBE_TIMEOUT = 5          # 单次探测超时 (秒)
+PROBE_GAP = 0.02           # 每个探测槽两次探测之间的间隔 (秒)，避免对交易所形成突发连接
+PROBE_MAX_RATE = 10        # 每个端点每秒最多新建的连接数 (所有探测槽合计)，避免被交易所当成扫描限流 / 封禁
+PROBE_REQUEST = "HEAD / HTTP/1.1\r\nHost: {host}\r\nUser-Agent: latency-test\r\nConnection: close\r\n\r\n"
+PHASES = ('dns', 'tcp', 'tls', 'ttfb')
+
+# 直方图: 对数分桶，相对精度 1% (p99 = 150ms 时误差 ±1.5ms)
+HIST_PRECISION = 0.01
+HIST_MIN_MS = 0.01
+HIST_MAX_MS = 60000
+
+# 常驻模式 (--daemon): 定期探测，把摘要写到 global_mesh 使用的 Redis Master
+MESH_CONFIG_PATH = os.getenv('MESH_CONFIG', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'global_mesh', 'config.yaml'))
+DAEMON_INTERVAL = 60            # 两轮探测的间隔 (秒)
+DAEMON_SAMPLES = 100            # 每轮每个端点的采样数 (限速下约 10 秒采完，每分钟每个端点 100 次连接)
+LATENCY_CHANNEL = 'latency_reports'   # 摘要广播频道 (config.yaml 的 channels.latency 可覆盖)
+LATENCY_KEY = 'latency:matrix'        # hash: 节点 -> 最新摘要，聚合端启动时先读它
+
+# 聚合模式 (--aggregate)
+AGG_REFRESH = 10                # 没有新摘要时重绘的间隔 (秒)，用于更新过期标记
+AGG_STALE_FACTOR = 3            # 超过 3 个探测间隔没有更新的节点标记为过期
+AGG_REGRESSION_FACTOR = 1.5     # p99 超过基线 1.5 倍 ...
+AGG_REGRESSION_MIN_MS = 5       # ... 且至少高出 5ms，视为路由退化
+AGG_BASELINE_ALPHA = 0.2        # 基线 p99 的 EWMA 系数
+AGG_RECONNECT_MIN = 0.5         # 断线后第一次重连前的等待 (秒)，之后每次翻倍 (加随机抖动)
+AGG_RECONNECT_MAX = 10          # 重连等待上限 (秒)
 
 # 节点位置 (自动检测或手动设置)
 # 可通过环境变量 NODE_NAME 手动覆盖: export NODE_NAME="🇯🇵 Osaka"
@@ -73,93 +142,306 @@ def get_node_name():
     # 4. 默认返回主机名
     return f"🖥️ {socket.gethostname()}"
 
-def test_tcp_latency(host, port, count=5):
+class ProbeSample(NamedTuple):
+    """一次探测的各阶段耗时 (毫秒)；失败时 error 为 "阶段: 原因"，未完成的阶段为 None"""
+    dns_ms: Optional[float]
+    tcp_ms: Optional[float]
+    tls_ms: Optional[float]
+    ttfb_ms: Optional[float]
+    error: Optional[str] = None
+
+    @property
+    def total_ms(self) -> float:
+        return sum(v for v in (self.dns_ms, self.tcp_ms, self.tls_ms, self.ttfb_ms) if v is not None)
+
+def endpoint_spec(value):
+    """(host, port) 或 (host, port, tls) -> (host, port, tls)"""
+    if len(value) == 3:
+        return value
+    host, port = value
+    return host, port, port == 443
+
+_default_ssl = None
+
+def default_ssl_context() -> ssl.SSLContext:
+    global _default_ssl
+    if _default_ssl is None:
+        _default_ssl = ssl.create_default_context()
+    return _default_ssl
+
+async def _probe_phases(host: str, port: int, tls: bool, ssl_context, timings: dict, full: bool = True):
     """
-    测试 TCP 连接延迟 (毫秒)
-    返回: (最小, 平均, 最大, 成功率)
+    依次完成各阶段，每完成一个就写入 timings (超时被取消时已完成的阶段仍然保留)
+    full=False 时 TCP 连上即断开
     """
-    latencies = []
-    success = 0
-    
-    for _ in range(count):
-        try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)
-            
-            start = time.perf_counter()
-            sock.connect((host, port))
-            end = time.perf_counter()
-            
-            latency_ms = (end - start) * 1000
-            latencies.append(latency_ms)
-            success += 1
+    loop = asyncio.get_running_loop()
+    t0 = time.perf_counter()
+    infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    t1 = time.perf_counter()
+    timings['dns'] = (t1 - t0) * 1000
+
+    family, type_, proto, _, addr = infos[0]
+    sock = socket.socket(family, type_, proto)
+    sock.setblocking(False)
+    writer = None
+    try:
+        await loop.sock_connect(sock, addr)
+        t2 = time.perf_counter()
+        timings['tcp'] = (t2 - t1) * 1000
+        if not full:
+            return
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        # 每次都是完整握手 (不复用 TLS session)，与新建连接的客户端一致
+        reader, writer = await asyncio.open_connection(
+            sock=sock, ssl=ssl_context if tls else None, server_hostname=host if tls else None)
+        t3 = time.perf_counter()
+        if tls:
+            timings['tls'] = (t3 - t2) * 1000
+
+        writer.write(PROBE_REQUEST.format(host=host).encode())
+        if not await reader.read(1):
+            raise ConnectionError("连接在响应前被关闭")
+        timings['ttfb'] = (time.perf_counter() - t3) * 1000
+    finally:
+        if writer is not None:
+            writer.transport.abort()    # 不等 TLS close_notify，直接断开
+        else:
             sock.close()
-            
-        except Exception:
-            pass
-        
-        time.sleep(0.1)  # 防止过快请求
-    
-    if not latencies:
-        return None, None, None, 0
-    
-    return (
-        min(latencies),
-        statistics.mean(latencies),
-        max(latencies),
-        (success / count) * 100
-    )
 
-def get_latency_rating(avg_ms):
-    """根据延迟评级"""
-    if avg_ms is None:
+async def probe_once(host: str, port: int, tls: bool, ssl_context=None,
+                     timeout: float = PROBE_TIMEOUT, full: bool = True) -> ProbeSample:
+    """一次探测，返回各阶段耗时 (full=False 时只有 DNS + TCP)"""
+    timings = {}
+    error = None
+    try:
+        await asyncio.wait_for(_probe_phases(host, port, tls, ssl_context or default_ssl_context(), timings, full),
+                               timeout)
+    except asyncio.TimeoutError:
+        error = "timeout"
+    except (OSError, ssl.SSLError, ConnectionError) as e:
+        error = str(e) or type(e).__name__
+    if error is not None:
+        failed = next(p for p in PHASES if p not in timings and (tls or p != 'tls'))
+        error = f"{failed}: {error}"
+    return ProbeSample(timings.get('dns'), timings.get('tcp'), timings.get('tls'), timings.get('ttfb'), error)
+
+class LatencyHistogram:
+    """
+    对数分桶直方图: 每个桶的上下界相差 HIST_PRECISION，分位数的相对误差不超过它，
+    内存只和覆盖范围有关 (约 1600 个桶)，和样本数无关
+    同时按到达顺序记录相邻样本的差值，得到抖动
+    """
+
+    def __init__(self, precision: float = HIST_PRECISION, min_ms: float = HIST_MIN_MS, max_ms: float = HIST_MAX_MS):
+        self.min_ms = min_ms
+        self.log_step = math.log1p(precision)
+        self.counts = [0] * (int(math.log(max_ms / min_ms) / self.log_step) + 2)
+        self.n = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.last = None
+        self.delta_total = 0.0
+        self.delta_n = 0
+
+    def _index(self, ms: float) -> int:
+        if ms <= self.min_ms:
+            return 0
+        return min(int(math.log(ms / self.min_ms) / self.log_step) + 1, len(self.counts) - 1)
+
+    def record(self, ms: float):
+        self.counts[self._index(ms)] += 1
+        self.n += 1
+        self.total += ms
+        self.total_sq += ms * ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+        if self.last is not None:
+            self.delta_total += abs(ms - self.last)
+            self.delta_n += 1
+        self.last = ms
+
+    def percentile(self, p: float) -> float:
+        """第 p 百分位 (返回所在桶的上界，不超过实际最大值)"""
+        if not self.n:
+            return math.nan
+        target = max(1, math.ceil(self.n * p / 100))
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                upper = self.min_ms * math.exp(self.log_step * idx)
+                return min(max(upper, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.n if self.n else math.nan
+
+    @property
+    def std(self) -> float:
+        if self.n < 2:
+            return math.nan
+        var = (self.total_sq - self.total * self.total / self.n) / (self.n - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+    @property
+    def jitter(self) -> float:
+        """相邻样本差的平均绝对值 (RFC 3550 的抖动定义，不做平滑)"""
+        return self.delta_total / self.delta_n if self.delta_n else math.nan
+
+
+class EndpointStats:
+    """一个端点的探测统计: 每个阶段一个直方图，加上丢失率和错误分类"""
+
+    def __init__(self):
+        self.phases = {phase: LatencyHistogram() for phase in PHASES}
+        self.probes = 0
+        self.failed = 0
+        self.errors = Counter()
+
+    def add(self, sample: ProbeSample):
+        self.probes += 1
+        for phase in PHASES:
+            value = getattr(sample, f"{phase}_ms")
+            if value is not None:
+                self.phases[phase].record(value)
+        if sample.error is not None:
+            self.failed += 1
+            self.errors[sample.error] += 1
+
+    @property
+    def loss_pct(self) -> float:
+        return self.failed / self.probes * 100 if self.probes else math.nan
+
+    @property
+    def tcp(self) -> LatencyHistogram:
+        return self.phases['tcp']
+
+async def probe_endpoint(host: str, port: int, tls: bool, count: Optional[int], deadline: Optional[float],
+                         concurrency: int, inflight: asyncio.Semaphore, ssl_context=None,
+                         rate: Optional[float] = PROBE_MAX_RATE) -> EndpointStats:
+    """
+    对一个端点采样: concurrency 个探测槽共享采样计数，
+    采满 count 次或到达 deadline (perf_counter 时间) 为止；rate 限制每秒新建的连接数 (None 不限)
+    """
+    stats = EndpointStats()
+    issued = 0
+    next_at = time.perf_counter()
+
+    def more() -> bool:
+        return (count is None or issued < count) and (deadline is None or time.perf_counter() < deadline)
+
+    async def slot():
+        nonlocal issued, next_at
+        while more():
+            if rate:
+                # 各探测槽轮流领取发送时间，合计不超过 rate 次 / 秒
+                now = time.perf_counter()
+                start_at = max(now, next_at)
+                next_at = start_at + 1 / rate
+                if start_at > now:
+                    await asyncio.sleep(start_at - now)
+                    if not more():
+                        break
+            full = issued % PROBE_FULL_EVERY == 0
+            issued += 1
+            async with inflight:
+                stats.add(await probe_once(host, port, tls, ssl_context, full=full))
+            await asyncio.sleep(PROBE_GAP)
+
+    await asyncio.gather(*(slot() for _ in range(concurrency)))
+    return stats
+
+async def probe_all(endpoints: dict, count: Optional[int] = TEST_COUNT, duration: Optional[float] = None,
+                    concurrency: int = PROBE_CONCURRENCY, ssl_context=None,
+                    rate: Optional[float] = PROBE_MAX_RATE) -> dict:
+    """并行探测所有端点，返回 {name: EndpointStats}"""
+    if count is None and duration is None:
+        raise ValueError("count 和 duration 至少指定一个")
+    inflight = asyncio.Semaphore(PROBE_MAX_INFLIGHT)
+    deadline = time.perf_counter() + duration if duration else None
+    tasks = [probe_endpoint(*endpoint_spec(spec), count, deadline, concurrency, inflight, ssl_context, rate)
+             for spec in endpoints.values()]
+    return dict(zip(endpoints, await asyncio.gather(*tasks)))
+
+def run_probes(endpoints: dict = ENDPOINTS, **kwargs) -> dict:
+    return asyncio.run(probe_all(endpoints, **kwargs))
+
+def _fmt_ms(value: float, width: int = 8) -> str:
+    return f"{value:>{width - 2}.1f}ms" if not math.isnan(value) else f"{'-':>{width}}"
+
+def get_latency_rating(p99_ms):
+    """根据 p99 延迟评级"""
+    if p99_ms is None:
         return "❌ FAIL"
-    elif avg_ms < 50:
+    elif p99_ms < 50:
         return "🟢 极速"
-    elif avg_ms < 100:
+    elif p99_ms < 100:
         return "🟡 快速"
-    elif avg_ms < 200:
+    elif p99_ms < 200:
         return "🟠 中等"
     else:
         return "🔴 慢速"
 
-def print_heatmap():
-    """打印延迟热力图"""
+def print_heatmap(endpoints: dict = ENDPOINTS, count: Optional[int] = TEST_COUNT,
+                  duration: Optional[float] = None, ssl_context=None, rate: Optional[float] = PROBE_MAX_RATE):
+    """
+    打印延迟热力图: TCP 连接耗时 (≈ 网络 RTT) 的分位数、抖动、丢失率用于评级，
+    TLS 握手和 TTFB 给出 p50
+    """
     node_name = get_node_name()
+    width = 128
     
-    print("\n" + "="*75)
+    print("\n" + "="*width)
     print(f" 🌐 GLOBAL EXCHANGE LATENCY HEATMAP")
     print(f" 📍 Testing from: {node_name}")
     print(f" 🕒 Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')}")
-    print("="*75)
+    print("="*width)
     
+    budget = f"{duration:.1f}s" if duration else f"{count} samples"
+    print(f"Probing {len(endpoints)} endpoints in parallel ({budget} each)...", end="\r")
+    start = time.perf_counter()
+    all_stats = run_probes(endpoints, count=count, duration=duration, ssl_context=ssl_context, rate=rate)
+    elapsed = time.perf_counter() - start
+
     # 表头
-    print(f"{'ENDPOINT':<25} | {'MIN':<8} | {'AVG':<8} | {'MAX':<8} | {'RATING':<10}")
-    print("-" * 75)
+    print(f"{'ENDPOINT':<25} | {'P50':>8} | {'P90':>8} | {'P99':>8} | {'P99.9':>8} | {'STD':>8} | "
+          f"{'JITTER':>8} | {'LOSS':>6} | {'TLS p50':>8} | {'TTFB p50':>8} | {'N':>6} | {'RATING':<10}")
+    print("-" * width)
     
     results = []
     
-    for name, (host, port) in ENDPOINTS.items():
-        print(f"Testing {name}...", end="\r")
-        
-        min_ms, avg_ms, max_ms, success_rate = test_tcp_latency(host, port, TEST_COUNT)
-        rating = get_latency_rating(avg_ms)
+    for name, stats in all_stats.items():
+        tcp = stats.tcp
+        p99 = tcp.percentile(99) if tcp.n else None
+        rating = get_latency_rating(p99)
         
-        if avg_ms is not None:
-            print(f"{name:<25} | {min_ms:>6.1f}ms | {avg_ms:>6.1f}ms | {max_ms:>6.1f}ms | {rating:<10}")
-            results.append((name, avg_ms))
+        if p99 is not None:
+            print(f"{name:<25} | {_fmt_ms(tcp.percentile(50))} | {_fmt_ms(tcp.percentile(90))} | "
+                  f"{_fmt_ms(p99)} | {_fmt_ms(tcp.percentile(99.9))} | {_fmt_ms(tcp.std)} | "
+                  f"{_fmt_ms(tcp.jitter)} | {stats.loss_pct:>5.1f}% | "
+                  f"{_fmt_ms(stats.phases['tls'].percentile(50))} | {_fmt_ms(stats.phases['ttfb'].percentile(50))} | "
+                  f"{stats.probes:>6} | {rating:<10}")
+            results.append((name, p99))
         else:
-            print(f"{name:<25} | {'N/A':>8} | {'N/A':>8} | {'N/A':>8} | {rating:<10}")
+            error = stats.errors.most_common(1)[0][0] if stats.errors else "no samples"
+            print(f"{name:<25} | {'N/A':>8} | {'N/A':>8} | {'N/A':>8} | {'N/A':>8} | {'':>8} | {'':>8} | "
+                  f"{stats.loss_pct:>5.1f}% | {'':>8} | {'':>8} | {stats.probes:>6} | {rating:<10} {error}")
     
-    print("="*75)
+    print("="*width)
+    total = sum(stats.probes for stats in all_stats.values())
+    print(f" {total} probes in {elapsed:.1f}s (TCP 分位数 / 抖动; 每 {PROBE_FULL_EVERY} 次做一次完整 TLS + HTTP)")
     
-    # 最佳交易所推荐
+    # 最佳交易所推荐 (按 p99)
     if results:
         # 只看交易所 (排除 Solana RPC)
         exchange_results = [(n, l) for n, l in results if "Solana" not in n]
         if exchange_results:
             best = min(exchange_results, key=lambda x: x[1])
-            print(f"\n💡 推荐: 从 {node_name} 连接 {best[0]} 延迟最低 ({best[1]:.1f}ms)")
+            print(f"\n💡 推荐: 从 {node_name} 连接 {best[0]} 尾部延迟最低 (p99 {best[1]:.1f}ms)")
     
     print()
 
@@ -169,17 +451,400 @@ def print_all_nodes_summary():
     print(" 📊 完整热力图需要在所有节点运行此脚本")
     print("="*75)
     print("""
-    在每个节点执行:
+    在每个节点常驻运行 (摘要自动汇总到 Redis Master):
+    
+    🇩🇪 Leipzig:     ssh root@srv28836 'cd ~/solana-global-nodes && nohup python3 scripts/latency_test.py --daemon &'
+    🇺🇸 LA:          ssh root@... 'cd ~/solana-global-nodes && nohup python3 scripts/latency_test.py --daemon &'
+    🇭🇰 Hong Kong:   ssh root@... 'cd ~/solana-global-nodes && nohup python3 scripts/latency_test.py --daemon &'
+    🇯🇵 Osaka:       ssh root@... 'cd ~/solana-global-nodes && nohup python3 scripts/latency_test.py --daemon &'
     
-    🇩🇪 Leipzig:     ssh root@srv28836 'cd ~/solana-global-nodes && python3 scripts/latency_test.py'
-    🇺🇸 LA:          ssh root@... 'cd ~/solana-global-nodes && python3 scripts/latency_test.py'
-    🇭🇰 Hong Kong:   ssh root@... 'cd ~/solana-global-nodes && python3 scripts/latency_test.py'
-    🇯🇵 Osaka:       ssh root@... 'cd ~/solana-global-nodes && python3 scripts/latency_test.py'
+    然后在 Master 上查看实时矩阵，找出最佳交易节点:
     
-    然后汇总结果，找出最佳交易节点！
+    python3 scripts/latency_test.py --aggregate --export heatmap.md
     """)
 
+# =================== 全网汇总 ===================
+
+def connect_mesh(config_path: str = MESH_CONFIG_PATH):
+    """按 global_mesh 的 config.yaml 连接 Redis Master，返回 (client, 摘要频道, 本节点位置代码)"""
+    if not REDIS_AVAILABLE or yaml is None:
+        raise SystemExit("❌ 常驻 / 聚合模式需要 redis 和 pyyaml: pip install -r global_mesh/requirements.txt")
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    conf = config['redis']
+    client = redis.Redis(
+        host=conf['host'],
+        port=conf['port'],
+        password=conf['password'],
+        db=conf['db'],
+        socket_timeout=conf['socket_timeout'],
+        decode_responses=True
+    )
+    location = config.get('node', {}).get('location')
+    return client, config.get('channels', {}).get('latency', LATENCY_CHANNEL), location
+
+def _round(value: float):
+    return None if math.isnan(value) else round(value, 2)
+
+def summarize_stats(node: str, all_stats: dict, interval: float, location: str = None) -> dict:
+    """
+    一轮探测结果 -> 紧凑摘要 (每个端点几个数字，整份约 1KB)
+    loc 是 mesh 里的节点代码 (HK / JP / LA / DE)，接收端的执行路由按它找节点
+    """
+    endpoints = {}
+    for name, stats in all_stats.items():
+        tcp = stats.tcp
+        endpoints[name] = {
+            'n': stats.probes,
+            'loss': _round(stats.loss_pct),
+            'p50': _round(tcp.percentile(50)),
+            'p90': _round(tcp.percentile(90)),
+            'p99': _round(tcp.percentile(99)),
+            'p999': _round(tcp.percentile(99.9)),
+            'std': _round(tcp.std),
+            'jit': _round(tcp.jitter),
+            'tls': _round(stats.phases['tls'].percentile(50)),
+            'ttfb': _round(stats.phases['ttfb'].percentile(50)),
+        }
+    return {'node': node, 'loc': location, 'ts': int(time.time()), 'interval': interval, 'endpoints': endpoints}
+
+def run_daemon(interval: float = DAEMON_INTERVAL, samples: int = DAEMON_SAMPLES, config_path: str = MESH_CONFIG_PATH):
+    """常驻探测: 每轮结束后把摘要写入 hash 并广播，Redis 不可用时继续探测、下一轮再试"""
+    client, channel, location = connect_mesh(config_path)
+    node = get_node_name()
+    print(f"📡 Latency daemon [{node}]: {len(ENDPOINTS)} endpoints × {samples} samples every {interval:g}s "
+          f"-> {channel}")
+    while True:
+        started = time.monotonic()
+        summary = summarize_stats(node, run_probes(ENDPOINTS, count=samples), interval, location)
+        report = json.dumps(summary, ensure_ascii=False, separators=(',', ':'))
+        try:
+            pipe = client.pipeline(transaction=False)
+            pipe.hset(LATENCY_KEY, node, report)
+            pipe.publish(channel, report)
+            pipe.execute()
+            worst = max(summary['endpoints'].items(), key=lambda kv: kv[1]['p99'] or math.inf)
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] 📤 {len(report)} bytes, "
+                  f"probe round {time.monotonic() - started:.1f}s, worst p99: {worst[0]} {worst[1]['p99']}ms")
+        except redis.RedisError as e:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] ❌ 发布失败: {e}")
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def validate_report(report) -> dict:
+    """
+    检查一份摘要的结构 (来自其他节点，可能是旧版本或被篡改)，不合法时抛 ValueError；
+    聚合端只捕获 ValueError / KeyError / TypeError，结构错误漏过去会在重绘时打断整个聚合循环
+    """
+    if not isinstance(report, dict):
+        raise ValueError(f"摘要不是对象: {type(report).__name__}")
+    if not isinstance(report.get('node'), str) or not report['node']:
+        raise ValueError(f"node 无效: {report.get('node')!r}")
+    if not _is_number(report.get('ts')):
+        raise ValueError(f"ts 无效: {report.get('ts')!r}")
+    if 'interval' in report and not _is_number(report['interval']):
+        raise ValueError(f"interval 无效: {report['interval']!r}")
+    endpoints = report.get('endpoints')
+    if not isinstance(endpoints, dict):
+        raise ValueError(f"endpoints 不是对象: {type(endpoints).__name__}")
+    for name, entry in endpoints.items():
+        if not isinstance(entry, dict):
+            raise ValueError(f"端点 {name} 的数据不是对象")
+        if entry.get('p99') is None:
+            continue
+        for field in ('p50', 'p99'):
+            if not _is_number(entry.get(field)):
+                raise ValueError(f"端点 {name} 的 {field} 无效: {entry.get(field)!r}")
+        if entry.get('loss') is not None and not _is_number(entry['loss']):
+            raise ValueError(f"端点 {name} 的 loss 无效: {entry['loss']!r}")
+    return report
+
+
+class LatencyMatrix:
+    """聚合端: 每个节点的最新摘要组成 节点 × 端点 矩阵，附带过期标记和路由退化检测"""
+
+    def __init__(self):
+        self.reports = {}     # node -> 摘要
+        self.baseline = {}    # (node, endpoint) -> p99 的 EWMA
+
+    def update(self, report: dict, detect: bool = True) -> list:
+        """收入一份摘要，返回检测到的退化 [(node, endpoint, p99, 基线), ...]；结构不合法时抛 ValueError，矩阵不变"""
+        node = validate_report(report)['node']
+        regressions = []
+        for name, entry in report['endpoints'].items():
+            p99 = entry.get('p99')
+            if p99 is None:
+                continue
+            key = (node, name)
+            base = self.baseline.get(key)
+            if base is None:
+                self.baseline[key] = p99
+                continue
+            if detect and p99 > base * AGG_REGRESSION_FACTOR and p99 - base >= AGG_REGRESSION_MIN_MS:
+                regressions.append((node, name, p99, base))
+            self.baseline[key] = AGG_BASELINE_ALPHA * p99 + (1 - AGG_BASELINE_ALPHA) * base
+        self.reports[node] = report
+        return regressions
+
+    def endpoints(self) -> list:
+        """列顺序: 先按 ENDPOINTS 的顺序，再加上其他节点报上来的端点"""
+        names = [name for name in ENDPOINTS if any(name in r['endpoints'] for r in self.reports.values())]
+        for report in self.reports.values():
+            names.extend(name for name in report['endpoints'] if name not in names)
+        return names
+
+    def is_stale(self, report: dict, now: float = None) -> bool:
+        now = time.time() if now is None else now
+        return now - report['ts'] > AGG_STALE_FACTOR * report.get('interval', DAEMON_INTERVAL)
+
+    def best(self) -> dict:
+        """每个端点 p99 最低的未过期节点"""
+        best = {}
+        for name in self.endpoints():
+            candidates = [(r['endpoints'][name]['p99'], node) for node, r in self.reports.items()
+                          if not self.is_stale(r) and r['endpoints'].get(name, {}).get('p99') is not None]
+            if candidates:
+                best[name] = min(candidates)[1]
+        return best
+
+    def render(self) -> str:
+        names = self.endpoints()
+        best = self.best()
+        now = time.time()
+        lines = [f"{'NODE':<22} | {'AGE':>6} | " + " | ".join(f"{name[:16]:>16}" for name in names)]
+        lines.append("-" * len(lines[0]))
+        for node in sorted(self.reports):
+            report = self.reports[node]
+            age = f"{now - report['ts']:.0f}s" + ("⚠️" if self.is_stale(report, now) else "")
+            cells = []
+            for name in names:
+                entry = report['endpoints'].get(name)
+                if not entry or entry.get('p99') is None:
+                    cells.append(f"{'N/A':>16}")
+                    continue
+                mark = ("🏆" if best.get(name) == node else "") + ("❗" if (entry.get('loss') or 0) >= 1 else "")
+                cells.append(f"{entry['p50']:.1f}/{entry['p99']:.1f}ms{mark}".rjust(16))
+            lines.append(f"{node:<22} | {age:>6} | " + " | ".join(cells))
+        lines.append("单元格: TCP p50/p99；🏆 该端点 p99 最低的节点，❗ 丢失率 ≥ 1%，⚠️ 节点摘要过期")
+        return "\n".join(lines)
+
+    def export(self, path: str):
+        """按扩展名导出: .json 原始摘要 / .csv 长表 / .md README 风格的热力图表格"""
+        tmp = path + '.tmp'
+        with open(tmp, 'w', newline='') as f:
+            if path.endswith('.json'):
+                json.dump({'generated': int(time.time()), 'reports': self.reports}, f, ensure_ascii=False, indent=2)
+            elif path.endswith('.csv'):
+                fields = ['n', 'loss', 'p50', 'p90', 'p99', 'p999', 'std', 'jit', 'tls', 'ttfb']
+                writer = csv.writer(f)
+                writer.writerow(['node', 'endpoint', 'ts'] + fields)
+                for node in sorted(self.reports):
+                    report = self.reports[node]
+                    for name, entry in report['endpoints'].items():
+                        writer.writerow([node, name, report['ts']] + [entry.get(k) for k in fields])
+            else:
+                names = self.endpoints()
+                best = self.best()
+                f.write(f"Measured by `scripts/latency_test.py --aggregate` at "
+                        f"{datetime.now().strftime('%Y-%m-%d %H:%M')}. TCP connect p99, lower is better.\n\n")
+                f.write("| Node | " + " | ".join(names) + " |\n")
+                f.write("|------|" + "|".join("-" * (len(name) + 2) for name in names) + "|\n")
+                for node in sorted(self.reports):
+                    cells = []
+                    for name in names:
+                        p99 = self.reports[node]['endpoints'].get(name, {}).get('p99')
+                        if p99 is None:
+                            cells.append("N/A")
+                        elif best.get(name) == node:
+                            cells.append(f"**{p99:.1f}ms** 🏆")
+                        else:
+                            cells.append(f"{p99:.1f}ms")
+                    f.write(f"| {node} | " + " | ".join(cells) + " |\n")
+        os.replace(tmp, path)
+
+
+def _subscribe_matrix(client, channel: str, matrix: 'LatencyMatrix'):
+    """
+    新建 pubsub 并订阅摘要频道，然后读一遍 hash (先订阅再读，中间发布的摘要不会漏掉；
+    断线重连后也靠这一步补上断线期间的摘要)
+    """
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(channel)
+        reports = client.hgetall(LATENCY_KEY).values()
+    except BaseException:
+        pubsub.close()
+        raise
+    for raw in reports:
+        try:
+            matrix.update(json.loads(raw), detect=False)
+        except (ValueError, KeyError, TypeError):
+            pass
+    return pubsub
+
+def run_aggregator(export: str = None, config_path: str = MESH_CONFIG_PATH):
+    """Master 上运行: 订阅摘要频道，实时重绘矩阵 (可选同时导出到文件)"""
+    client, channel, _ = connect_mesh(config_path)
+    matrix = LatencyMatrix()
+    alerts = deque(maxlen=10)
+
+    def redraw():
+        if sys.stdout.isatty():
+            print("\033[H\033[J", end="")
+        print("="*100)
+        print(f" 🌐 MESH LATENCY MATRIX ({len(matrix.reports)} nodes)  🕒 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print("="*100)
+        print(matrix.render())
+        for line in alerts:
+            print(line)
+        if export:
+            matrix.export(export)
+
+    pubsub = None
+    attempt = 0
+    last_draw = -math.inf
+    while True:
+        try:
+            if pubsub is None:
+                # 断开的 pubsub 不能直接复用: 重新建连接、重新订阅
+                pubsub = _subscribe_matrix(client, channel, matrix)
+                if attempt:
+                    print(f"✅ 已重连并重新订阅 {channel}")
+                attempt = 0
+            message = pubsub.get_message(timeout=1.0)
+        except (redis.ConnectionError, redis.TimeoutError, OSError) as e:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+                pubsub = None
+            delay = min(AGG_RECONNECT_MAX, AGG_RECONNECT_MIN * 2 ** attempt)
+            delay = random.uniform(delay / 2, delay)
+            attempt += 1
+            print(f"❌ Redis 连接中断: {e}，{delay:.1f} 秒后重连 (第 {attempt} 次)...")
+            time.sleep(delay)
+            continue
+        changed = False
+        if message and message['type'] == 'message':
+            try:
+                report = json.loads(message['data'])
+                for node, name, p99, base in matrix.update(report):
+                    alerts.append(f"[{datetime.now().strftime('%H:%M:%S')}] ⚠️ 路由退化: {node} → {name} "
+                                  f"p99 {p99:.1f}ms (基线 {base:.1f}ms)")
+                changed = True
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"⚠️ 无效摘要: {e}")
+        if changed or time.monotonic() - last_draw >= AGG_REFRESH:
+            redraw()
+            last_draw = time.monotonic()
+
+def _make_test_cert(directory: str):
+    """用 openssl 生成 localhost 的自签名证书，没有 openssl 时返回 None"""
+    if not shutil.which('openssl'):
+        return None
+    cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    result = subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1', '-nodes',
+         '-keyout', key, '-out', cert, '-days', '1', '-subj', '/CN=localhost',
+         '-addext', 'subjectAltName=DNS:localhost'],
+        capture_output=True)
+    return (cert, key) if result.returncode == 0 else None
+
+def start_standin_servers(think_ms: float = 2.0):
+    """
+    在独立线程的事件循环里启动本地回环替身服务器 (HTTP，有 openssl 时再加一个 HTTPS)，
+    每个请求等待 think_ms 后返回首字节。返回 (端点表, 客户端 ssl context)
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            await asyncio.sleep(think_ms / 1000)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\nok")
+            await writer.drain()
+        except (OSError, ssl.SSLError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def serve(host, ssl_ctx=None):
+        server = asyncio.run_coroutine_threadsafe(asyncio.start_server(handle, host, 0, ssl=ssl_ctx), loop).result()
+        return server.sockets[0].getsockname()[1]
+
+    endpoints = {
+        "Loopback HTTP (ip)": ("127.0.0.1", serve('127.0.0.1'), False),
+        "Loopback HTTP (name)": ("localhost", serve('127.0.0.1'), False),
+    }
+    client_ctx = None
+    pair = _make_test_cert(tempfile.mkdtemp(prefix='latency-test-'))
+    if pair:
+        server_ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_ctx.load_cert_chain(*pair)
+        client_ctx = ssl.create_default_context(cafile=pair[0])
+        endpoints["Loopback HTTPS"] = ("localhost", serve('127.0.0.1', server_ctx), True)
+    return endpoints, client_ctx
+
+def run_bench(legacy_count: int = 5):
+    """
+    回环替身服务器上对比: 旧的串行测试 (逐个端点、每次间隔 100ms) 用掉的时间，
+    在同样的时间预算内并发探测引擎能采到多少样本
+    """
+    endpoints, client_ctx = start_standin_servers()
+    if client_ctx is None:
+        print("⚠️ 未找到 openssl，跳过 HTTPS 替身服务器")
+
+    # 旧方式: 每个端点串行 connect，每次之后 sleep 0.1
+    start = time.perf_counter()
+    for host, port, _ in endpoints.values():
+        for _ in range(legacy_count):
+            sock = socket.create_connection((host, port), timeout=5)
+            sock.close()
+            time.sleep(0.1)
+    legacy_s = time.perf_counter() - start
+    print(f"旧串行测试: {len(endpoints)} 个端点 × {legacy_count} 次 TCP connect，用时 {legacy_s:.2f}s")
+
+    # 回环替身服务器不需要限速，看引擎本身能采多少样本
+    print_heatmap(endpoints, count=None, duration=legacy_s, ssl_context=client_ctx, rate=None)
+
+    # 直方图分位数和精确分位数 (排序) 对比
+    random.seed(3)
+    values = [random.lognormvariate(math.log(20), 0.6) for _ in range(100000)]
+    hist = LatencyHistogram()
+    for v in values:
+        hist.record(v)
+    values.sort()
+    print(f"直方图精度 ({len(values)} 个对数正态样本, {len(hist.counts)} 个桶):")
+    for p in (50, 90, 99, 99.9):
+        exact = values[max(1, math.ceil(len(values) * p / 100)) - 1]
+        approx = hist.percentile(p)
+        print(f"  p{p:<5} 精确 {exact:8.3f}ms  直方图 {approx:8.3f}ms  误差 {(approx - exact) / exact * 100:+.2f}%")
+
 if __name__ == "__main__":
-    print("🚀 Initializing Global Latency Tester...")
-    print_heatmap()
-    print_all_nodes_summary()
+    parser = argparse.ArgumentParser(description="全球交易所延迟测试")
+    parser.add_argument('--samples', type=int,
+                        help=f"每个端点的采样数 (默认 {TEST_COUNT}，常驻模式每轮 {DAEMON_SAMPLES})")
+    parser.add_argument('--duration', type=float, help="按时间预算采样 (秒)，指定后忽略 --samples")
+    parser.add_argument('--bench', action='store_true', help="本地回环替身服务器基准测试")
+    parser.add_argument('--daemon', action='store_true', help="常驻模式: 定期探测并把摘要发布到 Redis Master")
+    parser.add_argument('--interval', type=float, default=DAEMON_INTERVAL, help="常驻模式的探测间隔 (秒)")
+    parser.add_argument('--aggregate', action='store_true', help="聚合模式: 实时显示全网 节点 × 端点 延迟矩阵")
+    parser.add_argument('--export', metavar='PATH', help="聚合模式下同时导出矩阵 (.json / .csv / .md)")
+    parser.add_argument('--mesh-config', default=MESH_CONFIG_PATH, help="global_mesh 的 config.yaml (Redis 连接)")
+    args = parser.parse_args()
+
+    if args.bench:
+        run_bench()
+    elif args.daemon:
+        run_daemon(args.interval, args.samples or DAEMON_SAMPLES, args.mesh_config)
+    elif args.aggregate:
+        run_aggregator(args.export, args.mesh_config)
+    else:
+        print("🚀 Initializing Global Latency Tester...")
+        print_heatmap(count=None if args.duration else (args.samples or TEST_COUNT), duration=args.duration)
+        print_all_nodes_summary()
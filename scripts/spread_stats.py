@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+📈 价差滚动统计 (固定内存，每个 tick O(1))
+- 环形缓冲区保存最近 window 个价差，维护滚动和 / 平方和 -> 均值、标准差、z-score
+- EWMA 跟踪价差的短期趋势
+- 固定宽度分桶直方图随缓冲区同步增删，分位数查询只扫描桶 (与 window 无关)
+
+Usage: python3 scripts/spread_stats.py --bench
+"""
+
+import math
+import random
+import sys
+import time
+
+# =================== 配置区域 ===================
+STATS_WINDOW = 600        # 滚动窗口 (tick 数，0.5s 轮询时约 5 分钟)
+STATS_EWMA_SPAN = 60      # EWMA 跨度 (tick 数)
+STATS_BIN_PCT = 0.005     # 分位数直方图的桶宽 (百分比)
+STATS_MAX_ABS_PCT = 5.0   # 直方图覆盖范围 ±5%，超出的值计入两端的桶
+STATS_MIN_SAMPLES = 30    # 样本少于这个数时不计算 z-score
+# ================================================
+
+
+class RollingStats:
+    """价差序列的滚动统计"""
+
+    def __init__(self, window: int = STATS_WINDOW, ewma_span: int = STATS_EWMA_SPAN,
+                 bin_width: float = STATS_BIN_PCT, max_abs: float = STATS_MAX_ABS_PCT):
+        self.window = window
+        self.buf = [0.0] * window
+        self.pos = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.alpha = 2.0 / (ewma_span + 1)
+        self.ewma = None
+        self.bin_width = bin_width
+        self.max_abs = max_abs
+        self.bins = [0] * (int(round(2 * max_abs / bin_width)) + 1)
+        self._pushes_since_resum = 0
+
+    def _bin(self, x: float) -> int:
+        idx = int((x + self.max_abs) / self.bin_width)
+        return 0 if idx < 0 else min(idx, len(self.bins) - 1)
+
+    def push(self, x: float) -> float:
+        """
+        加入一个价差，返回它相对于加入前窗口的 z-score
+        (先算 z 再入窗，尖峰本身不会抬高标准差把自己掩盖掉)
+        """
+        z = self.zscore(x)
+
+        if self.count == self.window:
+            old = self.buf[self.pos]
+            self.total -= old
+            self.total_sq -= old * old
+            self.bins[self._bin(old)] -= 1
+        else:
+            self.count += 1
+        self.buf[self.pos] = x
+        self.pos = (self.pos + 1) % self.window
+        self.total += x
+        self.total_sq += x * x
+        self.bins[self._bin(x)] += 1
+        self.ewma = x if self.ewma is None else self.alpha * x + (1 - self.alpha) * self.ewma
+
+        # 每滚动一整个窗口重新求和一次，消除浮点增删累积的误差 (均摊 O(1))
+        self._pushes_since_resum += 1
+        if self._pushes_since_resum >= self.window:
+            self._pushes_since_resum = 0
+            values = self.buf if self.count == self.window else self.buf[:self.count]
+            self.total = math.fsum(values)
+            self.total_sq = math.fsum(v * v for v in values)
+        return z
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else float('nan')
+
+    @property
+    def std(self) -> float:
+        if self.count < 2:
+            return float('nan')
+        var = (self.total_sq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+    @property
+    def warm(self) -> bool:
+        return self.count >= STATS_MIN_SAMPLES
+
+    def zscore(self, x: float) -> float:
+        """x 相对于当前窗口的 z-score，样本不足或方差为 0 时返回 0"""
+        if not self.warm:
+            return 0.0
+        std = self.std
+        return (x - self.mean) / std if std > 0 else 0.0
+
+    def percentile(self, p: float) -> float:
+        """窗口内的第 p 百分位 (精度为一个桶宽)"""
+        if not self.count:
+            return float('nan')
+        target = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for idx, n in enumerate(self.bins):
+            seen += n
+            if seen >= target:
+                return -self.max_abs + (idx + 0.5) * self.bin_width
+        return self.max_abs
+
+    def summary(self) -> str:
+        if not self.count:
+            return "暂无数据"
+        return (f"n={self.count} mean={self.mean:+.3f}% std={self.std:.3f}% ewma={self.ewma:+.3f}% "
+                f"p5={self.percentile(5):+.3f}% p50={self.percentile(50):+.3f}% p95={self.percentile(95):+.3f}%")
+
+
+def run_bench(n: int = 200000):
+    """验证每个 tick 的耗时与窗口大小无关"""
+    random.seed(1)
+    data = [random.gauss(0.05, 0.1) for _ in range(n)]
+    print(f"{'WINDOW':>8} | {'PUSH':>9} | {'P50 QUERY':>10}")
+    for window in (100, 1000, 10000, 100000):
+        stats = RollingStats(window=window)
+        start = time.perf_counter()
+        for x in data:
+            stats.push(x)
+        push_us = (time.perf_counter() - start) / n * 1e6
+        start = time.perf_counter()
+        for _ in range(100):
+            stats.percentile(50)
+        query_us = (time.perf_counter() - start) / 100 * 1e6
+        print(f"{window:>8} | {push_us:>7.2f}µs | {query_us:>8.1f}µs")
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    if '--bench' in sys.argv:
+        run_bench()
+    else:
+        print(__doc__)
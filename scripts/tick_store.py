@@ -0,0 +1,458 @@
+#!/usr/bin/env python3
+"""
+💾 Tick 记录 & 回放回测
+- 追加写的列式存储: 每列一个定长二进制文件，可以直接 mmap
+    ts.i64      采样时间 (Unix 纪元纳秒)
+    venue.u8    场所编号 (cex / dex ...)
+    symbol.u16  交易对编号
+    price.f64   价格
+    meta.json   场所 / 交易对字典
+  崩溃时各列长度可能不一致，读取时按最短的列截断
+- 回放: 用实时监控的判定 (classify_tick: 阈值 / 滚动 z-score / 采样时间差) + 冷却跑一组参数，
+  报告每组参数会触发多少次报警、分别在什么时候；有 numpy 时用结果相同的向量化实现
+
+Usage:
+  python3 scripts/arb_watchdog.py --record ticks/              # 监控时同时记录
+  python3 scripts/tick_store.py --backtest ticks/ --thresholds 0.5,1,1.5 --cooldowns 0,30,60
+  python3 scripts/tick_store.py --synth ticks/ 5000000         # 生成模拟数据
+  python3 scripts/tick_store.py --bench                        # 回放吞吐测试
+"""
+
+import json
+import math
+import mmap
+import os
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# =================== 配置区域 ===================
+FLUSH_TICKS = 4096        # 缓冲这么多 tick 后写盘
+FLUSH_INTERVAL = 1.0      # 或者距离上次写盘超过这么久 (秒)
+# ================================================
+
+# 列名 -> (文件名, array 类型码)
+COLUMNS = {
+    'ts': ('ts.i64', 'q'),
+    'venue': ('venue.u8', 'B'),
+    'symbol': ('symbol.u16', 'H'),
+    'price': ('price.f64', 'd'),
+}
+META_FILE = 'meta.json'
+
+
+def _load_meta(path: str) -> dict:
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'version': 1, 'venues': [], 'symbols': []}
+
+# =================== 记录 ===================
+
+class TickWriter:
+    """追加写 tick (线程安全，推送流线程和主线程可以同时写)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta = _load_meta(path)
+        self.venues = {name: i for i, name in enumerate(meta['venues'])}
+        self.symbols = {name: i for i, name in enumerate(meta['symbols'])}
+        self.lock = threading.Lock()
+        self.buffers = {col: array(code) for col, (_, code) in COLUMNS.items()}
+        self.files = {col: open(os.path.join(path, name), 'ab') for col, (name, _) in COLUMNS.items()}
+        self._truncate_torn()
+        self._meta_dirty = False
+        self.last_flush = time.monotonic()
+        self.written = 0
+
+    def _truncate_torn(self):
+        """上次崩溃时写了一半的行: 把所有列截到同一长度"""
+        rows = min(os.path.getsize(os.path.join(self.path, name)) // array(code).itemsize
+                   for name, code in COLUMNS.values())
+        for col, (name, code) in COLUMNS.items():
+            f = self.files[col]
+            if f.tell() != rows * array(code).itemsize:
+                f.truncate(rows * array(code).itemsize)
+                f.seek(0, os.SEEK_END)
+
+    def _code(self, table: dict, name: str, limit: int) -> int:
+        code = table.get(name)
+        if code is None:
+            if len(table) >= limit:
+                raise ValueError(f"字典已满 ({limit})")
+            code = table[name] = len(table)
+            self._meta_dirty = True
+        return code
+
+    def append(self, ts_ns: int, venue: str, symbol: str, price: float):
+        with self.lock:
+            self.buffers['ts'].append(ts_ns)
+            self.buffers['venue'].append(self._code(self.venues, venue, 256))
+            self.buffers['symbol'].append(self._code(self.symbols, symbol, 65536))
+            self.buffers['price'].append(price)
+            self._maybe_flush()
+
+    def append_many(self, ts_ns: int, venue: str, prices: dict):
+        """一次记录一个场所的批量行情 {symbol: price}"""
+        with self.lock:
+            venue_code = self._code(self.venues, venue, 256)
+            n = 0
+            for symbol, price in prices.items():
+                self.buffers['symbol'].append(self._code(self.symbols, symbol, 65536))
+                self.buffers['price'].append(float(price))
+                n += 1
+            self.buffers['ts'].extend([ts_ns] * n)
+            self.buffers['venue'].extend([venue_code] * n)
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self.buffers['ts']) >= FLUSH_TICKS or time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+            self._flush()
+
+    def _flush(self):
+        # 先写字典，保证数据里出现的编号在 meta.json 中一定存在
+        if self._meta_dirty:
+            meta = {'version': 1,
+                    'venues': sorted(self.venues, key=self.venues.get),
+                    'symbols': sorted(self.symbols, key=self.symbols.get)}
+            tmp = os.path.join(self.path, META_FILE + '.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp, os.path.join(self.path, META_FILE))
+            self._meta_dirty = False
+        for col, buf in self.buffers.items():
+            if buf:
+                buf.tofile(self.files[col])
+                self.files[col].flush()
+        self.written += len(self.buffers['ts'])
+        for buf in self.buffers.values():
+            del buf[:]
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            for f in self.files.values():
+                f.close()
+
+# =================== 读取 ===================
+
+class TickReader:
+    """mmap 读取列式 tick 文件 (零拷贝)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        meta = _load_meta(path)
+        self.venues = meta['venues']
+        self.symbols = meta['symbols']
+        self._maps = []
+        sizes = {col: os.path.getsize(os.path.join(path, name)) // array(code).itemsize
+                 for col, (name, code) in COLUMNS.items()}
+        self.rows = min(sizes.values())
+        self.columns = {col: self._map(col) for col in COLUMNS}
+
+    def _map(self, col: str):
+        name, code = COLUMNS[col]
+        if self.rows == 0:
+            return np.zeros(0, dtype=code) if np is not None else array(code)
+        with open(os.path.join(self.path, name), 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mm)
+        if np is not None:
+            return np.frombuffer(mm, dtype=code, count=self.rows)
+        return memoryview(mm)[:self.rows * array(code).itemsize].cast(code)
+
+    def __len__(self):
+        return self.rows
+
+# =================== 回放回测 ===================
+
+def _fmt_ts(ts_ns: int) -> str:
+    return datetime.fromtimestamp(ts_ns / 1e9).strftime('%m-%d %H:%M:%S')
+
+
+def backtest(reader: TickReader, thresholds, cooldowns, cex: str = 'cex', dex: str = 'dex',
+             max_skew_ms: float = None, fast: bool = None):
+    """
+    按时间顺序回放 tick: 每个 tick 更新该场所的最新价，两边都有价时用实时监控的 classify_tick 判定
+    (阈值 / 滚动 z-score + ALERT_FLOOR / 采样时间差)，每个交易对一个独立的 RollingStats，
+    再对每组 (阈值, 冷却) 统计报警 (冷却按记录时间、按交易对独立计算)
+    max_skew_ms: 默认与监控相同 (MAX_SKEW_MS)
+    fast: 使用 numpy 向量化 (结果与逐 tick 调用 classify_tick 相同)；默认有 numpy 时启用
+    返回 (结果列表, 价差事件数)，价差事件为计入滚动统计 (时间差未超限) 的 tick
+    结果: [{'threshold', 'cooldown', 'alerts': [(ts_ns, symbol, spread_pct, direction)]}]
+    """
+    import arb_watchdog
+
+    if cex not in reader.venues or dex not in reader.venues:
+        raise ValueError(f"记录中没有场所 {cex} / {dex} (已有: {reader.venues})")
+    cex_code, dex_code = reader.venues.index(cex), reader.venues.index(dex)
+    max_skew_ms = arb_watchdog.MAX_SKEW_MS if max_skew_ms is None else max_skew_ms
+    fast = np is not None if fast is None else fast
+
+    if fast:
+        replay = _ReplayNumpy(reader, cex_code, dex_code, max_skew_ms)
+    else:
+        replay = _ReplayPython(reader, cex_code, dex_code, max_skew_ms)
+
+    results = []
+    for threshold in thresholds:
+        candidates = replay.alerts(threshold)    # [(ts_ns, symbol 编号, spread_pct)]，按记录顺序
+        for cooldown in cooldowns:
+            cooldown_ns = int(cooldown * 1e9)
+            alerts = []
+            # 冷却按交易对独立计算 (与扫描模式一致；单交易对时与主循环相同)
+            until = {}
+            for ts, symbol, spread_pct in candidates:
+                if ts < until.get(symbol, 0):
+                    continue
+                until[symbol] = ts + cooldown_ns
+                _, direction = arb_watchdog.calculate_spread(1.0, 1.0 + spread_pct / 100)
+                alerts.append((ts, reader.symbols[symbol], spread_pct, direction))
+            results.append({'threshold': threshold, 'cooldown': cooldown, 'alerts': alerts})
+    return results, replay.events
+
+
+class _ReplayPython:
+    """逐 tick 调用 classify_tick (与实时监控完全相同的判定)，每个阈值重新回放一遍"""
+
+    def __init__(self, reader, cex_code, dex_code, max_skew_ms):
+        self.reader = reader
+        self.cex_code, self.dex_code = cex_code, dex_code
+        self.max_skew_ms = max_skew_ms
+        self.events = 0
+
+    def alerts(self, threshold: float):
+        from arb_watchdog import PriceSample, classify_tick
+        from spread_stats import RollingStats
+
+        reader = self.reader
+        ts_col = reader.columns['ts']
+        venue_col = reader.columns['venue']
+        symbol_col = reader.columns['symbol']
+        price_col = reader.columns['price']
+        cex_code, dex_code = self.cex_code, self.dex_code
+        latest = {}    # (symbol, venue) -> PriceSample
+        stats = {}     # symbol -> RollingStats
+        out = []
+        events = 0
+        for i in range(len(reader)):
+            venue = venue_col[i]
+            if venue != cex_code and venue != dex_code:
+                continue
+            symbol = symbol_col[i]
+            ts = int(ts_col[i])
+            latest[symbol, venue] = PriceSample(float(price_col[i]), ts, 0.0, reader.venues[venue])
+            c = latest.get((symbol, cex_code))
+            d = latest.get((symbol, dex_code))
+            if c is None or d is None or not (0 < c.price < math.inf) or not math.isfinite(d.price):
+                continue
+            symbol_stats = stats.get(symbol)
+            if symbol_stats is None:
+                symbol_stats = stats[symbol] = RollingStats()
+            tick = classify_tick(c, d, symbol_stats, threshold=threshold, max_skew_ms=self.max_skew_ms)
+            if not tick.skew_ms > self.max_skew_ms:
+                events += 1
+            if tick.alert:
+                out.append((ts, int(symbol), tick.spread_pct))
+        self.events = events
+        return out
+
+
+class _ReplayNumpy:
+    """
+    向量化: 按交易对分组，把两边的价格前向填充到每个 tick，
+    用前缀和算出每个价差入窗前的滚动均值 / 标准差 (与 RollingStats.push 返回的 z-score 相同)，
+    判定条件与 classify_tick 相同；价差和 z-score 与阈值无关，只算一遍
+    """
+
+    def __init__(self, reader, cex_code, dex_code, max_skew_ms):
+        from arb_watchdog import ALERT_FLOOR, Z_ALERT
+        from spread_stats import STATS_MIN_SAMPLES, STATS_WINDOW
+
+        ts = reader.columns['ts']
+        venue = reader.columns['venue']
+        symbol = reader.columns['symbol']
+        price = reader.columns['price']
+        out_row, out_spread, out_z = [], [], []
+
+        # 稳定排序保持组内的记录顺序
+        order = np.argsort(symbol, kind='stable')
+        order = order[np.isin(venue[order], (cex_code, dex_code))]
+        bounds = np.flatnonzero(np.diff(symbol[order])) + 1
+        for group in np.split(order, bounds):
+            if not len(group):
+                continue
+            g_venue = venue[group]
+            g_price = price[group]
+            g_ts = ts[group]
+            positions = np.arange(len(group))
+            last = {}
+            for code in (cex_code, dex_code):
+                idx = np.where(g_venue == code, positions, -1)
+                last[code] = np.maximum.accumulate(idx)
+            valid = (last[cex_code] >= 0) & (last[dex_code] >= 0)
+            c_idx, d_idx = np.maximum(last[cex_code], 0), np.maximum(last[dex_code], 0)
+            cex_price, dex_price = g_price[c_idx], g_price[d_idx]
+            with np.errstate(invalid='ignore'):
+                valid &= (cex_price > 0) & np.isfinite(cex_price) & np.isfinite(dex_price)
+            skew_ms = np.abs(g_ts[c_idx] - g_ts[d_idx]) / 1e6
+            valid &= ~(skew_ms > max_skew_ms)       # 时间差超限的 tick 不报警，也不计入滚动统计
+            with np.errstate(divide='ignore', invalid='ignore'):
+                spread = ((dex_price - cex_price) / cex_price) * 100
+            spread = spread[valid]
+            out_row.append(group[valid])
+            out_spread.append(spread)
+            out_z.append(self._zscores(spread, STATS_WINDOW, STATS_MIN_SAMPLES))
+
+        if out_row:
+            rows = np.concatenate(out_row)
+            order = np.argsort(rows, kind='stable')    # 合并回记录顺序，冷却按顺序推进
+            self.rows = rows[order]
+            self.spread = np.concatenate(out_spread)[order]
+            self.z = np.concatenate(out_z)[order]
+        else:
+            self.rows, self.spread, self.z = np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+        self.ts = ts[self.rows]
+        self.symbol = symbol[self.rows]
+        self.deviation = (np.abs(self.z) >= Z_ALERT) & (np.abs(self.spread) >= ALERT_FLOOR)
+        self.events = len(self.rows)
+
+    @staticmethod
+    def _zscores(x, window: int, min_samples: int):
+        """每个值相对于它之前 window 个值的 z-score (样本不足或方差为 0 时为 0)"""
+        n = len(x)
+        z = np.zeros(n)
+        if n <= min_samples:
+            return z
+        # 先减去均值再求前缀和，减小大数相减的误差
+        centered = x - x.mean()
+        s1 = np.concatenate(([0.0], np.cumsum(centered)))
+        s2 = np.concatenate(([0.0], np.cumsum(centered * centered)))
+        k = np.arange(n)
+        lo = np.maximum(k - window, 0)
+        count = k - lo
+        total = s1[k] - s1[lo]
+        total_sq = s2[k] - s2[lo]
+        warm = count >= min_samples
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var = (total_sq - total * total / count) / (count - 1)
+            std = np.sqrt(np.where(var > 0, var, 0.0))
+            z = np.where(warm & (std > 0), (centered - total / count) / std, 0.0)
+        return z
+
+    def alerts(self, threshold: float):
+        hit = np.flatnonzero((np.abs(self.spread) >= threshold) | self.deviation)
+        return [(int(self.ts[i]), int(self.symbol[i]), float(self.spread[i])) for i in hit]
+
+
+def print_backtest(results, events: int, show: int = 5):
+    print("="*80)
+    print(f" 💾 BACKTEST | {events:,} 个价差事件")
+    print("="*80)
+    print(f"{'THRESHOLD':>9} | {'COOLDOWN':>8} | {'ALERTS':>7} | {'FIRST':<14} | {'LAST':<14} | 涉及交易对")
+    print("-"*80)
+    for r in results:
+        alerts = r['alerts']
+        first = _fmt_ts(alerts[0][0]) if alerts else '-'
+        last = _fmt_ts(alerts[-1][0]) if alerts else '-'
+        pairs = len({a[1] for a in alerts})
+        print(f"{r['threshold']:>8.2f}% | {r['cooldown']:>7.0f}s | {len(alerts):>7} | {first:<14} | {last:<14} | {pairs}")
+    if show:
+        for r in results:
+            if r['alerts']:
+                print(f"\n阈值 {r['threshold']}% / 冷却 {r['cooldown']}s 的前 {show} 次报警:")
+                for ts, symbol, spread, direction in r['alerts'][:show]:
+                    print(f"  {_fmt_ts(ts)} | {symbol:<12} | {spread:+.3f}% | {direction}")
+    print("="*80)
+
+# =================== 模拟数据 & 基准 ===================
+
+def synth(path: str, n_ticks: int = 1_000_000, n_symbols: int = 50, seed: int = 42):
+    """生成模拟 tick: 多个交易对的 cex / dex 随机游走，偶尔出现价差尖峰"""
+    import random
+    random.seed(seed)
+    writer = TickWriter(path)
+    prices = [random.uniform(1, 200) for _ in range(n_symbols)]
+    names = [f"S{i:03d}USDT" for i in range(n_symbols)]
+    ts = time.time_ns() - n_ticks * 10_000_000   # 平均 10ms 一个 tick
+    for i in range(n_ticks):
+        s = random.randrange(n_symbols)
+        prices[s] *= 1 + random.gauss(0, 0.0005)
+        ts += random.randint(1, 20_000_000)
+        if random.random() < 0.5:
+            writer.append(ts, 'cex', names[s], prices[s])
+        else:
+            spike = random.uniform(0.8, 2.5) if random.random() < 0.0005 else random.gauss(0, 0.1)
+            writer.append(ts, 'dex', names[s], prices[s] * (1 + spike / 100))
+    writer.close()
+    return writer.written
+
+
+def run_bench(n_ticks: int = 2_000_000):
+    import shutil
+    import tempfile
+
+    tmp = tempfile.mkdtemp(prefix='ticks-')
+    try:
+        start = time.perf_counter()
+        synth(tmp, n_ticks)
+        write_s = time.perf_counter() - start
+        size = sum(os.path.getsize(os.path.join(tmp, name)) for name, _ in COLUMNS.values())
+        print(f"📝 写入 {n_ticks:,} ticks ({size / n_ticks:.0f} 字节/tick)，{write_s:.1f}s (含随机数生成)")
+
+        start = time.perf_counter()
+        reader = TickReader(tmp)
+        results, events = backtest(reader, [0.5, 1.0, 1.5, 2.0], [0, 30, 60])
+        elapsed = time.perf_counter() - start
+        print(f"⚡ 回放 {len(reader):,} ticks × 12 组参数: {elapsed:.2f}s "
+              f"({len(reader) / elapsed / 1e6:.1f}M ticks/s, {'numpy' if np is not None else '纯 Python'})")
+        print_backtest(results, events, show=0)
+    finally:
+        shutil.rmtree(tmp)
+
+
+def _floats(text: str):
+    return [float(x) for x in text.split(',') if x]
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    def opt(name, default=None):
+        return args[args.index(name) + 1] if name in args else default
+
+    if '--backtest' in args:
+        reader = TickReader(opt('--backtest'))
+        start = time.perf_counter()
+        results, events = backtest(
+            reader,
+            _floats(opt('--thresholds', '1.0')),
+            _floats(opt('--cooldowns', '60')),
+            cex=opt('--cex', 'cex'), dex=opt('--dex', 'dex'),
+            max_skew_ms=float(opt('--max-skew-ms')) if opt('--max-skew-ms') else None,
+        )
+        elapsed = time.perf_counter() - start
+        print(f"回放 {len(reader):,} ticks 用时 {elapsed:.2f}s ({len(reader) / max(elapsed, 1e-9) / 1e6:.1f}M ticks/s)")
+        print_backtest(results, events, show=int(opt('--show', '5')))
+    elif '--synth' in args:
+        path = opt('--synth')
+        count = int(args[args.index('--synth') + 2]) if len(args) > args.index('--synth') + 2 else 1_000_000
+        print(f"📝 写入 {synth(path, count):,} ticks -> {path}")
+    elif '--bench' in args:
+        run_bench()
+    else:
+        print(__doc__)
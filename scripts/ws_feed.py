@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+📡 WebSocket 行情流 (仅标准库)
+- 最小 RFC 6455 客户端: 握手、文本帧、分片、ping/pong、close
+- BookTickerFeed: 订阅最优买卖价流 (Binance bookTicker)，断线自动重连
+- 本地替身服务器: 按录制时间回放 tick，不连交易所也能测试
+
+回放文件为 JSONL，每行: {"t": 相对秒数, "stream": 路径名, "data": bookTicker 消息}
+
+Usage:
+  python3 scripts/ws_feed.py --synth ticks.jsonl          # 生成一段模拟录制
+  python3 scripts/ws_feed.py --serve ticks.jsonl [PORT]   # 回放服务器 (默认 8765)
+  然后: python3 scripts/arb_watchdog.py --ws \\
+          --spot-ws ws://127.0.0.1:8765/spot --futures-ws ws://127.0.0.1:8765/futures
+"""
+
+import base64
+import hashlib
+import json
+import os
+import random
+import socket
+import socketserver
+import ssl
+import struct
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+# =================== 配置区域 ===================
+WS_CONNECT_TIMEOUT = 5.0     # 连接 + 握手超时 (秒)
+WS_READ_TIMEOUT = 10.0       # 这么久没有任何数据就认为连接已死，重连
+RECONNECT_MIN = 0.5          # 重连退避 (秒)
+RECONNECT_MAX = 10.0
+# ================================================
+
+_WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC11B65'
+
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+
+class WebSocketClosed(Exception):
+    pass
+
+
+def _accept_key(key: bytes) -> bytes:
+    return base64.b64encode(hashlib.sha1(key + _WS_GUID).digest())
+
+
+def _mask(payload: bytes, mask: bytes) -> bytes:
+    # 整块异或，比逐字节循环快得多
+    n = len(payload)
+    if not n:
+        return payload
+    key = int.from_bytes((mask * (n // 4 + 1))[:n], 'big')
+    return (int.from_bytes(payload, 'big') ^ key).to_bytes(n, 'big')
+
+
+def _read_exact(stream, n: int) -> bytes:
+    data = stream.read(n)
+    if data is None or len(data) < n:
+        raise WebSocketClosed("connection closed")
+    return data
+
+
+def read_frame(stream):
+    """读取一帧，返回 (fin, opcode, payload)"""
+    b0, b1 = _read_exact(stream, 2)
+    length = b1 & 0x7F
+    if length == 126:
+        (length,) = struct.unpack('>H', _read_exact(stream, 2))
+    elif length == 127:
+        (length,) = struct.unpack('>Q', _read_exact(stream, 8))
+    mask = _read_exact(stream, 4) if b1 & 0x80 else None
+    payload = _read_exact(stream, length)
+    if mask:
+        payload = _mask(payload, mask)
+    return bool(b0 & 0x80), b0 & 0x0F, payload
+
+
+def encode_frame(opcode: int, payload: bytes, masked: bool) -> bytes:
+    """编码一帧 (客户端发送必须加掩码，服务端不加)"""
+    n = len(payload)
+    if n < 126:
+        header = struct.pack('>BB', 0x80 | opcode, (0x80 if masked else 0) | n)
+    elif n < 65536:
+        header = struct.pack('>BBH', 0x80 | opcode, (0x80 if masked else 0) | 126, n)
+    else:
+        header = struct.pack('>BBQ', 0x80 | opcode, (0x80 if masked else 0) | 127, n)
+    if not masked:
+        return header + payload
+    mask = os.urandom(4)
+    return header + mask + _mask(payload, mask)
+
+
+class WebSocketClient:
+    """阻塞式 WebSocket 客户端 (每个连接由一个线程使用)"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.sock = None
+        self.stream = None
+
+    def connect(self):
+        parts = urlsplit(self.url)
+        secure = parts.scheme == 'wss'
+        host = parts.hostname
+        port = parts.port or (443 if secure else 80)
+        path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+
+        sock = socket.create_connection((host, port), timeout=WS_CONNECT_TIMEOUT)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+
+        key = base64.b64encode(os.urandom(16))
+        sock.sendall(
+            f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUpgrade: websocket\r\n"
+            f"Connection: Upgrade\r\nSec-WebSocket-Key: {key.decode()}\r\n"
+            f"Sec-WebSocket-Version: 13\r\nUser-Agent: ArbWatchdog/1.0\r\n\r\n".encode()
+        )
+        stream = sock.makefile('rb')
+        status = stream.readline()
+        if b' 101 ' not in status:
+            sock.close()
+            raise ConnectionError(f"WebSocket 握手失败: {status.strip().decode(errors='replace')}")
+        headers = {}
+        while True:
+            line = stream.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('sec-websocket-accept', '').encode() != _accept_key(key):
+            sock.close()
+            raise ConnectionError("WebSocket 握手校验失败")
+
+        sock.settimeout(WS_READ_TIMEOUT)
+        self.sock, self.stream = sock, stream
+
+    def send(self, opcode: int, payload: bytes = b''):
+        self.sock.sendall(encode_frame(opcode, payload, masked=True))
+
+    def recv(self) -> bytes:
+        """返回下一条完整的数据消息，自动回复 ping"""
+        fragments = []
+        while True:
+            fin, opcode, payload = read_frame(self.stream)
+            if opcode == OP_PING:
+                self.send(OP_PONG, payload)
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                raise WebSocketClosed("server closed")
+            fragments.append(payload)
+            if fin:
+                return b''.join(fragments)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.send(OP_CLOSE)
+            except OSError:
+                pass
+            self.sock.close()
+            self.sock = self.stream = None
+
+# =================== bookTicker 流 ===================
+
+def parse_book_ticker(message: bytes):
+    """bookTicker 消息 -> 中间价 (买一卖一的均值)"""
+    data = json.loads(message)
+    data = data.get('data', data)   # 组合流格式 {"stream":..., "data":...}
+    return (float(data['b']) + float(data['a'])) / 2
+
+
+class BookTickerFeed(threading.Thread):
+    """
+    后台线程: 订阅一个 bookTicker 流，每次更新调用 on_update(name, price, recv_ns, recv_perf)
+    recv_perf 为收到消息时的 perf_counter，用于测量 "更新 -> 决策" 延迟
+    """
+
+    def __init__(self, name: str, url: str, on_update):
+        super().__init__(name=f"ws-{name}", daemon=True)
+        self.feed_name = name
+        self.url = url
+        self.on_update = on_update
+        self.last_update = 0.0        # 最近一次更新的 monotonic 时间
+        self.connected = False
+        self.stats = {'updates': 0, 'reconnects': 0, 'errors': 0}
+        self._stop = threading.Event()
+
+    def is_stale(self, max_age: float) -> bool:
+        return not self.connected or time.monotonic() - self.last_update > max_age
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        backoff = RECONNECT_MIN
+        while not self._stop.is_set():
+            client = WebSocketClient(self.url)
+            try:
+                client.connect()
+                self.connected = True
+                backoff = RECONNECT_MIN
+                while not self._stop.is_set():
+                    message = client.recv()
+                    recv_perf = time.perf_counter()
+                    recv_ns = time.time_ns()
+                    try:
+                        price = parse_book_ticker(message)
+                    except (ValueError, KeyError, TypeError):
+                        continue   # 订阅确认等非行情消息
+                    self.last_update = time.monotonic()
+                    self.stats['updates'] += 1
+                    self.on_update(self.feed_name, price, recv_ns, recv_perf)
+            except (OSError, WebSocketClosed, ConnectionError) as e:
+                self.stats['errors'] += 1
+                if not self._stop.is_set():
+                    print(f"⚠️ {self.feed_name} stream 断开: {e}，{backoff:.1f}s 后重连")
+            finally:
+                self.connected = False
+                client.close()
+            if self._stop.wait(backoff):
+                break
+            self.stats['reconnects'] += 1
+            backoff = min(backoff * 2, RECONNECT_MAX)
+
+# =================== 本地回放服务器 ===================
+
+def load_ticks(path: str):
+    """读取录制文件，按流名分组: {stream: [(t, 消息 bytes), ...]}"""
+    ticks = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                ticks.setdefault(row['stream'], []).append((float(row['t']), json.dumps(row['data']).encode()))
+    for rows in ticks.values():
+        rows.sort(key=lambda r: r[0])
+    return ticks
+
+
+def make_replay_server(ticks: dict, port: int = 0, loop: bool = True):
+    """
+    创建回放服务器 (ThreadingTCPServer，调用方负责 serve_forever)
+    连接路径的最后一段即流名，例如 ws://127.0.0.1:8765/spot
+    """
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request_line = self.rfile.readline().decode('latin-1')
+            key = b''
+            while True:
+                line = self.rfile.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'sec-websocket-key':
+                    key = value.strip().encode()
+            stream = request_line.split(' ')[1].rstrip('/').rsplit('/', 1)[-1]
+            rows = ticks.get(stream)
+            if not rows:
+                self.wfile.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                return
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.wfile.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                             b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + _accept_key(key) + b"\r\n\r\n")
+            try:
+                while True:
+                    start = time.monotonic()
+                    for t, message in rows:
+                        delay = start + t - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                        self.wfile.write(encode_frame(OP_TEXT, message, masked=False))
+                    if not loop:
+                        self.wfile.write(encode_frame(OP_CLOSE, b'', masked=False))
+                        return
+            except OSError:
+                return
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    return Server(('127.0.0.1', port), Handler)
+
+
+def synth_ticks(path: str, seconds: float = 60.0, rate: float = 20.0):
+    """生成一段模拟的现货 / 合约 bookTicker 录制 (随机游走，偶尔出现价差)"""
+    random.seed(42)
+    price = 150.0
+    with open(path, 'w') as f:
+        t = 0.0
+        while t < seconds:
+            price *= 1 + random.gauss(0, 0.0002)
+            basis = 0.02 if int(t) % 20 < 17 else random.uniform(1.0, 2.0)   # 每 20 秒有一段大价差
+            for stream, mid in (('spot', price), ('futures', price * (1 + basis / 100))):
+                data = {'u': int(t * 1000), 's': 'SOLUSDT',
+                        'b': f"{mid - 0.005:.4f}", 'B': '10', 'a': f"{mid + 0.005:.4f}", 'A': '10'}
+                f.write(json.dumps({'t': round(t + random.uniform(0, 0.01), 4), 'stream': stream, 'data': data}) + '\n')
+            t += random.expovariate(rate)
+    print(f"📝 已生成 {path} ({seconds:.0f}s)")
+
+
+if __name__ == "__main__":
+    if '--synth' in sys.argv:
+        synth_ticks(sys.argv[sys.argv.index('--synth') + 1])
+    elif '--serve' in sys.argv:
+        idx = sys.argv.index('--serve')
+        port = int(sys.argv[idx + 2]) if len(sys.argv) > idx + 2 else 8765
+        server = make_replay_server(load_ticks(sys.argv[idx + 1]), port)
+        print(f"📡 回放服务器: ws://127.0.0.1:{server.server_address[1]}/<stream>  (Ctrl+C 停止)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        print(__doc__)
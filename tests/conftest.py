@@ -0,0 +1,50 @@
+"""
+global_mesh/ 和 scripts/ 下的模块按脚本方式互相导入 (import wire)，测试时把两个目录加到 sys.path
+两边都有 global_monitor.py，同名时 import 以 global_mesh/ 为准；
+需要指定哪一个时用 load_module() 按文件路径导入
+依赖 Redis 的测试使用 fakeredis，不需要真的 redis-server
+"""
+import asyncio
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for sub in ('scripts', 'global_mesh'):
+    # 先移除再插到最前: 其他入口 (例如收集到 scripts/*_test.py) 可能已经把目录加进来了
+    path = os.path.join(ROOT, sub)
+    while path in sys.path:
+        sys.path.remove(path)
+    sys.path.insert(0, path)
+
+
+def load_module(sub: str, name: str):
+    """按文件路径导入 <sub>/<name>.py，注册为 <sub>_<name>，不受 sys.path 顺序和同名模块影响"""
+    key = f"{sub}_{name}"
+    if key not in sys.modules:
+        spec = importlib.util.spec_from_file_location(key, os.path.join(ROOT, sub, f"{name}.py"))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[key] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[key]
+            raise
+    return sys.modules[key]
+
+
+def emulate_block(client, max_wait: float = 0.02):
+    """
+    fakeredis 的 XREADGROUP 忽略 BLOCK，空结果立即返回，读取循环会变成忙等
+    (取消信号也可能被吞掉)；没有消息时在这里补一个短暂的等待
+    """
+    original = client.xreadgroup
+
+    async def xreadgroup(*args, **kwargs):
+        response = await original(*args, **kwargs)
+        if not response and kwargs.get('block') is not None:
+            await asyncio.sleep(max_wait)
+        return response
+
+    client.xreadgroup = xreadgroup
+    return client
@@ -0,0 +1,43 @@
+"""多交易对价差扫描: numpy 与纯 Python 结果一致，异常报价不报警"""
+import math
+
+import pytest
+
+import arb_scan
+from arb_scan import SpreadScanner
+
+CEX = {'AUSDT': '100', 'BUSDT': '0', 'CUSDT': '10', 'DUSDT': 'inf', 'EUSDT': '-5',
+       'FUSDT': '50', 'GUSDT': '1'}
+DEX = {'AUSDT': '102', 'BUSDT': '1', 'CUSDT': '9.5', 'DUSDT': '3', 'EUSDT': '5',
+       'FUSDT': 'nan', 'GUSDT': '0'}
+
+
+def _scan(monkeypatch, backend):
+    if backend == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(arb_scan, 'np', None)
+    scanner = SpreadScanner(thresholds={}, default_threshold=1.0, cooldown=60)
+    first = scanner.update(CEX, DEX)
+    second = scanner.update(CEX, DEX)
+    spread = [float(s) for s in first.spread]
+    return scanner.symbols, spread, first.alerts, second.alerts, first.top(10)
+
+
+@pytest.mark.parametrize('backend', ['numpy', 'python'])
+def test_invalid_prices_never_alert(monkeypatch, backend):
+    symbols, spread, alerts, again, top = _scan(monkeypatch, backend)
+    assert [symbols[i] for i in alerts] == ['AUSDT', 'CUSDT']
+    assert again == []                                  # 冷却中
+    assert [symbols[i] for i in top] == ['CUSDT', 'AUSDT']
+    for symbol in ('BUSDT', 'DUSDT', 'EUSDT', 'FUSDT', 'GUSDT'):
+        assert math.isnan(spread[symbols.index(symbol)])
+
+
+def test_backends_agree(monkeypatch):
+    pytest.importorskip('numpy')
+    fast = _scan(monkeypatch, 'numpy')
+    slow = _scan(monkeypatch, 'python')
+    assert fast[0] == slow[0]
+    assert fast[1] == pytest.approx(slow[1], nan_ok=True)
+    assert fast[2:] == slow[2:]
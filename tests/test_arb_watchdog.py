@@ -0,0 +1,96 @@
+"""scripts/arb_watchdog.py: 持久连接池 / 推送模式的采样时间"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+arb_watchdog = pytest.importorskip('arb_watchdog')
+
+
+@pytest.fixture
+def server():
+    release = threading.Event()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path == '/stall':
+                release.wait(5)
+            body = json.dumps({'path': self.path}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"127.0.0.1:{httpd.server_address[1]}", release
+    release.set()
+    httpd.shutdown()
+
+
+def test_connections_are_reused(server):
+    host, _ = server
+    client = arb_watchdog.KeepAliveClient('http', host)
+    for i in range(5):
+        assert client.get_json(f"/p{i}") == {'path': f"/p{i}"}
+    assert client.opened == 1
+    client.close()
+
+
+def test_stalled_request_does_not_block_same_host(server):
+    """对冲中落后的一路卡住时，同一主机的其他请求用另一条连接，不排队"""
+    host, release = server
+    client = arb_watchdog.KeepAliveClient('http', host, timeout=5)
+    with ThreadPoolExecutor(2) as pool:
+        stalled = pool.submit(client.get_json, '/stall')
+        time.sleep(0.05)
+        start = time.perf_counter()
+        assert client.get_json('/fast') == {'path': '/fast'}
+        assert time.perf_counter() - start < 1.0
+        assert not stalled.done()
+        release.set()
+        assert stalled.result(5) == {'path': '/stall'}
+    assert client.opened == 2
+    assert len(client.idle) == 2
+    client.close()
+
+
+def test_stale_idle_connection_is_replaced(server):
+    host, _ = server
+    client = arb_watchdog.KeepAliveClient('http', host)
+    client.get_json('/a')
+    client.idle[0].sock.close()      # 服务端已关闭的空闲连接
+    assert client.get_json('/b') == {'path': '/b'}
+    assert client.opened == 2
+    client.close()
+
+
+def test_stream_samples_keep_their_own_timestamps(monkeypatch):
+    """推送模式下两边的采样时间差来自各自的接收时间，不会被重新打成同一时刻"""
+    ticks = []
+    monkeypatch.setattr(arb_watchdog, 'print_row', lambda timestamp, cex, dex, tick: ticks.append(tick))
+    monkeypatch.setattr(arb_watchdog, 'record_sample', lambda *args: None)
+    monkeypatch.setattr(arb_watchdog, 'WS_PRINT_INTERVAL', 0)
+    watchdog = arb_watchdog.StreamWatchdog('ws://127.0.0.1:1/spot', 'ws://127.0.0.1:1/futures')
+    for feed in watchdog.feeds.values():
+        feed.connected = True
+        feed.last_update = time.monotonic()
+
+    t0 = time.time_ns()
+    watchdog.on_update('spot', 100.0, t0, time.perf_counter())
+    watchdog.on_update('futures', 100.05, t0 + 20 * 10**6, time.perf_counter())
+    assert ticks[-1].skew_ms == pytest.approx(20)
+    assert ticks[-1].status != "⏱️ SKEWED"
+
+    # 现货 500ms 没有更新: 这一对价格不是同一时刻的
+    watchdog.on_update('futures', 103.0, t0 + 500 * 10**6, time.perf_counter())
+    assert ticks[-1].skew_ms == pytest.approx(500)
+    assert ticks[-1].status == "⏱️ SKEWED" and not ticks[-1].alert
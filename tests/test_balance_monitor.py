@@ -0,0 +1,251 @@
+"""scripts/global_monitor.py: ATA 推导 / 批量查询 / RPC 客户端重试 / 监视模式"""
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import ROOT, load_module
+
+gm = load_module('scripts', 'global_monitor')
+
+
+@pytest.fixture
+def mock_rpc():
+    servers = []
+
+    def start(n: int, delay_ms: float = 0.0):
+        wallets, accounts = gm.mock_wallets(n)
+        server, state = gm.make_mock_rpc(accounts, delay_ms)
+        servers.append(server)
+        client = gm.RpcClient(f"http://127.0.0.1:{server.server_address[1]}")
+        return wallets, accounts, state, client
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def _raw_server(respond: bool):
+    """
+    原始 socket 服务器: respond=True 时每个连接只回复一次 (不声明 Connection: close) 就关闭，
+    模拟服务端悄悄关掉空闲的 keep-alive 连接；respond=False 时读完请求后一直不回复
+    """
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(8)
+    accepted = []
+    body = json.dumps({'jsonrpc': '2.0', 'id': 1, 'result': 42}).encode()
+
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            accepted.append(conn)
+            conn.recv(65536)
+            if respond:
+                conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(body) + body)
+                conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return listener, accepted
+
+
+def test_ata_derivation_matches_reference_vectors():
+    """参考值由 solders 的 Pubkey.find_program_address 生成 (200 个随机钱包)"""
+    with open(os.path.join(ROOT, 'tests', 'data', 'ata_vectors.json')) as f:
+        reference = json.load(f)
+    gm._ata_cache.clear()
+    for owner, mint, ata, bump in reference['vectors']:
+        assert gm.get_associated_token_address(owner, mint, reference['token_program']) == ata
+        seeds = [gm.decode_pubkey(owner), gm.decode_pubkey(reference['token_program']), gm.decode_pubkey(mint)]
+        assert gm.find_program_address(seeds, gm.decode_pubkey(gm.ASSOCIATED_TOKEN_PROGRAM_ID))[1] == bump
+
+
+def test_ata_derivation_matches_solders():
+    solders = pytest.importorskip('solders.pubkey')
+    Pubkey = solders.Pubkey
+    wallets, _ = gm.mock_wallets(50, seed=17)
+    program = Pubkey.from_string(gm.ASSOCIATED_TOKEN_PROGRAM_ID)
+    for owner in wallets.values():
+        seeds = [bytes(Pubkey.from_string(s)) for s in (owner, gm.TOKEN_PROGRAM_ID, gm.TOKEN_MINT)]
+        assert gm.get_associated_token_address(owner, gm.TOKEN_MINT) == str(Pubkey.find_program_address(seeds, program)[0])
+
+
+def test_audit_batches_over_100_addresses(mock_rpc):
+    wallets, accounts, state, client = mock_rpc(120)      # 240 个地址 -> 3 个批次 (替身 RPC 拒绝超过 100 个)
+    with ThreadPoolExecutor(max_workers=gm.RPC_POOL_SIZE) as executor:
+        balances = gm.audit_balances(client, wallets, executor=executor)
+    assert state['requests'] == 3
+    for name, address in wallets.items():
+        ata = accounts.get(gm.get_associated_token_address(address, gm.TOKEN_MINT))
+        token = ata['data']['parsed']['info']['tokenAmount']['amount'] if ata else None
+        assert balances[name][0] == gm.format_sol(accounts[address]['lamports'])
+        assert balances[name][1] == (gm.format_token(gm.Balance(0, int(token), 6)) if token else "0 (No Account)")
+
+
+def test_placeholder_addresses_are_na(mock_rpc):
+    wallets, _, _, client = mock_rpc(2)
+    wallets = {**wallets, 'Pending': 'Pending...', 'Broken': 'O0Il' * 8}
+    balances = gm.audit_balances(client, wallets)
+    assert balances['Pending'] == ("N/A", "N/A") and balances['Broken'] == ("N/A", "N/A")
+    assert all(v[0].endswith(' SOL') for name, v in balances.items() if name.startswith('Wallet'))
+
+
+def test_rpc_failure_marks_valid_wallets_as_error():
+    wallets, _ = gm.mock_wallets(3)
+    wallets['Pending'] = 'Pending...'
+    with socket.socket() as sock:           # 没有人监听的端口
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    balances = gm.audit_balances(gm.RpcClient(f"http://127.0.0.1:{port}", timeout=1), wallets)
+    assert balances == {**{name: ("Error", "Error") for name in wallets}, 'Pending': ("N/A", "N/A")}
+
+
+def test_rpc_error_reply_that_is_not_an_object():
+    class Client(gm.RpcClient):
+        def _post(self, body):
+            return {'jsonrpc': '2.0', 'id': 1, 'error': 'node is behind'}
+
+    with pytest.raises(gm.RpcError, match='node is behind'):
+        Client('http://127.0.0.1:1').call('getSlot')
+
+
+def test_stale_reused_connection_is_retried_once():
+    listener, accepted = _raw_server(respond=True)
+    try:
+        client = gm.RpcClient(f"http://127.0.0.1:{listener.getsockname()[1]}")
+        assert client.call('getSlot') == 42
+        time.sleep(0.05)                    # 服务端已关闭这条连接，客户端还把它当作空闲连接
+        assert client.call('getSlot') == 42
+        assert len(accepted) == 2
+    finally:
+        listener.close()
+
+
+def test_timed_out_request_is_not_retried():
+    listener, accepted = _raw_server(respond=False)
+    try:
+        client = gm.RpcClient(f"http://127.0.0.1:{listener.getsockname()[1]}", timeout=0.3)
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError):
+            client.call('getSlot')
+        assert time.perf_counter() - start < 0.5
+        assert len(accepted) == 1
+    finally:
+        listener.close()
+
+
+# =================== 监视模式 ===================
+
+@pytest.fixture
+def watch_env(mock_rpc, monkeypatch):
+    """两个钱包: Wallet 000 没有代币账户，Wallet 001 有"""
+    monkeypatch.setattr(gm, 'WATCH_COLD_AFTER', 2)
+    monkeypatch.setattr(gm, 'WATCH_COLD_EVERY', 3)
+    wallets, accounts, state, client = mock_rpc(2)
+    watcher = gm.BalanceWatcher(client, wallets)
+    watcher.poll(force=True)
+    return watcher, wallets, accounts, state
+
+
+def _poll(watcher, state, advance: bool = True):
+    if advance:
+        state['slot'] += 1
+    before = watcher.stats['accounts']
+    events = watcher.poll()
+    return events, watcher.stats['accounts'] - before
+
+
+def test_watch_skips_accounts_when_slot_does_not_advance(watch_env):
+    watcher, _, accounts, state = watch_env
+    requests = state['requests']
+    events, queried = _poll(watcher, state, advance=False)
+    assert events == [] and queried == 0
+    assert state['requests'] == requests + 1          # 只有 getSlot
+    assert watcher.stats['skipped'] == 1
+
+
+def test_watch_emits_delta_events(watch_env):
+    watcher, wallets, accounts, state = watch_env
+    address = wallets['Wallet 001']
+    ata = accounts[gm.get_associated_token_address(address, gm.TOKEN_MINT)]
+    old_lamports = accounts[address]['lamports']
+    old_amount = int(ata['data']['parsed']['info']['tokenAmount']['amount'])
+    accounts[address]['lamports'] += 1_500_000_000
+    ata['data']['parsed']['info']['tokenAmount']['amount'] = str(old_amount - 2_500_000)
+
+    events, _ = _poll(watcher, state)
+    sol, token = events
+    assert (sol['wallet'], sol['asset'], sol['old'], sol['delta'], sol['delta_ui']) == \
+        ('Wallet 001', 'SOL', old_lamports, 1_500_000_000, '1.5')
+    assert (token['asset'], token['decimals'], token['delta'], token['delta_ui']) == (gm.TOKEN_MINT, 6, -2_500_000, '-2.5')
+    assert sol['slot'] == state['slot'] and sol['address'] == address
+    assert _poll(watcher, state)[0] == []
+
+
+def test_watch_ata_created_and_closed(watch_env):
+    watcher, wallets, accounts, state = watch_env
+    address = wallets['Wallet 000']
+    ata_address = gm.get_associated_token_address(address, gm.TOKEN_MINT)
+    assert watcher.state['Wallet 000'].token is None
+    accounts[ata_address] = {'lamports': 2039280, 'owner': gm.TOKEN_PROGRAM_ID, 'data': {'parsed': {'info': {
+        'tokenAmount': {'amount': '7000000', 'decimals': 6}}}}}
+
+    (created,), _ = _poll(watcher, state)
+    assert (created['old'], created['new'], created['decimals'], created['delta_ui']) == (0, 7_000_000, 6, '7')
+
+    del accounts[ata_address]
+    (closed,), _ = _poll(watcher, state)
+    assert (closed['old'], closed['new'], closed['decimals'], closed['delta_ui']) == (7_000_000, 0, 6, '-7')
+    assert watcher.state['Wallet 000'].token is None
+
+
+def test_watch_demotes_quiet_wallets_and_promotes_on_change(watch_env):
+    watcher, wallets, accounts, state = watch_env
+    # 第 2、3 轮: 两个钱包都还是热的
+    assert [_poll(watcher, state)[1] for _ in range(2)] == [4, 4]
+    # 连续 2 轮没变化 -> 冷钱包，只在轮次是 3 的倍数时查询 (第 6 轮)
+    assert [_poll(watcher, state)[1] for _ in range(3)] == [0, 0, 4]
+
+    accounts[wallets['Wallet 000']]['lamports'] += 1
+    assert _poll(watcher, state) == ([], 0)             # 第 7 轮: 冷钱包不查询，还没发现变化
+    assert _poll(watcher, state) == ([], 0)
+    events, queried = _poll(watcher, state)            # 第 9 轮: 发现变化
+    assert [e['wallet'] for e in events] == ['Wallet 000'] and queried == 4
+    # 有变化的钱包回到每轮查询，另一个仍是冷的
+    assert _poll(watcher, state)[1] == 2
+    assert watcher.quiet == {'Wallet 000': 1, 'Wallet 001': 4}   # 只在被查询的轮次计数
+
+
+def test_run_watch_survives_rpc_error_at_startup(mock_rpc, tmp_path):
+    wallets, accounts, state, client = mock_rpc(2)
+    calls = {'n': 0}
+    call = client.call
+
+    def flaky(method, params=None):
+        calls['n'] += 1
+        if calls['n'] == 1:
+            raise gm.RpcError("getSlot: node is behind")
+        return call(method, params)
+
+    client.call = flaky
+    events_path = tmp_path / 'events.jsonl'
+
+    def mutate():
+        time.sleep(0.15)
+        accounts[wallets['Wallet 001']]['lamports'] += 10
+        state['slot'] += 1
+
+    threading.Thread(target=mutate, daemon=True).start()
+    watcher = gm.run_watch(wallets, client, interval=0.05, events_path=str(events_path), duration=0.5)
+    assert watcher.stats['errors'] == 1
+    assert set(watcher.state) == set(wallets)
+    events = [json.loads(line) for line in events_path.read_text().splitlines()]
+    assert [(e['wallet'], e['delta']) for e in events] == [('Wallet 001', 10)]
@@ -0,0 +1,95 @@
+"""链上状态缓存: 刷新 / 过期 / RPC 错误"""
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+import chain_state
+from chain_state import ChainStateCache, fee_percentile
+
+FAST = {'blockhash_interval': 0.05, 'fee_interval': 0.05, 'timeout': 1.0}
+
+
+def test_fee_percentile():
+    fees = list(range(0, 100_000, 1000))
+    assert fee_percentile(fees, 75, 1_000, 2_000_000) == 74_000
+    assert fee_percentile([0, 0, 0], 75, 1_000, 2_000_000) == 1_000          # 下限
+    assert fee_percentile([5_000_000], 75, 1_000, 2_000_000) == 2_000_000    # 上限
+    assert fee_percentile([], 75, 1_000, 2_000_000) == 1_000
+
+
+def _run(scenario):
+    async def main():
+        runner, url, state = await chain_state.start_mock_rpc(delay_ms=0)
+        cache = ChainStateCache(url, FAST)
+        try:
+            await scenario(cache, state)
+        finally:
+            await cache.stop()
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_start_fetches_both_and_background_refresh_continues():
+    async def scenario(cache, state):
+        await cache.start()
+        first = cache.blockhash()
+        assert first.last_valid_block_height == first.slot + 150
+        expected = fee_percentile([(i * 7919) % 50_000 for i in range(150)], 75, 1_000, 2_000_000)
+        assert cache.hints() == {'recent_blockhash': first.blockhash, 'priority_fee': expected}
+        assert cache.hints(['priority_fee']) == {'priority_fee': expected}
+        await asyncio.sleep(0.2)
+        assert cache.blockhash().slot > first.slot
+        assert cache.fetch_ms['recent_blockhash'] is not None
+        assert cache.record_snipe({'recent_blockhash': 'x'}) == cache.fetch_ms['recent_blockhash']
+
+    _run(scenario)
+
+
+def test_stale_entries_are_not_returned():
+    async def scenario(cache, state):
+        await cache.start()
+        await cache.stop()                  # 停止后台刷新，让条目变旧
+        cache._blockhash = cache._blockhash._replace(fetched_at=cache._blockhash.fetched_at - 21)
+        assert cache.blockhash() is None
+        assert set(cache.hints()) == {'priority_fee'}
+        cache._fee = cache._fee._replace(fetched_at=cache._fee.fetched_at - 31)
+        assert cache.hints() == {}
+        assert cache.stats['stale'] == 4
+
+    _run(scenario)
+
+
+@pytest.mark.parametrize('error', [{'code': -32005, 'message': 'node is behind'}, 'node is behind', 503])
+def test_rpc_errors_are_failures_not_crashes(error):
+    async def scenario(cache, state):
+        await cache.start()
+        refreshes = cache.stats['refreshes']
+        if error == 503:
+            state['down'] = True
+        else:
+            state['error'] = error
+        assert await cache._refresh(cache.refresh_blockhash) is False
+        await asyncio.sleep(0.2)
+        assert cache.stats['failures'] >= 3
+        assert all(not task.done() for task in cache._tasks)     # 刷新循环还活着
+        state['down'], state['error'] = False, None
+        await asyncio.sleep(0.2)
+        assert cache.stats['refreshes'] > refreshes
+        assert not cache._failing
+
+    _run(scenario)
+
+
+def test_unreachable_rpc_does_not_block_start():
+    async def main():
+        cache = ChainStateCache('http://127.0.0.1:9/', {**FAST, 'timeout': 0.5})
+        try:
+            await cache.start()
+            assert cache.hints() == {} and cache.stats['failures'] == 2
+        finally:
+            await cache.stop()
+
+    asyncio.run(main())
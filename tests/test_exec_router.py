@@ -0,0 +1,196 @@
+"""执行路由: 截止时间 / 认领 / 回退本地 / 结果未知"""
+import asyncio
+import importlib.util
+import json
+import time
+from typing import NamedTuple, Optional
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+import fakeredis.aioredis as far
+
+import exec_router
+import supervisor
+import wire
+from exec_router import ExecutionAgent, ExecutionRouter, RemoteResult, Route
+
+ROUTE = Route('HK', 5.0, 50.0, 20.0, 70.0)
+FAST = {'ack_timeout_ms': 50, 'ack_grace_ms': 20, 'result_timeout': 0.2,
+        'reconcile_timeout': 1, 'reconcile_interval': 0.05, 'local': 'LA'}
+
+
+class BuyResult(NamedTuple):
+    success: bool
+    tx_signature: Optional[str]
+    price: Optional[float]
+    output_amount: Optional[float]
+    error: Optional[str]
+
+
+class FakeTrader:
+    def __init__(self):
+        self.buys = []
+
+    async def buy(self, address, amount_sol):
+        self.buys.append(address)
+        return BuyResult(True, 'sig', 0.001, 1000.0, None)
+
+
+async def _subscribed(client, channel):
+    """在请求频道上挂一个订阅者，让 publish 返回 1，并收集请求"""
+    pubsub = client.pubsub()
+    await pubsub.subscribe(channel)
+    await pubsub.get_message(timeout=1)   # 订阅确认
+    return pubsub
+
+
+async def _next_request(pubsub) -> dict:
+    while True:
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1)
+        if message:
+            return json.loads(message['data'])
+
+
+def test_routing_is_opt_in(monkeypatch):
+    monkeypatch.delenv('EXEC_ROUTING', raising=False)
+    spec = importlib.util.spec_from_file_location('exec_router_default', exec_router.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert module.ROUTER_CONFIG['enabled'] is False
+
+
+def test_deadline_is_stamped_in_agent_clock():
+    async def scenario():
+        client = far.FakeRedis(decode_responses=True)
+        skew_ns = 10 * 10**9                  # 执行节点的时钟快 10 秒
+        router = ExecutionRouter(client, clock_offset_ns=lambda loc: skew_ns, config=FAST)
+        pubsub = await _subscribed(client, wire.CHANNEL_EXEC_REQUEST + 'HK')
+        task = asyncio.create_task(router.execute(ROUTE, 'addr', 'SYM', 0.01))
+        request = await _next_request(pubsub)
+        before = time.time_ns()
+        assert request['deadline_ns'] - before == pytest.approx(skew_ns + 50 * 10**6, abs=30 * 10**6)
+        assert await task is None            # 没有确认 -> 本地认领后本地执行
+        assert await client.get(wire.KEY_EXEC_CLAIM + request['id']) == 'LA'
+
+    asyncio.run(scenario())
+
+
+def test_no_agent_online_falls_back():
+    async def scenario():
+        router = ExecutionRouter(far.FakeRedis(decode_responses=True), config=FAST)
+        assert await router.execute(ROUTE, 'addr', 'SYM', 0.01) is None
+        assert router.stats['fallback'] == 1
+
+    asyncio.run(scenario())
+
+
+def test_agent_rejects_request_claimed_by_receiver():
+    """接收端超时后本地认领，之后才到达执行节点的请求 (即使没过截止时间) 不会被执行"""
+    async def scenario():
+        client = far.FakeRedis(decode_responses=True)
+        router = ExecutionRouter(client, config=FAST)
+        pubsub = await _subscribed(client, wire.CHANNEL_EXEC_REQUEST + 'HK')
+        task = asyncio.create_task(router.execute(ROUTE, 'addr', 'SYM', 0.01))
+        request = await _next_request(pubsub)
+        assert await task is None
+
+        trader = FakeTrader()
+        replies = await _subscribed(client, wire.CHANNEL_EXEC_REPLY)
+        request['deadline_ns'] = time.time_ns() + 10**9   # 时钟偏差让请求看起来还没过期
+        await ExecutionAgent(client, 'HK', trader, config=FAST).handle(json.dumps(request))
+        reply = await _next_request(replies)
+        assert reply['status'] == 'rejected'
+        assert trader.buys == []
+
+    asyncio.run(scenario())
+
+
+def test_agent_claim_wins_when_ack_is_lost():
+    """执行节点已认领但确认丢失: 接收端认领失败，不能本地买，等待结果"""
+    async def scenario():
+        client = far.FakeRedis(decode_responses=True)
+        router = ExecutionRouter(client, config=FAST)
+        pubsub = await _subscribed(client, wire.CHANNEL_EXEC_REQUEST + 'HK')
+        task = asyncio.create_task(router.execute(ROUTE, 'addr', 'SYM', 0.01))
+        request = await _next_request(pubsub)
+        await client.set(wire.KEY_EXEC_CLAIM + request['id'], 'HK', nx=True)
+        await asyncio.sleep(0.1)             # 超过 确认超时 + 余量
+        router.handle_reply(json.dumps({'id': request['id'], 'status': 'done', 'node': 'HK',
+                                        'success': True, 'tx': 'sig', 'price': 1.0, 'output_amount': 5.0}))
+        result = await task
+        assert result.success and result.node == 'HK' and not result.unknown
+
+    asyncio.run(scenario())
+
+
+def test_lost_result_is_unknown_and_reconciled():
+    async def scenario():
+        client = far.FakeRedis(decode_responses=True)
+        router = ExecutionRouter(client, config=FAST)
+        pubsub = await _subscribed(client, wire.CHANNEL_EXEC_REQUEST + 'HK')
+        task = asyncio.create_task(router.execute(ROUTE, 'addr', 'SYM', 0.01))
+        request = await _next_request(pubsub)
+        router.handle_reply(json.dumps({'id': request['id'], 'status': 'accepted', 'node': 'HK'}))
+        result = await task
+        assert result.unknown and not result.success
+        assert result.request_id == request['id']
+
+        # 执行节点稍后保存了结果
+        async def save():
+            await asyncio.sleep(0.1)
+            await client.set(wire.KEY_EXEC_RESULT + request['id'],
+                             json.dumps({'success': True, 'tx': 'sig', 'price': 1.0, 'output_amount': 5.0}))
+
+        asyncio.create_task(save())
+        final = await router.reconcile(result)
+        assert final == RemoteResult(True, 'sig', 1.0, 5.0, None, 'HK', request['id'])
+        assert router.stats['unknown'] == 1 and router.stats['reconciled'] == 1
+
+    asyncio.run(scenario())
+
+
+def test_lost_result_message_read_back_from_agent():
+    async def scenario():
+        client = far.FakeRedis(decode_responses=True)
+        router = ExecutionRouter(client, config=FAST)
+        pubsub = await _subscribed(client, wire.CHANNEL_EXEC_REQUEST + 'HK')
+        task = asyncio.create_task(router.execute(ROUTE, 'addr', 'SYM', 0.01))
+        request = await _next_request(pubsub)
+        router.handle_reply(json.dumps({'id': request['id'], 'status': 'accepted', 'node': 'HK'}))
+        await client.set(wire.KEY_EXEC_RESULT + request['id'], json.dumps({'success': False, 'error': 'slippage'}))
+        result = await task
+        assert not result.unknown and not result.success and result.error == 'slippage'
+
+    asyncio.run(scenario())
+
+
+def test_round_trip_through_agent():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        trader = FakeTrader()
+        agent = ExecutionAgent(far.FakeRedis(server=server, decode_responses=True), 'HK', trader, config=FAST)
+        agent_task = asyncio.create_task(agent.run())
+        client = far.FakeRedis(server=server, decode_responses=True)
+        router = ExecutionRouter(client, config={**FAST, 'ack_timeout_ms': 500, 'result_timeout': 2})
+        replies = supervisor.PubSubSupervisor(client, [wire.CHANNEL_EXEC_REPLY], name='replies')
+        await replies.connect()
+
+        async def read_replies():
+            async for message in replies.messages():
+                router.handle_reply(message['data'])
+
+        reader = asyncio.create_task(read_replies())
+        while not (await client.pubsub_numsub(wire.CHANNEL_EXEC_REQUEST + 'HK'))[0][1]:
+            await asyncio.sleep(0.01)
+        try:
+            result = await router.execute(ROUTE, 'addr', 'SYM', 0.01)
+        finally:
+            for task in (agent_task, reader):
+                task.cancel()
+            await asyncio.gather(agent_task, reader, return_exceptions=True)
+        assert result.success and result.node == 'HK'
+        assert trader.buys == ['addr']
+        assert router.stats['accepted'] == 1
+
+    asyncio.run(scenario())
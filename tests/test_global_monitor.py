@@ -0,0 +1,111 @@
+"""全球广播器: 批量发送 / 失败重试"""
+import asyncio
+import sys
+import time
+import types
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+import fakeredis.aioredis as far
+
+from conftest import load_module
+
+
+@pytest.fixture
+def monitor_module(monkeypatch):
+    """global_monitor 导入 ~/solana-sniper-bot 的 monitor 模块，测试时用一个最小替身"""
+    if 'monitor' not in sys.modules:
+        try:
+            import monitor  # noqa: F401
+        except ImportError:
+            stub = types.ModuleType('monitor')
+            stub.TokenMonitor = object
+            stub.NewToken = object
+            monkeypatch.setitem(sys.modules, 'monitor', stub)
+    return load_module('global_mesh', 'global_monitor')
+
+
+class FlakyPipeline:
+    """前 failures 次 execute 抛出连接错误，之后交给真正的 pipeline"""
+
+    def __init__(self, broadcaster, client, failures):
+        self.client = client
+        self.failures = failures
+        self.attempts = 0
+        broadcaster.redis_client = self
+
+    def pipeline(self, transaction=False):
+        inner = self.client.pipeline(transaction=transaction)
+        outer = self
+
+        class Pipe:
+            def __getattr__(self, name):
+                return getattr(inner, name)
+
+            async def execute(self):
+                outer.attempts += 1
+                if outer.attempts <= outer.failures:
+                    raise ConnectionError("connection reset")
+                return await inner.execute()
+
+        return Pipe()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def _fast(monkeypatch, global_monitor):
+    monkeypatch.setitem(global_monitor.supervisor.SUPERVISOR_CONFIG, 'backoff_base', 0.01)
+    monkeypatch.setitem(global_monitor.supervisor.SUPERVISOR_CONFIG, 'backoff_max', 0.02)
+
+
+def test_failed_batch_is_retried_in_order(monitor_module, monkeypatch):
+    _fast(monkeypatch, monitor_module)
+    broadcaster = monitor_module.GlobalBroadcaster()
+    client = far.FakeRedis(decode_responses=True)
+
+    async def scenario():
+        flaky = FlakyPipeline(broadcaster, client, failures=2)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(monitor_module.CHANNEL_ALERTS)
+        await pubsub.get_message(timeout=1)
+        for i in range(5):
+            broadcaster.broadcast_alert('PUMP_DETECTED', {'token': f"T{i}", 'price': 1.0, 'reason': 'x'})
+        await broadcaster.start()
+        received = []
+        while len(received) < 5:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1)
+            assert message is not None, "重试后仍未收到消息"
+            received.append(monitor_module.wire.decode_message(message['data'])['data']['token'])
+        await broadcaster.stop()
+        return flaky.attempts, received
+
+    attempts, received = asyncio.run(scenario())
+    assert attempts == 3
+    assert received == [f"T{i}" for i in range(5)]
+    assert broadcaster.stats['retried'] == 10
+    assert broadcaster.stats['published'] == 5
+    assert broadcaster.stats['failed'] == 0
+
+
+def test_stale_messages_are_not_retried(monitor_module, monkeypatch):
+    broadcaster = monitor_module.GlobalBroadcaster()
+    now = time.perf_counter_ns()
+    stale = now - int((monitor_module.BROADCAST_CONFIG['retry_max_age'] + 1) * 1e9)
+    broadcaster._queue.append(('ch', 'queued', 'q', now))
+    batch = [('ch', 'old', 'old', stale), ('ch', 'a', 'a', now), ('ch', 'b', 'b', now)]
+    assert broadcaster._requeue(batch) == 2
+    assert [item[1] for item in broadcaster._queue] == ['a', 'b', 'queued']
+    assert broadcaster.stats['failed'] == 1
+
+
+def test_requeue_respects_queue_limit(monitor_module, monkeypatch):
+    monkeypatch.setitem(monitor_module.BROADCAST_CONFIG, 'max_queue', 3)
+    broadcaster = monitor_module.GlobalBroadcaster()
+    now = time.perf_counter_ns()
+    for label in ('x', 'y'):
+        broadcaster._queue.append(('ch', label, label, now))
+    broadcaster._requeue([('ch', 'a', 'a', now), ('ch', 'b', 'b', now)])
+    assert [item[1] for item in broadcaster._queue] == ['b', 'x', 'y']
+    assert broadcaster.stats['dropped'] == 1
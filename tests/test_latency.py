@@ -0,0 +1,142 @@
+"""延迟测量: 直方图百分位 / NTP 式时钟偏差估计 / pong 处理 / 报表"""
+import asyncio
+import json
+import math
+
+import pytest
+
+pytest.importorskip('loguru')
+
+import latency
+from latency import ClockOffsetEstimator, ClockSync, LatencyHistogram, LatencyTracker
+
+MS = 1_000_000
+
+
+def test_histogram_percentiles_within_bucket_error():
+    hist = LatencyHistogram()
+    for value in range(1, 101):
+        hist.record(float(value))
+
+    assert hist.count == 100
+    assert hist.mean_ms == pytest.approx(50.5)
+    assert hist.max_ms == 100.0
+    assert hist.percentile(50) == pytest.approx(50, rel=0.02)
+    assert hist.percentile(99) == pytest.approx(99, rel=0.02)
+    # 百分位不会超过实际最大值
+    assert hist.percentile(100) == 100.0
+    assert hist.percentile(1) == pytest.approx(1, rel=0.02)
+
+
+def test_histogram_edge_values():
+    hist = LatencyHistogram()
+    assert math.isnan(hist.percentile(50))
+    assert math.isnan(hist.mean_ms)
+
+    hist.record(-3.0)
+    hist.record(0.0)
+    assert hist.negative == 1
+    assert hist.count == 2
+    assert hist.percentile(50) == 0.0          # 不超过 max_ms (负值按 0 计)
+
+    hist.record(0.005)
+    assert hist.percentile(100) == 0.005
+
+
+def test_offset_uses_min_rtt_sample():
+    clock = ClockOffsetEstimator(window=4)
+    # 节点时钟快 50ms，单向 10ms: offset = t1 - (t0 + t3) / 2 = 60 - 10
+    clock.add_sample('HK', t0=0, t1=60 * MS, t3=20 * MS)
+    # 回程排队 20ms 的样本估计偏差会偏大，但 RTT 更大，不会被选中
+    clock.add_sample('HK', t0=1000 * MS, t1=1060 * MS, t3=1040 * MS)
+
+    assert clock.offset_ns('HK') == 50 * MS
+    assert clock.rtt_ms('HK') == 20.0
+    assert clock.offset_ns('SG') is None
+    assert clock.rtt_ms('SG') is None
+
+
+def test_offset_window_and_negative_rtt():
+    clock = ClockOffsetEstimator(window=2)
+    clock.add_sample('HK', t0=0, t1=60 * MS, t3=20 * MS)            # rtt 20, offset 50
+    clock.add_sample('HK', t0=100 * MS, t1=175 * MS, t3=150 * MS)   # rtt 50, offset 50
+    clock.add_sample('HK', t0=200 * MS, t1=285 * MS, t3=260 * MS)   # rtt 60, offset 55
+    # 窗口只保留最近 2 个样本，最早的 (RTT 最小) 已被淘汰
+    assert clock.rtt_ms('HK') == 50.0
+    assert clock.offset_ns('HK') == 50 * MS
+
+    clock.add_sample('SG', t0=10 * MS, t1=0, t3=5 * MS)             # 时间倒退，丢弃
+    assert clock.offset_ns('SG') is None
+
+
+def test_tracker_corrects_for_clock_offset():
+    tracker = LatencyTracker()
+    # 没有偏差样本: 按原始时间差记录
+    assert tracker.record('HK', sent_ns=0, recv_ns=12 * MS) == 12.0
+
+    # 节点时钟快 50ms，消息在接收端时间 T 发出、T + 10ms 到达
+    tracker.clock.add_sample('HK', t0=0, t1=60 * MS, t3=20 * MS)
+    t = 5_000 * MS
+    assert tracker.record('HK', sent_ns=t + 50 * MS, recv_ns=t + 10 * MS) == pytest.approx(10.0)
+    assert tracker.histograms['HK'].count == 2
+
+
+def test_report_lists_percentiles_offset_and_rtt():
+    tracker = LatencyTracker()
+    tracker.clock.add_sample('HK', t0=0, t1=60 * MS, t3=20 * MS)
+    for value in range(1, 101):
+        tracker.record('HK', sent_ns=50 * MS, recv_ns=value * MS)
+    tracker.record('SG', sent_ns=0, recv_ns=5 * MS)
+
+    header, hk, sg = tracker.report().splitlines()
+    assert header.split() == ['SOURCE', '|', 'COUNT', '|', 'P50', '|', 'P99', '|', 'MAX', '|',
+                              'OFFSET', '|', 'RTT']
+    cols = [col.strip() for col in hk.split('|')]
+    assert cols[:2] == ['HK', '100']
+    assert float(cols[2].rstrip('ms')) == pytest.approx(50, rel=0.02)
+    assert float(cols[3].rstrip('ms')) == pytest.approx(99, rel=0.02)
+    assert cols[4:] == ['100.00ms', '+50.00ms', '20.00ms']
+    assert [col.strip() for col in sg.split('|')][-2:] == ['N/A', 'N/A']
+
+
+def test_clock_sync_handle_pong(monkeypatch):
+    tracker = LatencyTracker()
+    sync = ClockSync(None, tracker)
+    monkeypatch.setattr(latency.time, 'time_ns', lambda: 20 * MS)
+
+    sync.handle_pong(json.dumps({'source': 'HK', 'id': 1, 't0': 0, 't1': 60 * MS}))
+    assert tracker.clock.offset_ns('HK') == 50 * MS
+    assert tracker.clock.rtt_ms('HK') == 20.0
+
+    # 格式错误的 pong 只记日志
+    for raw in ('not json', '[1, 2]', json.dumps({'source': 'SG', 't0': 0}),
+                json.dumps({'source': 'SG', 't0': 'x', 't1': 0})):
+        sync.handle_pong(raw)
+    assert tracker.clock.offset_ns('SG') is None
+
+
+def test_clock_sync_run_publishes_pings_and_survives_errors():
+    class FlakyRedis:
+        def __init__(self):
+            self.published = []
+            self.failures = 1
+
+        async def publish(self, channel, message):
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError('redis down')
+            self.published.append((channel, json.loads(message)))
+
+    async def main():
+        redis_client = FlakyRedis()
+        task = asyncio.create_task(ClockSync(redis_client, LatencyTracker(), interval=0.01).run())
+        while len(redis_client.published) < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return redis_client.published
+
+    published = asyncio.run(main())
+    assert {channel for channel, _ in published} == {latency.CHANNEL_CLOCK_PING}
+    # 第一次发送失败不影响后续 ping，id 持续递增
+    assert [ping['id'] for _, ping in published[:2]] == [1, 2]
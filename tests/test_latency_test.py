@@ -0,0 +1,182 @@
+"""scripts/latency_test.py: 分阶段探测 / 直方图 / 探测限速 / 聚合端重连"""
+import asyncio
+import json
+import math
+import random
+import socket
+import time
+
+import pytest
+
+import latency_test
+
+
+@pytest.fixture(scope='module')
+def standins():
+    return latency_test.start_standin_servers(think_ms=20)
+
+
+def test_probe_once_times_each_phase(standins):
+    endpoints, client_ctx = standins
+    host, port, _ = endpoints["Loopback HTTP (name)"]
+    sample = asyncio.run(latency_test.probe_once(host, port, False))
+    assert sample.error is None and sample.tls_ms is None
+    assert sample.dns_ms >= 0 and sample.tcp_ms >= 0
+    assert sample.ttfb_ms >= 20 * 0.9            # 替身服务器等待 20ms 才返回首字节
+    assert sample.total_ms == pytest.approx(sample.dns_ms + sample.tcp_ms + sample.ttfb_ms)
+
+    light = asyncio.run(latency_test.probe_once(host, port, False, full=False))
+    assert light.error is None and light.tcp_ms is not None and light.ttfb_ms is None
+
+    if "Loopback HTTPS" in endpoints:
+        host, port, _ = endpoints["Loopback HTTPS"]
+        sample = asyncio.run(latency_test.probe_once(host, port, True, client_ctx))
+        assert sample.error is None and sample.tls_ms > 0 and sample.ttfb_ms is not None
+
+
+def test_probe_once_reports_failed_phase():
+    with socket.socket() as sock:       # 取一个没有人监听的端口
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    sample = asyncio.run(latency_test.probe_once('127.0.0.1', port, False))
+    assert sample.error.startswith('tcp: ') and sample.dns_ms is not None and sample.tcp_ms is None
+
+
+def test_probe_all_runs_endpoints_in_parallel(standins, monkeypatch):
+    """每 PROBE_FULL_EVERY 次做一次完整探测；多个端点、多个探测槽并行，总耗时远小于串行"""
+    endpoints, _ = standins
+    endpoints = {name: spec for name, spec in endpoints.items() if not spec[2]}
+    stats = asyncio.run(latency_test.probe_all(endpoints, count=20, concurrency=4, rate=None))
+    for result in stats.values():
+        assert result.probes == 20 and result.failed == 0
+        assert result.tcp.n == 20
+        assert result.phases['ttfb'].n == 20 // latency_test.PROBE_FULL_EVERY
+
+    monkeypatch.setattr(latency_test, 'PROBE_FULL_EVERY', 1)
+    start = time.perf_counter()
+    stats = asyncio.run(latency_test.probe_all(endpoints, count=8, concurrency=4, rate=None))
+    elapsed = time.perf_counter() - start
+    assert all(result.phases['ttfb'].n == 8 for result in stats.values())
+    assert elapsed < len(endpoints) * 8 * 0.02          # 串行至少 16 x 20ms
+
+
+def test_histogram_percentiles_within_precision():
+    random.seed(1)
+    values = [random.lognormvariate(math.log(20), 0.6) for _ in range(20000)]
+    hist = latency_test.LatencyHistogram()
+    for v in values:
+        hist.record(v)
+    values.sort()
+    for p in (50, 90, 99, 99.9):
+        exact = values[max(1, math.ceil(len(values) * p / 100)) - 1]
+        assert abs(hist.percentile(p) - exact) / exact <= latency_test.HIST_PRECISION * 1.01
+    assert hist.percentile(100) == values[-1]
+    assert hist.std == pytest.approx(math.sqrt(sum((v - hist.mean) ** 2 for v in values) / (len(values) - 1)))
+
+
+def test_histogram_empty_and_jitter():
+    hist = latency_test.LatencyHistogram()
+    assert math.isnan(hist.percentile(99)) and math.isnan(hist.jitter)
+    for v in (10, 12, 9, 9):
+        hist.record(v)
+    assert hist.jitter == pytest.approx((2 + 3 + 0) / 3)
+    assert hist.min == 9 and hist.max == 12
+
+
+def test_endpoint_stats_loss():
+    stats = latency_test.EndpointStats()
+    stats.add(latency_test.ProbeSample(1.0, 5.0, None, None))
+    stats.add(latency_test.ProbeSample(1.0, None, None, None, error='tcp: refused'))
+    assert stats.loss_pct == 50 and stats.tcp.n == 1
+    assert stats.errors == {'tcp: refused': 1}
+
+
+def test_probe_rate_limit():
+    """真实端点按 PROBE_MAX_RATE 限速；回环基准测试 (rate=None) 不限速"""
+    endpoints, _ = latency_test.start_standin_servers(think_ms=0)
+    endpoints = {name: spec for name, spec in endpoints.items() if not spec[2]}
+
+    def timed(rate):
+        start = time.perf_counter()
+        result = asyncio.run(latency_test.probe_all(endpoints, count=20, rate=rate))
+        return time.perf_counter() - start, result
+
+    limited_s, result = timed(50)
+    assert all(stats.probes == 20 for stats in result.values())
+    assert limited_s >= 19 / 50 * 0.9
+    unlimited_s, result = timed(None)
+    assert all(stats.probes == 20 for stats in result.values())
+    assert unlimited_s < limited_s
+
+
+def _report(node: str, p99: float) -> str:
+    return json.dumps({'node': node, 'loc': node, 'ts': int(time.time()), 'interval': 60,
+                       'endpoints': {'Solana Mainnet RPC': {'p50': p99 / 2, 'p99': p99}}})
+
+
+class _Done(Exception):
+    pass
+
+
+def test_aggregator_resubscribes_after_disconnect(monkeypatch):
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    client.hset(latency_test.LATENCY_KEY, 'HK', _report('HK', 20))
+    monkeypatch.setattr(latency_test, 'connect_mesh', lambda path: (client, 'latency_reports', None))
+    monkeypatch.setattr(latency_test, 'AGG_REFRESH', 0)
+    server.connected = False        # 启动时 Master 不可达
+
+    sleeps = []
+
+    def sleep(delay):
+        sleeps.append(delay)
+        server.connected = True
+
+    monkeypatch.setattr(latency_test.time, 'sleep', sleep)
+    draws = []
+    original_render = latency_test.LatencyMatrix.render
+
+    def render(matrix):
+        draws.append(sorted(matrix.reports))
+        if len(draws) == 1:
+            # 第一次重绘后: 断线期间另一个节点上报，然后连接中断
+            client.hset(latency_test.LATENCY_KEY, 'JP', _report('JP', 10))
+            server.connected = False
+        elif 'JP' in matrix.reports:
+            raise _Done
+        return original_render(matrix)
+
+    monkeypatch.setattr(latency_test.LatencyMatrix, 'render', render)
+    with pytest.raises(_Done):
+        latency_test.run_aggregator()
+    assert draws[0] == ['HK'] and draws[-1] == ['HK', 'JP']
+    assert len(sleeps) == 2
+    assert all(0 < d <= latency_test.AGG_RECONNECT_MAX for d in sleeps)
+
+
+@pytest.mark.parametrize('report', [
+    [],
+    {'ts': 1, 'endpoints': {}},
+    {'node': 'HK', 'ts': 'now', 'endpoints': {}},
+    {'node': 'HK', 'ts': 1, 'endpoints': []},
+    {'node': 'HK', 'ts': 1, 'endpoints': {'RPC': [1, 2]}},
+    {'node': 'HK', 'ts': 1, 'endpoints': {'RPC': {'p50': None, 'p99': 'slow'}}},
+    {'node': 'HK', 'ts': 1, 'endpoints': {'RPC': {'p50': 1.0, 'p99': 2.0, 'loss': '5%'}}},
+])
+def test_matrix_rejects_malformed_report(report):
+    """结构不合法的摘要抛 ValueError (聚合端会捕获)，矩阵保持不变，之后仍能正常重绘"""
+    matrix = latency_test.LatencyMatrix()
+    matrix.update(json.loads(_report('JP', 10)))
+    with pytest.raises(ValueError):
+        matrix.update(report)
+    assert sorted(matrix.reports) == ['JP']
+    assert list(matrix.baseline) == [('JP', 'Solana Mainnet RPC')]
+    assert 'JP' in matrix.render()
+
+
+def test_matrix_accepts_endpoint_without_samples():
+    matrix = latency_test.LatencyMatrix()
+    report = {'node': 'HK', 'ts': int(time.time()), 'endpoints': {'RPC': {'n': 0, 'loss': 100.0, 'p50': None, 'p99': None}}}
+    assert matrix.update(report) == []
+    assert 'N/A' in matrix.render()
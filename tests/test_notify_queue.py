@@ -0,0 +1,89 @@
+"""后台通知队列: 合并 / 有界丢弃 / 发送失败不影响后续"""
+import asyncio
+
+import pytest
+
+pytest.importorskip('loguru')
+
+import notify_queue
+from notify_queue import NotificationQueue
+
+
+class RecordingNotifier:
+    def __init__(self, fail=()):
+        self.sent = []
+        self.fail = set(fail)
+
+    async def notify_new_token(self, symbol, *args):
+        if symbol in self.fail:
+            raise RuntimeError('telegram down')
+        self.sent.append(('new_token', symbol))
+
+    async def notify_buy(self, symbol, *args):
+        self.sent.append(('buy', symbol))
+
+
+def test_same_key_is_coalesced_to_latest():
+    queue = NotificationQueue(RecordingNotifier())
+    queue.submit('notify_new_token', 'OLD', key=('new_token', 'A'))
+    queue.submit('notify_new_token', 'NEW', key=('new_token', 'A'))
+    queue.submit('notify_new_token', 'OTHER')
+    assert len(queue) == 2
+    assert queue.stats['coalesced'] == 1
+    assert [item[1] for item in queue._pending.values()] == [('NEW',), ('OTHER',)]
+
+
+def test_full_queue_drops_oldest_droppable_and_keeps_buys():
+    queue = NotificationQueue(RecordingNotifier(), maxsize=2)
+    queue.submit('notify_buy', 'BUY1', droppable=False)
+    queue.submit('notify_new_token', 'T1')
+    queue.submit('notify_new_token', 'T2')          # 挤掉 T1
+    assert [item[1] for item in queue._pending.values()] == [('BUY1',), ('T2',)]
+    queue.submit('notify_buy', 'BUY2', droppable=False)   # 挤掉 T2
+    queue.submit('notify_buy', 'BUY3', droppable=False)   # 没有可丢弃的，也不能丢
+    queue.submit('notify_new_token', 'T3')          # 没有可丢弃的，丢掉自己
+    assert [item[1] for item in queue._pending.values()] == [('BUY1',), ('BUY2',), ('BUY3',)]
+    assert queue.stats['dropped'] == 3
+
+
+def test_workers_send_in_order_and_survive_failures(monkeypatch):
+    monkeypatch.setitem(notify_queue.NOTIFY_QUEUE_CONFIG, 'drain_timeout', 2.0)
+    notifier = RecordingNotifier(fail={'BAD'})
+
+    async def scenario():
+        queue = NotificationQueue(notifier, workers=1)
+        await queue.start()
+        for symbol in ('A', 'BAD', 'B'):
+            queue.submit('notify_new_token', symbol)
+        queue.submit('notify_buy', 'A', droppable=False)
+        await queue.stop()          # 退出前发完剩余通知
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert notifier.sent == [('new_token', 'A'), ('new_token', 'B'), ('buy', 'A')]
+    assert queue.stats['sent'] == 3 and queue.stats['failed'] == 1
+    assert len(queue) == 0
+
+
+def test_submit_does_not_wait_for_slow_notifier(monkeypatch):
+    monkeypatch.setitem(notify_queue.NOTIFY_QUEUE_CONFIG, 'drain_timeout', 0.1)
+
+    class SlowNotifier:
+        async def notify_new_token(self, *args):
+            await asyncio.sleep(10)
+
+    async def scenario():
+        queue = NotificationQueue(SlowNotifier(), workers=1)
+        await queue.start()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for i in range(5):
+            queue.submit('notify_new_token', f'T{i}')
+        await asyncio.sleep(0.05)
+        elapsed = loop.time() - started
+        await queue.stop()          # 超过 drain_timeout 后放弃剩余通知
+        return elapsed, queue
+
+    elapsed, queue = asyncio.run(scenario())
+    assert elapsed < 0.5
+    assert queue.stats['sent'] == 0 and len(queue) == 4
@@ -0,0 +1,113 @@
+"""持仓 WAL: 载入 / 截断不完整记录 / 分组提交 / 压缩"""
+import asyncio
+
+import pytest
+
+pytest.importorskip('loguru')
+
+import position_store
+from position_store import PositionStore
+
+
+def _position(i: int) -> dict:
+    return {'symbol': f'T{i}', 'amount': 1000 + i, 'sol_spent': 0.01}
+
+
+def _reload(path) -> PositionStore:
+    store = PositionStore(str(path))
+    store.load()
+    return store
+
+
+def test_missing_log_starts_empty(tmp_path):
+    store = _reload(tmp_path / 'nested' / 'positions.wal')
+    assert len(store) == 0 and (tmp_path / 'nested').is_dir()
+
+
+def test_round_trip_with_lazy_parse(tmp_path):
+    path = tmp_path / 'positions.wal'
+
+    async def scenario():
+        store = PositionStore(str(path))
+        await store.start()
+        for i in range(3):
+            store.add(f'A{i}', _position(i))
+        store.remove('A1')
+        store.remove('missing')              # 没有持仓的平仓不写日志
+        await store.stop()
+        return store
+
+    assert asyncio.run(scenario()).records == 4
+    store = _reload(path)
+    assert 'A0' in store and 'A1' not in store and len(store) == 2
+    assert isinstance(store._positions['A2'], str)     # 读取前不解析
+    assert store.get('A2') == _position(2)
+    assert dict(store.items()) == {'A0': _position(0), 'A2': _position(2)}
+    assert store.records == 4
+
+
+def test_torn_last_line_is_truncated(tmp_path):
+    path = tmp_path / 'positions.wal'
+    good = position_store._open_line('A0', _position(0)) + '\n'
+    path.write_bytes(good.encode() + b'O A1 {"symbol":"T')
+    store = _reload(path)
+    assert list(store.items()) == [('A0', _position(0))]
+    assert path.read_bytes() == good.encode()
+
+
+def test_corrupt_bytes_skip_only_that_line(tmp_path):
+    path = tmp_path / 'positions.wal'
+    lines = [position_store._open_line(f'A{i}', _position(i)).encode() for i in range(3)]
+    lines[1] = lines[1].replace(b'T1', b'T\xff\xfe')
+    path.write_bytes(b'\n'.join(lines + [b'garbage', b'C A2']) + b'\n')
+    store = _reload(path)
+    assert dict(store.items()) == {'A0': _position(0)}
+    assert store.records == 5
+
+
+def test_group_commit_batches_writes(tmp_path, monkeypatch):
+    monkeypatch.setitem(position_store.POSITION_STORE_CONFIG, 'commit_interval', 0.05)
+    path = tmp_path / 'positions.wal'
+
+    async def scenario():
+        store = PositionStore(str(path))
+        await store.start()
+        for i in range(100):
+            store.add(f'A{i}', _position(i))
+            if i % 10 == 0:
+                await asyncio.sleep(0)       # 在同一个提交间隔内陆续写入
+        assert store.stats['commits'] == 0   # 写入只入队，不在调用方等待磁盘
+        await asyncio.sleep(0.2)
+        commits = store.stats['commits']
+        assert len(path.read_text().splitlines()) == 100
+        await store.stop()
+        return commits
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_compaction_keeps_only_open_positions(tmp_path, monkeypatch):
+    monkeypatch.setitem(position_store.POSITION_STORE_CONFIG, 'commit_interval', 0.01)
+    monkeypatch.setitem(position_store.POSITION_STORE_CONFIG, 'compact_min_records', 20)
+    monkeypatch.setitem(position_store.POSITION_STORE_CONFIG, 'compact_ratio', 2)
+    path = tmp_path / 'positions.wal'
+
+    async def scenario():
+        store = PositionStore(str(path))
+        await store.start()
+        for i in range(30):
+            store.add(f'A{i}', _position(i))
+            if i >= 3:
+                store.remove(f'A{i}')
+        await asyncio.sleep(0.1)
+        store.add('B', _position(99))
+        await store.stop()
+        return store
+
+    store = asyncio.run(scenario())
+    assert store.stats['compactions'] == 1
+    assert path.read_text().splitlines()[:3] == [position_store._open_line(f'A{i}', _position(i)) for i in range(3)]
+    assert len(path.read_text().splitlines()) == 4
+    assert not (tmp_path / 'positions.wal.tmp').exists()
+    reloaded = _reload(path)
+    assert dict(reloaded.items()) == {**{f'A{i}': _position(i) for i in range(3)}, 'B': _position(99)}
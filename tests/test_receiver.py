@@ -0,0 +1,237 @@
+"""GlobalReceiver 启动 / 传输模式"""
+import asyncio
+import json
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+import fakeredis.aioredis as far
+
+import global_receiver as gr
+import stream_transport
+from conftest import emulate_block
+
+
+def _new_token(symbol: str) -> str:
+    return json.dumps({'type': 'NEW_TOKEN', 'source': 'HK', 'timestamp': time.time(),
+                       'data': {'address': f'{symbol}'.ljust(40, 'x'), 'symbol': symbol,
+                                'platform': 'raydium', 'liquidity': 1.0}})
+
+
+@pytest.fixture
+def receiver_factory(monkeypatch, tmp_path):
+    monkeypatch.setitem(gr.RECEIVER_CONFIG, 'positions_path', str(tmp_path / 'positions.wal'))
+    monkeypatch.setitem(gr.SNIPER_CONFIG, 'enabled', False)
+
+    def make(transport: str):
+        monkeypatch.setitem(gr.RECEIVER_CONFIG, 'transport', transport)
+        server = fakeredis.FakeServer()
+        receiver = gr.GlobalReceiver({'telegram': {'enabled': False}})
+        receiver.redis_client = emulate_block(far.FakeRedis(server=server))
+        receiver.clock_sync.redis_client = receiver.redis_client
+        seen = []
+
+        async def handle_new_token(source, data, timer=None):
+            seen.append(data['symbol'])
+
+        receiver.handle_new_token = handle_new_token
+        return receiver, far.FakeRedis(server=server), seen
+
+    return make
+
+
+async def _run_until(receiver, predicate, timeout: float = 5.0):
+    task = asyncio.create_task(receiver.start())
+    deadline = time.monotonic() + timeout
+    try:
+        while not predicate():
+            if task.done():
+                task.result()   # 启动失败时把异常抛出来
+            assert time.monotonic() < deadline, "超时"
+            await asyncio.sleep(0.01)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await receiver.stop()
+
+
+@pytest.mark.parametrize('transport', [stream_transport.TRANSPORT_PUBSUB, stream_transport.TRANSPORT_STREAMS])
+def test_receiver_starts_and_receives(receiver_factory, transport):
+    receiver, publisher, seen = receiver_factory(transport)
+
+    async def scenario():
+        async def publish():
+            while not receiver._trade_ready.is_set():
+                await asyncio.sleep(0.01)
+            if transport == stream_transport.TRANSPORT_STREAMS:
+                await stream_transport.publish(publisher, gr.CHANNELS[0], _new_token('STRM'))
+            else:
+                while not seen:
+                    await publisher.publish(gr.CHANNELS[0], _new_token('STRM'))
+                    await asyncio.sleep(0.05)
+
+        pub = asyncio.create_task(publish())
+        await _run_until(receiver, lambda: 'STRM' in seen)
+        pub.cancel()
+
+    asyncio.run(scenario())
+    assert 'STRM' in seen
+
+
+def test_unknown_remote_result_is_not_a_failure(receiver_factory):
+    """远端已接单但结果没送达: 持仓记为 unconfirmed 防止重复买入，核对到结果后补全"""
+    from exec_router import RemoteResult, Route
+
+    receiver, _, _ = receiver_factory(stream_transport.TRANSPORT_PUBSUB)
+    unknown = RemoteResult(False, None, None, None, 'timeout', 'HK', 'req-1', unknown=True)
+    final = RemoteResult(True, 'sig', 1.0, 5.0, None, 'HK', 'req-1')
+    notifications = []
+
+    class Router:
+        def choose(self):
+            return Route('HK', 5.0, 50.0, 20.0, 70.0)
+
+        async def execute(self, *args):
+            return unknown
+
+        async def reconcile(self, result):
+            assert result is unknown
+            return final
+
+    receiver.router = Router()
+    receiver.notify = lambda method, *args, **kwargs: notifications.append(method)
+
+    async def scenario():
+        await receiver.execute_snipe({'address': 'A' * 40, 'symbol': 'UNK'}, buy_amount=0.01)
+        assert receiver.positions.get('A' * 40)['status'] == 'unconfirmed'
+        assert 'notify_error' not in notifications
+        await asyncio.gather(*receiver._reconcile_tasks)
+
+    asyncio.run(scenario())
+    position = receiver.positions.get('A' * 40)
+    assert 'status' not in position and position['node'] == 'HK' and position['amount'] == 5.0
+    assert notifications[-1] == 'notify_buy'
+
+
+def test_new_token_without_liquidity(receiver_factory):
+    """二进制消息中缺失的流动性解码为 None，日志 / 通知不能因此报错"""
+    receiver, _, _ = receiver_factory(stream_transport.TRANSPORT_PUBSUB)
+    notifications = []
+    receiver.notify = lambda method, *args, **kwargs: notifications.append((method, args))
+    data = {'address': 'A' * 40, 'symbol': 'NOLIQ', 'platform': 'raydium', 'liquidity': None}
+    asyncio.run(gr.GlobalReceiver.handle_new_token(receiver, 'HK', data))
+    assert notifications == [('notify_new_token', ('NOLIQ', 'A' * 40, 'raydium (via HK)', 0.0))]
+
+
+def test_stream_message_acked_after_handler_completes(receiver_factory):
+    """Streams 模式: 处理任务结束前消息保持未确认 (进程此时退出会重新投递)，结束后才确认"""
+    receiver, publisher, seen = receiver_factory(stream_transport.TRANSPORT_STREAMS)
+    key = stream_transport.stream_key(gr.CHANNELS[0])
+    group = gr.RECEIVER_CONFIG['stream_group']
+    release = asyncio.Event()
+    started = asyncio.Event()
+
+    async def handle_new_token(source, data, timer=None):
+        started.set()
+        await release.wait()
+        seen.append(data['symbol'])
+
+    receiver.handle_new_token = handle_new_token
+
+    async def pending() -> int:
+        return (await publisher.xpending(key, group))['pending']
+
+    async def scenario():
+        task = asyncio.create_task(receiver.start())
+        try:
+            while not receiver._trade_ready.is_set():
+                await asyncio.sleep(0.01)
+            await stream_transport.publish(publisher, gr.CHANNELS[0], _new_token('SLOW'))
+            await asyncio.wait_for(started.wait(), 5)
+            await asyncio.sleep(0.1)              # 读取循环又转了几圈
+            assert await pending() == 1
+            release.set()
+            deadline = time.monotonic() + 5
+            while await pending():
+                assert time.monotonic() < deadline, "处理完成后没有确认"
+                await asyncio.sleep(0.01)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await receiver.stop()
+
+    asyncio.run(scenario())
+    assert seen == ['SLOW']
+
+
+def test_snipe_runs_before_notification(receiver_factory):
+    """先交易后通知: Telegram 卡住时买入不被拖慢，通知只入队"""
+    from notify_queue import NotificationQueue
+
+    receiver, _, _ = receiver_factory(stream_transport.TRANSPORT_PUBSUB)
+    events = []
+
+    class StuckNotifier:
+        async def notify_new_token(self, *args):
+            events.append('notify')
+            await asyncio.sleep(10)
+
+    class Decision:
+        amount_sol = 0.01
+
+    async def should_snipe(data, source):
+        return Decision()
+
+    async def execute_snipe(data, timer=None, buy_amount=None):
+        events.append('buy')
+
+    receiver.should_snipe = should_snipe
+    receiver.execute_snipe = execute_snipe
+    receiver.trader = object()
+    receiver._trade_ready.set()
+    data = {'address': 'A' * 40, 'symbol': 'FAST', 'platform': 'raydium', 'liquidity': 1.0}
+
+    async def scenario():
+        receiver.notify_queue = NotificationQueue(StuckNotifier(), workers=1)
+        await receiver.notify_queue.start()
+        try:
+            await asyncio.wait_for(gr.GlobalReceiver.handle_new_token(receiver, 'HK', data), 1)
+            await asyncio.sleep(0.05)
+            assert receiver.notify_queue.stats['enqueued'] == 1
+        finally:
+            for task in receiver.notify_queue._workers:
+                task.cancel()
+            await asyncio.gather(*receiver.notify_queue._workers, return_exceptions=True)
+
+    asyncio.run(scenario())
+    assert events == ['buy', 'notify']
+
+
+@pytest.mark.parametrize('raw', [
+    '{"type": "NEW_TOKEN", "data": [1]}',
+    '[1, 2]',
+    '{"type": "NEW_TOKEN", "source": ["HK"], "data": {}}',
+    '{"type": "NEW_TOKEN", "data": {"address": ["x"]}}',
+])
+def test_malformed_messages_are_dropped(receiver_factory, raw):
+    """结构不对的合法 JSON 不能让读取循环抛异常"""
+    receiver, _, _ = receiver_factory(stream_transport.TRANSPORT_PUBSUB)
+    assert asyncio.run(receiver.dispatch({'channel': gr.CHANNELS[0], 'data': raw})) is None
+
+
+def test_invalid_ts_ns_skips_latency_only(receiver_factory):
+    receiver, _, seen = receiver_factory(stream_transport.TRANSPORT_PUBSUB)
+    message = json.loads(_new_token('BADTS'))
+
+    async def scenario():
+        receiver._handler_slots = asyncio.Semaphore(1)
+        for ts_ns in ('soon', 1.5e300, True, -1):
+            message['ts_ns'] = ts_ns
+            message['data']['address'] = f'BADTS{ts_ns}'.ljust(40, 'x')
+            task = await receiver.dispatch({'channel': gr.CHANNELS[0], 'data': json.dumps(message)})
+            await task
+
+    asyncio.run(scenario())
+    assert seen == ['BADTS'] * 4
+    assert not receiver.latency.histograms
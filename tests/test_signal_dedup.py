@@ -0,0 +1,47 @@
+"""跨区域信号去重: TTL 过期 / 跨区域副本 / 同区域重复"""
+from signal_dedup import SignalDedup
+
+MS = 10**6
+
+
+def test_first_arrival_wins_and_other_regions_are_dropped():
+    dedup = SignalDedup(ttl_seconds=60)
+    assert dedup.check('A', 'HK', 'raydium', now_ns=0)
+    assert not dedup.check('A', 'JP', 'raydium', now_ns=30 * MS)
+    assert not dedup.check('A', 'DE', 'raydium', now_ns=80 * MS)
+    assert dedup.winner('A') == 'HK' and dedup.dropped == 2
+
+    stats = dedup.stats['raydium']
+    assert stats['HK'].wins == 1 and stats['HK'].losses == 0
+    assert stats['HK'].avg_lead_ms == 30           # 只按第二名计算领先
+    assert stats['JP'].losses == 1 and stats['DE'].losses == 1
+    assert stats['DE'].avg_lag_ms == 80 and stats['DE'].lag_ms_max == 80
+
+
+def test_same_source_repeat_is_not_a_loss():
+    dedup = SignalDedup(ttl_seconds=60)
+    assert dedup.check('A', 'HK', 'pump', now_ns=0)
+    assert not dedup.check('A', 'HK', 'pump', now_ns=5 * MS)
+    assert not dedup.check('A', 'JP', 'pump', now_ns=20 * MS)
+    stats = dedup.stats['pump']
+    assert stats['HK'].losses == 0 and stats['HK'].wins == 1
+    assert stats['HK'].avg_lead_ms == 20           # 领先幅度由第一个其他区域决定
+    assert stats['JP'].losses == 1
+    assert dedup.dropped == 2
+
+
+def test_entries_expire_after_ttl():
+    dedup = SignalDedup(ttl_seconds=1)
+    assert dedup.check('A', 'HK', now_ns=0)
+    assert not dedup.check('A', 'JP', now_ns=999 * MS)
+    assert dedup.check('A', 'JP', now_ns=1000 * MS)  # 过期后重新算作第一份
+    assert dedup.winner('A') == 'JP' and len(dedup) == 1
+
+
+def test_max_entries_evicts_oldest():
+    dedup = SignalDedup(ttl_seconds=60, max_entries=2)
+    for i, address in enumerate('ABC'):
+        assert dedup.check(address, 'HK', now_ns=i)
+    dedup.check('D', 'HK', now_ns=3)
+    assert dedup.winner('A') is None and dedup.winner('D') == 'HK'
+    assert len(dedup) <= 3
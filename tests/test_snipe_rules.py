@@ -0,0 +1,133 @@
+"""狙击规则编译 / 判定 / 热加载"""
+import os
+
+import pytest
+
+yaml = pytest.importorskip('yaml')
+
+from snipe_rules import CompiledRules, RuleEngine, RuleError, rules_from_sniper_config
+
+
+def _spec(*rules, **extra):
+    return {'defaults': {'buy_amount_sol': 0.01}, 'rules': list(rules), **extra}
+
+
+def test_first_matching_rule_wins_per_platform():
+    rules = CompiledRules(_spec(
+        {'name': 'big', 'platforms': ['raydium'], 'min_liquidity': 10000, 'buy_amount_sol': 0.05},
+        {'name': 'any', 'min_liquidity': 1000},
+        {'name': 'pump', 'platforms': ['pump_fun'], 'min_liquidity': 0},
+    ))
+    assert rules.evaluate({'platform': 'raydium', 'liquidity': 20000}) == (True, 0.05, 'big', '命中规则 big')
+    assert rules.evaluate({'platform': 'raydium', 'liquidity': 2000}).rule == 'any'
+    assert rules.evaluate({'platform': 'orca', 'liquidity': 2000}).rule == 'any'
+    assert rules.evaluate({'platform': 'pump_fun', 'liquidity': 10}).rule == 'pump'
+    assert not rules.evaluate({'platform': 'raydium', 'liquidity': 10}).buy
+
+
+def test_blocklist_trust_and_skip_action():
+    rules = CompiledRules(_spec(
+        {'name': 'skip_low', 'max_liquidity': 100, 'action': 'skip'},
+        {'name': 'trusted', 'min_trust': 0.9},
+        blocklist={'name': ['scam'], 'symbol': ['RUG']},
+        sources={'HK': 1.0, 'JP': 0.5, 'XX': 0, 'default': 0.8},
+    ))
+    assert rules.evaluate({'liquidity': 500}, 'HK').rule == 'trusted'
+    assert not rules.evaluate({'liquidity': 500}, 'JP').buy
+    assert not rules.evaluate({'liquidity': 500}, 'XX').buy
+    assert rules.evaluate({'liquidity': 50}, 'HK') == (False, 0.0, 'skip_low', '规则 skip_low 要求跳过')
+    assert not rules.evaluate({'liquidity': 500, 'name': 'Big SCAM coin'}, 'HK').buy
+    assert not rules.evaluate({'liquidity': 500, 'symbol': '$rug'}, 'HK').buy
+
+
+@pytest.mark.parametrize('name, blocked', [
+    ('Rug Pull', True), ('RUG', True), ('$rug-coin', True), ('safe_rug', True),
+    ('Drug', False), ('Rugby Club', False), ('rug2', False), ('Scammer', False),
+])
+def test_blocklist_matches_whole_words(name, blocked):
+    rules = CompiledRules(_spec({'name': 'any'}, blocklist={'name': ['rug', 'scam'], 'symbol': ['TEST']}))
+    assert rules.evaluate({'name': name, 'symbol': 'TESTER'}).buy is not blocked
+
+
+@pytest.mark.parametrize('spec', [
+    _spec({'name': 'r', 'min_liquidty': 1000}),
+    _spec({'name': 'r', 'platform': ['raydium']}),
+    _spec({'name': 'r'}, rule=[]),
+    _spec({'name': 'r'}, blocklist={'names': ['rug']}),
+    {'defaults': {'buy_amount': 0.01}, 'rules': []},
+])
+def test_unknown_keys_are_rejected(spec):
+    with pytest.raises(RuleError, match='未知字段'):
+        CompiledRules(spec)
+
+
+def test_scalar_blocklist_is_rejected():
+    with pytest.raises(RuleError):
+        CompiledRules(_spec({'name': 'r'}, blocklist={'name': 'rug'}))
+
+
+def test_missing_price_never_matches_price_bounds():
+    rules = CompiledRules(_spec({'name': 'cheap', 'max_price': 1.0}))
+    assert rules.evaluate({'price': 0.5}).buy
+    assert not rules.evaluate({}).buy
+
+
+@pytest.mark.parametrize('bound', [float('inf'), float('-inf'), float('nan'), '.inf', 'nan'])
+def test_non_finite_bounds_are_rejected(bound):
+    with pytest.raises(RuleError):
+        CompiledRules(_spec({'name': 'r', 'min_liquidity': bound}))
+
+
+def test_non_numeric_and_non_finite_amount_are_rejected():
+    with pytest.raises(RuleError):
+        CompiledRules(_spec({'name': 'r', 'min_liquidity': 'lots'}))
+    with pytest.raises(RuleError):
+        CompiledRules(_spec({'name': 'r', 'buy_amount_sol': float('inf')}))
+
+
+def test_scalar_platforms_are_rejected():
+    with pytest.raises(RuleError):
+        CompiledRules(_spec({'name': 'r', 'platforms': 'raydium'}))
+    rules = CompiledRules(_spec({'name': 'r', 'platforms': ('raydium',)}))
+    assert rules.evaluate({'platform': 'raydium'}).buy
+    assert not rules.evaluate({'platform': 'r'}).buy
+
+
+def test_sniper_config_fallback():
+    rules = rules_from_sniper_config({'buy_amount_sol': 0.02, 'platforms': ['raydium'], 'min_liquidity': 1000})
+    assert rules.evaluate({'platform': 'raydium', 'liquidity': 1500}) == (True, 0.02, 'sniper_config', '命中规则 sniper_config')
+    assert not rules.evaluate({'platform': 'pump_fun', 'liquidity': 1500}).buy
+
+
+def _write(path, spec, mtime_ns):
+    with open(path, 'w') as f:
+        yaml.safe_dump(spec, f)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_failed_reload_keeps_previous_rules(tmp_path):
+    path = str(tmp_path / 'snipe_rules.yaml')
+    fallback = rules_from_sniper_config({'buy_amount_sol': 0.01, 'platforms': [], 'min_liquidity': 0})
+    _write(path, _spec({'name': 'good', 'min_liquidity': 1000}), 1_000_000_000)
+    engine = RuleEngine(path, fallback)
+    good = engine.current
+    assert engine.evaluate({'liquidity': 2000}).rule == 'good'
+
+    # YAML 的 .inf 会被解析成 float('inf')
+    with open(path, 'w') as f:
+        f.write("rules:\n  - name: bad\n    min_liquidity: .inf\n")
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    assert engine.reload() is False
+    assert engine.current is good
+
+    _write(path, _spec({'name': 'scalar', 'platforms': 'raydium'}), 3_000_000_000)
+    assert engine.reload() is False
+    assert engine.evaluate({'liquidity': 2000}).rule == 'good'
+
+    _write(path, _spec({'name': 'better', 'min_liquidity': 0}), 4_000_000_000)
+    assert engine.reload() is True
+    assert engine.evaluate({'liquidity': 2000}).rule == 'better'
+
+    os.remove(path)
+    assert engine.reload() is True
+    assert engine.current is fallback
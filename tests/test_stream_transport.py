@@ -0,0 +1,106 @@
+"""Streams 传输: 消费组启动 / 过期跳过 / 处理完成后才确认"""
+import asyncio
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+import fakeredis.aioredis as far
+
+import stream_transport
+from conftest import emulate_block
+from stream_transport import StreamConsumer, SyncStreamConsumer, stream_key
+
+CHANNEL = 'new_tokens'
+KEY = stream_key(CHANNEL)
+
+
+async def _pending(client) -> int:
+    return (await client.xpending(KEY, 'receivers'))['pending']
+
+
+async def _next_batch(batches):
+    return await asyncio.wait_for(batches.__anext__(), 2)
+
+
+def test_consumer_starts_on_missing_stream_and_reads_new_messages():
+    async def scenario():
+        client = emulate_block(far.FakeRedis())
+        consumer = StreamConsumer(client, [CHANNEL], consumer='c1')
+        batches = consumer.batches()
+        reader = asyncio.ensure_future(_next_batch(batches))
+        while not await client.exists(KEY):      # 消费组 (和 stream) 已创建
+            await asyncio.sleep(0.01)
+        await stream_transport.publish(client, CHANNEL, b'hello')
+        batch = await reader
+        assert [(m['channel'], m['data']) for m in batch] == [(CHANNEL, b'hello')]
+        assert await _pending(client) == 1        # 调用方还没处理完
+        await stream_transport.publish(client, CHANNEL, b'second')
+        assert [m['data'] for m in await _next_batch(batches)] == [b'second']
+        assert consumer.stats['acked'] == 1       # 取下一批时确认上一批
+        await batches.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_stale_messages_are_acked_and_skipped():
+    async def scenario():
+        client = emulate_block(far.FakeRedis())
+        consumer = StreamConsumer(client, [CHANNEL], consumer='c1', stale_ms=1000)
+        await consumer.ensure_groups()
+        old_ms = int(time.time() * 1000) - 5000
+        await client.xadd(KEY, {stream_transport.FIELD: b'old'}, id=f"{old_ms}-0")
+        await stream_transport.publish(client, CHANNEL, b'new')
+        batches = consumer.batches()
+        assert [m['data'] for m in await _next_batch(batches)] == [b'new']
+        assert consumer.stats['stale'] == 1
+        assert await _pending(client) == 1        # 只剩没处理完的 new
+        await batches.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_deferred_ack_waits_for_done():
+    """ack_on_next=False: 处理完 (done) 之前不确认；重连后重新取回未确认消息时跳过还在处理的"""
+    async def scenario():
+        client = emulate_block(far.FakeRedis())
+        consumer = StreamConsumer(client, [CHANNEL], consumer='c1')
+        await consumer.ensure_groups()
+        await stream_transport.publish(client, CHANNEL, b'a')
+        await stream_transport.publish(client, CHANNEL, b'b')
+        batches = consumer.batches(ack_on_next=False)
+        first, second = await _next_batch(batches)
+        await stream_transport.publish(client, CHANNEL, b'c')
+        assert [m['data'] for m in await _next_batch(batches)] == [b'c']
+        assert await _pending(client) == 3
+
+        consumer.done(first)
+        consumer.pending_first = True             # 模拟重连: 先读未确认的消息
+        await stream_transport.publish(client, CHANNEL, b'd')
+        assert [m['data'] for m in await _next_batch(batches)] == [b'd']
+        assert await _pending(client) == 3        # a 已确认；b、c、d 还在处理
+        for message in (second,):
+            consumer.done(message)
+        await consumer.flush()
+        assert await _pending(client) == 2
+        await batches.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_sync_consumer_acks_after_processing():
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    consumer = SyncStreamConsumer(client, [CHANNEL], consumer='sync')
+    consumer.ensure_groups()
+    for data in (b'x', b'y'):
+        stream_transport.publish(client, CHANNEL, data)
+    messages = consumer.messages()
+    first = next(messages)
+    assert first['data'] == b'x'
+    assert client.xpending(KEY, 'receivers')['pending'] == 2
+    assert next(messages)['data'] == b'y'
+    assert client.xpending(KEY, 'receivers')['pending'] == 2
+    stream_transport.publish(client, CHANNEL, b'z')
+    assert next(messages)['data'] == b'z'     # 取下一批之前确认了 x、y
+    assert client.xpending(KEY, 'receivers')['pending'] == 1
@@ -0,0 +1,197 @@
+"""Redis 连接监管: 退避 / 心跳 / 中断统计 / 断线重新订阅"""
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+import supervisor
+from supervisor import Backoff, DeadPeer, Heartbeat, OutageStats, PubSubSupervisor, SyncPubSubSupervisor
+
+FAST = {'backoff_base': 0.01, 'backoff_max': 0.02, 'heartbeat_interval': 0.05, 'heartbeat_timeout': 0.05,
+        'connect_timeout': 0.5}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(supervisor.time, 'monotonic', fake)
+    return fake
+
+
+def test_backoff_bounds_and_reset():
+    random.seed(4)
+    backoff = Backoff(0.1, 2.0, 2.0)
+    for attempt in range(8):
+        ceiling = min(2.0, 0.1 * 2 ** attempt)
+        assert ceiling / 2 <= backoff.next() <= ceiling
+    backoff.reset()
+    assert 0.05 <= backoff.next() <= 0.1
+
+
+def test_backoff_is_jittered():
+    """同时断线的客户端不能在同一时刻一起重连"""
+    delays = []
+    for _ in range(50):
+        backoff = Backoff(0.1, 2.0, 2.0)
+        backoff.attempt = 10
+        delays.append(backoff.next())
+    assert min(delays) >= 1.0 and max(delays) <= 2.0
+    assert len({round(d, 6) for d in delays}) > 40
+
+
+def test_heartbeat_pings_when_idle_and_detects_dead_peer(clock):
+    hb = Heartbeat(interval=1.0, timeout=0.5)
+    assert hb.budget() == 1.0
+    clock.now += 0.4
+    assert hb.budget() == pytest.approx(0.6)
+    clock.now += 0.6
+    assert hb.budget() == 0                 # 空闲满 interval: 该发 PING 了
+    hb.ping_sent = clock.now
+    clock.now += 0.3
+    assert hb.budget() == pytest.approx(0.2)
+    clock.now += 0.2
+    with pytest.raises(DeadPeer):
+        hb.budget()
+
+
+def test_heartbeat_any_data_counts_as_alive(clock):
+    hb = Heartbeat(interval=1.0, timeout=0.5)
+    clock.now += 1.0
+    hb.ping_sent = clock.now
+    clock.now += 0.4
+    hb.alive()                              # PONG 或任何消息
+    assert hb.ping_sent is None and hb.budget() == 1.0
+
+
+def test_outage_stats(clock):
+    stats = OutageStats(history=2)
+    assert stats.up() is None and stats.report() == "无中断"
+    stats.down(ConnectionError('reset'))
+    clock.now += 0.2
+    stats.down(ConnectionError(''))         # 同一次中断里的后续失败不重复计数
+    assert stats.outages == 1 and stats.last_error == 'ConnectionError'
+    clock.now += 0.3
+    assert stats.up() == pytest.approx(0.5)
+    for ttr in (0.1, 0.2):
+        stats.down(DeadPeer('silent'))
+        clock.now += ttr
+        stats.up()
+    assert stats.outages == 3 and stats.dead_peers == 2
+    assert list(stats.recoveries) == pytest.approx([0.1, 0.2])   # 只保留最近 history 次
+    stats.down(OSError('down'))
+    clock.now += 1.5
+    assert "中断 4 次 (心跳判死 2)" in stats.report() and "当前已中断 1.5s" in stats.report()
+
+
+class SilentPubSub:
+    """接受订阅，但之后什么都不回 (半开连接)"""
+
+    def __init__(self):
+        self.pings = 0
+        self.closed = False
+
+    async def subscribe(self, *channels):
+        pass
+
+    async def get_message(self, timeout=None):
+        await asyncio.sleep(timeout)
+        return None
+
+    async def ping(self):
+        self.pings += 1
+
+    async def aclose(self):
+        self.closed = True
+
+
+class ScriptedClient:
+    """第一个 pubsub 是半开连接，之后交给真正的 (fakeredis) 客户端"""
+
+    def __init__(self, real):
+        self.real = real
+        self.silent = SilentPubSub()
+        self.created = 0
+
+    def pubsub(self):
+        self.created += 1
+        return self.silent if self.created == 1 else self.real.pubsub()
+
+
+def test_async_supervisor_detects_dead_peer_and_resubscribes():
+    fakeredis = pytest.importorskip('fakeredis')
+    import fakeredis.aioredis as far
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        client = ScriptedClient(far.FakeRedis(server=server))
+        publisher = far.FakeRedis(server=server)
+        sup = PubSubSupervisor(client, ['ch'], name='test', config=FAST)
+        messages = sup.messages()
+        reader = asyncio.ensure_future(messages.__anext__())
+
+        while not (await publisher.pubsub_numsub('ch'))[0][1]:
+            await asyncio.sleep(0.01)
+        await publisher.publish('ch', 'hello')
+        message = await asyncio.wait_for(reader, 2)
+        assert message['data'] == b'hello'
+        assert client.silent.pings == 1 and client.silent.closed
+        assert sup.stats.outages == 1 and sup.stats.dead_peers == 1 and len(sup.stats.recoveries) == 1
+
+        # 连接断开: 重连后自动重新订阅，之后的消息照常收到
+        server.connected = False
+        reader = asyncio.ensure_future(messages.__anext__())
+        await asyncio.sleep(0.1)
+        server.connected = True
+        # 旧订阅在服务端可能还没清理掉，重复发布直到新订阅收到
+        for _ in range(100):
+            await publisher.publish('ch', 'again')
+            await asyncio.wait([reader], timeout=0.02)
+            if reader.done():
+                break
+        assert reader.result()['data'] == b'again'
+        assert sup.stats.outages == 2 and sup.stats.down_since is None
+        assert sup.backoff.attempt == 0
+        await messages.aclose()
+        await sup.close()
+
+    asyncio.run(scenario())
+
+
+def test_sync_supervisor_resubscribes_after_drop():
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    publisher = fakeredis.FakeRedis(server=server)
+    sup = SyncPubSubSupervisor(fakeredis.FakeRedis(server=server), ['ch'], name='sync', config=FAST)
+    sup.connect()
+    received = []
+    messages = sup.messages()
+
+    def publish_after_drop():
+        time.sleep(0.1)
+        server.connected = False
+        time.sleep(0.1)
+        server.connected = True
+        deadline = time.monotonic() + 2
+        while not publisher.pubsub_numsub('ch')[0][1] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        while not received and time.monotonic() < deadline:
+            publisher.publish('ch', 'after')
+            time.sleep(0.05)
+
+    thread = threading.Thread(target=publish_after_drop)
+    thread.start()
+    received.append(next(messages)['data'])
+    thread.join()
+    sup.close()
+    assert received == [b'after']
+    assert sup.stats.outages == 1 and len(sup.stats.recoveries) == 1
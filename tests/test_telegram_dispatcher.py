@@ -0,0 +1,154 @@
+"""Telegram 分发器: 令牌桶限速 / 摘要合并 / 优先队列插队 / 429 retry_after"""
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+import telegram_dispatcher
+from telegram_dispatcher import TelegramDispatcher, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_burst_then_rate(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(telegram_dispatcher.time, 'monotonic', clock)
+    bucket = TokenBucket(rate=2.0, burst=3)
+
+    for _ in range(3):
+        assert bucket.delay() == 0.0
+        bucket.take()
+    assert bucket.delay() == pytest.approx(0.5)
+
+    clock.now += 0.25
+    assert bucket.delay() == pytest.approx(0.25)
+    clock.now += 0.25
+    assert bucket.delay() == 0.0
+    bucket.take()
+
+    # 长时间空闲最多只攒 burst 个令牌
+    clock.now += 100
+    for _ in range(3):
+        assert bucket.delay() == 0.0
+        bucket.take()
+    assert bucket.delay() > 0
+
+
+def test_token_bucket_pause_overrides_tokens(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(telegram_dispatcher.time, 'monotonic', clock)
+    bucket = TokenBucket(rate=1.0, burst=3)
+
+    bucket.pause(2.0)
+    assert bucket.delay() == pytest.approx(2.0)
+    clock.now += 2.0
+    assert bucket.delay() == 0.0
+    bucket.take()
+    # 暂停结束时只留一个令牌，之后按 rate 补充
+    assert bucket.delay() == pytest.approx(1.0)
+
+
+def _run(scenario, config=None, **api):
+    async def main():
+        runner, api_base, state = await telegram_dispatcher.start_mock_api(**api)
+        dispatcher = TelegramDispatcher({'bot_token': 'TEST', 'chat_id': 1, 'api_base': api_base,
+                                         'drain_timeout': 5, **(config or {})})
+        try:
+            await scenario(dispatcher, state)
+        finally:
+            await dispatcher.stop()
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def test_sends_are_paced_by_the_bucket():
+    async def scenario(dispatcher, state):
+        for i in range(4):
+            dispatcher.submit('send_message', f'msg{i}', droppable=False)
+        await dispatcher.start()
+        await dispatcher.stop()
+
+        times = [ts for ts, _ in state['received']]
+        assert [text for _, text in state['received']] == [f'msg{i}' for i in range(4)]
+        # 突发 1 条，之后每 0.1s 一条
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        assert all(gap >= 0.08 for gap in gaps)
+        assert dispatcher.stats['sent'] == 4
+
+    _run(scenario, {'rate': 10.0, 'burst': 1}, min_interval=0)
+
+
+def test_backlog_is_folded_into_one_digest():
+    async def scenario(dispatcher, state):
+        for i in range(8):
+            dispatcher.submit('notify_new_token', f'TOK{i}', f'Addr{i}', 'pump_fun', 1000 * i,
+                              key=('new_token', f'Addr{i}'))
+        dispatcher.submit('notify_new_token', 'TOK3', 'Addr3', 'pump_fun', 99_999, key=('new_token', 'Addr3'))
+        await dispatcher.start()
+        await dispatcher.stop()
+
+        assert len(state['received']) == 1
+        lines = state['received'][0][1].splitlines()
+        assert lines[0].startswith('📦 *8 个新币')
+        # 按流动性从高到低列出前 digest_top 个，同一地址只保留最新的一条
+        assert lines[1] == '• TOK3 - pump_fun - $99,999'
+        assert lines[3] == '• TOK7 - pump_fun - $7,000'
+        assert lines[-1] == '… 另有 4 个'
+        assert dispatcher.stats['coalesced'] == 1
+        assert dispatcher.stats['digests'] == 1 and dispatcher.stats['folded'] == 8
+
+    _run(scenario, {'digest_top': 4}, min_interval=0)
+
+
+def test_below_threshold_is_sent_individually():
+    async def scenario(dispatcher, state):
+        dispatcher.submit('notify_new_token', 'ONE', 'Addr1', 'pump_fun', 1000)
+        dispatcher.submit('notify_new_token', 'TWO', 'Addr2', 'pump_fun', 2000)
+        await dispatcher.start()
+        await dispatcher.stop()
+
+        assert [text.splitlines()[0] for _, text in state['received']] == ['🆕 *新币*: ONE', '🆕 *新币*: TWO']
+        assert dispatcher.stats['digests'] == 0
+
+    _run(scenario, min_interval=0)
+
+
+def test_urgent_notifications_jump_the_queue():
+    async def scenario(dispatcher, state):
+        dispatcher.submit('notify_new_token', 'TOK', 'Addr', 'pump_fun', 1000)
+        dispatcher.submit('notify_buy', symbol='TOK', amount_sol=0.01, token_amount=1, tx='TX1', droppable=False)
+        dispatcher.submit('notify_error', 'boom', droppable=False)
+        await dispatcher.start()
+        await dispatcher.stop()
+
+        firsts = [text.splitlines()[0] for _, text in state['received']]
+        assert firsts == ['✅ *买入成功*: TOK', '❌ *错误*', '🆕 *新币*: TOK']
+
+    _run(scenario, min_interval=0)
+
+
+def test_rate_limit_waits_retry_after_and_resends():
+    async def scenario(dispatcher, state):
+        for i in range(3):
+            dispatcher.submit('send_message', f'msg{i}', droppable=False)
+        await dispatcher.start()
+        await dispatcher.stop()
+
+        assert [text for _, text in state['received']] == ['msg0', 'msg1', 'msg2']
+        times = [ts for ts, _ in state['received']]
+        # 每条都先被拒一次，暂停 retry_after 后重发成功，限流不计入失败 / 重试
+        assert all(b - a >= 0.3 for a, b in zip(times, times[1:]))
+        assert state['rejected'] == 2
+        assert dispatcher.stats['rate_limited'] == 2
+        assert dispatcher.stats['sent'] == 3
+        assert dispatcher.stats['retries'] == 0 and dispatcher.stats['failed'] == 0
+
+    _run(scenario, {'rate': 100.0, 'burst': 3}, min_interval=0.3, retry_after=0.35)
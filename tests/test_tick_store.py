@@ -0,0 +1,125 @@
+"""Tick 列式存储: 写读往返 / 崩溃截断 / 回放 (numpy 与纯 Python 结果一致)"""
+import os
+
+import pytest
+
+import tick_store
+from tick_store import COLUMNS, TickReader, TickWriter
+
+BASE = 1_700_000_000 * 10**9
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(tick_store, 'np', None)
+    return request.param
+
+
+def _rows(reader):
+    cols = reader.columns
+    return [(int(cols['ts'][i]), reader.venues[cols['venue'][i]], reader.symbols[cols['symbol'][i]],
+             float(cols['price'][i])) for i in range(len(reader))]
+
+
+def test_round_trip(tmp_path, backend):
+    writer = TickWriter(str(tmp_path))
+    writer.append(BASE, 'cex', 'SOLUSDT', 100.0)
+    writer.append_many(BASE + 1, 'dex', {'SOLUSDT': 100.5, 'JUPUSDT': 0.75})
+    writer.close()
+    # 重新打开继续追加，沿用已有字典
+    writer = TickWriter(str(tmp_path))
+    writer.append(BASE + 2, 'cex', 'JUPUSDT', 0.7)
+    writer.close()
+
+    reader = TickReader(str(tmp_path))
+    assert reader.venues == ['cex', 'dex'] and reader.symbols == ['SOLUSDT', 'JUPUSDT']
+    assert _rows(reader) == [(BASE, 'cex', 'SOLUSDT', 100.0), (BASE + 1, 'dex', 'SOLUSDT', 100.5),
+                             (BASE + 1, 'dex', 'JUPUSDT', 0.75), (BASE + 2, 'cex', 'JUPUSDT', 0.7)]
+
+
+def test_torn_write_is_truncated(tmp_path, backend):
+    writer = TickWriter(str(tmp_path))
+    writer.append(BASE, 'cex', 'SOLUSDT', 100.0)
+    writer.append(BASE + 1, 'dex', 'SOLUSDT', 101.0)
+    writer.close()
+    # 模拟崩溃: 只有价格列多写了半行 + 一整行
+    with open(os.path.join(tmp_path, COLUMNS['price'][0]), 'ab') as f:
+        f.write(b'\x00' * 12)
+
+    assert len(TickReader(str(tmp_path))) == 2
+    writer = TickWriter(str(tmp_path))
+    writer.append(BASE + 2, 'cex', 'SOLUSDT', 102.0)
+    writer.close()
+    assert [row[3] for row in _rows(TickReader(str(tmp_path)))] == [100.0, 101.0, 102.0]
+
+
+def test_backtest_threshold_cooldown_and_skew(tmp_path, backend):
+    writer = TickWriter(str(tmp_path))
+    second = 10**9
+    writer.append(BASE, 'cex', 'SOLUSDT', 100.0)
+    writer.append(BASE + 1 * second, 'dex', 'SOLUSDT', 102.0)     # +2%
+    writer.append(BASE + 2 * second, 'dex', 'SOLUSDT', 101.5)     # +1.5%，冷却中
+    writer.append(BASE + 20 * second, 'dex', 'SOLUSDT', 98.0)     # -2%，cex 价已经旧了 20s
+    writer.close()
+    reader = TickReader(str(tmp_path))
+    fast = backend == 'numpy'
+
+    results, events = tick_store.backtest(reader, [1.0], [0, 10], max_skew_ms=60_000, fast=fast)
+    assert events == 3
+    no_cooldown, cooldown = results
+    assert [round(a[2], 6) for a in no_cooldown['alerts']] == [2.0, 1.5, -2.0]
+    assert [a[0] for a in cooldown['alerts']] == [BASE + second, BASE + 20 * second]
+    assert cooldown['alerts'][0][1] == 'SOLUSDT'
+    assert cooldown['alerts'][0][3] == 'CEX → DEX' and cooldown['alerts'][1][3] == 'DEX → CEX'
+
+    results, events = tick_store.backtest(reader, [1.0], [0], max_skew_ms=5000, fast=fast)
+    assert events == 2
+    assert [round(a[2], 6) for a in results[0]['alerts']] == [2.0, 1.5]
+
+    # 默认与监控相同的 MAX_SKEW_MS: 相隔 1s 的两边价格都不可信
+    results, events = tick_store.backtest(reader, [1.0], [0], fast=fast)
+    assert events == 0 and results[0]['alerts'] == []
+
+
+def _noisy_then_spike(path, spike: float, n: int = 60):
+    """两边同时采样的平稳小价差，最后一个 tick 出现 spike% 的偏离"""
+    import random
+    rng = random.Random(3)
+    writer = TickWriter(str(path))
+    for i in range(n):
+        ts = BASE + i * 10**9
+        spread = spike if i == n - 1 else rng.gauss(0.05, 0.02)
+        writer.append(ts, 'cex', 'SOLUSDT', 100.0)
+        writer.append(ts, 'dex', 'SOLUSDT', 100.0 * (1 + spread / 100))
+    writer.close()
+    return TickReader(str(path))
+
+
+@pytest.mark.parametrize('spike, expected', [(0.5, 1), (0.25, 0)])
+def test_backtest_uses_zscore_and_alert_floor(tmp_path, backend, spike, expected):
+    """阈值以下、偏离滚动均值足够大且不低于 ALERT_FLOOR 的价差也报警 (与 classify_tick 一致)"""
+    reader = _noisy_then_spike(tmp_path, spike)
+    results, _ = tick_store.backtest(reader, [1.0], [0], fast=backend == 'numpy')
+    alerts = results[0]['alerts']
+    assert len(alerts) == expected
+    if expected:
+        assert alerts[0][0] == BASE + 59 * 10**9 and alerts[0][2] == pytest.approx(spike)
+
+
+def test_numpy_replay_matches_classify_tick(tmp_path):
+    pytest.importorskip('numpy')
+    tick_store.synth(str(tmp_path), n_ticks=20_000, n_symbols=5)
+    reader = TickReader(str(tmp_path))
+    args = ([0.3, 0.5, 1.0], [0, 30])
+
+    for max_skew_ms in (None, 2000):
+        fast, fast_events = tick_store.backtest(reader, *args, max_skew_ms=max_skew_ms, fast=True)
+        slow, slow_events = tick_store.backtest(reader, *args, max_skew_ms=max_skew_ms, fast=False)
+        assert fast_events == slow_events > 0
+        for a, b in zip(fast, slow):
+            assert [(t, s, d) for t, s, _, d in a['alerts']] == [(t, s, d) for t, s, _, d in b['alerts']]
+            assert [x[2] for x in a['alerts']] == pytest.approx([x[2] for x in b['alerts']])
+        assert any(r['alerts'] for r in fast)
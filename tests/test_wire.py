@@ -0,0 +1,99 @@
+"""Mesh 线格式: JSON / 二进制往返与边界情况"""
+import json
+import math
+
+import pytest
+
+import wire
+
+PUBKEY = 'So11111111111111111111111111111111111111112'
+
+
+def test_b58_round_trip():
+    for raw in (bytes(32), b'\x00\x01' + bytes(range(30)), bytes(range(256))[:32], b'\xff' * 32):
+        assert wire.b58decode(wire.b58encode(raw)) == raw
+    assert wire.b58encode(wire.b58decode(PUBKEY)) == PUBKEY
+
+
+def test_new_token_binary_round_trip():
+    data = {'address': PUBKEY, 'name': 'Mesh Token', 'symbol': 'MESH', 'platform': 'raydium',
+            'liquidity': 12345.5, 'price': 0.0001}
+    raw = wire.encode_message('NEW_TOKEN', 'HK', data, ts_ns=1_700_000_000_123_456_789, fmt=wire.FORMAT_BINARY)
+    assert wire.is_binary(raw)
+    message = wire.decode_message(raw)
+    assert message['type'] == 'NEW_TOKEN' and message['source'] == 'HK'
+    assert message['ts_ns'] == 1_700_000_000_123_456_789
+    assert message['data'] == data
+
+
+def test_new_token_text_address_and_unknown_platform():
+    data = {'address': 'not-a-pubkey', 'name': '', 'symbol': 'X', 'platform': 'orca',
+            'liquidity': None, 'price': None}
+    message = wire.decode_message(wire.encode_message('NEW_TOKEN', 'JP', data, fmt=wire.FORMAT_BINARY))
+    assert message['data'] == data
+
+
+def test_missing_or_nan_liquidity_decodes_as_none():
+    for liquidity in (None, float('nan')):
+        raw = wire.encode_message('NEW_TOKEN', 'HK', {'address': PUBKEY, 'liquidity': liquidity},
+                                  fmt=wire.FORMAT_BINARY)
+        assert wire.decode_message(raw)['data']['liquidity'] is None
+
+
+def test_pump_detected_round_trip_with_extra():
+    data = {'token': 'MESH', 'price': 1.5, 'reason': '5分钟涨幅 300%', 'volume': 1e6, 'pairs': ['a', 'b']}
+    message = wire.decode_message(wire.encode_message('PUMP_DETECTED', 'DE', data, fmt=wire.FORMAT_BINARY))
+    assert message['type'] == 'PUMP_DETECTED'
+    assert message['data'] == data
+
+
+def test_str8_truncates_on_character_boundary():
+    # 3 字节字符 × 100 = 300 字节: 按字节截到 255 会切开第 86 个字符
+    name = '币' * 100
+    encoded = wire._str8(name)
+    assert encoded[0] == 255 - 255 % 3
+    assert encoded[1:].decode('utf-8') == '币' * 85
+    message = wire.decode_message(wire.encode_message(
+        'NEW_TOKEN', 'HK', {'address': PUBKEY, 'name': name, 'symbol': '🚀' * 100}, fmt=wire.FORMAT_BINARY))
+    assert message['data']['name'] == '币' * 85
+    assert message['data']['symbol'] == '🚀' * 63
+
+
+def test_str8_ascii_and_none():
+    assert wire._str8(None) == b'\x00'
+    assert wire._str8('a' * 300) == b'\xff' + b'a' * 255
+
+
+def test_json_format_and_auto_detect():
+    raw = wire.encode_message('NEW_TOKEN', 'HK', {'address': PUBKEY}, ts_ns=123)
+    assert isinstance(raw, str) and not wire.is_binary(raw)
+    assert wire.decode_message(raw)['ts_ns'] == 123
+    # 没有二进制 schema 的类型即使要求 binary 也用 JSON
+    assert json.loads(wire.encode_message('HEARTBEAT', 'HK', {}, fmt=wire.FORMAT_BINARY))['type'] == 'HEARTBEAT'
+    # 旧发布端的 JSON 没有 ts_ns
+    assert wire.decode_message(json.dumps({'type': 'NEW_TOKEN', 'data': {}}))['ts_ns'] is None
+
+
+@pytest.mark.parametrize('raw', [
+    b'\xb5\x01\x01\x00',                                # 头部不完整
+    b'\xb5\x02' + bytes(10),                            # 版本不对
+    b'\xb5\x01\x09\x00' + bytes(8) + b'\x00',           # 未知类型
+    'not json', '[1, 2]', b'\xff\xfe',
+])
+def test_invalid_messages_raise_value_error(raw):
+    with pytest.raises(ValueError):
+        wire.decode_message(raw)
+
+
+def test_truncated_binary_body_raises_value_error():
+    raw = wire.encode_message('NEW_TOKEN', 'HK', {'address': PUBKEY, 'name': 'abc'}, fmt=wire.FORMAT_BINARY)
+    for cut in (20, len(raw) - 3):
+        with pytest.raises(ValueError):
+            wire.decode_message(raw[:cut])
+
+
+def test_ping_pong():
+    ping = wire.make_ping(7)
+    pong = json.loads(wire.make_pong('HK', ping))
+    assert pong['id'] == 7 and pong['source'] == 'HK'
+    assert pong['t1'] >= pong['t0'] and not math.isnan(pong['t0'])